@@ -0,0 +1,129 @@
+"""
+Benchmark: cold start of a fresh process. Import time of the clients and time to the first authorized
+invoice against the local AfipStubServer, authenticating with WSAA (cold) vs restoring a WarmState (warm).
+Every measure runs in a new interpreter.
+
+    PYTHONPATH=src python benchmarks/bench_cold_start.py [--latency 0.05] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from common import CUIT, build_credentials
+from easyAfip.utils.afip_ws_connector import AfipWSConnector
+from easyAfip.utils.stub_server import AfipStubServer
+from easyAfip.utils.store import MemoryStore
+from easyAfip.utils.param_cache import ParamCache
+from easyAfip.warm_state import WarmState
+from easyAfip.wsaa import WSAA
+from easyAfip.wsfev import WSFEV
+
+IMPORT_SCRIPT = '''
+import json, sys, time
+# the interpreter and some of the stdlib are already initialized, only the given modules are measured
+started = time.perf_counter()
+for module in sys.argv[1:]:
+    __import__(module)
+elapsed = time.perf_counter() - started
+print(json.dumps({'elapsed': elapsed}))
+'''
+
+FIRST_INVOICE_SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+from easyAfip.utils.afip_ws_connector import AfipWSConnector
+from easyAfip.utils.messages import FECAEDetRequest
+from easyAfip.warm_state import WarmState
+from easyAfip.wsaa import WSAA
+from easyAfip.wsfev import WSFEV
+imported = time.perf_counter()
+
+config = json.load(open(sys.argv[1]))
+if config.get('state'):
+    state = WarmState.from_dict(json.load(open(config['state'])))
+    state.restore()
+    wsaa_connector, wsfev_connector = state.get_connector('wsaa'), state.get_connector('wsfev1')
+else:
+    wsaa_connector = AfipWSConnector(config['endpoints']['wsaa'])
+    wsfev_connector = AfipWSConnector(config['endpoints']['wsfev1'])
+wsaa = WSAA(open(config['pem']).read(), open(config['key']).read(), 'wsfe', test_mode=True, cuit=config['cuit'],
+            connector=wsaa_connector)
+ticket = wsaa.get_access_ticket()
+wsfev = WSFEV(ticket['token'], ticket['sign'], config['cuit'], test_mode=True, connector=wsfev_connector)
+monedas = {item.id for item in wsfev.feparamgettiposmonedas()}
+invoice = FECAEDetRequest(concepto=1, doc_tipo=99, doc_nro=0, cbte_fch=time.strftime('%Y%m%d'), imp_total='121.00',
+                          imp_tot_conc=0, imp_neto='100.00', imp_op_ex=0, imp_iva='21.00', imp_trib=0, mon_id='PES',
+                          mon_cotiz=1)
+assert invoice.mon_id in monedas
+result = wsfev.fecaesolicitar(1, 11, [invoice])
+assert result.details[0].cae, result
+finished = time.perf_counter()
+print(json.dumps({'import': imported - started, 'first_invoice': finished - imported, 'total': finished - started,
+                  'heavy_modules': sorted(name for name in ('requests', 'lxml.etree', 'cryptography') if name in sys.modules)}))
+'''
+
+
+def run_script(script, *args):
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, ['src', os.environ.get('PYTHONPATH')]))}
+    output = subprocess.run([sys.executable, '-c', script, *args], env=env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.splitlines()[-1])
+
+
+def measure_imports(repeat):
+    print('import time (new interpreter, median)')
+    for modules in (['easyAfip.utils.soap_serializer'], ['easyAfip.wsfev'], ['easyAfip.wsfev', 'easyAfip.wsaa'],
+                    ['requests'], ['lxml.etree'], ['cryptography.hazmat.primitives.serialization.pkcs7']):
+        elapsed = statistics.median(run_script(IMPORT_SCRIPT, *modules)['elapsed'] for _ in range(repeat))
+        print(f'  {" + ".join(modules):<52}: {elapsed * 1000:8.1f} ms')
+
+
+def capture_state(stub, pem, key, path):
+    wsaa = WSAA(pem, key, 'wsfe', test_mode=True, cuit=CUIT, ticket_store=MemoryStore(),
+                connector=AfipWSConnector(stub.url('wsaa')))
+    ticket = wsaa.get_access_ticket()
+    wsfev = WSFEV(ticket['token'], ticket['sign'], CUIT, test_mode=True, param_cache=ParamCache(),
+                  connector=AfipWSConnector(stub.url('wsfev1')))
+    wsfev.feparamgettiposmonedas()
+    state = WarmState.capture([wsaa], wsfev)
+    with open(path, 'w') as state_file:
+        json.dump(state.to_dict(), state_file)
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', type=float, default=0.05, help='stub latency per request, in seconds')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    measure_imports(args.repeat)
+
+    pem, key = build_credentials()
+    with tempfile.TemporaryDirectory() as directory, AfipStubServer(latency=args.latency) as stub:
+        paths = {name: os.path.join(directory, name) for name in ('cert.pem', 'key.pem', 'state.json')}
+        for name, content in (('cert.pem', pem), ('key.pem', key)):
+            with open(paths[name], 'w') as pem_file:
+                pem_file.write(content)
+        print(f'snapshot: {capture_state(stub, pem, key, paths["state.json"])}, '
+              f'{os.path.getsize(paths["state.json"])} bytes')
+
+        print(f'time to first invoice (new interpreter, median, stub latency={args.latency * 1000:.0f} ms)')
+        print(f'  {"mode":<6} {"import":>10} {"first inv.":>11} {"total":>10}  heavy modules loaded')
+        for mode in ('cold', 'warm'):
+            config = {'endpoints': stub.endpoints, 'pem': paths['cert.pem'], 'key': paths['key.pem'], 'cuit': CUIT,
+                      'state': paths['state.json'] if mode == 'warm' else None}
+            config_path = os.path.join(directory, f'{mode}.json')
+            with open(config_path, 'w') as config_file:
+                json.dump(config, config_file)
+            runs = [run_script(FIRST_INVOICE_SCRIPT, config_path) for _ in range(args.repeat)]
+            median = {name: statistics.median(run[name] for run in runs) for name in ('import', 'first_invoice', 'total')}
+            print(f'  {mode:<6} {median["import"] * 1000:>8.1f} ms {median["first_invoice"] * 1000:>8.1f} ms '
+                  f'{median["total"] * 1000:>7.1f} ms  {", ".join(runs[-1]["heavy_modules"])}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmark: end to end invoices/second against the local AfipStubServer, for different batch sizes and
+concurrency levels (one CUIT per concurrent worker, through WSFEVPool).
+
+    PYTHONPATH=src python benchmarks/bench_end_to_end.py [--latency 0.05] [--invoices 1000]
+"""
+import argparse
+import time
+
+from common import build_credentials, build_invoices
+from easyAfip.utils.credentials import CredentialRegistry
+from easyAfip.utils.sequence_allocator import SequenceAllocator
+from easyAfip.utils.stub_server import AfipStubServer
+from easyAfip.utils.store import MemoryStore
+from easyAfip.wsfev_pool import WSFEVPool
+
+
+def run(stub, credentials, cuits, batch_size, total_invoices, use_allocator):
+    allocator = SequenceAllocator() if use_allocator else None
+    with WSFEVPool(credentials, max_workers=len(cuits), ticket_store=MemoryStore(), sequence_allocator=allocator,
+                   endpoints=stub.endpoints) as pool:
+        for cuit in cuits:
+            pool.get_client(cuit)
+        started = time.perf_counter()
+        futures = []
+        for index in range(0, total_invoices, batch_size):
+            cuit = cuits[(index // batch_size) % len(cuits)]
+            futures.append(pool.submit(cuit, 1, 11, build_invoices(min(batch_size, total_invoices - index), numbered=False)))
+        approved = sum(1 for future in futures for detail in future.result().details if detail.resultado.value == 'A')
+        elapsed = time.perf_counter() - started
+    return approved, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', type=float, default=0.05, help='stub latency per request, in seconds')
+    parser.add_argument('--invoices', type=int, default=1000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 10, 50, 250])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    args = parser.parse_args()
+
+    cuits = [f'20{index:08d}{index % 10}' for index in range(max(args.concurrency))]
+    pairs = {cuit: build_credentials(cuit) for cuit in cuits}
+    credentials = CredentialRegistry(loader=lambda cuit: pairs[cuit])
+
+    print(f'end to end against AfipStubServer (latency={args.latency * 1000:.0f} ms, {args.invoices} invoices)')
+    print(f'  {"batch":>6} {"workers":>8} {"numbering":>10} {"inv/s":>10} {"approved":>9}')
+    for batch_size in args.batch_sizes:
+        for concurrency in args.concurrency:
+            for use_allocator in (False, True):
+                with AfipStubServer(latency=args.latency) as stub:
+                    approved, elapsed = run(stub, credentials, cuits[:concurrency], batch_size, args.invoices, use_allocator)
+                numbering = 'local' if use_allocator else 'remote'
+                print(f'  {batch_size:>6} {concurrency:>8} {numbering:>10} {args.invoices / elapsed:>10.1f} {approved:>9}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark: FECAESolicitar envelope build, node by node with XMLProcessor vs the precompiled SoapSerializer.
+
+    PYTHONPATH=src python benchmarks/bench_envelope.py [--invoices 250] [--repeat 20]
+"""
+import argparse
+import timeit
+
+from common import build_invoices
+from easyAfip.utils.xml_processor import XMLProcessor
+from easyAfip.wsfev import WSFEV
+
+
+def _text(value):
+    # the models keep typed values (int, Decimal), lxml only takes strings
+    return None if value is None else str(value)
+
+
+def legacy_build(wsfev, pto_vta, ct_tipo, invoices):
+    """The per-field XMLProcessor construction used before the SoapSerializer"""
+    request = wsfev.build_base_request('FECAESolicitar')
+    request.add_child('FeCAEReq', tag_ns='ar', parent_element_path='ar:FECAESolicitar')
+    request.add_child('FeCabReq', tag_ns='ar', parent_element_path='.//ar:FeCAEReq')
+    request.add_child('PtoVta', tag_ns='ar', text=str(pto_vta), parent_element_path='.//ar:FeCabReq')
+    request.add_child('CbteTipo', tag_ns='ar', text=str(ct_tipo), parent_element_path='.//ar:FeCabReq')
+    request.add_child('CantReg', tag_ns='ar', text=str(len(invoices)), parent_element_path='.//ar:FeCabReq')
+    request.add_child('FeDetReq', tag_ns='ar', parent_element_path='.//ar:FeCAEReq')
+    for invoice in invoices:
+        node = XMLProcessor(namespaces=wsfev.WS_NSMAP['wsfev1'])
+        node.create_root(tag_name='FECAEDetRequest', tag_ns='ar')
+        for tag, attr in wsfev.SERIALIZER.DET_REQUIRED_FIELDS:
+            node.add_child(tag, tag_ns='ar', text=_text(getattr(invoice, attr)))
+        for tag, attr in wsfev.SERIALIZER.DET_OPTIONAL_FIELDS:
+            if _text(getattr(invoice, attr)):
+                node.add_child(tag, tag_ns='ar', text=_text(getattr(invoice, attr)))
+        if invoice.tributos:
+            node.add_child('Tributos', tag_ns='ar')
+            for tributo in invoice.tributos:
+                for tag, attr in wsfev.SERIALIZER.TRIBUTO_FIELDS:
+                    node.add_child(tag, tag_ns='ar', text=_text(getattr(tributo, attr)), parent_element_path='.//ar:Tributos')
+        request.add_child_from_xml(node.get_xml(), parent_element_path='.//ar:FeDetReq')
+    return request.get_xml().encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--invoices', type=int, default=250)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    wsfev = WSFEV('token', 'sign', '20123456789', test_mode=True)
+    invoices = build_invoices(args.invoices)
+
+    legacy = legacy_build(wsfev, 1, 11, invoices)
+    compiled = wsfev.build_fecaesolicitar_request(1, 11, invoices)
+    assert legacy == compiled, 'The serializer output differs from the XMLProcessor output'
+
+    legacy_time = min(timeit.repeat(lambda: legacy_build(wsfev, 1, 11, invoices), number=1, repeat=args.repeat))
+    compiled_time = min(timeit.repeat(lambda: wsfev.build_fecaesolicitar_request(1, 11, invoices), number=1, repeat=args.repeat))
+    print(f'envelope with {args.invoices} invoices ({len(compiled)} bytes, byte-identical)')
+    print(f'  XMLProcessor   : {legacy_time * 1000:8.2f} ms')
+    print(f'  SoapSerializer : {compiled_time * 1000:8.2f} ms')
+    print(f'  speedup        : {legacy_time / compiled_time:8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmark: download of the invoices of a point of sale into an InvoiceLedger with FECompConsultar against the
+local AfipStubServer, with different numbers of requests in flight, and the same lookups answered locally.
+
+    PYTHONPATH=src python benchmarks/bench_ledger.py [--latency 0.05] [--invoices 500]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from common import CUIT, best_of, build_credentials, build_invoices
+from easyAfip.invoice_ledger import InvoiceLedger
+from easyAfip.utils.afip_ws_connector import AfipWSConnector
+from easyAfip.utils.sequence_allocator import SequenceAllocator
+from easyAfip.utils.stub_server import AfipStubServer
+from easyAfip.utils.store import MemoryStore
+from easyAfip.wsaa import WSAA
+from easyAfip.wsfev import WSFEV
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', type=float, default=0.05, help='stub latency per request, in seconds')
+    parser.add_argument('--invoices', type=int, default=500)
+    parser.add_argument('--max-workers', type=int, nargs='+', default=[1, 4, 16])
+    args = parser.parse_args()
+
+    pem, key = build_credentials()
+    with AfipStubServer(latency=args.latency) as stub, tempfile.TemporaryDirectory() as directory:
+        wsaa = WSAA(pem, key, 'wsfe', test_mode=True, cuit=CUIT, ticket_store=MemoryStore(),
+                    connector=AfipWSConnector(stub.url('wsaa')))
+        ticket = wsaa.get_access_ticket()
+        wsfev = WSFEV(ticket['token'], ticket['sign'], CUIT, test_mode=True, sequence_allocator=SequenceAllocator(),
+                      connector=AfipWSConnector(stub.url('wsfev1'), pool_size=max(args.max_workers)))
+        for start in range(0, args.invoices, 250):
+            wsfev.fecaesolicitar(1, 11, build_invoices(min(250, args.invoices - start), numbered=False))
+
+        print(f'FECompConsultar download of {args.invoices} invoices (stub latency={args.latency * 1000:.0f} ms)')
+        print(f'  {"workers":>8} {"inv/s":>10} {"seconds":>9}')
+        for max_workers in args.max_workers:
+            ledger = InvoiceLedger(os.path.join(directory, f'ledger-{max_workers}.db'))
+            started = time.perf_counter()
+            summary = ledger.download(wsfev, 1, 11, max_workers=max_workers)
+            elapsed = time.perf_counter() - started
+            assert summary['downloaded'] == args.invoices, summary
+            print(f'  {max_workers:>8} {args.invoices / elapsed:>10.1f} {elapsed:>9.2f}')
+
+        number = args.invoices // 2
+        cae = ledger.get(CUIT, 1, 11, number).cod_autorizacion
+        print('lookups')
+        print(f'  FECompConsultar          : {best_of(lambda: wsfev.fecompconsultar(1, 11, number)) * 1000:8.3f} ms')
+        print(f'  ledger.get (by number)   : {best_of(lambda: ledger.get(CUIT, 1, 11, number)) * 1000:8.3f} ms')
+        print(f'  ledger.get_by_cae        : {best_of(lambda: ledger.get_by_cae(cae)) * 1000:8.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark: memory used per FECAEDetRequest kept in memory, compared with the former models (a plain
+class with a __dict__, string values and a list per nested collection), and to_dict/from_dict timings.
+
+    PYTHONPATH=src python benchmarks/bench_memory.py [--count 50000]
+"""
+import argparse
+import gc
+import sys
+import tracemalloc
+
+from common import best_of
+from easyAfip.utils.messages import FECAEDetRequest, Tributo
+
+
+class LegacyTributo:
+    def __init__(self, id, base_imp, alic, importe, desc=None):
+        self.id = id
+        self.base_imp = base_imp
+        self.alic = alic
+        self.importe = importe
+        self.desc = desc
+
+
+class LegacyFECAEDetRequest:
+    """The FECAEDetRequest as it was before the compact models"""
+    def __init__(self, concepto=None, doc_tipo=None, doc_nro=None, cbte_desde=None, cbte_hasta=None, imp_total=None,
+                 imp_tot_conc=None, imp_neto=None, imp_op_ex=None, imp_trib=None, imp_iva=None, mon_id=None,
+                 mon_cotiz=None, cbte_fch=None, fch_serv_desde=None, fch_serv_hasta=None, fch_vto_pago=None,
+                 cbtes_asoc=None, tributos=None, iva=None, opcionales=None, compradores=None, periodo_asoc=None,
+                 actividades=None):
+        self.concepto = concepto
+        self.doc_tipo = doc_tipo
+        self.doc_nro = doc_nro
+        self.cbte_desde = cbte_desde
+        self.cbte_hasta = cbte_hasta
+        self.cbte_fch = cbte_fch
+        self.imp_total = imp_total
+        self.imp_tot_conc = imp_tot_conc
+        self.imp_neto = imp_neto
+        self.imp_op_ex = imp_op_ex
+        self.imp_trib = imp_trib
+        self.imp_iva = imp_iva
+        self.fch_serv_desde = fch_serv_desde
+        self.fch_serv_hasta = fch_serv_hasta
+        self.fch_vto_pago = fch_vto_pago
+        self.mon_id = mon_id
+        self.mon_cotiz = mon_cotiz
+        self.cbtes_asoc = cbtes_asoc if cbtes_asoc else []
+        self.tributos = tributos if tributos else []
+        self.iva = iva if iva else []
+        self.opcionales = opcionales if opcionales else []
+        self.compradores = compradores if compradores else []
+        self.periodo_asoc = periodo_asoc
+        self.actividades = actividades if actividades else []
+
+
+def invoice_values(index):
+    """The values of an invoice read from a file or a database: new strings for every row"""
+    neto = f'{index % 20000 + 1}.{index % 100:02d}'
+    iva = f'{(index % 20000 + 1) * 21 // 100}.{index % 97:02d}'
+    total = f'{index % 50000 + 1}.{index % 89:02d}'
+    return dict(concepto=str(1), doc_tipo=str(80), doc_nro=str(20000000000 + index), cbte_desde=str(index + 1),
+                cbte_hasta=str(index + 1), cbte_fch=f'202401{index % 28 + 1:02d}', imp_total=total,
+                imp_tot_conc=str(0), imp_neto=neto, imp_op_ex=str(0), imp_iva=iva, imp_trib=f'{index % 7}.00',
+                mon_id='PES', mon_cotiz=str(1))
+
+
+def measure(build, count):
+    """
+    :return: The bytes retained per invoice after loading `count` invoices (the source rows are released, so
+             the strings kept by the invoices are counted)
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    rows = [invoice_values(index) for index in range(count)]
+    invoices = [build(index, row) for index, row in enumerate(rows)]
+    del rows
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before - sys.getsizeof(invoices)) / count, invoices
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=50000)
+    args = parser.parse_args()
+
+    variants = (
+        ('legacy (dict, str)', lambda index, row: LegacyFECAEDetRequest(**row)),
+        ('legacy + tributo', lambda index, row: LegacyFECAEDetRequest(
+            tributos=[LegacyTributo('99', row['imp_neto'], '1', row['imp_trib'], 'Percepcion')], **row)),
+        ('slots, typed', lambda index, row: FECAEDetRequest(**row)),
+        ('slots + tributo', lambda index, row: FECAEDetRequest(
+            tributos=(Tributo('99', row['imp_neto'], '1', row['imp_trib'], 'Percepcion'),), **row)),
+    )
+    print(f'memory per invoice ({args.count} invoices, unique values per row)')
+    for name, build in variants:
+        per_invoice, _ = measure(build, args.count)
+        print(f'  {name:20s}: {per_invoice:8.1f} bytes')
+
+    invoice = FECAEDetRequest(tributos=(Tributo('99', '100.00', '1', '1.00', 'Percepcion'),), **invoice_values(1))
+    data = invoice.to_dict()
+    assert FECAEDetRequest.from_dict(data).to_dict() == data
+    print('conversions')
+    print(f'  to_dict   : {best_of(invoice.to_dict, repeat=5, number=10000) * 1e6:6.2f} us')
+    print(f'  from_dict : {best_of(lambda: FECAEDetRequest.from_dict(data), repeat=5, number=10000) * 1e6:6.2f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark: checking the receptors of a batch of invoices with DocTipo 80 against the padrón of the local
+AfipStubServer: one request per invoice (no cache), a single getPersonaList_v2 request (cold cache) and the
+PersonaCache already warm (no requests).
+
+    PYTHONPATH=src python benchmarks/bench_padron.py [--latency 0.05] [--invoices 250] [--customers 100]
+"""
+import argparse
+import time
+
+from common import CUIT, build_credentials, build_invoices
+from easyAfip.utils.afip_ws_connector import AfipWSConnector
+from easyAfip.utils.invoice_validator import InvoiceValidator, is_valid_cuit
+from easyAfip.utils.persona_cache import PersonaCache
+from easyAfip.utils.stub_server import AfipStubServer
+from easyAfip.utils.store import MemoryStore
+from easyAfip.wsaa import WSAA
+from easyAfip.wspadron import WSPadron
+
+
+def build_cuits(count):
+    cuits, number = [], 20000000
+    while len(cuits) < count:
+        cuits.extend(cuit for cuit in (f'30{number:08d}{digit}' for digit in range(10)) if is_valid_cuit(cuit))
+        number += 1
+    return cuits[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', type=float, default=0.05, help='stub latency per request, in seconds')
+    parser.add_argument('--invoices', type=int, default=250)
+    parser.add_argument('--customers', type=int, default=100, help='distinct receptors in the batch')
+    args = parser.parse_args()
+
+    pem, key = build_credentials()
+    cuits = build_cuits(args.customers)
+    invoices = build_invoices(args.invoices, numbered=False)
+    for index, invoice in enumerate(invoices):
+        invoice.doc_nro = cuits[index % len(cuits)]
+
+    with AfipStubServer(latency=args.latency) as stub:
+        wsaa = WSAA(pem, key, WSPadron.WSAA_SERVICE, test_mode=True, cuit=CUIT, ticket_store=MemoryStore(),
+                    connector=AfipWSConnector(stub.url('wsaa')))
+        ticket = wsaa.get_access_ticket()
+
+        def build_padron():
+            return WSPadron(ticket['token'], ticket['sign'], CUIT, test_mode=True, persona_cache=PersonaCache(),
+                            connector=AfipWSConnector(stub.url('ws_sr_constancia_inscripcion')))
+
+        print(f'Receptors of {args.invoices} invoices ({args.customers} distinct CUITs, '
+              f'stub latency={args.latency * 1000:.0f} ms)')
+        print(f'  {"mode":<30} {"ms":>10} {"requests":>9}')
+
+        def measure(name, function):
+            before = stub.request_counts.get('getPersonaList_v2', 0)
+            started = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - started
+            print(f'  {name:<30} {elapsed * 1000:>10.1f} {stub.request_counts.get("getPersonaList_v2", 0) - before:>9}')
+
+        per_invoice = build_padron()
+        measure('one request per invoice', lambda: [per_invoice.request_persona_list([invoice.doc_nro])
+                                                    for invoice in invoices])
+        validator = InvoiceValidator(padron=build_padron())
+        measure('validate, cold cache', lambda: validator.validate(invoices, 1))
+        measure('validate, warm cache', lambda: validator.validate(invoices, 1))
+        measure('validate, no padron', lambda: InvoiceValidator().validate(invoices, 1))
+
+
+if __name__ == '__main__':
+    main()
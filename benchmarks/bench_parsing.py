@@ -0,0 +1,31 @@
+"""
+Benchmark: FECAESolicitar response parsing for different batch sizes.
+
+    PYTHONPATH=src python benchmarks/bench_parsing.py [--repeat 20]
+"""
+import argparse
+
+from common import best_of, build_invoices
+from easyAfip.utils.stub_server import AfipStubServer
+from easyAfip.wsfev import WSFEV
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 50, 250, 1000])
+    args = parser.parse_args()
+
+    wsfev = WSFEV('token', 'sign', '20123456786', test_mode=True)
+    print('FECAESolicitar response parsing')
+    for size in args.sizes:
+        stub = AfipStubServer(reg_x_req=size, seed=1)
+        request = wsfev.build_fecaesolicitar_request(1, 11, build_invoices(size))
+        _, response = stub.handle(stub.PATHS['wsfev1'], 'http://ar.gov.afip.dif.FEV1/FECAESolicitar', request)
+        elapsed = best_of(lambda: wsfev.parse_fecaesolicitar_response(response), repeat=args.repeat)
+        print(f'  {size:5d} details ({len(response):8d} bytes): {elapsed * 1000:8.3f} ms '
+              f'({elapsed / size * 1e6:6.2f} us/detail)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark: a single CUIT pushing many points of sale at once against an AfipStubServer with a limited capacity
+(it rejects the requests over it with HTTP 503 and Retry-After), with and without the shared RateLimiter.
+Reports invoices/second, the requests rejected by the stub and the limit reached by the limiter.
+
+    PYTHONPATH=src python benchmarks/bench_rate_limit.py [--capacity 4] [--max-workers 16]
+"""
+import argparse
+import time
+
+from common import CUIT, build_credentials, build_invoices
+from easyAfip.invoice_scheduler import InvoiceScheduler
+from easyAfip.utils.afip_ws_connector import AfipWSConnector
+from easyAfip.utils.rate_limiter import RateLimiter
+from easyAfip.utils.retry_policy import RetryPolicy
+from easyAfip.utils.sequence_allocator import SequenceAllocator
+from easyAfip.utils.stub_server import AfipStubServer
+from easyAfip.utils.store import MemoryStore
+from easyAfip.wsaa import WSAA
+from easyAfip.wsfev import WSFEV
+
+
+def run(stub, pem, key, args, rate_limiter):
+    wsaa = WSAA(pem, key, 'wsfe', test_mode=True, cuit=CUIT, ticket_store=MemoryStore(),
+                connector=AfipWSConnector(stub.url('wsaa')))
+    ticket = wsaa.get_access_ticket()
+    wsfev = WSFEV(ticket['token'], ticket['sign'], CUIT, test_mode=True, sequence_allocator=SequenceAllocator(),
+                  retry_policy=RetryPolicy(max_attempts=20, backoff=0.05, max_backoff=1.0),
+                  rate_limiter=rate_limiter, connector=AfipWSConnector(stub.url('wsfev1'), pool_size=args.max_workers))
+    work = [(pto_vta, 11, build_invoices(args.batch_size, numbered=False))
+            for _ in range(args.batches) for pto_vta in range(1, args.points_of_sale + 1)]
+    started = time.perf_counter()
+    with InvoiceScheduler(wsfev, max_workers=args.max_workers) as scheduler:
+        futures = scheduler.submit_many(work)
+    elapsed = time.perf_counter() - started
+    approved, failed = 0, 0
+    for future in futures:
+        if future.exception() is not None:
+            failed += 1
+        else:
+            approved += sum(1 for detail in future.result().details if detail.resultado.value == 'A')
+    return approved, failed, elapsed, wsfev.ws_endpoint
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', type=float, default=0.05, help='stub latency per request, in seconds')
+    parser.add_argument('--capacity', type=int, default=4, help='requests in progress accepted by the stub')
+    parser.add_argument('--retry-after', type=float, default=0.2, help='Retry-After sent by the stub, in seconds')
+    parser.add_argument('--points-of-sale', type=int, default=16)
+    parser.add_argument('--batches', type=int, default=8, help='batches per point of sale')
+    parser.add_argument('--batch-size', type=int, default=10)
+    parser.add_argument('--max-workers', type=int, default=16)
+    args = parser.parse_args()
+
+    pem, key = build_credentials()
+    total = args.points_of_sale * args.batches * args.batch_size
+    print(f'{args.max_workers} workers against AfipStubServer (latency={args.latency * 1000:.0f} ms, '
+          f'capacity={args.capacity}, retry-after={args.retry_after}s, {total} invoices)')
+    print(f'  {"mode":<8} {"inv/s":>8} {"approved":>9} {"failed":>7} {"rejected":>9}  limit')
+    for mode in ('none', 'limiter'):
+        rate_limiter = RateLimiter(rate=200, initial_limit=args.capacity) if mode == 'limiter' else None
+        with AfipStubServer(latency=args.latency, capacity=args.capacity, retry_after=args.retry_after) as stub:
+            approved, failed, elapsed, wsfev_endpoint = run(stub, pem, key, args, rate_limiter)
+            rejected = stub.rejected
+        limit = f'{rate_limiter.get_state(wsfev_endpoint, CUIT)["limit"]:.1f}' if rate_limiter else '-'
+        print(f'  {mode:<8} {total / elapsed:>8.1f} {approved:>9} {failed:>7} {rejected:>9}  {limit}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmark: rendering the PDFs (with the QR code of RG 4892) of a batch of approved invoices into a zip, in the
+current process and with the InvoiceRenderer process pool, reported in pages per second.
+
+    PYTHONPATH=src python benchmarks/bench_render.py [--invoices 1000] [--workers 0 1 2 4]
+"""
+import argparse
+import io
+import os
+import time
+
+from common import CUIT, build_invoices
+from easyAfip.invoice_renderer import InvoiceDocument, InvoiceRenderer, InvoiceTemplate
+from easyAfip.utils.messages import FECAEDetResponse, FECAEResultEnum, FECAESolicitarResult
+
+ISSUER = {'razon_social': 'EASYAFIP BENCH S.A.', 'domicilio': 'Av. Siempreviva 742 - CABA',
+          'condicion_iva': 'IVA Responsable Inscripto', 'iibb': '901-123456-7', 'inicio_actividades': '01/01/2020'}
+
+
+def build_result(invoices):
+    # the details FECAESolicitar would return for the invoices
+    result = FECAESolicitarResult()
+    result.cuit, result.pto_vta, result.cbte_tipo, result.resultado = CUIT, 1, 1, FECAEResultEnum.APROBADO
+    for invoice in invoices:
+        detail = FECAEDetResponse(invoice.concepto, invoice.doc_tipo, invoice.doc_nro, invoice.cbte_desde,
+                                  invoice.cbte_hasta, invoice.cbte_fch, FECAEResultEnum.APROBADO)
+        detail.cae, detail.cae_fch_vto = f'7412{invoice.cbte_desde:010d}', '20240111'
+        result.details.append(detail)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--invoices', type=int, default=1000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, 2, os.cpu_count()],
+                        help='process pool sizes, 0 renders in the current process')
+    args = parser.parse_args()
+
+    invoices = build_invoices(args.invoices)
+    documents = InvoiceDocument.from_result(build_result(invoices), invoices)
+    template = InvoiceTemplate(ISSUER)
+    print(f'{len(documents)} invoices, {os.cpu_count()} CPUs, '
+          f'{len(template.render(documents[0])) / 1024:.1f} KiB per PDF')
+
+    for max_workers in dict.fromkeys(args.workers):
+        with InvoiceRenderer(template, max_workers=max_workers) as renderer:
+            # start the processes before timing
+            renderer.render_to_zip(documents[:max_workers * renderer.chunk_size or 1], io.BytesIO())
+            output = io.BytesIO()
+            start = time.perf_counter()
+            pages = renderer.render_to_zip(documents, output)
+            elapsed = time.perf_counter() - start
+        print(f'max_workers={max_workers:<3} {elapsed:6.2f} s  {pages / elapsed:8.1f} pages/s  '
+              f'zip {output.tell() / 1024 / 1024:.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Benchmark: invoices/second of a single CUIT against the local AfipStubServer, sending the batches of several
+points of sale through the InvoiceScheduler (one request in flight per sequence) with different global limits.
+
+    PYTHONPATH=src python benchmarks/bench_scheduler.py [--latency 0.05] [--points-of-sale 8]
+"""
+import argparse
+import time
+
+from common import CUIT, build_credentials, build_invoices
+from easyAfip.invoice_scheduler import InvoiceScheduler
+from easyAfip.utils.afip_ws_connector import AfipWSConnector
+from easyAfip.utils.sequence_allocator import SequenceAllocator
+from easyAfip.utils.stub_server import AfipStubServer
+from easyAfip.utils.store import MemoryStore
+from easyAfip.wsaa import WSAA
+from easyAfip.wsfev import WSFEV
+
+
+def run(stub, pem, key, points_of_sale, batches, batch_size, max_workers):
+    wsaa = WSAA(pem, key, 'wsfe', test_mode=True, cuit=CUIT, ticket_store=MemoryStore(),
+                connector=AfipWSConnector(stub.url('wsaa')))
+    ticket = wsaa.get_access_ticket()
+    wsfev = WSFEV(ticket['token'], ticket['sign'], CUIT, test_mode=True, sequence_allocator=SequenceAllocator(),
+                  connector=AfipWSConnector(stub.url('wsfev1'), pool_size=max_workers))
+    work = [(pto_vta, 11, build_invoices(batch_size, numbered=False))
+            for _ in range(batches) for pto_vta in range(1, points_of_sale + 1)]
+    started = time.perf_counter()
+    with InvoiceScheduler(wsfev, max_workers=max_workers) as scheduler:
+        futures = scheduler.submit_many(work)
+    approved = sum(1 for future in futures for detail in future.result().details if detail.resultado.value == 'A')
+    return approved, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', type=float, default=0.05, help='stub latency per request, in seconds')
+    parser.add_argument('--points-of-sale', type=int, default=8)
+    parser.add_argument('--batches', type=int, default=10, help='batches per point of sale')
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--max-workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    pem, key = build_credentials()
+    total = args.points_of_sale * args.batches * args.batch_size
+    print(f'InvoiceScheduler against AfipStubServer (latency={args.latency * 1000:.0f} ms, '
+          f'{args.points_of_sale} points of sale, {total} invoices)')
+    print(f'  {"workers":>8} {"inv/s":>10} {"approved":>9}')
+    for max_workers in args.max_workers:
+        with AfipStubServer(latency=args.latency) as stub:
+            approved, elapsed = run(stub, pem, key, args.points_of_sale, args.batches, args.batch_size, max_workers)
+        print(f'  {max_workers:>8} {total / elapsed:>10.1f} {approved:>9}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+"""
+Benchmark: CMS signing of the WSAA login ticket, parsing the PEMs on every signature vs a cached Signer.
+
+    PYTHONPATH=src python benchmarks/bench_signing.py [--repeat 50]
+"""
+import argparse
+
+from common import best_of, build_credentials
+from easyAfip.utils.signer import Signer
+from easyAfip.wsaa import WSAA
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    pem, key = build_credentials()
+    wsaa = WSAA(pem, key, 'wsfe', test_mode=True)
+    ticket = wsaa.get_pre_ticket_xml().encode('utf-8')
+    cached_signer = Signer(pem.encode('utf-8'), key.encode('utf-8'))
+
+    uncached = best_of(lambda: Signer(pem.encode('utf-8'), key.encode('utf-8')).sign_cms(ticket), repeat=args.repeat)
+    cached = best_of(lambda: cached_signer.sign_cms(ticket), repeat=args.repeat)
+    login_request = best_of(wsaa.build_login_request, repeat=args.repeat)
+    print('CMS signing (RSA 2048)')
+    print(f'  parse PEM + sign   : {uncached * 1000:8.3f} ms')
+    print(f'  cached Signer      : {cached * 1000:8.3f} ms')
+    print(f'  full LoginCms build: {login_request * 1000:8.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Helpers shared by the benchmarks. Run the benchmarks from the repository root, e.g.:
+
+    PYTHONPATH=src python benchmarks/bench_envelope.py
+"""
+import datetime
+import timeit
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+from easyAfip.utils.messages import FECAEDetRequest, Tributo
+
+CUIT = '20123456786'
+
+
+def build_invoices(count, numbered=True):
+    invoices = []
+    for index in range(count):
+        invoice = FECAEDetRequest(concepto='1', doc_tipo='80', doc_nro='20123456786', cbte_fch='20240101',
+                                  imp_total='122.00', imp_tot_conc='0', imp_neto='100.00', imp_op_ex='0',
+                                  imp_iva='21.00', imp_trib='1.00', mon_id='PES', mon_cotiz='1',
+                                  tributos=[Tributo('99', '100.00', '1', '1.00', 'Percepcion')])
+        if numbered:
+            invoice.cbte_desde = invoice.cbte_hasta = index + 1
+        invoices.append(invoice)
+    return invoices
+
+
+def build_credentials(cuit=CUIT, key_size=2048):
+    """
+    Build a self signed certificate with the CUIT in its subject, as AFIP does
+    :return: (pem, key) as str
+    """
+    key = rsa.generate_private_key(public_exponent=65537, key_size=key_size)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'easyafip-bench'),
+                      x509.NameAttribute(NameOID.SERIAL_NUMBER, f'CUIT {cuit}')])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+                   .serial_number(x509.random_serial_number()).not_valid_before(now - datetime.timedelta(days=1))
+                   .not_valid_after(now + datetime.timedelta(days=365)).sign(key, hashes.SHA256()))
+    pem = certificate.public_bytes(serialization.Encoding.PEM).decode('utf-8')
+    key_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                serialization.NoEncryption()).decode('utf-8')
+    return pem, key_pem
+
+
+def best_of(function, repeat=10, number=1):
+    """
+    :return: The best time of a single call, in seconds
+    """
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
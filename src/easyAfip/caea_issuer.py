@@ -0,0 +1,200 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, List, Tuple
+
+from easyAfip.utils.messages import FECAEADetRequest, FECAEAResponse, FECAEASinMovimientoResponse, FECAEDetRequest, \
+    FECAEResultEnum, FECAESolicitarResult, WSFEVException
+from easyAfip.utils.sequence_allocator import SequenceAllocator
+from easyAfip.utils.store import BaseStore, MemoryStore, build_key
+from easyAfip.wsfev import WSFEV
+
+
+logger = logging.getLogger(__name__)
+
+
+class CAEAIssuer:
+    """
+        Emisión de comprobantes con CAEA (Código de Autorización Electrónico Anticipado).
+
+        El CAEA se obtiene una vez por quincena (FECAEASolicitar, o FECAEAConsultar si ya fue otorgado) y se
+        guarda en el `store`; a partir de ahí `issue` numera el comprobante con el `SequenceAllocator`, le asigna
+        el CAEA y lo guarda como pendiente de informar, sin ningún request a la AFIP. Luego `report` informa
+        los pendientes con FECAEARegInformativo en lotes de RegXReq comprobantes, tomando como punto de partida
+        el último comprobante informado según FECompUltimoAutorizado.
+
+        Con un `FileStore` o `SqliteStore` el CAEA, la numeración y los comprobantes pendientes sobreviven a un
+        reinicio y se comparten entre procesos. El punto de venta debe ser uno habilitado para CAEA.
+
+            issuer = CAEAIssuer(wsfev, store=SqliteStore('caea.db'))
+            issuer.prepare(pto_vta, cbte_tipo)          # al abrir la caja: CAEA y numeración
+            invoice = issuer.issue(pto_vta, cbte_tipo, invoice)   # en cada venta, sin red
+            issuer.report(pto_vta, cbte_tipo)           # periódicamente, antes de FchTopeInf
+    """
+
+    def __init__(self, wsfev: WSFEV, store: BaseStore = None, sequence_allocator: SequenceAllocator = None):
+        """
+        :param wsfev: The WSFEV client of the CUIT
+        :param store: Store for the CAEAs and the invoices pending to be informed, defaults to a MemoryStore
+        :param sequence_allocator: Allocator for the invoice numbers, defaults to one over the same store
+        """
+        self.wsfev = wsfev
+        self.store = store if store is not None else MemoryStore()
+        self.sequence_allocator = sequence_allocator or SequenceAllocator(self.store)
+        self._caeas = {}
+
+    @staticmethod
+    def get_period(cbte_fch) -> Tuple[int, int]:
+        """
+        Get the CAEA period and fortnight of a date
+        :param cbte_fch: The date, yyyymmdd
+        :return: (periodo, orden), e.g. '20240117' -> (202401, 2)
+        """
+        cbte_fch = str(cbte_fch)
+        return int(cbte_fch[:6]), 1 if int(cbte_fch[6:8]) <= 15 else 2
+
+    @staticmethod
+    def today() -> str:
+        return datetime.now(timezone(timedelta(hours=-3))).strftime('%Y%m%d')
+
+    def get_caea(self, periodo, orden) -> FECAEAResponse:
+        """
+        Get the CAEA of a fortnight, from memory, from the store or, the first time, from the service
+        :param periodo: The period, yyyymm
+        :param orden: The fortnight, 1 or 2
+        :return:
+        :raises WSFEVException: If the service does not grant the CAEA
+        """
+        key = build_key('caea', self.wsfev.cuit, self.wsfev.environment, periodo, orden)
+        caea = self._caeas.get(key)
+        if caea is not None:
+            return caea
+        with self.store.lock(key):
+            stored = self.store.get(key)
+            if stored is not None:
+                caea = FECAEAResponse.from_dict(stored)
+            else:
+                caea = self._request_caea(periodo, orden)
+                self.store.set(key, caea.to_dict(json_safe=True))
+        self._caeas[key] = caea
+        return caea
+
+    def _request_caea(self, periodo, orden) -> FECAEAResponse:
+        # FECAEASolicitar is rejected when the CAEA was already granted (e.g. to another process or system),
+        # in that case it is consulted
+        caea = self.wsfev.fecaeasolicitar(periodo, orden)
+        if not caea.found:
+            caea = self.wsfev.fecaeaconsultar(periodo, orden)
+        if not caea.found:
+            raise WSFEVException(f"Could not get the CAEA of the period {periodo} orden {orden}",
+                                 [(error.code, error.msg) for error in caea.errors or []])
+        logger.info('CAEA %s for the period %s orden %s, valid from %s to %s', caea.caea, periodo, orden,
+                    caea.fch_vig_desde, caea.fch_vig_hasta)
+        return caea
+
+    def prepare(self, pto_vta, ct_tipo, cbte_fch: str = None) -> FECAEAResponse:
+        """
+        Get the CAEA and initialize the numbering of the given point of sale and invoice type, so the
+        following issue calls need no request to the service. Call it with a date of the next fortnight to
+        get its CAEA in advance.
+        :param pto_vta: The point of sale
+        :param ct_tipo: The invoice type
+        :param cbte_fch: The date of the invoices to issue (yyyymmdd), defaults to today
+        :return: The CAEA
+        """
+        caea = self.get_caea(*self.get_period(cbte_fch or self.today()))
+        self.sequence_allocator.allocate(self._sequence_key(pto_vta, ct_tipo), 0, seed=self._seed(pto_vta, ct_tipo))
+        return caea
+
+    def issue(self, pto_vta, ct_tipo, invoice: FECAEDetRequest) -> FECAEADetRequest:
+        """
+        Issue an invoice with the CAEA of its date: number it (when it has no number), set the CAEA and keep
+        it as pending to be informed. An invoice rejected by report can be corrected and issued again, it
+        keeps its number.
+        :param pto_vta: The point of sale
+        :param ct_tipo: The invoice type
+        :param invoice: The invoice, cbte_fch defaults to today
+        :return: The issued FECAEADetRequest (the same object when a FECAEADetRequest is given)
+        :raises WSFEVException: If the CAEA does not cover the invoice date
+        """
+        cbte_fch = invoice.cbte_fch or self.today()
+        caea = self.get_caea(*self.get_period(cbte_fch))
+        if not caea.covers(cbte_fch):
+            raise WSFEVException(f"The CAEA {caea.caea} is valid from {caea.fch_vig_desde} to {caea.fch_vig_hasta}, "
+                                 f"it does not cover the date {cbte_fch}")
+        if not isinstance(invoice, FECAEADetRequest):
+            invoice = FECAEADetRequest.from_invoice(invoice)
+        invoice.cbte_fch = cbte_fch
+        invoice.caea = caea.caea
+        if invoice.cbte_desde:
+            self.store.set(self._invoice_key(pto_vta, ct_tipo, invoice.cbte_desde), invoice.to_dict(json_safe=True))
+            return invoice
+        sequence_key = self._sequence_key(pto_vta, ct_tipo)
+        # the pending invoice is saved before its number is taken, both under the lock of the sequence: a crash
+        # in between leaves an invoice that was never returned, overwritten by the next issue, and never a number
+        # without its invoice
+        with self.store.lock(sequence_key):
+            number = self.sequence_allocator.allocate(sequence_key, 0, seed=self._seed(pto_vta, ct_tipo)) + 1
+            invoice.cbte_desde = invoice.cbte_hasta = number
+            self.store.set(self._invoice_key(pto_vta, ct_tipo, number), invoice.to_dict(json_safe=True))
+            self.sequence_allocator.allocate(sequence_key, 1, seed=self._seed(pto_vta, ct_tipo))
+        return invoice
+
+    def pending(self, pto_vta, ct_tipo, after=None) -> Iterator[FECAEADetRequest]:
+        """
+        Iterate the issued invoices not informed yet, in number order
+        :param pto_vta: The point of sale
+        :param ct_tipo: The invoice type
+        :param after: The last informed number, defaults to the one informed by FECompUltimoAutorizado
+        :return:
+        :raises WSFEVException: If an issued number is missing from the store
+        """
+        if after is None:
+            after = self.wsfev.fecompultimoautorizado(pto_vta, ct_tipo).nro_cbte
+        last_issued = self.sequence_allocator.store.get(self._sequence_key(pto_vta, ct_tipo))
+        for number in range(int(after) + 1, int(last_issued or 0) + 1):
+            stored = self.store.get(self._invoice_key(pto_vta, ct_tipo, number))
+            if stored is None:
+                raise WSFEVException(f"The invoice {number} (pto_vta={pto_vta}, cbte_tipo={ct_tipo}) was numbered but "
+                                     f"is not in the store, it must be issued again before informing the next ones")
+            yield FECAEADetRequest.from_dict(stored)
+
+    def report(self, pto_vta, ct_tipo, batch_size: int = None) -> List[FECAESolicitarResult]:
+        """
+        Inform the pending invoices with FECAEARegInformativo, in batches of at most RegXReq invoices.
+        The approved invoices are removed from the store; the informing stops at the first batch that is not
+        fully approved, since the following numbers would be rejected.
+        :param pto_vta: The point of sale
+        :param ct_tipo: The invoice type
+        :param batch_size: Max invoices per request, defaults to the RegXReq informed by the service
+        :return: The result of every informed batch
+        """
+        results = []
+        for result in self.wsfev.fecaeareginformativo_stream(pto_vta, ct_tipo, self.pending(pto_vta, ct_tipo), batch_size):
+            results.append(result)
+            for detail in result.details:
+                if detail.resultado == FECAEResultEnum.APROBADO:
+                    self.store.delete(self._invoice_key(pto_vta, ct_tipo, detail.cbte_desde))
+            if result.errors or any(detail.resultado != FECAEResultEnum.APROBADO for detail in result.details):
+                logger.warning('FECAEARegInformativo batch not fully approved for pto_vta=%s cbte_tipo=%s: %s',
+                               pto_vta, ct_tipo, result)
+                break
+        return results
+
+    def inform_no_movement(self, pto_vta, periodo, orden) -> FECAEASinMovimientoResponse:
+        """
+        Inform that no invoices were issued in the point of sale with the CAEA of a fortnight
+        :param pto_vta: The point of sale
+        :param periodo: The period, yyyymm
+        :param orden: The fortnight, 1 or 2
+        :return:
+        """
+        return self.wsfev.fecaeasinmovimientoinformar(pto_vta, self.get_caea(periodo, orden).caea)
+
+    def _sequence_key(self, pto_vta, ct_tipo) -> str:
+        return SequenceAllocator.get_key(self.wsfev.cuit, pto_vta, ct_tipo, self.wsfev.environment)
+
+    def _invoice_key(self, pto_vta, ct_tipo, number) -> str:
+        return build_key('caea_cbte', self.wsfev.cuit, pto_vta, ct_tipo, self.wsfev.environment, number)
+
+    def _seed(self, pto_vta, ct_tipo):
+        return lambda: self.wsfev.fecompultimoautorizado(pto_vta, ct_tipo).nro_cbte
@@ -0,0 +1,299 @@
+import csv
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Iterator, List, Tuple
+
+from easyAfip.utils.messages import FECompConsultarResponse
+from easyAfip.wsfev import WSFEV
+
+
+logger = logging.getLogger(__name__)
+
+
+class InvoiceLedger:
+    """
+        Libro local de los comprobantes emitidos, sobre una base sqlite indexada por número, fecha y CAE.
+
+        `download` trae con FECompConsultar (un request por comprobante) un rango de números de un punto de
+        venta y tipo, o el rango que corresponde a un período de fechas, con varios requests en curso a la vez
+        (acotados por `max_workers` y por el RateLimiter del cliente, si tiene uno). Los comprobantes se
+        guardan a medida que llegan, en transacciones de `commit_every`: el libro mismo es el checkpoint, y
+        volver a llamar a `download` después de una interrupción solo consulta los números que faltan.
+
+        Las consultas posteriores por número, fecha o CAE (`get`, `get_by_cae`, `query`) y las exportaciones
+        a JSONL o CSV se resuelven localmente, sin requests a la AFIP.
+
+            ledger = InvoiceLedger('ledger.db')
+            ledger.download(wsfev, pto_vta, cbte_tipo, fch_desde='20240101', fch_hasta='20240131')
+            ledger.export_csv('enero.csv', wsfev.cuit, fch_desde='20240101', fch_hasta='20240131')
+    """
+
+    TABLE = 'easyafip_ledger'
+
+    # exported columns, in order
+    COLUMNS = ('cuit', 'pto_vta', 'cbte_tipo', 'cbte_nro', 'cbte_fch', 'concepto', 'doc_tipo', 'doc_nro', 'imp_total',
+               'resultado', 'cod_autorizacion', 'emision_tipo', 'fch_vto', 'fch_proceso')
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        """
+        :param path: The sqlite database file
+        :param timeout: Seconds to wait for the database lock
+        """
+        self.path = path
+        self.timeout = timeout
+        with self._connection() as conn:
+            # WAL: the queries do not block a download in progress
+            conn.execute('PRAGMA journal_mode=WAL')
+        with self._transaction() as conn:
+            conn.execute(f'''CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                cuit TEXT NOT NULL, pto_vta INTEGER NOT NULL, cbte_tipo INTEGER NOT NULL, cbte_nro INTEGER NOT NULL,
+                cbte_fch TEXT, concepto INTEGER, doc_tipo INTEGER, doc_nro TEXT, imp_total TEXT, resultado TEXT,
+                cod_autorizacion TEXT, emision_tipo TEXT, fch_vto TEXT, fch_proceso TEXT, data TEXT NOT NULL,
+                downloaded_at REAL NOT NULL, PRIMARY KEY (cuit, pto_vta, cbte_tipo, cbte_nro))''')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {self.TABLE}_fch ON {self.TABLE} (cuit, cbte_fch)')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {self.TABLE}_cae ON {self.TABLE} (cod_autorizacion)')
+
+    def download(self, wsfev: WSFEV, pto_vta, cbte_tipo, cbte_desde: int = None, cbte_hasta: int = None,
+                 fch_desde: str = None, fch_hasta: str = None, max_workers: int = 8, commit_every: int = 100) -> dict:
+        """
+        Download the invoices of a point of sale and invoice type that are not in the ledger yet
+        :param wsfev: The WSFEV client of the CUIT
+        :param pto_vta: The point of sale
+        :param cbte_tipo: The invoice type
+        :param cbte_desde: First number of the range, defaults to the first one of the dates (or 1)
+        :param cbte_hasta: Last number of the range, defaults to the last one of the dates (or the last authorized)
+        :param fch_desde: First date (yyyymmdd) of the range, used when cbte_desde is not given
+        :param fch_hasta: Last date (yyyymmdd) of the range, used when cbte_hasta is not given
+        :param max_workers: Max number of FECompConsultar in flight
+        :param commit_every: Invoices saved per transaction
+        :return: {'downloaded', 'skipped', 'not_found', 'failed'} number of invoices; the failed ones are
+            downloaded by the next call
+        """
+        cuit = str(wsfev.cuit)
+        if cbte_desde is None or cbte_hasta is None:
+            first, last = self.find_range(wsfev, pto_vta, cbte_tipo, fch_desde, fch_hasta)
+            cbte_desde = first if cbte_desde is None else cbte_desde
+            cbte_hasta = last if cbte_hasta is None else cbte_hasta
+        missing = self.missing(cuit, pto_vta, cbte_tipo, cbte_desde, cbte_hasta)
+        summary = {'downloaded': 0, 'skipped': max(0, cbte_hasta - cbte_desde + 1) - len(missing), 'not_found': 0,
+                   'failed': 0}
+        logger.info('Downloading %s invoices of cuit=%s pto_vta=%s cbte_tipo=%s (%s to %s, %s already in the ledger)',
+                    len(missing), cuit, pto_vta, cbte_tipo, cbte_desde, cbte_hasta, summary['skipped'])
+        numbers = iter(missing)
+        in_flight, responses = {}, []
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='easyafip-ledger') as executor:
+            while True:
+                # a bounded window of requests, so a large range is not queued at once
+                while len(in_flight) < max_workers * 2:
+                    number = next(numbers, None)
+                    if number is None:
+                        break
+                    in_flight[executor.submit(wsfev.fecompconsultar, pto_vta, cbte_tipo, number)] = number
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    number = in_flight.pop(future)
+                    try:
+                        response = future.result()
+                    except Exception as error:
+                        logger.warning('Could not download the invoice %s (pto_vta=%s cbte_tipo=%s): %s',
+                                       number, pto_vta, cbte_tipo, error)
+                        summary['failed'] += 1
+                        continue
+                    if not response.found:
+                        summary['not_found'] += 1
+                        continue
+                    responses.append(response)
+                if len(responses) >= commit_every:
+                    summary['downloaded'] += self.save(cuit, responses)
+                    responses = []
+        summary['downloaded'] += self.save(cuit, responses)
+        return summary
+
+    def find_range(self, wsfev: WSFEV, pto_vta, cbte_tipo, fch_desde: str = None, fch_hasta: str = None) -> Tuple[int, int]:
+        """
+        Find the numbers of the first and last invoices of a period. AFIP only queries by number, so the ends
+        are searched with FECompConsultar (a binary search over the numbers up to the last authorized, whose
+        dates do not decrease), saving the consulted invoices in the ledger.
+        :param wsfev: The WSFEV client of the CUIT
+        :param pto_vta: The point of sale
+        :param cbte_tipo: The invoice type
+        :param fch_desde: First date (yyyymmdd), None from the first invoice
+        :param fch_hasta: Last date (yyyymmdd), None up to the last authorized invoice
+        :return: (first number, last number), an empty range when first > last
+        """
+        last = int(wsfev.fecompultimoautorizado(pto_vta, cbte_tipo).nro_cbte or 0)
+        first = self._first_after(wsfev, pto_vta, cbte_tipo, last, fch_desde, inclusive=True) if fch_desde else 1
+        if fch_hasta:
+            last = self._first_after(wsfev, pto_vta, cbte_tipo, last, fch_hasta, inclusive=False) - 1
+        return first, last
+
+    def missing(self, cuit, pto_vta, cbte_tipo, cbte_desde: int, cbte_hasta: int) -> List[int]:
+        """
+        :return: The numbers of the range that are not in the ledger
+        """
+        with self._connection() as conn:
+            present = {row[0] for row in conn.execute(
+                f'SELECT cbte_nro FROM {self.TABLE} WHERE cuit = ? AND pto_vta = ? AND cbte_tipo = ? '
+                f'AND cbte_nro BETWEEN ? AND ?', (str(cuit), int(pto_vta), int(cbte_tipo), cbte_desde, cbte_hasta))}
+        return [number for number in range(cbte_desde, cbte_hasta + 1) if number not in present]
+
+    def save(self, cuit, responses: List[FECompConsultarResponse]) -> int:
+        """
+        Save (or replace) consulted invoices
+        :param cuit: The CUIT that issued the invoices
+        :param responses: The FECompConsultar responses of found invoices
+        :return: The number of saved invoices
+        """
+        if not responses:
+            return 0
+        now = time.time()
+        rows = [(str(cuit), response.pto_vta, response.cbte_tipo, response.cbte_desde, response.cbte_fch,
+                 response.concepto, response.doc_tipo, response.doc_nro,
+                 str(response.imp_total) if response.imp_total is not None else None,
+                 response.resultado.value if response.resultado is not None else None, response.cod_autorizacion,
+                 response.emision_tipo, response.fch_vto, response.fch_proceso,
+                 json.dumps(response.to_dict(json_safe=True)), now) for response in responses]
+        with self._transaction() as conn:
+            conn.executemany(f'INSERT OR REPLACE INTO {self.TABLE} ({", ".join(self.COLUMNS)}, data, downloaded_at) '
+                             f'VALUES ({", ".join("?" * (len(self.COLUMNS) + 2))})', rows)
+        return len(rows)
+
+    def get(self, cuit, pto_vta, cbte_tipo, cbte_nro) -> FECompConsultarResponse:
+        """
+        :return: The invoice, None if it is not in the ledger
+        """
+        with self._connection() as conn:
+            row = conn.execute(f'SELECT data FROM {self.TABLE} WHERE cuit = ? AND pto_vta = ? AND cbte_tipo = ? '
+                               f'AND cbte_nro = ?', (str(cuit), int(pto_vta), int(cbte_tipo), int(cbte_nro))).fetchone()
+        return self._load(row[0]) if row else None
+
+    def get_by_cae(self, cod_autorizacion: str) -> FECompConsultarResponse:
+        """
+        :return: The invoice with the CAE (or CAEA), None if it is not in the ledger
+        """
+        with self._connection() as conn:
+            row = conn.execute(f'SELECT data FROM {self.TABLE} WHERE cod_autorizacion = ?',
+                               (str(cod_autorizacion),)).fetchone()
+        return self._load(row[0]) if row else None
+
+    def query(self, cuit, pto_vta=None, cbte_tipo=None, fch_desde: str = None,
+              fch_hasta: str = None) -> Iterator[FECompConsultarResponse]:
+        """
+        Iterate the invoices of a CUIT in the ledger, by point of sale, invoice type and number
+        :param cuit: The CUIT that issued the invoices
+        :param pto_vta: Only this point of sale
+        :param cbte_tipo: Only this invoice type
+        :param fch_desde: From this date (yyyymmdd)
+        :param fch_hasta: Up to this date (yyyymmdd)
+        :return:
+        """
+        for row in self._select('data', cuit, pto_vta, cbte_tipo, fch_desde, fch_hasta):
+            yield self._load(row[0])
+
+    def export_jsonl(self, path: str, cuit, pto_vta=None, cbte_tipo=None, fch_desde: str = None,
+                     fch_hasta: str = None) -> int:
+        """
+        Write the invoices of the ledger as JSON lines (the FECompConsultarResponse dicts plus the cuit), with
+        the same filters as query
+        :param path: The output file
+        :return: The number of exported invoices
+        """
+        exported = 0
+        with open(path, 'w', encoding='utf-8') as output:
+            for cuit_rs, data in self._select('cuit, data', cuit, pto_vta, cbte_tipo, fch_desde, fch_hasta):
+                output.write(json.dumps({'cuit': cuit_rs, **json.loads(data)}) + '\n')
+                exported += 1
+        return exported
+
+    def export_csv(self, path: str, cuit, pto_vta=None, cbte_tipo=None, fch_desde: str = None,
+                   fch_hasta: str = None) -> int:
+        """
+        Write the invoices of the ledger as CSV, one column per COLUMNS, with the same filters as query
+        :param path: The output file
+        :return: The number of exported invoices
+        """
+        exported = 0
+        with open(path, 'w', encoding='utf-8', newline='') as output:
+            writer = csv.writer(output)
+            writer.writerow(self.COLUMNS)
+            for row in self._select(', '.join(self.COLUMNS), cuit, pto_vta, cbte_tipo, fch_desde, fch_hasta):
+                writer.writerow(row)
+                exported += 1
+        return exported
+
+    def counts(self, cuit) -> dict:
+        """
+        :return: {(pto_vta, cbte_tipo): number of invoices in the ledger}
+        """
+        with self._connection() as conn:
+            return {(pto_vta, cbte_tipo): count for pto_vta, cbte_tipo, count in conn.execute(
+                f'SELECT pto_vta, cbte_tipo, COUNT(*) FROM {self.TABLE} WHERE cuit = ? GROUP BY pto_vta, cbte_tipo',
+                (str(cuit),))}
+
+    def _first_after(self, wsfev: WSFEV, pto_vta, cbte_tipo, last: int, fch: str, inclusive: bool) -> int:
+        # first number dated on or after fch (inclusive) or after fch, last + 1 when there is none
+        low, high = 1, last + 1
+        while low < high:
+            middle = (low + high) // 2
+            cbte_fch = self._get_date(wsfev, pto_vta, cbte_tipo, middle)
+            # a number that does not exist is taken as part of the period, so the search keeps looking for the
+            # first end of the period before it (inclusive) or the second one after it
+            if cbte_fch is None:
+                before = not inclusive
+            else:
+                before = cbte_fch < fch if inclusive else cbte_fch <= fch
+            if before:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _get_date(self, wsfev: WSFEV, pto_vta, cbte_tipo, cbte_nro: int):
+        invoice = self.get(wsfev.cuit, pto_vta, cbte_tipo, cbte_nro)
+        if invoice is None:
+            invoice = wsfev.fecompconsultar(pto_vta, cbte_tipo, cbte_nro)
+            if not invoice.found:
+                return None
+            self.save(wsfev.cuit, [invoice])
+        return invoice.cbte_fch
+
+    def _select(self, columns: str, cuit, pto_vta=None, cbte_tipo=None, fch_desde: str = None, fch_hasta: str = None):
+        conditions, params = ['cuit = ?'], [str(cuit)]
+        for condition, value in (('pto_vta = ?', pto_vta), ('cbte_tipo = ?', cbte_tipo), ('cbte_fch >= ?', fch_desde),
+                                 ('cbte_fch <= ?', fch_hasta)):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        with self._connection() as conn:
+            yield from conn.execute(f'SELECT {columns} FROM {self.TABLE} WHERE {" AND ".join(conditions)} '
+                                    f'ORDER BY pto_vta, cbte_tipo, cbte_nro', params)
+
+    @staticmethod
+    def _load(data: str) -> FECompConsultarResponse:
+        return FECompConsultarResponse.from_dict(json.loads(data))
+
+    @contextmanager
+    def _connection(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._connection() as conn:
+            conn.isolation_level = None
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
@@ -0,0 +1,377 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Iterable, List, Tuple
+
+from easyAfip.utils.messages import FECAEDetRequest, FECAEDetResponse, FECAEResultEnum, FEError
+from easyAfip.utils.sequence_allocator import SequenceAllocator
+from easyAfip.wsfev import WSFEV
+
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxEntry:
+    """
+    Estado de un comprobante del outbox
+    """
+    __slots__ = ('idempotency_key', 'cuit', 'pto_vta', 'cbte_tipo', 'status', 'cbte_nro', 'invoice', 'result',
+                 'errors', 'attempts')
+
+    def __init__(self, idempotency_key, cuit, pto_vta, cbte_tipo, status, cbte_nro=None,
+                 invoice: FECAEDetRequest = None, result: FECAEDetResponse = None, errors: List[FEError] = None,
+                 attempts: int = 0):
+        self.idempotency_key = idempotency_key
+        self.cuit = cuit
+        self.pto_vta = pto_vta
+        self.cbte_tipo = cbte_tipo
+        self.status = status
+        self.cbte_nro = cbte_nro
+        self.invoice = invoice
+        self.result = result
+        self.errors = errors or []
+        self.attempts = attempts
+
+    @property
+    def cae(self):
+        return self.result.cae if self.result is not None else None
+
+    @property
+    def is_final(self) -> bool:
+        return self.status in (InvoiceOutbox.DONE, InvoiceOutbox.REJECTED)
+
+    def __str__(self):
+        return (f"OutboxEntry(idempotency_key={self.idempotency_key}, cuit={self.cuit}, pto_vta={self.pto_vta}, "
+                f"cbte_tipo={self.cbte_tipo}, status={self.status}, cbte_nro={self.cbte_nro}, cae={self.cae}, "
+                f"attempts={self.attempts}, errors={', '.join(str(error) for error in self.errors)})")
+
+
+class InvoiceOutbox:
+    """
+        Outbox durable de comprobantes a autorizar, sobre una base sqlite.
+
+        `submit` registra el comprobante bajo una clave de idempotencia provista por el llamador (una escritura
+        local) y `drain` los envía a FECAESolicitar en lotes de RegXReq comprobantes por punto de venta y tipo.
+        Volver a enviar una clave conocida devuelve el estado guardado (y el CAE, si ya fue otorgado) sin
+        ningún request, por lo que los reintentos del llamador no duplican comprobantes.
+
+        Los números se asignan y guardan antes de enviar cada lote: si el proceso cae o la respuesta se pierde,
+        el lote queda en estado `sending` y `recover` averigua con FECompConsultar cuáles fueron autorizados
+        (ver WSFEV.reconcile); el resto vuelve a `pending`. Los lotes de un mismo punto de venta y tipo nunca
+        se envían en paralelo, de modo que varios workers (hilos o procesos) pueden drenar la misma base.
+
+            outbox = InvoiceOutbox('outbox.db')
+            outbox.submit(order_id, pto_vta, cbte_tipo, invoice, cuit=cuit)   # al aceptar el pedido
+            outbox.start(wsfev)                                               # workers en segundo plano
+            entry = outbox.wait(order_id)                                     # entry.cae
+    """
+
+    PENDING = 'pending'
+    SENDING = 'sending'
+    DONE = 'done'
+    REJECTED = 'rejected'
+
+    TABLE = 'easyafip_outbox'
+
+    def __init__(self, path: str, timeout: float = 30.0, lease: float = 300.0, max_attempts: int = 5):
+        """
+        :param path: The sqlite database file
+        :param timeout: Seconds to wait for the database lock
+        :param lease: Seconds after which a batch still in `sending` is considered abandoned by its worker
+            (e.g. the process died) and recover reconciles it
+        :param max_attempts: Sends after which an invoice that keeps failing (request level errors) is rejected
+        """
+        self.path = path
+        self.timeout = timeout
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._stop = threading.Event()
+        self._threads = []
+        with self._connection() as conn:
+            # WAL: the readers (get, wait) do not block the writers
+            conn.execute('PRAGMA journal_mode=WAL')
+        with self._transaction() as conn:
+            # the invoices are sent in insertion (rowid) order
+            conn.execute(f'''CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                idempotency_key TEXT PRIMARY KEY, cuit TEXT NOT NULL, pto_vta INTEGER NOT NULL,
+                cbte_tipo INTEGER NOT NULL, status TEXT NOT NULL, cbte_nro INTEGER, invoice TEXT NOT NULL,
+                result TEXT, errors TEXT, attempts INTEGER NOT NULL DEFAULT 0, claimed_by TEXT, claimed_at REAL,
+                created_at REAL NOT NULL)''')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {self.TABLE}_status ON {self.TABLE} '
+                         f'(cuit, status, pto_vta, cbte_tipo)')
+
+    def submit(self, idempotency_key: str, pto_vta, cbte_tipo, invoice: FECAEDetRequest, cuit) -> OutboxEntry:
+        """
+        Record an invoice to be authorized. Resubmitting a known key returns its current state, without
+        touching the stored invoice.
+        :param idempotency_key: The caller's unique key of the invoice, e.g. the order id
+        :param pto_vta: The point of sale
+        :param cbte_tipo: The invoice type
+        :param invoice: The invoice, without number
+        :param cuit: The CUIT issuing the invoice
+        :return: The entry
+        :raises ValueError: If the key is already used for another CUIT, point of sale or invoice type
+        """
+        return self.submit_many([(idempotency_key, pto_vta, cbte_tipo, invoice)], cuit)[0]
+
+    def submit_many(self, items: Iterable[Tuple], cuit) -> List[OutboxEntry]:
+        """
+        Record many (idempotency_key, pto_vta, cbte_tipo, invoice) in a single transaction
+        :param items: Iterable of (idempotency_key, pto_vta, cbte_tipo, invoice)
+        :param cuit: The CUIT issuing the invoices
+        :return: The entries, in the same order
+        """
+        cuit = str(cuit)
+        now = time.time()
+        keys = []
+        with self._transaction() as conn:
+            for idempotency_key, pto_vta, cbte_tipo, invoice in items:
+                keys.append(idempotency_key)
+                inserted = conn.execute(
+                    f'INSERT OR IGNORE INTO {self.TABLE} (idempotency_key, cuit, pto_vta, cbte_tipo, status, invoice, '
+                    f'created_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (idempotency_key, cuit, int(pto_vta), int(cbte_tipo), self.PENDING,
+                     json.dumps(invoice.to_dict(json_safe=True)), now)).rowcount
+                if not inserted:
+                    row = conn.execute(f'SELECT cuit, pto_vta, cbte_tipo FROM {self.TABLE} WHERE idempotency_key = ?',
+                                       (idempotency_key,)).fetchone()
+                    if row != (cuit, int(pto_vta), int(cbte_tipo)):
+                        raise ValueError(f"The idempotency key {idempotency_key} is already used for cuit={row[0]} "
+                                         f"pto_vta={row[1]} cbte_tipo={row[2]}")
+            return [self._get(conn, key) for key in keys]
+
+    def get(self, idempotency_key: str) -> OutboxEntry:
+        """
+        :return: The entry of the key, None if it is unknown
+        """
+        with self._connection() as conn:
+            return self._get(conn, idempotency_key)
+
+    def wait(self, idempotency_key: str, timeout: float = None, poll_interval: float = 0.05) -> OutboxEntry:
+        """
+        Wait until the invoice is authorized or rejected
+        :param idempotency_key: The key of the invoice
+        :param timeout: Max seconds to wait, None to wait forever
+        :param poll_interval: Seconds between checks
+        :return: The entry, which may still be pending when the timeout expires
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            entry = self.get(idempotency_key)
+            if entry is None or entry.is_final or (deadline is not None and time.monotonic() >= deadline):
+                return entry
+            time.sleep(poll_interval)
+
+    def counts(self, cuit=None) -> dict:
+        """
+        :return: {status: number of entries}
+        """
+        sql, params = f'SELECT status, COUNT(*) FROM {self.TABLE}', ()
+        if cuit is not None:
+            sql, params = sql + ' WHERE cuit = ?', (str(cuit),)
+        with self._connection() as conn:
+            return dict(conn.execute(sql + ' GROUP BY status', params).fetchall())
+
+    def drain(self, wsfev: WSFEV, batch_size: int = None, max_batches: int = None) -> int:
+        """
+        Send the pending invoices of the CUIT of the client, in batches of at most RegXReq invoices of the
+        same point of sale and invoice type
+        :param wsfev: The WSFEV client of the CUIT
+        :param batch_size: Max invoices per request, defaults to the RegXReq informed by the service
+        :param max_batches: Stop after this number of batches, None to drain the outbox
+        :return: The number of processed batches
+        """
+        processed = 0
+        while max_batches is None or processed < max_batches:
+            batch = self._claim(str(wsfev.cuit), wsfev.get_batch_size(batch_size))
+            if batch is None:
+                break
+            processed += 1
+            if not self._send(wsfev, *batch):
+                # nothing could be resolved (e.g. communication errors), leave the rest for a later drain
+                break
+        return processed
+
+    def recover(self, wsfev: WSFEV, stale_after: float = None) -> int:
+        """
+        Resolve the batches left in `sending` by a crashed worker or a lost response: the authorized invoices
+        are marked as done and the others go back to pending
+        :param wsfev: The WSFEV client of the CUIT
+        :param stale_after: Seconds a batch must be in `sending` to be recovered, defaults to the lease
+        :return: The number of recovered entries
+        """
+        stale_after = self.lease if stale_after is None else stale_after
+        with self._connection() as conn:
+            groups = conn.execute(f'SELECT DISTINCT pto_vta, cbte_tipo, claimed_by FROM {self.TABLE} '
+                                  f'WHERE cuit = ? AND status = ? AND claimed_at <= ?',
+                                  (str(wsfev.cuit), self.SENDING, time.time() - stale_after)).fetchall()
+        recovered = 0
+        for pto_vta, cbte_tipo, claim in groups:
+            recovered += self._reconcile(wsfev, pto_vta, cbte_tipo, claim)
+        return recovered
+
+    def start(self, wsfev: WSFEV, workers: int = 1, interval: float = 0.5) -> None:
+        """
+        Start background threads that recover abandoned batches and drain the outbox every `interval` seconds
+        :param wsfev: The WSFEV client of the CUIT
+        :param workers: Number of threads, batches of different points of sale / invoice types are sent in parallel
+        :param interval: Seconds to wait when there is nothing to send
+        """
+        self._stop.clear()
+        for index in range(workers):
+            thread = threading.Thread(target=self._work, args=(wsfev, interval), daemon=True,
+                                      name=f'easyafip-outbox-{index}')
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, wait: bool = True) -> None:
+        self._stop.set()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
+
+    def _work(self, wsfev: WSFEV, interval: float) -> None:
+        while not self._stop.is_set():
+            try:
+                self.recover(wsfev)
+                if not self.drain(wsfev, max_batches=1):
+                    self._stop.wait(interval)
+            except Exception:
+                logger.exception('Error draining the invoice outbox of %s', wsfev.cuit)
+                self._stop.wait(interval)
+
+    def _claim(self, cuit: str, batch_size: int):
+        # takes the oldest pending invoices of a point of sale / invoice type without a batch in flight
+        claim = uuid.uuid4().hex
+        with self._transaction() as conn:
+            group = conn.execute(
+                f'SELECT pto_vta, cbte_tipo FROM {self.TABLE} AS pending WHERE cuit = ? AND status = ? AND NOT EXISTS '
+                f'(SELECT 1 FROM {self.TABLE} AS sending WHERE sending.cuit = pending.cuit AND sending.status = ? '
+                f'AND sending.pto_vta = pending.pto_vta AND sending.cbte_tipo = pending.cbte_tipo) ORDER BY rowid LIMIT 1',
+                (cuit, self.PENDING, self.SENDING)).fetchone()
+            if group is None:
+                return None
+            pto_vta, cbte_tipo = group
+            rows = conn.execute(f'SELECT idempotency_key, invoice, attempts + 1 FROM {self.TABLE} WHERE cuit = ? '
+                                f'AND status = ? AND pto_vta = ? AND cbte_tipo = ? ORDER BY rowid LIMIT ?',
+                                (cuit, self.PENDING, pto_vta, cbte_tipo, batch_size)).fetchall()
+            conn.executemany(f'UPDATE {self.TABLE} SET status = ?, claimed_by = ?, claimed_at = ?, '
+                             f'attempts = attempts + 1 WHERE idempotency_key = ?',
+                             [(self.SENDING, claim, time.time(), row[0]) for row in rows])
+        return pto_vta, cbte_tipo, claim, [(key, FECAEDetRequest.from_dict(json.loads(invoice)), attempts)
+                                           for key, invoice, attempts in rows]
+
+    def _send(self, wsfev: WSFEV, pto_vta, cbte_tipo, claim: str, entries: list) -> bool:
+        invoices = [invoice for _, invoice, _ in entries]
+        # the numbers are saved before sending, so an interrupted batch can be reconciled; fecaesolicitar
+        # receives the batch already numbered and does not reserve numbers again
+        unnumbered = sum(1 for invoice in invoices if not invoice.cbte_desde)
+        try:
+            if unnumbered:
+                wsfev.number_invoices(invoices, wsfev.reserve_numbers(pto_vta, cbte_tipo, unnumbered))
+        except Exception:
+            self._release(claim)
+            raise
+        with self._transaction() as conn:
+            conn.executemany(f'UPDATE {self.TABLE} SET cbte_nro = ? WHERE idempotency_key = ?',
+                             [(invoice.cbte_desde, key) for key, invoice, _ in entries])
+        try:
+            result = wsfev.fecaesolicitar(pto_vta, cbte_tipo, invoices)
+        except Exception:
+            logger.warning('FECAESolicitar failed for the outbox batch %s (pto_vta=%s cbte_tipo=%s), reconciling',
+                           claim, pto_vta, cbte_tipo, exc_info=True)
+            try:
+                self._reconcile(wsfev, pto_vta, cbte_tipo, claim)
+            except Exception:
+                logger.warning('Could not reconcile the outbox batch %s, it will be recovered later', claim,
+                               exc_info=True)
+            return False
+        return self._save_result(wsfev, pto_vta, cbte_tipo, entries, result.details, result.errors or [])
+
+    def _save_result(self, wsfev: WSFEV, pto_vta, cbte_tipo, entries: list, details: List[FECAEDetResponse],
+                     errors: List[FEError]) -> bool:
+        # returns whether the batch made progress: some invoice was resolved or the numbering was reseeded
+        by_number = {detail.cbte_desde: detail for detail in details}
+        updates, resolved, numbering_error = [], 0, False
+        for key, invoice, attempts in entries:
+            detail = by_number.get(invoice.cbte_desde)
+            if detail is not None and detail.resultado == FECAEResultEnum.APROBADO:
+                updates.append((self.DONE, invoice.cbte_desde, json.dumps(detail.to_dict(json_safe=True)),
+                                self._dump_errors(detail.obs_l), key))
+            elif detail is not None and not SequenceAllocator.is_numbering_error(detail.obs_l):
+                updates.append((self.REJECTED, invoice.cbte_desde, json.dumps(detail.to_dict(json_safe=True)),
+                                self._dump_errors(detail.obs_l), key))
+            else:
+                # numbering errors and request level errors: send it again in a later batch, with a new number
+                numbering_error = numbering_error or detail is not None or SequenceAllocator.is_numbering_error(errors)
+                status = self.REJECTED if attempts >= self.max_attempts else self.PENDING
+                updates.append((status, None, None, self._dump_errors(detail.obs_l if detail else errors), key))
+            resolved += updates[-1][0] != self.PENDING
+        if numbering_error:
+            wsfev.reset_numbers(pto_vta, cbte_tipo)
+        with self._transaction() as conn:
+            conn.executemany(f'UPDATE {self.TABLE} SET status = ?, cbte_nro = ?, result = ?, errors = ?, '
+                             f'claimed_by = NULL, claimed_at = NULL WHERE idempotency_key = ?', updates)
+        return bool(resolved) or numbering_error
+
+    def _reconcile(self, wsfev: WSFEV, pto_vta, cbte_tipo, claim: str) -> int:
+        with self._connection() as conn:
+            rows = conn.execute(f'SELECT idempotency_key, invoice, cbte_nro, attempts FROM {self.TABLE} '
+                                f'WHERE claimed_by = ? AND status = ? ORDER BY rowid', (claim, self.SENDING)).fetchall()
+        entries = []
+        for key, invoice, cbte_nro, attempts in rows:
+            invoice = FECAEDetRequest.from_dict(json.loads(invoice))
+            invoice.cbte_desde = invoice.cbte_hasta = cbte_nro
+            entries.append((key, invoice, attempts))
+        numbered = [invoice for _, invoice, _ in entries if invoice.cbte_desde]
+        granted, _ = wsfev.reconcile(pto_vta, cbte_tipo, numbered) if numbered else ([], [])
+        # the invoices not authorized go back to pending, to be numbered again
+        wsfev.reset_numbers(pto_vta, cbte_tipo)
+        self._save_result(wsfev, pto_vta, cbte_tipo, entries, granted, [])
+        logger.info('Reconciled the outbox batch %s: %s of %s invoices were authorized', claim, len(granted), len(entries))
+        return len(entries)
+
+    def _release(self, claim: str) -> None:
+        with self._transaction() as conn:
+            conn.execute(f'UPDATE {self.TABLE} SET status = ?, claimed_by = NULL, claimed_at = NULL '
+                         f'WHERE claimed_by = ? AND status = ?', (self.PENDING, claim, self.SENDING))
+
+    def _get(self, conn, idempotency_key: str) -> OutboxEntry:
+        row = conn.execute(f'SELECT idempotency_key, cuit, pto_vta, cbte_tipo, status, cbte_nro, invoice, result, '
+                           f'errors, attempts FROM {self.TABLE} WHERE idempotency_key = ?', (idempotency_key,)).fetchone()
+        if row is None:
+            return None
+        key, cuit, pto_vta, cbte_tipo, status, cbte_nro, invoice, result, errors, attempts = row
+        return OutboxEntry(key, cuit, pto_vta, cbte_tipo, status, cbte_nro,
+                           FECAEDetRequest.from_dict(json.loads(invoice)),
+                           FECAEDetResponse.from_dict(json.loads(result)) if result else None,
+                           [FEError(code, msg) for code, msg in json.loads(errors)] if errors else [], attempts)
+
+    @staticmethod
+    def _dump_errors(errors) -> str:
+        return json.dumps([(error.code, error.msg) for error in errors]) if errors else None
+
+    @contextmanager
+    def _connection(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._connection() as conn:
+            conn.isolation_level = None
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
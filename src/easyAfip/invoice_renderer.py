@@ -0,0 +1,329 @@
+import io
+import logging
+import os
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import groupby, islice
+from typing import Iterable, Iterator, List, Tuple
+
+from easyAfip.utils.afip_qr import build_qr_data, build_qr_url
+from easyAfip.utils.messages import FECAEDetRequest, FECAEDetResponse, FECAEResultEnum, FECAESolicitarResult
+
+
+logger = logging.getLogger(__name__)
+
+
+class InvoiceDocument:
+    """
+    Comprobante autorizado a imprimir: el FECAEDetRequest enviado y el FECAEDetResponse con su CAE.
+    """
+    __slots__ = ('cuit', 'pto_vta', 'cbte_tipo', 'invoice', 'detail')
+
+    def __init__(self, cuit, pto_vta, cbte_tipo, invoice: FECAEDetRequest, detail: FECAEDetResponse):
+        self.cuit = str(cuit)
+        self.pto_vta = int(pto_vta)
+        self.cbte_tipo = int(cbte_tipo)
+        self.invoice = invoice
+        self.detail = detail
+
+    @classmethod
+    def from_result(cls, result: FECAESolicitarResult, invoices: List[FECAEDetRequest]) -> List['InvoiceDocument']:
+        """
+        Build the documents of the approved invoices of a FECAESolicitar (or FECAEARegInformativo) result
+        :param result: The result
+        :param invoices: The invoices sent, matched with the details by number when they are numbered and by
+            position otherwise
+        :return:
+        """
+        if all(invoice.cbte_desde for invoice in invoices):
+            by_number = {int(invoice.cbte_desde): invoice for invoice in invoices}
+            pairs = [(by_number.get(detail.cbte_desde), detail) for detail in result.details]
+        else:
+            pairs = list(zip(invoices, result.details))
+        return [cls(result.cuit, result.pto_vta, result.cbte_tipo, invoice, detail) for invoice, detail in pairs
+                if invoice is not None and detail.resultado == FECAEResultEnum.APROBADO]
+
+    @property
+    def number(self) -> int:
+        return int(self.detail.cbte_desde)
+
+    @property
+    def filename(self) -> str:
+        return f'{self.cuit}_{self.cbte_tipo:03d}_{self.pto_vta:05d}_{self.number:08d}.pdf'
+
+    @property
+    def qr_url(self) -> str:
+        return build_qr_url(build_qr_data(self.cuit, self.pto_vta, self.cbte_tipo, self.invoice, self.detail))
+
+    def __str__(self):
+        return (f"InvoiceDocument(cuit={self.cuit}, pto_vta={self.pto_vta}, cbte_tipo={self.cbte_tipo}, "
+                f"number={self.number}, cae={self.detail.cae})")
+
+
+class InvoiceTemplate:
+    """
+    Plantilla de una página por comprobante, dibujada con reportlab: encabezado con la letra y el tipo de
+    comprobante, datos del emisor y del receptor, importes, CAE con su vencimiento y el código QR de la
+    RG 4892. Para otro diseño, heredar y redefinir `draw`; la plantilla se envía a los procesos del
+    InvoiceRenderer, por lo que sus atributos deben poder serializarse con pickle.
+    Requiere el extra `pdf`: pip install easyAfip[pdf]
+    """
+
+    # A4, en puntos
+    PAGE_SIZE = (595.28, 841.89)
+    MARGIN = 36
+    QR_SIZE = 100
+
+    # tipo de comprobante -> (descripción, letra)
+    CBTE_TIPOS = {
+        1: ('FACTURA', 'A'), 2: ('NOTA DE DEBITO', 'A'), 3: ('NOTA DE CREDITO', 'A'), 4: ('RECIBO', 'A'),
+        6: ('FACTURA', 'B'), 7: ('NOTA DE DEBITO', 'B'), 8: ('NOTA DE CREDITO', 'B'), 9: ('RECIBO', 'B'),
+        11: ('FACTURA', 'C'), 12: ('NOTA DE DEBITO', 'C'), 13: ('NOTA DE CREDITO', 'C'), 15: ('RECIBO', 'C'),
+        19: ('FACTURA', 'E'), 20: ('NOTA DE DEBITO', 'E'), 21: ('NOTA DE CREDITO', 'E'),
+        51: ('FACTURA', 'M'), 52: ('NOTA DE DEBITO', 'M'), 53: ('NOTA DE CREDITO', 'M'),
+        201: ('FACTURA DE CREDITO ELECTRONICA MiPyMEs', 'A'), 206: ('FACTURA DE CREDITO ELECTRONICA MiPyMEs', 'B'),
+        211: ('FACTURA DE CREDITO ELECTRONICA MiPyMEs', 'C'),
+    }
+    DOC_TIPOS = {80: 'CUIT', 86: 'CUIL', 87: 'CDI', 96: 'DNI', 99: 'Consumidor Final'}
+
+    def __init__(self, issuer: dict = None, compress: bool = True):
+        """
+        :param issuer: Data of the issuer printed in the header: razon_social, domicilio, condicion_iva,
+            iibb, inicio_actividades
+        :param compress: Compress the page streams (smaller files, a bit more CPU)
+        """
+        self.issuer = issuer or {}
+        self.compress = compress
+
+    def render(self, document: InvoiceDocument) -> bytes:
+        """
+        Render the PDF of a document
+        :param document: The document
+        :return: The PDF
+        """
+        try:
+            from reportlab.pdfgen.canvas import Canvas
+        except ImportError:
+            raise ImportError('reportlab is required to render the invoices, install it with: pip install easyAfip[pdf]')
+        output = io.BytesIO()
+        canvas = Canvas(output, pagesize=self.PAGE_SIZE, pageCompression=int(self.compress))
+        canvas.setTitle(document.filename[:-4])
+        self.draw(canvas, document)
+        canvas.showPage()
+        canvas.save()
+        return output.getvalue()
+
+    def draw(self, canvas, document: InvoiceDocument) -> None:
+        """
+        Draw the page of a document
+        :param canvas: The reportlab canvas
+        :param document: The document
+        """
+        width, height = self.PAGE_SIZE
+        left, right, top = self.MARGIN, width - self.MARGIN, height - self.MARGIN
+        invoice, detail = document.invoice, document.detail
+        description, letter = self.CBTE_TIPOS.get(document.cbte_tipo, ('COMPROBANTE', ''))
+
+        # header: issuer on the left, letter in the middle, invoice on the right
+        canvas.rect(left, top - 120, right - left, 120)
+        canvas.rect(width / 2 - 22, top - 50, 44, 50)
+        canvas.setFont('Helvetica-Bold', 30)
+        canvas.drawCentredString(width / 2, top - 32, letter)
+        canvas.setFont('Helvetica', 7)
+        canvas.drawCentredString(width / 2, top - 45, f'COD. {document.cbte_tipo:03d}')
+        canvas.setFont('Helvetica-Bold', 13)
+        canvas.drawString(left + 10, top - 25, str(self.issuer.get('razon_social', '')))
+        canvas.setFont('Helvetica', 8)
+        lines = (('Domicilio', self.issuer.get('domicilio')), ('Condición frente al IVA', self.issuer.get('condicion_iva')))
+        self._draw_lines(canvas, left + 10, top - 45, lines)
+        canvas.setFont('Helvetica-Bold', 13)
+        canvas.drawString(width / 2 + 35, top - 25, description)
+        canvas.setFont('Helvetica', 8)
+        lines = (('Punto de Venta', f'{document.pto_vta:05d}'), ('Comp. Nro', f'{document.number:08d}'),
+                 ('Fecha de Emisión', self._format_date(detail.cbte_fch or invoice.cbte_fch)),
+                 ('CUIT', document.cuit), ('Ingresos Brutos', self.issuer.get('iibb')),
+                 ('Inicio de Actividades', self.issuer.get('inicio_actividades')))
+        self._draw_lines(canvas, width / 2 + 35, top - 45, lines)
+
+        # receptor and service period
+        doc_tipo = int(detail.doc_tipo if detail.doc_tipo is not None else invoice.doc_tipo or 99)
+        lines = [(self.DOC_TIPOS.get(doc_tipo, f'Doc. {doc_tipo}'), detail.doc_nro or invoice.doc_nro)]
+        if invoice.fch_serv_desde:
+            lines.append(('Período facturado', f'{self._format_date(invoice.fch_serv_desde)} al '
+                                               f'{self._format_date(invoice.fch_serv_hasta)}'))
+            lines.append(('Vencimiento del pago', self._format_date(invoice.fch_vto_pago)))
+        canvas.rect(left, top - 190, right - left, 60)
+        self._draw_lines(canvas, left + 10, top - 148, lines)
+
+        # amounts
+        amounts = [('Importe Neto Gravado', invoice.imp_neto), ('Importe No Gravado', invoice.imp_tot_conc),
+                   ('Importe Exento', invoice.imp_op_ex), ('IVA', invoice.imp_iva),
+                   ('Otros Tributos', invoice.imp_trib)]
+        y = top - 240
+        canvas.setFont('Helvetica', 9)
+        for label, amount in amounts:
+            canvas.drawRightString(right - 110, y, f'{label}: {invoice.mon_id or "PES"}')
+            canvas.drawRightString(right - 10, y, self._format_amount(amount))
+            y -= 14
+        canvas.setFont('Helvetica-Bold', 11)
+        canvas.drawRightString(right - 110, y - 4, f'Importe Total: {invoice.mon_id or "PES"}')
+        canvas.drawRightString(right - 10, y - 4, self._format_amount(invoice.imp_total))
+
+        # footer: QR code and authorization
+        self.draw_qr(canvas, document.qr_url, left, self.MARGIN, self.QR_SIZE)
+        canvas.setFont('Helvetica-Bold', 10)
+        canvas.drawString(left + self.QR_SIZE + 15, self.MARGIN + 65, 'Comprobante Autorizado')
+        canvas.setFont('Helvetica', 9)
+        authorization = 'CAEA' if getattr(invoice, 'caea', None) else 'CAE'
+        canvas.drawString(left + self.QR_SIZE + 15, self.MARGIN + 50,
+                          f'{authorization} N°: {getattr(invoice, "caea", None) or detail.cae}')
+        if detail.cae_fch_vto:
+            canvas.drawString(left + self.QR_SIZE + 15, self.MARGIN + 36,
+                              f'Fecha de Vto. de {authorization}: {self._format_date(detail.cae_fch_vto)}')
+
+    @staticmethod
+    def draw_qr(canvas, url: str, x: float, y: float, size: float) -> None:
+        """
+        Draw a QR code with its bottom left corner at (x, y)
+        """
+        from reportlab.graphics.barcode import qrencoder
+
+        # encoded once and drawn as a single path of the runs of dark modules: the QrCodeWidget encodes the data
+        # twice (bounds and drawing) and builds a shape per module, which made it ~95% of the render time
+        qr = qrencoder.QRCode(None, qrencoder.QRErrorCorrectLevel.M)
+        qr.addData(url)
+        qr.make()
+        count = qr.getModuleCount()
+        # 4 modules of quiet zone around the code
+        module = size / (count + 8)
+        path = canvas.beginPath()
+        for row_index, row in enumerate(qr.modules):
+            top = y + size - (row_index + 5) * module
+            column = 0
+            for dark, run in groupby(row):
+                length = len(list(run))
+                if dark:
+                    path.rect(x + (column + 4) * module, top, length * module, module)
+                column += length
+        canvas.drawPath(path, stroke=0, fill=1)
+
+    @staticmethod
+    def _draw_lines(canvas, x: float, y: float, lines, leading: float = 12) -> None:
+        for label, value in lines:
+            if value is None or value == '':
+                continue
+            canvas.drawString(x, y, f'{label}: {value}')
+            y -= leading
+
+    @staticmethod
+    def _format_date(value) -> str:
+        value = str(value or '')
+        return f'{value[6:8]}/{value[4:6]}/{value[:4]}' if len(value) == 8 else value
+
+    @staticmethod
+    def _format_amount(value) -> str:
+        if value is None or value == '':
+            return '0,00'
+        # 1234567.5 -> 1.234.567,50
+        return f'{float(value):,.2f}'.replace(',', '_').replace('.', ',').replace('_', '.')
+
+
+def _render_chunk(template: InvoiceTemplate, documents: List[InvoiceDocument]) -> List[Tuple[str, bytes]]:
+    # runs in the worker processes
+    return [(document.filename, template.render(document)) for document in documents]
+
+
+class InvoiceRenderer:
+    """
+        Renderizado en paralelo de los PDF de los comprobantes autorizados.
+
+        Los comprobantes se reparten de a `chunk_size` entre `max_workers` procesos (el render es CPU y el
+        GIL no permite paralelizarlo con hilos), con a lo sumo dos lotes por proceso en curso: los documentos
+        se consumen a medida que hay lugar y cada PDF se escribe apenas llega, de modo que la memoria no crece
+        con la cantidad de comprobantes.
+
+            documents = InvoiceDocument.from_result(result, invoices)
+            with InvoiceRenderer(InvoiceTemplate(issuer)) as renderer:
+                renderer.render_to_zip(documents, 'facturas.zip')
+    """
+
+    DEFAULT_CHUNK_SIZE = 20
+
+    def __init__(self, template: InvoiceTemplate = None, max_workers: int = None, chunk_size: int = None):
+        """
+        :param template: The template, defaults to InvoiceTemplate()
+        :param max_workers: Number of processes, defaults to the number of CPUs; 0 renders in the current process
+        :param chunk_size: Documents sent to a process at once
+        """
+        self.template = template if template is not None else InvoiceTemplate()
+        self.max_workers = os.cpu_count() if max_workers is None else max_workers
+        self.chunk_size = chunk_size or self.DEFAULT_CHUNK_SIZE
+        self._executor = None
+
+    def render(self, documents: Iterable[InvoiceDocument]) -> Iterator[Tuple[str, bytes]]:
+        """
+        Render the documents, in the order they are finished
+        :param documents: The documents, e.g. from InvoiceDocument.from_result
+        :return: Iterator of (filename, PDF)
+        """
+        documents = iter(documents)
+        if not self.max_workers:
+            for chunk in iter(lambda: list(islice(documents, self.chunk_size)), []):
+                yield from _render_chunk(self.template, chunk)
+            return
+        executor = self._get_executor()
+        in_flight = set()
+        while True:
+            while len(in_flight) < self.max_workers * 2:
+                chunk = list(islice(documents, self.chunk_size))
+                if not chunk:
+                    break
+                in_flight.add(executor.submit(_render_chunk, self.template, chunk))
+            if not in_flight:
+                return
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+
+    def render_to_directory(self, documents: Iterable[InvoiceDocument], directory: str) -> int:
+        """
+        Render the documents as files of a directory, named after the CUIT, type, point of sale and number
+        :return: The number of rendered documents
+        """
+        os.makedirs(directory, exist_ok=True)
+        rendered = 0
+        for filename, pdf in self.render(documents):
+            with open(os.path.join(directory, filename), 'wb') as output:
+                output.write(pdf)
+            rendered += 1
+        return rendered
+
+    def render_to_zip(self, documents: Iterable[InvoiceDocument], path) -> int:
+        """
+        Render the documents into a zip file (stored, the PDFs are already compressed)
+        :param path: The zip path or a writable file object
+        :return: The number of rendered documents
+        """
+        rendered = 0
+        with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED) as output:
+            for filename, pdf in self.render(documents):
+                output.writestr(filename, pdf)
+                rendered += 1
+        return rendered
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # the pool is kept between calls, starting the processes costs more than rendering a small batch
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
@@ -0,0 +1,66 @@
+from concurrent.futures import Future
+from typing import Iterable, List, Tuple
+
+from easyAfip.utils.messages import FECAEDetRequest
+from easyAfip.utils.sequence_allocator import SequenceAllocator
+from easyAfip.utils.sharded_executor import ShardedExecutor
+from easyAfip.wsfev import WSFEV
+
+
+class InvoiceScheduler:
+    """
+        Planificador de FECAESolicitar particionado por secuencia de numeración.
+
+        La AFIP solo exige orden dentro de cada secuencia (CUIT, punto de venta, tipo de comprobante), de modo
+        que los lotes se encolan por secuencia: dentro de una secuencia se envían en orden y de a uno, y las
+        secuencias distintas se envían en paralelo hasta `max_workers` requests en curso. El throughput crece
+        con la cantidad de puntos de venta y tipos de comprobante en lugar de quedar serializado.
+
+            with InvoiceScheduler(wsfev, max_workers=8) as scheduler:
+                futures = [scheduler.submit(pto_vta, cbte_tipo, batch) for pto_vta, cbte_tipo, batch in work]
+                results = [future.result() for future in futures]
+    """
+
+    def __init__(self, wsfev: WSFEV, max_workers: int = 8):
+        """
+        :param wsfev: The WSFEV client of the CUIT
+        :param max_workers: Max number of requests in flight across all the sequences
+        """
+        self.wsfev = wsfev
+        self.executor = ShardedExecutor(max_workers=max_workers, thread_name_prefix='easyafip-scheduler')
+
+    def submit(self, pto_vta, ct_tipo, invoices: List[FECAEDetRequest]) -> Future:
+        """
+        Queue a FECAESolicitar, it is sent after the ones already queued for the same sequence
+        :param pto_vta: The point of sale
+        :param ct_tipo: The invoice type
+        :param invoices: The invoices to create
+        :return: Future with the FECAESolicitarResult
+        """
+        return self.executor.submit(self.get_shard(pto_vta, ct_tipo), self.wsfev.fecaesolicitar, pto_vta, ct_tipo, invoices)
+
+    def submit_many(self, work_items: Iterable[Tuple]) -> List[Future]:
+        """
+        Queue many (pto_vta, cbte_tipo, invoices) work items
+        :param work_items: Iterable of work items
+        :return: The futures, in the same order as the work items
+        """
+        return [self.submit(*work_item) for work_item in work_items]
+
+    def get_shard(self, pto_vta, ct_tipo) -> str:
+        """
+        Get the shard of a sequence, the same key used by the SequenceAllocator
+        """
+        return SequenceAllocator.get_key(self.wsfev.cuit, pto_vta, ct_tipo, self.wsfev.environment)
+
+    def pending(self) -> int:
+        return self.executor.pending()
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
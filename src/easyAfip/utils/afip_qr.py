@@ -0,0 +1,69 @@
+import base64
+import json
+from decimal import Decimal
+
+
+# RG 4892: url del código QR de los comprobantes electrónicos
+QR_URL = 'https://www.afip.gob.ar/fe/qr/'
+QR_VERSION = 1
+
+# tipoCodAut: E para CAE, A para CAEA
+CAE_CODE_TYPE = 'E'
+CAEA_CODE_TYPE = 'A'
+
+
+def build_qr_data(cuit, pto_vta, cbte_tipo, invoice, detail) -> dict:
+    """
+    Build the data of the QR code of an authorized invoice, as specified by RG 4892
+    :param cuit: The CUIT of the issuer
+    :param pto_vta: The point of sale
+    :param cbte_tipo: The invoice type
+    :param invoice: The FECAEDetRequest (or FECAEADetRequest) sent to the service
+    :param detail: The FECAEDetResponse of the invoice
+    :return: The JSON serializable data, in the order of the specification
+    """
+    caea = getattr(invoice, 'caea', None)
+    cbte_fch = str(detail.cbte_fch or invoice.cbte_fch)
+    data = {
+        'ver': QR_VERSION,
+        'fecha': f'{cbte_fch[:4]}-{cbte_fch[4:6]}-{cbte_fch[6:8]}',
+        'cuit': int(cuit),
+        'ptoVta': int(pto_vta),
+        'tipoCmp': int(cbte_tipo),
+        'nroCmp': int(detail.cbte_desde if detail.cbte_desde is not None else invoice.cbte_desde),
+        'importe': _to_number(invoice.imp_total),
+        'moneda': invoice.mon_id or 'PES',
+        'ctz': _to_number(invoice.mon_cotiz or 1),
+    }
+    doc_tipo = detail.doc_tipo if detail.doc_tipo is not None else invoice.doc_tipo
+    doc_nro = detail.doc_nro if detail.doc_nro is not None else invoice.doc_nro
+    # the receptor is optional, e.g. consumidor final without document
+    if doc_tipo is not None and doc_nro is not None and int(doc_nro):
+        data['tipoDocRec'] = int(doc_tipo)
+        data['nroDocRec'] = int(doc_nro)
+    data['tipoCodAut'] = CAEA_CODE_TYPE if caea else CAE_CODE_TYPE
+    data['codAut'] = int(caea or detail.cae)
+    return data
+
+
+def build_qr_url(data: dict) -> str:
+    """
+    Build the url encoded in the QR code: the data as base64 JSON in the p parameter
+    :param data: The data returned by build_qr_data
+    :return:
+    """
+    payload = base64.b64encode(json.dumps(data, separators=(',', ':')).encode('utf-8')).decode('ascii')
+    return f'{QR_URL}?p={payload}'
+
+
+def parse_qr_url(url: str) -> dict:
+    """
+    Decode the data of a QR code url
+    """
+    return json.loads(base64.b64decode(url.split('?p=', 1)[1]))
+
+
+def _to_number(value):
+    # the amounts are JSON numbers: integers without decimals, floats otherwise
+    amount = Decimal(str(value))
+    return int(amount) if amount == amount.to_integral_value() else float(amount)
@@ -1,45 +1,191 @@
-import requests
-import ssl
-from requests.adapters import HTTPAdapter
-from urllib3.poolmanager import PoolManager
-from urllib3.util.ssl_ import create_urllib3_context
+import threading
+import time
 import logging
+from types import MappingProxyType
+
+from easyAfip.utils import metrics
+from easyAfip.utils.circuit_breaker import CircuitBreaker
+from easyAfip.utils.messages import AfipCommunicationError, AfipThrottledError
 
 logger = logging.getLogger(__name__)
 
-class SSLAdapter(HTTPAdapter):
-    def init_poolmanager(self, *args, **kwargs):
-        context = create_urllib3_context()
-        context.check_hostname = False
-        context.verify_mode = ssl.CERT_NONE
-        context.set_ciphers(":HIGH:!DH:!aNULL")
-        kwargs['ssl_context'] = context
-        return super(SSLAdapter, self).init_poolmanager(*args, **kwargs)
-
-    def build_response(self, req, resp):
-        response = super(SSLAdapter, self).build_response(req, resp)
-        return response
 
 class AfipWSConnector:
+    """
+    Conector HTTP contra un endpoint de la AFIP.
+
+    Mantiene una única `requests.Session` con un pool de conexiones keep-alive, de modo que las
+    conexiones TCP/TLS se reutilizan entre requests. Puede compartirse entre hilos y entre instancias
+    de WSAA/WSFEV; `AfipWSConnector.get_shared(ws_url)` devuelve el conector compartido del endpoint.
+    Cada conector tiene un `CircuitBreaker`, de modo que mientras el endpoint no responde los requests
+    fallan inmediatamente con `CircuitOpenError`.
+    Los headers HTTP se fijan por instancia al crearla (`headers`, sobre los HEADERS por defecto) y no se
+    modifican después: `add_header` los reemplaza por una copia, sin afectar a otros conectores.
+    """
 
     HEADERS = {
         "Content-Type": "text/xml;charset=UTF-8",
         "User-Agent": "easy-afip/1.0 (+https://example.com/contact)"
     }
 
-    def __init__(self, ws_url: str):
+    DEFAULT_POOL_SIZE = 10
+    THROTTLING_STATUS_CODES = (429, 503)
+    DEFAULT_TIMEOUT = (10, 60)
+
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, ws_url: str, pool_size: int = None, timeout=None, circuit_breaker: CircuitBreaker = None,
+                 headers: dict = None):
+        """
+        :param ws_url: The endpoint url
+        :param pool_size: Max number of keep-alive connections kept open against the endpoint
+        :param timeout: (connect, read) timeouts in seconds, or a single value for both
+        :param circuit_breaker: The circuit breaker of the endpoint, a default one is created when not given
+        :param headers: HTTP headers sent in every request, added to (or overriding) HEADERS
+        """
         self.ws_url = ws_url
+        self.headers = MappingProxyType({**self.HEADERS, **(headers or {})})
+        self.pool_size = pool_size or self.DEFAULT_POOL_SIZE
+        self.timeout = timeout if timeout is not None else self.DEFAULT_TIMEOUT
+        if isinstance(self.timeout, list):  # e.g. a config loaded from JSON
+            self.timeout = tuple(self.timeout)
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else CircuitBreaker()
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        """
+        The requests.Session of the connector, created (and requests imported) on the first request
+        """
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    def _create_session(self):
+        import requests
+        from easyAfip.utils.http_adapters import SSLAdapter, TimedHTTPAdapter
 
-    def execute_request(self, data: str, headers:dict ={}):
-        headers = {**self.HEADERS, **headers}
         session = requests.Session()
-        session.mount('https://', SSLAdapter())
-        response = session.post(self.ws_url, data=data, headers=headers, verify=False)
-        # response = requests.post(self.ws_url, headers=headers, data=data, verify=False)
+        session.verify = False
+        session.mount('https://', SSLAdapter(pool_connections=1, pool_maxsize=self.pool_size, pool_block=True))
+        session.mount('http://', TimedHTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, pool_block=True))
+        return session
+
+    def get_config(self) -> dict:
+        """
+        Get the configuration of the connector, JSON serializable, to build an equivalent one with
+        get_shared(**config), e.g. in another process
+        :return: {'ws_url', 'pool_size', 'timeout', 'headers'}
+        """
+        return {'ws_url': self.ws_url, 'pool_size': self.pool_size, 'timeout': self.timeout, 'headers': dict(self.headers)}
+
+    @classmethod
+    def get_shared(cls, ws_url: str, pool_size: int = None, timeout=None, headers: dict = None):
+        """
+        Get the connector shared by every client of the given endpoint, creating it on first use.
+        pool_size, timeout and headers are only used when the connector is created.
+        :param ws_url: The endpoint url
+        :param pool_size: Max number of keep-alive connections kept open against the endpoint
+        :param timeout: (connect, read) timeouts in seconds
+        :param headers: HTTP headers sent in every request, added to HEADERS
+        :return: The shared AfipWSConnector
+        """
+        with cls._shared_lock:
+            connector = cls._shared.get(ws_url)
+            if connector is None:
+                connector = cls._shared[ws_url] = cls(ws_url, pool_size=pool_size, timeout=timeout, headers=headers)
+            return connector
+
+    @classmethod
+    def close_shared(cls) -> None:
+        """
+        Close and forget every shared connector.
+        :return:
+        """
+        with cls._shared_lock:
+            connectors, cls._shared = cls._shared, {}
+        for connector in connectors.values():
+            connector.close()
+
+    def execute_request(self, data: str, headers:dict ={}):
+        return self._post(data, headers).text
+
+    def execute_request_raw(self, data, headers: dict = {}) -> bytes:
+        """
+        Same as execute_request but returns the undecoded response body, to be fed directly to a parser
+        """
+        return self._post(data, headers).content
+
+    def _post(self, data, headers: dict):
+        import requests
+
+        headers = {**self.headers, **headers}
+        self.circuit_breaker.before_request(self.ws_url)
+        request_metrics = metrics.current()
+        connect_before = request_metrics.phases.get('connect', 0.0) if request_metrics is not metrics.NULL_METRICS else 0.0
+        started = time.perf_counter()
+        try:
+            response = self.session.post(self.ws_url, data=data, headers=headers, timeout=self.timeout)
+        except requests.RequestException:
+            self.circuit_breaker.record_failure()
+            raise
+        except BaseException:
+            # no outcome (interrupted, or an error that is not the endpoint's), don't leave a trial request pending
+            self.circuit_breaker.release()
+            raise
+        if request_metrics is not metrics.NULL_METRICS:
+            connect = request_metrics.phases.get('connect', 0.0) - connect_before
+            request_metrics.add_phase('server', time.perf_counter() - started - connect)
+            request_metrics.request_bytes += len(data)
+            request_metrics.response_bytes += len(response.content)
+        # a throttling response with Retry-After comes from a live endpoint shedding load, it does not open the circuit
+        throttled = response.status_code in self.THROTTLING_STATUS_CODES and 'Retry-After' in response.headers
+        if response.status_code >= 500 and not throttled:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
         if response.status_code != 200:
             logger.warning('AFIP communication error. Error Detail: %s', response.text)
-            raise Exception(f"AFIP service communication error. ErrorCode={response.status_code}")
-        return response.text
+            raise self.build_error(response.status_code, response.headers.get('Retry-After'))
+        return response
+
+    @classmethod
+    def build_error(cls, status_code: int, retry_after: str = None) -> AfipCommunicationError:
+        """
+        Build the error of a non 200 response, an AfipThrottledError when the service is shedding load
+        :param status_code: The HTTP status
+        :param retry_after: The Retry-After header, if any
+        :return:
+        """
+        message = f"AFIP service communication error. ErrorCode={status_code}"
+        if status_code not in cls.THROTTLING_STATUS_CODES:
+            return AfipCommunicationError(message, status_code)
+        try:
+            retry_after = float(retry_after) if retry_after is not None else None
+        except ValueError:  # an HTTP date, not used by AFIP
+            retry_after = None
+        return AfipThrottledError(message, status_code, retry_after)
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
 
     def add_header(self, key: str, value: str):
-        self.HEADERS[key] = value
\ No newline at end of file
+        """
+        Add a header to the requests of this connector (and of the clients sharing it). The headers are
+        replaced by a new mapping, so a request in flight keeps the ones it started with.
+        """
+        self.headers = MappingProxyType({**self.headers, key: value})
+
+
+def __getattr__(name):
+    # the adapters were moved to http_adapters, so importing this module does not import requests
+    if name in ('TimedHTTPConnection', 'TimedHTTPSConnection', 'TimedHTTPConnectionPool', 'TimedHTTPSConnectionPool',
+                'TimedHTTPAdapter', 'SSLAdapter'):
+        from easyAfip.utils import http_adapters
+        return getattr(http_adapters, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
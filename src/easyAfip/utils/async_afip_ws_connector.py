@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from types import MappingProxyType
+
+from easyAfip.utils import metrics
+from easyAfip.utils.afip_ws_connector import AfipWSConnector
+from easyAfip.utils.http_adapters import SSLAdapter
+from easyAfip.utils.circuit_breaker import CircuitBreaker
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover - optional dependency
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncAfipWSConnector:
+    """
+    Conector HTTP no bloqueante (asyncio) contra un endpoint de la AFIP, basado en aiohttp.
+
+    Igual que `AfipWSConnector` mantiene un pool de conexiones keep-alive por endpoint. Como las sesiones
+    de aiohttp están atadas a un event loop, se crea una sesión por loop la primera vez que se usa.
+    Requiere el extra `async`: pip install easyAfip[async]
+    """
+
+    HEADERS = AfipWSConnector.HEADERS
+
+    DEFAULT_POOL_SIZE = AfipWSConnector.DEFAULT_POOL_SIZE
+    DEFAULT_TIMEOUT = AfipWSConnector.DEFAULT_TIMEOUT
+
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, ws_url: str, pool_size: int = None, timeout=None, circuit_breaker: CircuitBreaker = None,
+                 headers: dict = None):
+        """
+        :param ws_url: The endpoint url
+        :param pool_size: Max number of keep-alive connections kept open against the endpoint
+        :param timeout: (connect, read) timeouts in seconds, or a single value for both
+        :param circuit_breaker: The circuit breaker of the endpoint, a default one is created when not given
+        :param headers: HTTP headers sent in every request, added to (or overriding) HEADERS
+        """
+        if aiohttp is None:
+            raise ImportError('aiohttp is required for the async clients, install it with: pip install easyAfip[async]')
+        self.ws_url = ws_url
+        self.headers = MappingProxyType({**self.HEADERS, **(headers or {})})
+        self.pool_size = pool_size or self.DEFAULT_POOL_SIZE
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else CircuitBreaker()
+        timeout = timeout if timeout is not None else self.DEFAULT_TIMEOUT
+        if isinstance(timeout, list):  # e.g. a config loaded from JSON
+            timeout = tuple(timeout)
+        self._timeout_config = timeout
+        connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self._ssl_context = SSLAdapter._create_ssl_context()
+        self._sessions = weakref.WeakKeyDictionary()
+
+    def get_config(self) -> dict:
+        """
+        Get the configuration of the connector, JSON serializable, to build an equivalent one with
+        get_shared(**config), e.g. in another process
+        :return: {'ws_url', 'pool_size', 'timeout', 'headers'}
+        """
+        return {'ws_url': self.ws_url, 'pool_size': self.pool_size, 'timeout': self._timeout_config,
+                'headers': dict(self.headers)}
+
+    @classmethod
+    def get_shared(cls, ws_url: str, pool_size: int = None, timeout=None, headers: dict = None):
+        """
+        Get the async connector shared by every client of the given endpoint, creating it on first use.
+        pool_size, timeout and headers are only used when the connector is created.
+        :param ws_url: The endpoint url
+        :param pool_size: Max number of keep-alive connections kept open against the endpoint
+        :param timeout: (connect, read) timeouts in seconds
+        :param headers: HTTP headers sent in every request, added to HEADERS
+        :return: The shared AsyncAfipWSConnector
+        """
+        with cls._shared_lock:
+            connector = cls._shared.get(ws_url)
+            if connector is None:
+                connector = cls._shared[ws_url] = cls(ws_url, pool_size=pool_size, timeout=timeout, headers=headers)
+            return connector
+
+    async def execute_request(self, data, headers: dict = {}):
+        return (await self._post(data, headers)).decode('utf-8')
+
+    async def execute_request_raw(self, data, headers: dict = {}) -> bytes:
+        """
+        Same as execute_request but returns the undecoded response body, to be fed directly to a parser
+        """
+        return await self._post(data, headers)
+
+    async def _post(self, data, headers: dict) -> bytes:
+        headers = {**self.headers, **headers}
+        session = self._get_session()
+        data = data.encode('utf-8') if isinstance(data, str) else data
+        request_metrics = metrics.current()
+        connect_before = request_metrics.phases.get('connect', 0.0) if request_metrics is not metrics.NULL_METRICS else 0.0
+        self.circuit_breaker.before_request(self.ws_url)
+        started = time.perf_counter()
+        try:
+            async with session.post(self.ws_url, data=data, headers=headers) as response:
+                body = await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.circuit_breaker.record_failure()
+            raise
+        except BaseException:
+            # no outcome (e.g. the task was cancelled), don't leave a trial request pending
+            self.circuit_breaker.release()
+            raise
+        if request_metrics is not metrics.NULL_METRICS:
+            connect = request_metrics.phases.get('connect', 0.0) - connect_before
+            request_metrics.add_phase('server', time.perf_counter() - started - connect)
+            request_metrics.request_bytes += len(data)
+            request_metrics.response_bytes += len(body)
+        throttled = response.status in AfipWSConnector.THROTTLING_STATUS_CODES and 'Retry-After' in response.headers
+        if response.status >= 500 and not throttled:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+        if response.status != 200:
+            logger.warning('AFIP communication error. Error Detail: %s', body.decode('utf-8', 'replace'))
+            raise AfipWSConnector.build_error(response.status, response.headers.get('Retry-After'))
+        return body
+
+    async def close(self) -> None:
+        """
+        Close the session of the running event loop.
+        :return:
+        """
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.close()
+
+    def add_header(self, key: str, value: str):
+        """
+        Add a header to the requests of this connector (and of the clients sharing it). The headers are
+        replaced by a new mapping, so a request in flight keeps the ones it started with.
+        """
+        self.headers = MappingProxyType({**self.headers, key: value})
+
+    def _get_session(self):
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, ssl=self._ssl_context)
+            session = self._sessions[loop] = aiohttp.ClientSession(connector=connector, timeout=self.timeout,
+                                                                   trace_configs=[self._build_trace_config()])
+        return session
+
+    @staticmethod
+    def _build_trace_config():
+        async def on_connection_create_start(session, trace_config_ctx, params):
+            trace_config_ctx.connect_started = time.perf_counter()
+
+        async def on_connection_create_end(session, trace_config_ctx, params):
+            metrics.current().add_phase('connect', time.perf_counter() - trace_config_ctx.connect_started)
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_start.append(on_connection_create_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        return trace_config
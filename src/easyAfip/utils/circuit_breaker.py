@@ -0,0 +1,92 @@
+import threading
+import time
+
+from easyAfip.utils.messages import CircuitOpenError
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de un endpoint de la AFIP.
+
+    Luego de `failure_threshold` fallas consecutivas (errores de conexión, timeouts o respuestas 5xx) el
+    circuito se abre y los requests fallan inmediatamente con `CircuitOpenError`, sin esperar el timeout.
+    Pasados `reset_timeout` segundos se deja pasar un único request de prueba (half-open): si responde
+    el circuito se cierra, si falla vuelve a abrirse. Si el request de prueba termina sin resultado
+    (cancelado, interrumpido) el conector lo libera con `release`, y si nadie lo libera se da por perdido
+    luego de otros `reset_timeout` segundos, de modo que el circuito nunca queda bloqueado en half-open.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        :param failure_threshold: Consecutive failures needed to open the circuit
+        :param reset_timeout: Seconds the circuit stays open before letting a trial request through
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._trial_started_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def before_request(self, name: str = None) -> None:
+        """
+        Check that a request can be sent
+        :param name: The endpoint name, used in the error message
+        :raises CircuitOpenError: If the circuit is open
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self._state == self.HALF_OPEN and self._trial_in_flight and \
+                    time.monotonic() - self._trial_started_at >= self.reset_timeout:
+                # the trial request never reported its outcome
+                self._trial_in_flight = False
+            if self._state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                self._trial_started_at = time.monotonic()
+                return
+            failures = self._failures
+            retry_in = max(self.reset_timeout - (time.monotonic() - self._opened_at), 0)
+        raise CircuitOpenError(f"The circuit of {name or 'the endpoint'} is open after {failures} "
+                               f"consecutive failures, retry in {retry_in:.1f}s")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def release(self) -> None:
+        """
+        Report that a request ended without outcome (e.g. it was cancelled): if it was the trial request,
+        the next request is let through as the trial
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def reset(self) -> None:
+        self.record_success()
@@ -0,0 +1,160 @@
+import csv
+import json
+from itertools import islice
+from typing import Iterator
+
+
+class InvoiceColumns:
+    """
+    Lote de comprobantes en formato columnar: una columna por campo de FECAEDetRequest.
+
+    Permite enviar a FECAESolicitar datos que ya vienen en columnas (arrays de NumPy, un DataFrame, un CSV
+    o un JSONL) sin crear un FECAEDetRequest por fila: cada lote se serializa directamente desde las columnas.
+    Las columnas se indexan por el nombre del atributo de FECAEDetRequest (imp_total, cbte_fch, ...); con
+    `mapping` ({atributo: columna}) se indica de qué columna de la fuente se toma cada uno. Solo se admiten
+    los campos simples (no tributos, iva, comprobantes asociados, etc). Si no hay columnas cbte_desde /
+    cbte_hasta los comprobantes se numeran al enviarlos.
+
+        columns = InvoiceColumns.from_dataframe(df, mapping={'imp_total': 'total', 'doc_nro': 'cuit'})
+        result = wsfev.fecaesolicitar_columns(pto_vta, cbte_tipo, columns)
+    """
+
+    FIELDS = ('concepto', 'doc_tipo', 'doc_nro', 'cbte_desde', 'cbte_hasta', 'cbte_fch', 'imp_total', 'imp_tot_conc',
+              'imp_neto', 'imp_op_ex', 'imp_trib', 'imp_iva', 'fch_serv_desde', 'fch_serv_hasta', 'fch_vto_pago',
+              'mon_id', 'mon_cotiz')
+
+    def __init__(self, columns: dict):
+        """
+        :param columns: {attribute: sequence} with the FECAEDetRequest attributes as keys
+        """
+        unknown = set(columns) - set(self.FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown invoice columns: {', '.join(sorted(unknown))}")
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError('Every column must have the same length')
+        self.columns = {name: self._to_list(values) for name, values in columns.items()}
+        self.length = lengths.pop() if lengths else 0
+
+    @classmethod
+    def from_mapping(cls, source, mapping: dict = None):
+        """
+        Build the columns from any mapping of sequences: a dict of lists or NumPy arrays, a DataFrame, etc
+        :param source: Object indexable by column name
+        :param mapping: {attribute: source column}, by default the source columns are named after the attributes
+        :return:
+        """
+        mapping = mapping or {name: name for name in cls.FIELDS if name in source}
+        return cls({name: source[column] for name, column in mapping.items()})
+
+    @classmethod
+    def from_dataframe(cls, dataframe, mapping: dict = None):
+        return cls.from_mapping(dataframe, mapping)
+
+    @classmethod
+    def iter_csv(cls, csv_file, mapping: dict = None, chunk_size: int = 10000, **reader_kwargs) -> Iterator['InvoiceColumns']:
+        """
+        Read a CSV stream (with header) in chunks of columns, with bounded memory
+        :param csv_file: Open text file or iterable of lines
+        :param mapping: {attribute: csv column}, by default the columns are named after the attributes
+        :param chunk_size: Rows per chunk
+        :param reader_kwargs: Extra arguments for csv.reader (delimiter, quotechar, ...)
+        :return: Iterator of InvoiceColumns
+        """
+        reader = csv.reader(csv_file, **reader_kwargs)
+        header = next(reader, None)
+        if header is None:
+            return
+        positions = {column: index for index, column in enumerate(header)}
+        mapping = mapping or {name: name for name in cls.FIELDS if name in positions}
+        indexes = [(name, positions[column]) for name, column in mapping.items()]
+        while True:
+            rows = list(islice(reader, chunk_size))
+            if not rows:
+                return
+            yield cls({name: [row[index] for row in rows] for name, index in indexes})
+
+    @classmethod
+    def iter_jsonl(cls, jsonl_file, mapping: dict = None, chunk_size: int = 10000) -> Iterator['InvoiceColumns']:
+        """
+        Read a JSON lines stream (one object per invoice) in chunks of columns
+        :param jsonl_file: Open text file or iterable of lines
+        :param mapping: {attribute: json key}, by default the keys are named after the attributes
+        :param chunk_size: Rows per chunk
+        :return: Iterator of InvoiceColumns
+        """
+        lines = (line for line in jsonl_file if line.strip())
+        while True:
+            rows = [json.loads(line) for line in islice(lines, chunk_size)]
+            if not rows:
+                return
+            row_mapping = mapping or {name: name for name in cls.FIELDS if name in rows[0]}
+            yield cls({name: [row.get(key) for row in rows] for name, key in row_mapping.items()})
+
+    def __len__(self):
+        return self.length
+
+    def has(self, name: str) -> bool:
+        return name in self.columns
+
+    def slice(self, start: int, stop: int) -> 'InvoiceColumns':
+        sliced = InvoiceColumns.__new__(InvoiceColumns)
+        sliced.columns = {name: values[start:stop] for name, values in self.columns.items()}
+        sliced.length = len(range(start, min(stop, self.length)))
+        return sliced
+
+    @staticmethod
+    def _to_list(values) -> list:
+        # NumPy arrays and pandas Series are converted in a single call, with python scalars
+        if hasattr(values, 'tolist'):
+            return values.tolist()
+        if hasattr(values, 'to_numpy'):
+            return values.to_numpy().tolist()
+        return list(values)
+
+
+class FECAESolicitarColumns:
+    """
+    Resultado columnar de FECAESolicitar: una lista por campo de FECAEDetResponse, en el orden de los
+    comprobantes enviados, más los errores generales de cada request.
+    """
+
+    FIELDS = ('cbte_desde', 'cbte_hasta', 'resultado', 'cae', 'cae_fch_vto', 'obs')
+
+    def __init__(self):
+        self.cbte_desde = []
+        self.cbte_hasta = []
+        self.resultado = []
+        self.cae = []
+        self.cae_fch_vto = []
+        self.obs = []
+        self.errors = []
+
+    def __len__(self):
+        return len(self.cbte_desde)
+
+    def extend(self, other: 'FECAESolicitarColumns') -> None:
+        for name in self.FIELDS:
+            getattr(self, name).extend(getattr(other, name))
+        self.errors.extend(other.errors)
+
+    def is_fully_approved(self) -> bool:
+        return not self.errors and all(resultado == 'A' for resultado in self.resultado)
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def to_numpy(self) -> dict:
+        """
+        Get the result columns as NumPy arrays (requires numpy)
+        """
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError('numpy is required for to_numpy, install it with: pip install easyAfip[columnar]')
+        return {name: numpy.array(values, dtype=object if name == 'obs' else None)
+                for name, values in self.to_dict().items()}
+
+    def __str__(self):
+        return (f"FECAESolicitarColumns(count={len(self)}, approved={self.resultado.count('A')}, "
+                f"errors={', '.join(str(error) for error in self.errors)})")
@@ -0,0 +1,127 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Tuple
+
+from easyAfip.utils.messages import CredentialError
+from easyAfip.utils.signer import Signer
+
+
+class Credential:
+    """
+    Par certificado / clave privada de un CUIT, con los objetos ya parseados listos para firmar.
+    """
+
+    def __init__(self, cuit: str, pem: bytes, key: bytes):
+        self.cuit = cuit
+        self.pem = pem
+        self.key = key
+        self.signer = Signer(pem, key)
+        # parse both PEMs once, on load
+        self.certificate = self.signer.certificate
+        self.private_key = self.signer.private_key
+
+    @property
+    def not_valid_after(self) -> datetime:
+        not_valid_after = getattr(self.certificate, 'not_valid_after_utc', None)
+        if not_valid_after is None:  # cryptography < 42
+            not_valid_after = self.certificate.not_valid_after.replace(tzinfo=timezone.utc)
+        return not_valid_after
+
+    def is_expired(self, margin: timedelta = timedelta(0)) -> bool:
+        return datetime.now(timezone.utc) + margin >= self.not_valid_after
+
+    def __str__(self):
+        return f"Credential(cuit={self.cuit}, not_valid_after={self.not_valid_after})"
+
+
+class CredentialRegistry:
+    """
+    Registro de credenciales (certificado + clave) de múltiples CUITs.
+
+    Las credenciales se cargan bajo demanda desde un directorio (`<cuit>.crt` o `<cuit>.pem` y `<cuit>.key`)
+    o desde un callback `loader(cuit) -> (pem, key)`, y se mantienen parseadas en un LRU de hasta `max_size`
+    entradas, de modo que firmar un nuevo ticket de acceso no vuelva a parsear los PEM.
+    """
+
+    CERT_EXTENSIONS = ('.crt', '.pem')
+    KEY_EXTENSION = '.key'
+
+    def __init__(self, directory: str = None, loader: Callable[[str], Tuple] = None, max_size: int = 1024,
+                 expiry_margin: timedelta = timedelta(0)):
+        """
+        :param directory: Directory with the certificates and keys, named after the CUIT
+        :param loader: Callable returning the (pem, key) pair of a CUIT, as str or bytes
+        :param max_size: Max number of parsed credentials kept in memory
+        :param expiry_margin: Credentials expiring within this margin are considered expired
+        """
+        if not directory and not loader:
+            raise ValueError('A directory or a loader is required')
+        self.directory = directory
+        self.loader = loader
+        self.max_size = max_size
+        self.expiry_margin = expiry_margin
+        self._credentials = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, cuit: str) -> Credential:
+        """
+        Get the credential of the given CUIT, loading it if it is not in memory
+        :param cuit: The CUIT
+        :return: The Credential
+        :raises CredentialError: If the credential can not be found or its certificate is expired
+        """
+        cuit = str(cuit)
+        with self._lock:
+            credential = self._credentials.get(cuit)
+            if credential is not None:
+                self._credentials.move_to_end(cuit)
+        if credential is None:
+            credential = self._load(cuit)
+            with self._lock:
+                self._credentials[cuit] = credential
+                while len(self._credentials) > self.max_size:
+                    self._credentials.popitem(last=False)
+        if credential.is_expired(self.expiry_margin):
+            raise CredentialError(f"The certificate of CUIT {cuit} expired on {credential.not_valid_after}")
+        return credential
+
+    def invalidate(self, cuit: str = None) -> None:
+        """
+        Forget the parsed credential of the given CUIT (or every credential), e.g. after a certificate renewal
+        :param cuit: The CUIT, None to clear the registry
+        :return:
+        """
+        with self._lock:
+            if cuit is None:
+                self._credentials.clear()
+            else:
+                self._credentials.pop(str(cuit), None)
+
+    def expiring(self, within: timedelta) -> List[Credential]:
+        """
+        Get the loaded credentials whose certificate expires within the given time
+        :param within: The time window
+        :return:
+        """
+        with self._lock:
+            credentials = list(self._credentials.values())
+        return [credential for credential in credentials if credential.is_expired(within)]
+
+    def _load(self, cuit: str) -> Credential:
+        pem, key = self.loader(cuit) if self.loader else self._read_files(cuit)
+        if pem is None or key is None:
+            raise CredentialError(f"There is no credential for CUIT {cuit}")
+        pem = pem.encode('utf-8') if isinstance(pem, str) else pem
+        key = key.encode('utf-8') if isinstance(key, str) else key
+        return Credential(cuit, pem, key)
+
+    def _read_files(self, cuit: str) -> Tuple:
+        key_path = os.path.join(self.directory, cuit + self.KEY_EXTENSION)
+        for extension in self.CERT_EXTENSIONS:
+            cert_path = os.path.join(self.directory, cuit + extension)
+            if os.path.exists(cert_path) and os.path.exists(key_path):
+                with open(cert_path, 'rb') as cert_file, open(key_path, 'rb') as key_file:
+                    return cert_file.read(), key_file.read()
+        return None, None
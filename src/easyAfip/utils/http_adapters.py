@@ -0,0 +1,70 @@
+"""
+Adapters de requests/urllib3 usados por AfipWSConnector. Están en un módulo aparte porque importar
+requests y urllib3 es lo más costoso de importar la librería: el conector lo importa recién al crear su
+sesión HTTP, de modo que importar los clientes (o solo construir y parsear XML) no lo paga.
+"""
+import ssl
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.ssl_ import create_urllib3_context
+
+from easyAfip.utils import metrics
+
+
+class TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        with metrics.current().phase('connect'):
+            super().connect()
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        with metrics.current().phase('connect'):
+            super().connect()
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """
+    Adapter que reporta a las métricas el tiempo de establecimiento de conexiones (TCP + TLS).
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(TimedHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': TimedHTTPConnectionPool, 'https': TimedHTTPSConnectionPool}
+
+
+class SSLAdapter(TimedHTTPAdapter):
+    """
+    Adapter con el contexto SSL requerido por los servidores de la AFIP.
+    El contexto se crea una única vez por adapter y es compartido por todas las conexiones del pool.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.ssl_context = self._create_ssl_context()
+        super(SSLAdapter, self).__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['ssl_context'] = self.ssl_context
+        return super(SSLAdapter, self).init_poolmanager(*args, **kwargs)
+
+    def build_response(self, req, resp):
+        response = super(SSLAdapter, self).build_response(req, resp)
+        return response
+
+    @staticmethod
+    def _create_ssl_context():
+        context = create_urllib3_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        context.set_ciphers(":HIGH:!DH:!aNULL")
+        return context
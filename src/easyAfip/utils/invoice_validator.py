@@ -0,0 +1,220 @@
+import logging
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from typing import List, Tuple
+
+from easyAfip.utils.messages import FECAEDetRequest, FEError
+
+
+logger = logging.getLogger(__name__)
+
+CUIT_WEIGHTS = (5, 4, 3, 2, 7, 6, 5, 4, 3, 2)
+
+
+def is_valid_cuit(cuit) -> bool:
+    """
+    Check the length and the check digit of a CUIT/CUIL
+    :param cuit: The CUIT, as int or str (dashes are ignored)
+    :return:
+    """
+    digits = str(cuit).replace('-', '')
+    if len(digits) != 11 or not digits.isdigit():
+        return False
+    remainder = 11 - sum(int(digit) * weight for digit, weight in zip(digits, CUIT_WEIGHTS)) % 11
+    check_digit = 0 if remainder == 11 else remainder
+    return check_digit != 10 and check_digit == int(digits[10])
+
+
+class InvoiceValidator:
+    """
+    Validación local de un lote de FECAEDetRequest antes de enviarlo a FECAESolicitar.
+
+    Replica las validaciones excluyentes de WSFEv1 que no dependen del estado del servicio (consistencia
+    del importe total, ventanas de fecha, fechas de servicio según el concepto y formato del documento,
+    incluido el dígito verificador del CUIT), de modo que un comprobante inválido no haga rechazar el lote
+    entero ni cueste un round trip. Los errores se devuelven como FEError con el código de la validación
+    equivalente del servicio, salvo los de CbteFch (ver CBTE_FCH_ERROR).
+    Con un cliente del padrón (`padron`, ver WSPadron) también se verifica que los receptores con DocTipo 80
+    existan y tengan la CUIT activa, con una única consulta por lote que normalmente resuelve el cache.
+    Las constantes del lote (fecha de hoy, ventanas de fecha, etc) se calculan una única vez por llamada y
+    los importes y fechas repetidos entre comprobantes se convierten una sola vez.
+
+        valid, rejected = InvoiceValidator().split(invoices, cbte_tipo)
+        results = wsfev.fecaesolicitar_stream(pto_vta, cbte_tipo, valid)
+    """
+
+    DOC_TYPE_ERROR = 10013
+    DOC_NRO_ERROR = 10015
+    # local code: the service rejects the date with 10016, the same code as an out of sequence number, and a
+    # date error must not be taken for a numbering error (see SequenceAllocator.is_numbering_error)
+    CBTE_FCH_ERROR = 90016
+    FCH_SERV_DESDE_ERROR = 10035
+    FCH_SERV_HASTA_ERROR = 10036
+    FCH_VTO_PAGO_ERROR = 10037
+    IMP_TOTAL_ERROR = 10048
+
+    # concepto -> días de tolerancia de CbteFch respecto de hoy
+    CBTE_FCH_WINDOW = {1: 5, 2: 10, 3: 10}
+
+    CUIT_DOC_TYPES = {80, 86, 87}
+    DNI_DOC_TYPE = 96
+    CONSUMIDOR_FINAL_DOC_TYPE = 99
+    # comprobantes clase A y M, que requieren DocTipo 80 (CUIT)
+    CBTE_TIPOS_A = {1, 2, 3, 4, 5, 34, 39, 51, 52, 53, 54, 60, 63, 201, 202, 203}
+
+    AMOUNT_FIELDS = (('ImpTotConc', 'imp_tot_conc'), ('ImpNeto', 'imp_neto'), ('ImpOpEx', 'imp_op_ex'),
+                     ('ImpIVA', 'imp_iva'), ('ImpTrib', 'imp_trib'))
+    TOLERANCE = Decimal('0.01')
+
+    def __init__(self, today: date = None, padron=None):
+        """
+        :param today: The reference date for the date windows, defaults to the current date in Argentina
+        :param padron: Optional WSPadron used to check the CUIT of the receptors
+        """
+        self.today = today
+        self.padron = padron
+
+    def validate(self, invoices: List[FECAEDetRequest], cbte_tipo=None) -> List[List[FEError]]:
+        """
+        Validate a batch of invoices
+        :param invoices: The invoices
+        :param cbte_tipo: The invoice type of the batch, enables the checks that depend on it
+        :return: The errors of every invoice, in the same order (an empty list for the valid ones)
+        """
+        today = self.today or datetime.now(timezone(timedelta(hours=-3))).date()
+        windows = {concepto: (today - timedelta(days=days), today + timedelta(days=days))
+                   for concepto, days in self.CBTE_FCH_WINDOW.items()}
+        requires_cuit = cbte_tipo is not None and int(cbte_tipo) in self.CBTE_TIPOS_A
+        personas = self._get_personas(invoices)
+        return [self._validate_invoice(invoice, windows, requires_cuit, personas) for invoice in invoices]
+
+    def split(self, invoices: List[FECAEDetRequest], cbte_tipo=None) -> Tuple[List[FECAEDetRequest], List[Tuple[FECAEDetRequest, List[FEError]]]]:
+        """
+        Split a batch into the valid invoices and the rejected ones, so only the valid ones are sent
+        :param invoices: The invoices
+        :param cbte_tipo: The invoice type of the batch
+        :return: (valid invoices, [(rejected invoice, errors)])
+        """
+        valid, rejected = [], []
+        for invoice, errors in zip(invoices, self.validate(invoices, cbte_tipo)):
+            if errors:
+                rejected.append((invoice, errors))
+            else:
+                valid.append(invoice)
+        return valid, rejected
+
+    def _validate_invoice(self, invoice: FECAEDetRequest, windows: dict, requires_cuit: bool,
+                          personas: dict) -> List[FEError]:
+        errors = []
+        self._check_totals(invoice, errors)
+        self._check_dates(invoice, windows, errors)
+        self._check_document(invoice, requires_cuit, personas, errors)
+        return errors
+
+    def _get_personas(self, invoices: List[FECAEDetRequest]) -> dict:
+        if self.padron is None:
+            return {}
+        cuits = {str(invoice.doc_nro) for invoice in invoices
+                 if self._to_int(invoice.doc_tipo) == 80 and is_valid_cuit(invoice.doc_nro)}
+        if not cuits:
+            return {}
+        try:
+            return self.padron.get_persona_list(sorted(cuits))
+        except Exception:
+            # the service checks them anyway, an unavailable padrón must not stop the batch
+            logger.warning('Could not look up the receptors in the padron, they are not checked', exc_info=True)
+            return {}
+
+    def _check_totals(self, invoice: FECAEDetRequest, errors: list) -> None:
+        total = Decimal(0)
+        for tag, attr in self.AMOUNT_FIELDS:
+            amount = self._to_decimal(getattr(invoice, attr))
+            if amount is None:
+                errors.append(FEError(self.IMP_TOTAL_ERROR, f"El campo {tag} no es un importe valido"))
+                return
+            total += amount
+        imp_total = self._to_decimal(invoice.imp_total)
+        if imp_total is None:
+            errors.append(FEError(self.IMP_TOTAL_ERROR, "El campo ImpTotal no es un importe valido"))
+        elif abs(imp_total - total) > self.TOLERANCE:
+            errors.append(FEError(self.IMP_TOTAL_ERROR, f"El campo ImpTotal ({imp_total}) debe ser igual a la suma de "
+                                                        f"ImpTotConc + ImpNeto + ImpOpEx + ImpTrib + ImpIVA ({total})"))
+
+    def _check_dates(self, invoice: FECAEDetRequest, windows: dict, errors: list) -> None:
+        concepto = self._to_int(invoice.concepto)
+        cbte_fch = self._to_date(invoice.cbte_fch)
+        if invoice.cbte_fch and cbte_fch is None:
+            errors.append(FEError(self.CBTE_FCH_ERROR, f"El campo CbteFch ({invoice.cbte_fch}) debe tener formato yyyymmdd"))
+        elif cbte_fch is not None and concepto in windows:
+            since, until = windows[concepto]
+            if not since <= cbte_fch <= until:
+                errors.append(FEError(self.CBTE_FCH_ERROR, f"El campo CbteFch ({invoice.cbte_fch}) debe estar comprendido "
+                                                           f"entre {since:%Y%m%d} y {until:%Y%m%d} para el concepto {concepto}"))
+        service_dates = (('FchServDesde', invoice.fch_serv_desde, self.FCH_SERV_DESDE_ERROR),
+                         ('FchServHasta', invoice.fch_serv_hasta, self.FCH_SERV_HASTA_ERROR),
+                         ('FchVtoPago', invoice.fch_vto_pago, self.FCH_VTO_PAGO_ERROR))
+        if concepto not in (2, 3):
+            for tag, value, code in service_dates:
+                if value:
+                    errors.append(FEError(code, f"El campo {tag} solo debe informarse para los conceptos 2 y 3"))
+            return
+        parsed = {}
+        for tag, value, code in service_dates:
+            parsed[tag] = self._to_date(value)
+            if parsed[tag] is None:
+                errors.append(FEError(code, f"El campo {tag} es obligatorio para el concepto {concepto} y debe tener "
+                                            f"formato yyyymmdd"))
+        if parsed['FchServDesde'] and parsed['FchServHasta'] and parsed['FchServHasta'] < parsed['FchServDesde']:
+            errors.append(FEError(self.FCH_SERV_HASTA_ERROR, "El campo FchServHasta no puede ser anterior a FchServDesde"))
+        if parsed['FchVtoPago'] and cbte_fch and parsed['FchVtoPago'] < cbte_fch:
+            errors.append(FEError(self.FCH_VTO_PAGO_ERROR, "El campo FchVtoPago no puede ser anterior a CbteFch"))
+
+    def _check_document(self, invoice: FECAEDetRequest, requires_cuit: bool, personas: dict, errors: list) -> None:
+        doc_tipo = self._to_int(invoice.doc_tipo)
+        doc_nro = str(invoice.doc_nro if invoice.doc_nro is not None else '0')
+        if requires_cuit and doc_tipo != 80:
+            errors.append(FEError(self.DOC_TYPE_ERROR, "Para comprobantes clase A y M el campo DocTipo debe ser 80 (CUIT)"))
+        if not doc_nro.isdigit() or len(doc_nro) > 11:
+            errors.append(FEError(self.DOC_NRO_ERROR, f"El campo DocNro ({doc_nro}) debe ser numerico de hasta 11 digitos"))
+        elif doc_tipo in self.CUIT_DOC_TYPES and not is_valid_cuit(doc_nro):
+            errors.append(FEError(self.DOC_NRO_ERROR, f"El campo DocNro ({doc_nro}) no es un CUIT/CUIL valido"))
+        elif doc_tipo == 80 and doc_nro in personas:
+            persona = personas[doc_nro]
+            if not persona.found:
+                errors.append(FEError(self.DOC_NRO_ERROR, f"El campo DocNro ({doc_nro}) no existe en el padron"))
+            elif not persona.is_active:
+                errors.append(FEError(self.DOC_NRO_ERROR, f"El campo DocNro ({doc_nro}) no tiene la CUIT activa "
+                                                          f"({persona.estado_clave})"))
+        elif doc_tipo == self.DNI_DOC_TYPE and not 0 < int(doc_nro) <= 99999999:
+            errors.append(FEError(self.DOC_NRO_ERROR, f"El campo DocNro ({doc_nro}) no es un DNI valido"))
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _to_decimal(value):
+        if value is None or value == '':
+            return Decimal(0)
+        try:
+            amount = Decimal(str(value))
+        except InvalidOperation:
+            return None
+        # NaN and Infinity are not amounts, and NaN can not even be compared
+        return amount if amount.is_finite() else None
+
+    @staticmethod
+    def _to_int(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _to_date(value):
+        value = str(value) if value else ''
+        if len(value) != 8 or not value.isdigit():
+            return None
+        try:
+            return date(int(value[:4]), int(value[4:6]), int(value[6:]))
+        except ValueError:
+            return None
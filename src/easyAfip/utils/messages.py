@@ -1,4 +1,6 @@
+from decimal import Decimal
 from enum import Enum
+from functools import lru_cache
 from typing import Tuple, List
 
 
@@ -18,108 +20,298 @@ class FECAEResultEnum(Enum):
                 return result
         raise ValueError(f"Not existst a result with value {value}")
 
+# ------------------------------
+# Field converters
+# ------------------------------
+
+def to_int(value):
+    if value is None or value == '' or type(value) is int:
+        return value
+    return int(value)
+
+
+@lru_cache(maxsize=65536)
+def _to_decimal(value: str) -> Decimal:
+    return Decimal(value)
+
+
+def to_decimal(value):
+    """
+    Convert an amount to Decimal, keeping its representation ('122.00' stays 122.00). The conversions of
+    strings are cached, so repeated amounts (zeros, unit prices, etc) share the same Decimal object. Only
+    strings are cached: equal Decimals and floats (Decimal('1.10') == Decimal('1.1') == 1.1) would share
+    a cache entry and lose their representation
+    """
+    if value is None or value == '':
+        return value
+    if type(value) is str:
+        return _to_decimal(value)
+    if type(value) is Decimal:
+        return value
+    return Decimal(str(value))
+
+
+def to_result(value):
+    if value is None or isinstance(value, FECAEResultEnum):
+        return value
+    return FECAEResultEnum.get_by_value(value)
+
+
 # ------------------------------
 # Messages
 # ------------------------------
 
-class FEError:
+class Message:
+    """
+    Base de los mensajes: objetos compactos (`__slots__`, sin `__dict__`) con conversión a y desde dict.
+
+    CONVERTERS indica el tipo de cada campo numérico (se aplica en el constructor y en from_dict) y NESTED
+    la clase de los campos que contienen otros mensajes.
+    """
+    __slots__ = ()
+
+    CONVERTERS = {}
+    NESTED = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.FIELDS = tuple(name for klass in reversed(cls.__mro__) for name in klass.__dict__.get('__slots__', ()))
+
+    def to_dict(self, json_safe: bool = False) -> dict:
+        """
+        Convert the message (and the nested ones) to a dict of plain values
+        :param json_safe: Convert the Decimal amounts to str and the results to their value, so the dict can be
+            saved in a store; from_dict converts them back
+        """
+        data = {}
+        for name in self.FIELDS:
+            value = getattr(self, name)
+            if name in self.NESTED and value is not None:
+                value = (value.to_dict(json_safe) if isinstance(value, Message)
+                         else [item.to_dict(json_safe) for item in value])
+            elif json_safe and isinstance(value, (Decimal, Enum)):
+                value = value.value if isinstance(value, Enum) else str(value)
+            data[name] = value
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """
+        Build the message from a dict like the ones returned by to_dict, converting the typed fields
+        """
+        message = cls.__new__(cls)
+        converters, nested = cls.CONVERTERS, cls.NESTED
+        for name in cls.FIELDS:
+            value = data.get(name)
+            if name in converters:
+                value = converters[name](value)
+            elif name in nested and value is not None:
+                nested_class = nested[name]
+                value = (nested_class.from_dict(value) if isinstance(value, dict)
+                         else [nested_class.from_dict(item) for item in value])
+            setattr(message, name, value)
+        return message
+
+
+class FEError(Message):
+    __slots__ = ('code', 'msg')
+
+    CONVERTERS = {'code': to_int}
+
     def __init__(self, code, msg) -> None:
-        self.code = code
+        self.code = to_int(code)
         self.msg = msg
 
     def __str__(self):
         return f"FEError(code={self.code}, msg={self.msg})"
 
-class FEBaseResponse:
+class FEBaseResponse(Message):
+    __slots__ = ('errors',)
+
+    NESTED = {'errors': FEError}
+
     def __init__(self) -> None:
         self.errors = None
 
     def __str__(self):
         return f"errors={', '.join([error.__str__() for error in self.errors])}"
 
-class FECompUltimoAutorizadoResponse:
+class FECompUltimoAutorizadoResponse(Message):
+    __slots__ = ('pto_vta', 'cbte_tipo', 'nro_cbte')
+
+    CONVERTERS = {'pto_vta': to_int, 'cbte_tipo': to_int, 'nro_cbte': to_int}
+
     def __init__(self, pto_vta, cbte_tipo, nro_cbte) -> None:
-        self.pto_vta = pto_vta
-        self.cbte_tipo = cbte_tipo
-        self.nro_cbte = nro_cbte
+        self.pto_vta = to_int(pto_vta)
+        self.cbte_tipo = to_int(cbte_tipo)
+        self.nro_cbte = to_int(nro_cbte)
     
     def __str__(self):
         return f"FECompUltimoAutorizadoResponse(pto_vta={self.pto_vta}, cbte_tipo={self.cbte_tipo}, nro_cbte={self.nro_cbte})"
 
 
-class FECompTotXRequestResponse:
+class FECompTotXRequestResponse(Message):
+    __slots__ = ('reg_x_req',)
+
+    CONVERTERS = {'reg_x_req': to_int}
+
     def __init__(self, reg_x_req) -> None:
-        self.reg_x_req = reg_x_req
+        self.reg_x_req = to_int(reg_x_req)
 
     def __str__(self):
         return f"FECompTotXRequestResponse(reg_x_req={self.reg_x_req})"
 
 
-class CbteAsoc:
+class ParamItem(Message):
+    """
+    Item de las tablas de parámetros de FEParamGet* (tipos de comprobante, documento, IVA, monedas, tributos)
+    """
+    __slots__ = ('id', 'desc', 'fch_desde', 'fch_hasta')
+
+    def __init__(self, id, desc=None, fch_desde=None, fch_hasta=None) -> None:
+        self.id = id
+        self.desc = desc
+        self.fch_desde = fch_desde
+        self.fch_hasta = fch_hasta
+
+    def __str__(self):
+        return f"ParamItem(id={self.id}, desc={self.desc}, fch_desde={self.fch_desde}, fch_hasta={self.fch_hasta})"
+
+
+class PtoVenta(Message):
+    __slots__ = ('nro', 'emision_tipo', 'bloqueado', 'fch_baja')
+
+    CONVERTERS = {'nro': to_int}
+
+    def __init__(self, nro, emision_tipo=None, bloqueado=None, fch_baja=None) -> None:
+        self.nro = to_int(nro)
+        self.emision_tipo = emision_tipo
+        self.bloqueado = bloqueado
+        self.fch_baja = fch_baja
+
+    def __str__(self):
+        return (f"PtoVenta(nro={self.nro}, emision_tipo={self.emision_tipo}, bloqueado={self.bloqueado}, "
+                f"fch_baja={self.fch_baja})")
+
+
+class Cotizacion(Message):
+    __slots__ = ('mon_id', 'mon_cotiz', 'fch_cotiz')
+
+    CONVERTERS = {'mon_cotiz': to_decimal}
+
+    def __init__(self, mon_id, mon_cotiz, fch_cotiz=None) -> None:
+        self.mon_id = mon_id
+        self.mon_cotiz = to_decimal(mon_cotiz)
+        self.fch_cotiz = fch_cotiz
+
+    def __str__(self):
+        return f"Cotizacion(mon_id={self.mon_id}, mon_cotiz={self.mon_cotiz}, fch_cotiz={self.fch_cotiz})"
+
+
+class CbteAsoc(Message):
+    __slots__ = ('tipo', 'pto_vta', 'nro', 'cuit', 'cbte_fch')
+
+    CONVERTERS = {'tipo': to_int, 'pto_vta': to_int, 'nro': to_int}
+
     def __init__(self, tipo, pto_vta, nro, cuit=None, cbte_fch=None):
-        self.tipo = tipo
-        self.pto_vta = pto_vta
-        self.nro = nro
+        self.tipo = to_int(tipo)
+        self.pto_vta = to_int(pto_vta)
+        self.nro = to_int(nro)
         self.cuit = cuit
         self.cbte_fch = cbte_fch
 
-class Tributo:
+class Tributo(Message):
+    __slots__ = ('id', 'base_imp', 'alic', 'importe', 'desc')
+
+    CONVERTERS = {'id': to_int, 'base_imp': to_decimal, 'alic': to_decimal, 'importe': to_decimal}
+
     def __init__(self, id, base_imp, alic, importe, desc=None):
-        self.id = id
-        self.base_imp = base_imp
-        self.alic = alic
-        self.importe = importe
+        self.id = to_int(id)
+        self.base_imp = to_decimal(base_imp)
+        self.alic = to_decimal(alic)
+        self.importe = to_decimal(importe)
         self.desc = desc
 
-class AlicIva:
+class AlicIva(Message):
+    __slots__ = ('id', 'base_imp', 'importe')
+
+    CONVERTERS = {'id': to_int, 'base_imp': to_decimal, 'importe': to_decimal}
+
     def __init__(self, id, base_imp, importe):
-        self.id = id
-        self.base_imp = base_imp
-        self.importe = importe
+        self.id = to_int(id)
+        self.base_imp = to_decimal(base_imp)
+        self.importe = to_decimal(importe)
+
+class Opcional(Message):
+    __slots__ = ('id', 'valor')
 
-class Opcional:
     def __init__(self, id=None, valor=None):
         self.id = id
         self.valor = valor
 
-class Comprador:
+class Comprador(Message):
+    __slots__ = ('doc_tipo', 'doc_nro', 'porcentaje')
+
+    CONVERTERS = {'doc_tipo': to_int, 'porcentaje': to_decimal}
+
     def __init__(self, doc_tipo, doc_nro, porcentaje):
-        self.doc_tipo = doc_tipo
+        self.doc_tipo = to_int(doc_tipo)
         self.doc_nro = doc_nro
-        self.porcentaje = porcentaje
+        self.porcentaje = to_decimal(porcentaje)
+
+class PeriodoAsoc(Message):
+    __slots__ = ('fch_desde', 'fch_hasta')
 
-class PeriodoAsoc:
     def __init__(self, fch_desde=None, fch_hasta=None):
         self.fch_desde = fch_desde
         self.fch_hasta = fch_hasta
 
-class Actividad:
+class Actividad(Message):
+    __slots__ = ('id',)
+
+    CONVERTERS = {'id': to_int}
+
     def __init__(self, id):
-        self.id = id
+        self.id = to_int(id)
+
+class FECAEDetRequest(Message):
+    """
+    Comprobante a autorizar. Los importes se guardan como Decimal y los códigos y números como int; las
+    colecciones que no se informan quedan como una tupla vacía compartida, en lugar de una lista por comprobante.
+    """
+    __slots__ = ('concepto', 'doc_tipo', 'doc_nro', 'cbte_desde', 'cbte_hasta', 'cbte_fch', 'imp_total', 'imp_tot_conc',
+                 'imp_neto', 'imp_op_ex', 'imp_trib', 'imp_iva', 'fch_serv_desde', 'fch_serv_hasta', 'fch_vto_pago',
+                 'mon_id', 'mon_cotiz', 'cbtes_asoc', 'tributos', 'iva', 'opcionales', 'compradores', 'periodo_asoc',
+                 'actividades')
+
+    CONVERTERS = {'concepto': to_int, 'doc_tipo': to_int, 'cbte_desde': to_int, 'cbte_hasta': to_int,
+                  'imp_total': to_decimal, 'imp_tot_conc': to_decimal, 'imp_neto': to_decimal, 'imp_op_ex': to_decimal,
+                  'imp_trib': to_decimal, 'imp_iva': to_decimal, 'mon_cotiz': to_decimal}
+    NESTED = {'cbtes_asoc': CbteAsoc, 'tributos': Tributo, 'iva': AlicIva, 'opcionales': Opcional,
+              'compradores': Comprador, 'periodo_asoc': PeriodoAsoc, 'actividades': Actividad}
 
-class FECAEDetRequest:
     def __init__(self, concepto=None, doc_tipo=None, doc_nro=None, cbte_desde=None, cbte_hasta=None, imp_total=None,
                  imp_tot_conc=None, imp_neto=None, imp_op_ex=None, imp_trib=None, imp_iva=None, mon_id=None,
                  mon_cotiz=None, cbte_fch=None, fch_serv_desde=None, fch_serv_hasta=None, fch_vto_pago=None,
                  cbtes_asoc=None, tributos=None, iva=None, opcionales=None, compradores=None, periodo_asoc=None,
                  actividades=None):
-        self.concepto = concepto
-        self.doc_tipo = doc_tipo
+        self.concepto = to_int(concepto)
+        self.doc_tipo = to_int(doc_tipo)
         self.doc_nro = doc_nro
-        self.cbte_desde = cbte_desde
-        self.cbte_hasta = cbte_hasta
+        self.cbte_desde = to_int(cbte_desde)
+        self.cbte_hasta = to_int(cbte_hasta)
         self.cbte_fch = cbte_fch
-        self.imp_total = imp_total
-        self.imp_tot_conc = imp_tot_conc
-        self.imp_neto = imp_neto
-        self.imp_op_ex = imp_op_ex
-        self.imp_trib = imp_trib
-        self.imp_iva = imp_iva
+        self.imp_total = to_decimal(imp_total)
+        self.imp_tot_conc = to_decimal(imp_tot_conc)
+        self.imp_neto = to_decimal(imp_neto)
+        self.imp_op_ex = to_decimal(imp_op_ex)
+        self.imp_trib = to_decimal(imp_trib)
+        self.imp_iva = to_decimal(imp_iva)
         self.fch_serv_desde = fch_serv_desde
         self.fch_serv_hasta = fch_serv_hasta
         self.fch_vto_pago = fch_vto_pago
         self.mon_id = mon_id
-        self.mon_cotiz = mon_cotiz
+        self.mon_cotiz = to_decimal(mon_cotiz)
         self.cbtes_asoc = cbtes_asoc if cbtes_asoc else []
         self.tributos = tributos if tributos else []
         self.iva = iva if iva else []
@@ -140,13 +332,45 @@ class FECAEDetRequest:
                 f"actividades={self.actividades})")
 
 
-class FECAEDetResponse:
+class FECAEADetRequest(FECAEDetRequest):
+    """
+    Comprobante emitido con CAEA, a informar con FECAEARegInformativo. Además de los datos del comprobante
+    lleva el CAEA con el que se emitió y, opcionalmente, la fecha y hora de generación (yyyymmddhhmmss).
+    """
+    __slots__ = ('caea', 'cbte_fch_hs_gen')
+
+    def __init__(self, *args, caea=None, cbte_fch_hs_gen=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.caea = caea
+        self.cbte_fch_hs_gen = cbte_fch_hs_gen
+
+    @classmethod
+    def from_invoice(cls, invoice: FECAEDetRequest, caea=None, cbte_fch_hs_gen=None) -> 'FECAEADetRequest':
+        """
+        Build the CAEA invoice from a FECAEDetRequest, sharing its (already converted) values
+        """
+        caea_invoice = cls.__new__(cls)
+        for name in FECAEDetRequest.FIELDS:
+            setattr(caea_invoice, name, getattr(invoice, name))
+        caea_invoice.caea = caea
+        caea_invoice.cbte_fch_hs_gen = cbte_fch_hs_gen
+        return caea_invoice
+
+
+class FECAEDetResponse(Message):
+    __slots__ = ('concepto', 'doc_tipo', 'doc_nro', 'cbte_desde', 'cbte_hasta', 'cbte_fch', 'resultado', 'cae',
+                 'cae_fch_vto', 'obs_l')
+
+    CONVERTERS = {'concepto': to_int, 'doc_tipo': to_int, 'cbte_desde': to_int, 'cbte_hasta': to_int,
+                  'resultado': to_result}
+    NESTED = {'obs_l': FEError}
+
     def __init__(self, concepto: int = None, doc_tipo: int = None, doc_nro: str = None, cbte_desde: int = None, cbte_hasta: int = None, cbte_fch: str = None, resultado: FECAEResultEnum = None):
-        self.concepto = concepto
-        self.doc_tipo = doc_tipo
+        self.concepto = to_int(concepto)
+        self.doc_tipo = to_int(doc_tipo)
         self.doc_nro = doc_nro
-        self.cbte_desde = cbte_desde
-        self.cbte_hasta = cbte_hasta
+        self.cbte_desde = to_int(cbte_desde)
+        self.cbte_hasta = to_int(cbte_hasta)
         self.cbte_fch = cbte_fch
         self.resultado = resultado
         self.cae = None
@@ -160,6 +384,11 @@ class FECAEDetResponse:
 
 
 class FECAESolicitarResult(FEBaseResponse):
+    __slots__ = ('cuit', 'pto_vta', 'cbte_tipo', 'fecha_proceso', 'cant_reg', 'resultado', 'reproceso', 'details')
+
+    CONVERTERS = {'pto_vta': to_int, 'cbte_tipo': to_int, 'cant_reg': to_int, 'resultado': to_result}
+    NESTED = {'errors': FEError, 'details': FECAEDetResponse}
+
     def __init__(self):
         super().__init__()
         self.cuit = None
@@ -176,7 +405,176 @@ class FECAESolicitarResult(FEBaseResponse):
                 f"fecha_proceso={self.fecha_proceso}, cant_reg={self.cant_reg}, resultado={self.resultado}, "
                 f"reproceso={self.reproceso}, details={', '.join([str(detail) for detail in self.details])}, {super().__str__()})")
 
+class FECompConsultarResponse(FEBaseResponse):
+    __slots__ = ('pto_vta', 'cbte_tipo', 'concepto', 'doc_tipo', 'doc_nro', 'cbte_desde', 'cbte_hasta', 'cbte_fch',
+                 'imp_total', 'resultado', 'cod_autorizacion', 'emision_tipo', 'fch_vto', 'fch_proceso')
+
+    CONVERTERS = {'pto_vta': to_int, 'cbte_tipo': to_int, 'concepto': to_int, 'doc_tipo': to_int,
+                  'cbte_desde': to_int, 'cbte_hasta': to_int, 'imp_total': to_decimal, 'resultado': to_result}
+
+    def __init__(self, pto_vta=None, cbte_tipo=None, concepto=None, doc_tipo=None, doc_nro=None, cbte_desde=None,
+                 cbte_hasta=None, cbte_fch=None, imp_total=None, resultado: FECAEResultEnum = None,
+                 cod_autorizacion=None, emision_tipo=None, fch_vto=None, fch_proceso=None) -> None:
+        super().__init__()
+        self.pto_vta = to_int(pto_vta)
+        self.cbte_tipo = to_int(cbte_tipo)
+        self.concepto = to_int(concepto)
+        self.doc_tipo = to_int(doc_tipo)
+        self.doc_nro = doc_nro
+        self.cbte_desde = to_int(cbte_desde)
+        self.cbte_hasta = to_int(cbte_hasta)
+        self.cbte_fch = cbte_fch
+        self.imp_total = to_decimal(imp_total)
+        self.resultado = resultado
+        self.cod_autorizacion = cod_autorizacion
+        self.emision_tipo = emision_tipo
+        self.fch_vto = fch_vto
+        self.fch_proceso = fch_proceso
+
+    @property
+    def found(self) -> bool:
+        return self.cbte_desde is not None
+
+    def to_detail(self) -> FECAEDetResponse:
+        """
+        Build the FECAEDetResponse that FECAESolicitar would have returned for this invoice
+        """
+        detail = FECAEDetResponse(self.concepto, self.doc_tipo, self.doc_nro, self.cbte_desde, self.cbte_hasta,
+                                  self.cbte_fch, self.resultado)
+        detail.cae = self.cod_autorizacion
+        detail.cae_fch_vto = self.fch_vto
+        detail.obs_l = []
+        return detail
 
+    def __str__(self):
+        return (f"FECompConsultarResponse(pto_vta={self.pto_vta}, cbte_tipo={self.cbte_tipo}, concepto={self.concepto}, "
+                f"doc_tipo={self.doc_tipo}, doc_nro={self.doc_nro}, cbte_desde={self.cbte_desde}, "
+                f"cbte_hasta={self.cbte_hasta}, cbte_fch={self.cbte_fch}, imp_total={self.imp_total}, "
+                f"resultado={self.resultado}, cod_autorizacion={self.cod_autorizacion}, "
+                f"emision_tipo={self.emision_tipo}, fch_vto={self.fch_vto}, fch_proceso={self.fch_proceso}, "
+                f"{super().__str__()})")
+
+
+class FECAEAResponse(FEBaseResponse):
+    """
+    CAEA otorgado para una quincena (FECAEASolicitar / FECAEAConsultar)
+    """
+    __slots__ = ('caea', 'periodo', 'orden', 'fch_vig_desde', 'fch_vig_hasta', 'fch_tope_inf', 'fch_proceso',
+                 'observaciones')
+
+    CONVERTERS = {'periodo': to_int, 'orden': to_int}
+    NESTED = {'errors': FEError, 'observaciones': FEError}
+
+    def __init__(self, caea=None, periodo=None, orden=None, fch_vig_desde=None, fch_vig_hasta=None,
+                 fch_tope_inf=None, fch_proceso=None) -> None:
+        super().__init__()
+        self.caea = caea
+        self.periodo = to_int(periodo)
+        self.orden = to_int(orden)
+        self.fch_vig_desde = fch_vig_desde
+        self.fch_vig_hasta = fch_vig_hasta
+        self.fch_tope_inf = fch_tope_inf
+        self.fch_proceso = fch_proceso
+        self.observaciones = ()
+
+    @property
+    def found(self) -> bool:
+        return bool(self.caea)
+
+    def covers(self, cbte_fch: str) -> bool:
+        """
+        Check if an invoice of the given date (yyyymmdd) can be issued with this CAEA
+        """
+        return bool(self.caea) and self.fch_vig_desde <= str(cbte_fch) <= self.fch_vig_hasta
+
+    def __str__(self):
+        return (f"FECAEAResponse(caea={self.caea}, periodo={self.periodo}, orden={self.orden}, "
+                f"fch_vig_desde={self.fch_vig_desde}, fch_vig_hasta={self.fch_vig_hasta}, "
+                f"fch_tope_inf={self.fch_tope_inf}, fch_proceso={self.fch_proceso}, {super().__str__()})")
+
+
+class FECAEASinMovimientoResponse(FEBaseResponse):
+    """
+    Resultado de informar (o consultar) un CAEA sin comprobantes emitidos en un punto de venta
+    """
+    __slots__ = ('caea', 'pto_vta', 'fch_proceso', 'resultado')
+
+    CONVERTERS = {'pto_vta': to_int, 'resultado': to_result}
+
+    def __init__(self, caea=None, pto_vta=None, fch_proceso=None, resultado: FECAEResultEnum = None) -> None:
+        super().__init__()
+        self.caea = caea
+        self.pto_vta = to_int(pto_vta)
+        self.fch_proceso = fch_proceso
+        self.resultado = resultado
+
+    def __str__(self):
+        return (f"FECAEASinMovimientoResponse(caea={self.caea}, pto_vta={self.pto_vta}, fch_proceso={self.fch_proceso}, "
+                f"resultado={self.resultado}, {super().__str__()})")
+
+
+class Persona(FEBaseResponse):
+    """
+    Contribuyente del padrón (ws_sr_constancia_inscripcion, getPersona_v2 / getPersonaList_v2). Una CUIT
+    inexistente se representa con `found` en False y los errores informados por el servicio.
+    """
+    __slots__ = ('id_persona', 'tipo_persona', 'nombre', 'apellido', 'razon_social', 'estado_clave', 'impuestos',
+                 'categoria_monotributo')
+
+    # impuestos del padrón que definen la condición frente al IVA
+    IVA_IMPUESTO = 30
+    IVA_EXENTO_IMPUESTO = 32
+    MONOTRIBUTO_IMPUESTO = 20
+
+    # condiciones frente al IVA del receptor (FEParamGetCondicionIvaReceptor)
+    RESPONSABLE_INSCRIPTO = 1
+    EXENTO = 4
+    CONSUMIDOR_FINAL = 5
+    MONOTRIBUTO = 6
+
+    def __init__(self, id_persona=None, tipo_persona=None, nombre=None, apellido=None, razon_social=None,
+                 estado_clave=None, impuestos=None, categoria_monotributo=None) -> None:
+        super().__init__()
+        self.id_persona = id_persona
+        self.tipo_persona = tipo_persona
+        self.nombre = nombre
+        self.apellido = apellido
+        self.razon_social = razon_social
+        self.estado_clave = estado_clave
+        self.impuestos = impuestos or []
+        self.categoria_monotributo = categoria_monotributo
+
+    @property
+    def found(self) -> bool:
+        return self.tipo_persona is not None
+
+    @property
+    def is_active(self) -> bool:
+        return self.estado_clave == 'ACTIVO'
+
+    @property
+    def denominacion(self) -> str:
+        if self.razon_social:
+            return self.razon_social
+        return ' '.join(part for part in (self.apellido, self.nombre) if part)
+
+    @property
+    def condicion_iva(self) -> int:
+        """
+        The IVA condition of the taxpayer as receptor of an invoice, derived from its taxes
+        """
+        if self.IVA_IMPUESTO in self.impuestos:
+            return self.RESPONSABLE_INSCRIPTO
+        if self.categoria_monotributo or self.MONOTRIBUTO_IMPUESTO in self.impuestos:
+            return self.MONOTRIBUTO
+        if self.IVA_EXENTO_IMPUESTO in self.impuestos:
+            return self.EXENTO
+        return self.CONSUMIDOR_FINAL
+
+    def __str__(self):
+        return (f"Persona(id_persona={self.id_persona}, tipo_persona={self.tipo_persona}, "
+                f"denominacion={self.denominacion}, estado_clave={self.estado_clave}, impuestos={self.impuestos}, "
+                f"categoria_monotributo={self.categoria_monotributo}, {super().__str__()})")
 
 
 # Exceptions
@@ -184,4 +582,41 @@ class FECAESolicitarResult(FEBaseResponse):
 class WSFEVException(Exception):
     def __init__(self, message: str, result: List[Tuple[int, str]] = None) -> None:
         super().__init__(message)
-        self.result = result
\ No newline at end of file
+        self.result = result
+
+
+class CredentialError(Exception):
+    pass
+
+
+class AfipCommunicationError(Exception):
+    """
+    The request could not be completed: connection error, timeout or a non 200 response from the service
+    """
+    def __init__(self, message: str, status_code: int = None) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(AfipCommunicationError):
+    """
+    The request was not sent because the circuit breaker of the endpoint is open
+    """
+    pass
+
+
+class AfipThrottledError(AfipCommunicationError):
+    """
+    The service rejected the request because of load (HTTP 429 or 503), retry_after are the seconds it asked
+    to wait (Retry-After header), when informed
+    """
+    def __init__(self, message: str, status_code: int = None, retry_after: float = None) -> None:
+        super().__init__(message, status_code)
+        self.retry_after = retry_after
+
+
+class RateLimitError(AfipCommunicationError):
+    """
+    The request was not sent because the rate limiter did not grant a slot within its timeout
+    """
+    pass
@@ -0,0 +1,193 @@
+"""
+Hooks de métricas para las llamadas a los WS de la AFIP.
+
+Cada llamada a un método de WSAA/WSFEV genera un `RequestMetrics` con la duración de cada fase
+(build, sign, throttle, connect, server, parse), el tamaño del request y de la respuesta y la cantidad de reintentos.
+Al terminar la llamada se entrega a cada hook registrado con `add_hook`. Mientras no haya hooks
+registrados la medición no hace nada.
+
+    from easyAfip.utils import metrics
+    aggregator = metrics.MetricsAggregator()
+    metrics.add_hook(aggregator)
+"""
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+PHASES = ('build', 'sign', 'throttle', 'connect', 'server', 'parse')
+
+_hooks = []
+_current = contextvars.ContextVar('easyafip_request_metrics', default=None)
+
+
+class RequestMetrics:
+    """
+    Métricas de una llamada a un método de un WS.
+    """
+
+    def __init__(self, service: str, method: str):
+        self.service = service
+        self.method = method
+        self.phases = {}
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.retries = 0
+        self.error = None
+        self.total = None
+        self._started = time.perf_counter()
+
+    def add_phase(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - started)
+
+    @contextmanager
+    def activate(self):
+        """
+        Make these metrics the current ones, so the connector and the signer report to them
+        """
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    def run(self, function: Callable, *args, **kwargs):
+        """
+        Run the function with these metrics as the current ones (e.g. inside an executor thread)
+        """
+        with self.activate():
+            return function(*args, **kwargs)
+
+    def finish(self, error: BaseException = None) -> None:
+        self.error = error
+        self.total = time.perf_counter() - self._started
+        for hook in list(_hooks):
+            try:
+                hook(self)
+            except Exception:
+                logger.exception('Metrics hook %s failed', hook)
+
+    def __str__(self):
+        phases = ', '.join(f'{name}={seconds * 1000:.2f}ms' for name, seconds in self.phases.items())
+        return (f"RequestMetrics(service={self.service}, method={self.method}, total={(self.total or 0) * 1000:.2f}ms, "
+                f"{phases}, request_bytes={self.request_bytes}, response_bytes={self.response_bytes}, "
+                f"retries={self.retries}, error={self.error!r})")
+
+
+class _NullMetrics:
+    """
+    Métricas que no registran nada, usadas cuando no hay hooks registrados.
+    """
+
+    def add_phase(self, name: str, seconds: float) -> None:
+        pass
+
+    @contextmanager
+    def phase(self, name: str):
+        yield
+
+    @contextmanager
+    def activate(self):
+        yield self
+
+    def run(self, function: Callable, *args, **kwargs):
+        return function(*args, **kwargs)
+
+    def finish(self, error: BaseException = None) -> None:
+        pass
+
+    def __setattr__(self, name, value):
+        pass
+
+    request_bytes = response_bytes = retries = 0
+
+
+NULL_METRICS = _NullMetrics()
+
+
+def add_hook(hook: Callable[[RequestMetrics], None]) -> None:
+    """
+    Register a callable that receives the RequestMetrics of every finished call
+    """
+    _hooks.append(hook)
+
+
+def remove_hook(hook: Callable[[RequestMetrics], None]) -> None:
+    _hooks.remove(hook)
+
+
+def start(service: str, method: str):
+    """
+    Create the metrics of a call, or a no-op object when there are no hooks registered
+    """
+    return RequestMetrics(service, method) if _hooks else NULL_METRICS
+
+
+@contextmanager
+def measure(service: str, method: str):
+    """
+    Measure a call: the metrics are current inside the block and reported to the hooks when it ends
+    """
+    request_metrics = start(service, method)
+    with request_metrics.activate():
+        try:
+            yield request_metrics
+        except BaseException as error:
+            request_metrics.finish(error)
+            raise
+    request_metrics.finish()
+
+
+def current():
+    """
+    Get the metrics of the call in progress, or a no-op object
+    """
+    return _current.get() or NULL_METRICS
+
+
+class MetricsAggregator:
+    """
+    Hook que acumula cantidad, tiempo total y máximo por (servicio, método, fase), además de bytes,
+    reintentos y errores. Es seguro para usar desde múltiples hilos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {}
+
+    def __call__(self, request_metrics: RequestMetrics) -> None:
+        key = (request_metrics.service, request_metrics.method)
+        with self._lock:
+            stats = self.stats.setdefault(key, {'count': 0, 'errors': 0, 'retries': 0, 'request_bytes': 0,
+                                                'response_bytes': 0, 'phases': {}})
+            stats['count'] += 1
+            stats['errors'] += 1 if request_metrics.error else 0
+            stats['retries'] += request_metrics.retries
+            stats['request_bytes'] += request_metrics.request_bytes
+            stats['response_bytes'] += request_metrics.response_bytes
+            for name, seconds in list(request_metrics.phases.items()) + [('total', request_metrics.total)]:
+                phase = stats['phases'].setdefault(name, {'total': 0.0, 'max': 0.0})
+                phase['total'] += seconds
+                phase['max'] = max(phase['max'], seconds)
+
+    def summary(self) -> str:
+        lines = []
+        with self._lock:
+            for (service, method), stats in sorted(self.stats.items()):
+                phases = ', '.join(f"{name}={phase['total'] / stats['count'] * 1000:.2f}ms"
+                                   for name, phase in stats['phases'].items())
+                lines.append(f"{service}.{method}: count={stats['count']} errors={stats['errors']} "
+                             f"retries={stats['retries']} avg[{phases}]")
+        return '\n'.join(lines)
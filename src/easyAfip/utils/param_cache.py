@@ -0,0 +1,129 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+from typing import Callable
+
+from easyAfip.utils.store import BaseStore
+
+
+logger = logging.getLogger(__name__)
+
+
+class ParamCache:
+    """
+    Cache de las tablas de parámetros de WSFEv1 (FEParamGet*).
+
+    Cada tabla se guarda con su propio TTL (un día para los catálogos, unos minutos para la cotización).
+    Las tablas se mantienen en memoria ya convertidas a objetos y, si se indica un `store` (por ejemplo un
+    `FileStore`), se persisten como JSON para que un proceso nuevo no tenga que volver a pedirlas.
+    Si la AFIP no responde al renovar una tabla vencida se devuelve la última versión conocida.
+    Con `snapshot` y `restore` las tablas vigentes se pasan a otro proceso (ver `easyAfip.warm_state`).
+    """
+
+    DEFAULT_TTL = timedelta(days=1)
+    DEFAULT_TTLS = {
+        'FEParamGetCotizacion': timedelta(minutes=10),
+    }
+
+    def __init__(self, store: BaseStore = None, ttls: dict = None, default_ttl: timedelta = None):
+        """
+        :param store: Optional store where the tables are persisted, e.g. FileStore for an on-disk snapshot
+        :param ttls: {method_name: timedelta} overriding the TTL of some tables
+        :param default_ttl: TTL of the tables not included in ttls
+        """
+        self.store = store
+        self.ttls = {**self.DEFAULT_TTLS, **(ttls or {})}
+        self.default_ttl = default_ttl or self.DEFAULT_TTL
+        self._entries = {}
+        self._restored = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def get_ttl(self, method_name: str) -> timedelta:
+        return self.ttls.get(method_name, self.default_ttl)
+
+    def get(self, key: str, method_name: str, load: Callable, decode: Callable = None):
+        """
+        Get a table, loading it when it is not cached or its TTL expired
+        :param key: The cache key of the table
+        :param method_name: The FEParamGet* method, used to pick the TTL
+        :param load: Callable requesting the table to the service, returning JSON serializable data
+        :param decode: Callable converting the data into the value kept in memory
+        :return: The decoded table
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.time():
+            return entry[1]
+        with self._get_lock(key):
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.time():
+                return entry[1]
+            stored = self._restored.pop(key, None)
+            if stored is None and self.store is not None:
+                stored = self.store.get(key)
+            if stored is not None and stored['expires_at'] > time.time():
+                return self._remember(key, stored, decode)
+            try:
+                data = load()
+            except Exception:
+                stale = stored or (entry and {'expires_at': entry[0], 'data': entry[2]})
+                if not stale:
+                    raise
+                logger.warning('Could not refresh %s, using the cached value', key, exc_info=True)
+                return self._remember(key, stale, decode)
+            stored = {'expires_at': time.time() + self.get_ttl(method_name).total_seconds(), 'data': data}
+            if self.store is not None:
+                self.store.set(key, stored)
+            return self._remember(key, stored, decode)
+
+    def invalidate(self, key: str = None) -> None:
+        """
+        Forget a table (or every table), the next lookup requests it again to the service
+        :param key: The cache key, None to clear the cache
+        :return:
+        """
+        with self._guard:
+            keys = list(self._entries) if key is None else [key]
+            for entry_key in keys:
+                self._entries.pop(entry_key, None)
+            if key is None:
+                self._restored.clear()
+            else:
+                self._restored.pop(key, None)
+        if self.store is not None:
+            for entry_key in keys:
+                self.store.delete(entry_key)
+
+    def snapshot(self) -> dict:
+        """
+        Get the tables still valid, JSON serializable, to warm up the cache of another process with restore
+        :return: {key: {'expires_at', 'data'}}
+        """
+        now = time.time()
+        entries = {key: stored for key, stored in self._restored.items() if stored['expires_at'] > now}
+        entries.update({key: {'expires_at': expires_at, 'data': data}
+                        for key, (expires_at, _, data) in list(self._entries.items()) if expires_at > now})
+        return entries
+
+    def restore(self, entries: dict) -> None:
+        """
+        Load the tables of a snapshot. They are decoded on their first lookup and keep their original
+        expiration, the expired ones are ignored.
+        :param entries: {key: {'expires_at', 'data'}}, as returned by snapshot
+        :return:
+        """
+        now = time.time()
+        with self._guard:
+            for key, stored in entries.items():
+                if stored['expires_at'] > now and key not in self._entries:
+                    self._restored[key] = stored
+
+    def _remember(self, key: str, stored: dict, decode: Callable):
+        value = decode(stored['data']) if decode else stored['data']
+        self._entries[key] = (stored['expires_at'], value, stored['data'])
+        return value
+
+    def _get_lock(self, key: str) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Dict, Iterable
+
+from easyAfip.utils.messages import Persona
+from easyAfip.utils.store import BaseStore
+
+
+class PersonaCache:
+    """
+    Cache LRU con TTL de las consultas al padrón.
+
+    Guarda en memoria hasta `max_size` contribuyentes (descartando los usados menos recientemente) durante
+    `ttl`, y también las CUITs inexistentes, con un TTL más corto (`negative_ttl`), de modo que un DocNro
+    inválido no se vuelva a consultar en cada lote. Si se indica un `store` (por ejemplo un `SqliteStore`)
+    las consultas se persisten como JSON y un proceso nuevo las encuentra sin ir a la AFIP.
+    """
+
+    DEFAULT_MAX_SIZE = 100000
+    DEFAULT_TTL = timedelta(days=1)
+    DEFAULT_NEGATIVE_TTL = timedelta(hours=1)
+
+    def __init__(self, max_size: int = None, ttl: timedelta = None, negative_ttl: timedelta = None,
+                 store: BaseStore = None):
+        """
+        :param max_size: Max number of entries kept in memory
+        :param ttl: TTL of the taxpayers found
+        :param negative_ttl: TTL of the CUITs the service informed as not found
+        :param store: Optional store where the entries are persisted
+        """
+        self.max_size = max_size or self.DEFAULT_MAX_SIZE
+        self.ttl = ttl or self.DEFAULT_TTL
+        self.negative_ttl = negative_ttl or self.DEFAULT_NEGATIVE_TTL
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Persona]:
+        """
+        Look up many keys
+        :param keys: The cache keys
+        :return: {key: Persona} of the keys cached and not expired (Persona.found is False for the negative ones)
+        """
+        keys = list(keys)
+        now = time.time()
+        found, missing = {}, []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(key)
+                    found[key] = entry[1]
+                else:
+                    missing.append(key)
+        if self.store is not None:
+            for key in missing:
+                stored = self.store.get(key)
+                if stored is not None and stored['expires_at'] > now:
+                    found[key] = self._remember(key, stored['expires_at'], Persona.from_dict(stored['data']))
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, personas: Dict[str, Persona]) -> None:
+        """
+        Cache the result of a lookup
+        :param personas: {key: Persona}
+        :return:
+        """
+        now = time.time()
+        for key, persona in personas.items():
+            ttl = self.ttl if persona.found else self.negative_ttl
+            expires_at = now + ttl.total_seconds()
+            self._remember(key, expires_at, persona)
+            if self.store is not None:
+                self.store.set(key, {'expires_at': expires_at, 'data': persona.to_dict(json_safe=True)})
+
+    def invalidate(self, key: str = None) -> None:
+        """
+        Forget an entry (or every entry kept in memory and the given key in the store)
+        :param key: The cache key, None to clear the memory cache
+        :return:
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+        if key is not None and self.store is not None:
+            self.store.delete(key)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remember(self, key: str, expires_at: float, persona: Persona) -> Persona:
+        with self._lock:
+            self._entries[key] = (expires_at, persona)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return persona
@@ -0,0 +1,224 @@
+import logging
+import math
+import threading
+import time
+import uuid
+
+from easyAfip.utils.messages import AfipCommunicationError, RateLimitError
+from easyAfip.utils.store import BaseStore, MemoryStore, build_key
+
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Limitador adaptativo de los requests a la AFIP, por endpoint y CUIT.
+
+    Combina un token bucket (a lo sumo `rate` requests por segundo, con ráfagas de hasta `burst`) con un
+    límite de requests en curso que se ajusta con AIMD: crece de a uno por ventana mientras las respuestas
+    llegan antes de `latency_target` y se multiplica por `decrease` ante una señal de sobrecarga (HTTP 5xx o
+    429, timeouts, errores de conexión, respuestas lentas o los errores internos de WSFEv1). Un 429/503 con
+    Retry-After además frena todos los requests del CUIT hasta entonces. Con la misma señal se reduce la
+    fracción de RegXReq usada como tamaño de lote de FECAESolicitar (ver `get_batch_size`), que se recupera
+    de a poco con las respuestas rápidas.
+
+    El estado se guarda en un `BaseStore`: con un `FileStore` o `SqliteStore` lo comparten todos los procesos
+    del nodo, de modo que entre todos respetan el mismo límite. Los lugares en curso son leases con
+    vencimiento, por lo que un proceso que muere no los retiene para siempre.
+
+        limiter = RateLimiter(SqliteStore('easyafip.db'), rate=20, max_limit=16)
+        wsfev = WSFEV(token, sign, cuit, rate_limiter=limiter)
+    """
+
+    # WSFEv1 errors returned with HTTP 200 while the service is overloaded
+    OVERLOAD_ERROR_CODES = (500, 501, 502)
+    # fraction of the batch size recovered on every fast response
+    BATCH_SCALE_STEP = 0.05
+
+    def __init__(self, store: BaseStore = None, rate: float = 10.0, burst: float = None, initial_limit: int = 4,
+                 min_limit: int = 1, max_limit: int = 32, latency_target: float = 5.0, decrease: float = 0.5,
+                 min_batch_scale: float = 0.1, lease: float = 300.0, timeout: float = 60.0, poll_interval: float = 0.05):
+        """
+        :param store: Store for the shared state, defaults to a MemoryStore (shared by the threads of the process)
+        :param rate: Max requests per second
+        :param burst: Max requests sent at once after an idle period, defaults to rate
+        :param initial_limit: Requests in flight allowed before any feedback
+        :param min_limit: Min requests in flight, even under pressure
+        :param max_limit: Max requests in flight
+        :param latency_target: Seconds above which a response counts as a sign of pressure
+        :param decrease: Factor applied to the limit and the batch size on every sign of pressure
+        :param min_batch_scale: Min fraction of the batch size kept under pressure
+        :param lease: Seconds after which the slot of a request that never released it is reclaimed
+        :param timeout: Default max seconds to wait for a slot
+        :param poll_interval: Max seconds between checks while waiting for a slot held by another process
+        """
+        self.store = store if store is not None else MemoryStore()
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.decrease = decrease
+        self.min_batch_scale = min_batch_scale
+        self.lease = lease
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._released = threading.Condition()
+
+    def acquire(self, *scope, timeout: float = None) -> 'Permit':
+        """
+        Wait for a slot to send a request
+        :param scope: The parts of the limiter key, e.g. (endpoint, cuit)
+        :param timeout: Max seconds to wait, defaults to the limiter timeout
+        :return: The Permit, to be released with the outcome of the request (or used as a context manager)
+        :raises RateLimitError: If no slot was granted within the timeout
+        """
+        key = self.get_key(*scope)
+        lease_id = uuid.uuid4().hex
+        deadline = time.monotonic() + (timeout if timeout is not None else self.timeout)
+        while True:
+            with self.store.lock(key):
+                state = self._load(key)
+                wait = self._take(state, lease_id)
+                self.store.set(key, state)
+            if wait is None:
+                return Permit(self, key, lease_id, state['refilled_at'])
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RateLimitError(f"No request slot for {key} within the timeout (limit={state['limit']:.1f}, "
+                                     f"in flight={len(state['leases'])})")
+            with self._released:
+                self._released.wait(min(wait, remaining))
+
+    def release(self, permit: 'Permit', latency: float = None, error: BaseException = None) -> None:
+        """
+        Release the slot of a request and feed the limiter with its outcome
+        :param permit: The permit returned by acquire
+        :param latency: Seconds the request took, None when it was not sent
+        :param error: The error raised by the request, if any
+        :return:
+        """
+        with self.store.lock(permit.key):
+            state = self._load(permit.key)
+            state['leases'].pop(permit.lease_id, None)
+            if error is not None and self.is_overload(error):
+                self._decrease(state, permit.acquired_at, getattr(error, 'retry_after', None))
+            elif error is None and latency is not None:
+                if latency > self.latency_target:
+                    self._decrease(state, permit.acquired_at)
+                else:
+                    self._increase(state)
+            self.store.set(permit.key, state)
+        with self._released:
+            self._released.notify_all()
+
+    def record_overload(self, *scope) -> None:
+        """
+        Feed the limiter with a sign of pressure detected after the response, e.g. an overload error code
+        :param scope: The parts of the limiter key
+        :return:
+        """
+        key = self.get_key(*scope)
+        with self.store.lock(key):
+            state = self._load(key)
+            self._decrease(state)
+            self.store.set(key, state)
+
+    def get_batch_size(self, batch_size: int, *scope) -> int:
+        """
+        Scale a batch size down while the service is under pressure
+        :param batch_size: The batch size without pressure, e.g. RegXReq
+        :param scope: The parts of the limiter key
+        :return:
+        """
+        state = self.store.get(self.get_key(*scope))
+        scale = state['batch_scale'] if state else 1.0
+        return max(1, int(batch_size * scale))
+
+    def get_state(self, *scope) -> dict:
+        """
+        :return: The current state of the limiter (limit, tokens, requests in flight, batch scale...)
+        """
+        with self.store.lock(self.get_key(*scope)):
+            return self._load(self.get_key(*scope))
+
+    @classmethod
+    def is_overload(cls, error: BaseException) -> bool:
+        """
+        Whether the error of a request is a sign of pressure on the service: every connection error or timeout
+        and the 5xx and 429 responses; other 4xx, like a malformed request, are not
+        """
+        if not isinstance(error, Exception) or isinstance(error, RateLimitError):
+            return False
+        if isinstance(error, AfipCommunicationError) and error.status_code is not None:
+            return error.status_code >= 500 or error.status_code == 429
+        return True
+
+    @staticmethod
+    def get_key(*scope) -> str:
+        return build_key('rate_limit', *scope)
+
+    def _load(self, key: str) -> dict:
+        state = self.store.get(key)
+        if state is None:
+            state = {'tokens': self.burst, 'refilled_at': time.time(), 'limit': float(self.initial_limit),
+                     'leases': {}, 'blocked_until': 0.0, 'decreased_at': 0.0, 'batch_scale': 1.0}
+        return state
+
+    def _take(self, state: dict, lease_id: str):
+        # take a token and a slot, or return the seconds to wait before trying again
+        now = time.time()
+        state['leases'] = {lease: expires_at for lease, expires_at in state['leases'].items() if expires_at > now}
+        state['tokens'] = min(self.burst, state['tokens'] + (now - state['refilled_at']) * self.rate)
+        state['refilled_at'] = now
+        if state['blocked_until'] > now:
+            return state['blocked_until'] - now
+        if len(state['leases']) >= math.floor(state['limit']):
+            return self.poll_interval
+        if state['tokens'] < 1:
+            return (1 - state['tokens']) / self.rate
+        state['tokens'] -= 1
+        state['leases'][lease_id] = now + self.lease
+        return None
+
+    def _increase(self, state: dict) -> None:
+        # additive increase: one more slot after a full window of fast responses
+        state['limit'] = min(float(self.max_limit), state['limit'] + 1 / state['limit'])
+        state['batch_scale'] = min(1.0, state['batch_scale'] + self.BATCH_SCALE_STEP)
+
+    def _decrease(self, state: dict, sent_at: float = None, retry_after: float = None) -> None:
+        now = time.time()
+        if retry_after:
+            state['blocked_until'] = max(state['blocked_until'], now + retry_after)
+        # the requests already in flight when the limit was reduced count as the same sign of pressure
+        # (without the send time of the request, the signs within latency_target are merged)
+        if state['decreased_at'] > (sent_at if sent_at is not None else now - self.latency_target):
+            return
+        state['decreased_at'] = now
+        state['limit'] = max(float(self.min_limit), state['limit'] * self.decrease)
+        state['batch_scale'] = max(self.min_batch_scale, state['batch_scale'] * self.decrease)
+        logger.warning('AFIP under pressure, limit reduced to %.1f requests in flight and %.0f%% of the batch size',
+                       state['limit'], state['batch_scale'] * 100)
+
+
+class Permit:
+    """
+    Lugar otorgado por el RateLimiter para enviar un request. Como context manager mide la latencia del
+    bloque y lo libera con su resultado.
+    """
+
+    def __init__(self, limiter: RateLimiter, key: str, lease_id: str, acquired_at: float):
+        self.limiter = limiter
+        self.key = key
+        self.lease_id = lease_id
+        self.acquired_at = acquired_at
+        self._started = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.limiter.release(self, time.perf_counter() - self._started, exc_value)
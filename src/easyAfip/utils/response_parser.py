@@ -0,0 +1,130 @@
+from io import BytesIO
+
+from easyAfip.utils.columnar import FECAESolicitarColumns
+from easyAfip.utils.messages import FECAESolicitarResult, FECAEDetResponse, FECAEResultEnum, FEError
+
+
+class FECAESolicitarResponseParser:
+    """
+    Parser de una sola pasada (iterparse) para las respuestas de FECAESolicitar.
+
+    Recorre la respuesta una única vez directamente desde los bytes recibidos, usando los nombres de tag
+    precompilados, y libera cada FECAEDetResponse apenas es procesado, por lo que el costo es O(n) en la
+    cantidad de comprobantes y la memoria se mantiene acotada. lxml se importa en el primer parseo.
+    """
+
+    def __init__(self, namespace: str, detail_tag: str = 'FECAEDetResponse'):
+        """
+        :param namespace: The service namespace (WSBASE.WS_NSMAP['wsfev1']['ar'])
+        :param detail_tag: The tag of every invoice result, FECAEADetResponse to parse FECAEARegInformativo responses
+        """
+        self.namespace = namespace
+        tag = self._tag
+        self.FE_CAB_RESP = tag('FeCabResp')
+        self.FECAE_DET_RESPONSE = tag(detail_tag)
+        self.ERRORS = tag('Errors')
+        self.OBSERVACIONES = tag('Observaciones')
+        self.CODE = tag('Code')
+        self.MSG = tag('Msg')
+        self._cab_fields = {
+            tag('Cuit'): ('cuit', str),
+            tag('PtoVta'): ('pto_vta', int),
+            tag('CbteTipo'): ('cbte_tipo', int),
+            tag('FchProceso'): ('fecha_proceso', str),
+            tag('CantReg'): ('cant_reg', int),
+            tag('Resultado'): ('resultado', FECAEResultEnum.get_by_value),
+            tag('Reproceso'): ('reproceso', str),
+        }
+        self._det_fields = {
+            tag('Concepto'): ('concepto', int),
+            tag('DocTipo'): ('doc_tipo', int),
+            tag('DocNro'): ('doc_nro', str),
+            tag('CbteDesde'): ('cbte_desde', int),
+            tag('CbteHasta'): ('cbte_hasta', int),
+            tag('CbteFch'): ('cbte_fch', str),
+            tag('Resultado'): ('resultado', FECAEResultEnum.get_by_value),
+            # FECAEADetResponse informs the CAEA of the invoice instead of a CAE
+            tag('CAEA' if detail_tag == 'FECAEADetResponse' else 'CAE'): ('cae', str),
+            tag('CAEFchVto'): ('cae_fch_vto', str),
+        }
+        self._tags = (self.FE_CAB_RESP, self.FECAE_DET_RESPONSE, self.ERRORS)
+
+    def parse(self, response) -> FECAESolicitarResult:
+        """
+        Parse a FECAESolicitar response
+        :param response: The raw response (bytes or str)
+        :return: The FECAESolicitarResult
+        """
+        from lxml import etree
+
+        if isinstance(response, str):
+            response = response.encode('utf-8')
+        result = FECAESolicitarResult()
+        result.errors = []
+        for _, element in etree.iterparse(BytesIO(response), events=('end',), tag=self._tags):
+            if element.tag == self.FECAE_DET_RESPONSE:
+                result.details.append(self._parse_detail(element))
+            elif element.tag == self.FE_CAB_RESP:
+                self._fill(result, element, self._cab_fields)
+            else:
+                result.errors.extend(self._parse_fe_errors(element))
+            self._release(element)
+        return result
+
+    def parse_columns(self, response) -> FECAESolicitarColumns:
+        """
+        Parse a FECAESolicitar response into columns, without building a FECAEDetResponse per invoice
+        :param response: The raw response (bytes or str)
+        :return: The FECAESolicitarColumns
+        """
+        from lxml import etree
+
+        if isinstance(response, str):
+            response = response.encode('utf-8')
+        result = FECAESolicitarColumns()
+        columns = {'cbte_desde': result.cbte_desde, 'cbte_hasta': result.cbte_hasta, 'resultado': result.resultado,
+                   'cae': result.cae, 'cae_fch_vto': result.cae_fch_vto}
+        fields = {tag: (columns[name], converter if name in ('cbte_desde', 'cbte_hasta') else str)
+                  for tag, (name, converter) in self._det_fields.items() if name in columns}
+        for _, element in etree.iterparse(BytesIO(response), events=('end',), tag=self._tags):
+            if element.tag == self.FECAE_DET_RESPONSE:
+                row = dict.fromkeys(fields)
+                for child in element:
+                    if child.tag in fields and child.text:
+                        row[child.tag] = child.text
+                for tag, (column, converter) in fields.items():
+                    column.append(converter(row[tag]) if row[tag] is not None else None)
+                observaciones = element.find(self.OBSERVACIONES)
+                result.obs.append(self._parse_fe_errors(observaciones) if observaciones is not None else [])
+            elif element.tag == self.ERRORS:
+                result.errors.extend(self._parse_fe_errors(element))
+            self._release(element)
+        return result
+
+    def _parse_detail(self, element) -> FECAEDetResponse:
+        detail = FECAEDetResponse()
+        detail.obs_l = []
+        self._fill(detail, element, self._det_fields)
+        observaciones = element.find(self.OBSERVACIONES)
+        if observaciones is not None:
+            detail.obs_l = self._parse_fe_errors(observaciones)
+        return detail
+
+    def _parse_fe_errors(self, element) -> list:
+        return [FEError(int(child.findtext(self.CODE)), child.findtext(self.MSG)) for child in element]
+
+    @staticmethod
+    def _fill(target, element, fields: dict) -> None:
+        for child in element:
+            field = fields.get(child.tag)
+            if field and child.text:
+                setattr(target, field[0], field[1](child.text))
+
+    @staticmethod
+    def _release(element) -> None:
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+    def _tag(self, name: str) -> str:
+        return f'{{{self.namespace}}}{name}'
@@ -0,0 +1,65 @@
+import random
+import sys
+
+from easyAfip.utils.messages import AfipCommunicationError, CircuitOpenError, RateLimitError
+
+
+class RetryPolicy:
+    """
+    Política de reintentos de los requests a la AFIP, con backoff exponencial y jitter.
+
+    Solo se reintentan los errores de comunicación (conexión, timeout, respuestas 5xx). Cuando el
+    circuit breaker del endpoint está abierto, o el rate limiter no otorgó lugar, no se reintenta, para fallar
+    rápido mientras la AFIP no responde. Si la AFIP indica cuánto esperar (Retry-After) se respeta.
+    En FECAESolicitar, antes de reenviar, el cliente consulta qué comprobantes llegaron a autorizarse
+    (ver WSFEV.reconcile) y reenvía solo los faltantes.
+    """
+
+    RETRYABLE_ERRORS = (AfipCommunicationError,)
+    NOT_RETRYABLE_ERRORS = (CircuitOpenError, RateLimitError)
+
+    def __init__(self, max_attempts: int = 3, backoff: float = 0.5, multiplier: float = 2.0,
+                 max_backoff: float = 10.0, jitter: float = 0.1):
+        """
+        :param max_attempts: Max number of attempts, including the first one
+        :param backoff: Seconds to wait before the first retry
+        :param multiplier: Factor applied to the wait on every retry
+        :param max_backoff: Max seconds to wait between attempts
+        :param jitter: Random fraction added to (or taken from) every wait
+        """
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.multiplier = multiplier
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+
+    def is_retryable(self, error: BaseException) -> bool:
+        return (isinstance(error, self.RETRYABLE_ERRORS + self._transport_errors())
+                and not isinstance(error, self.NOT_RETRYABLE_ERRORS))
+
+    @staticmethod
+    def _transport_errors() -> tuple:
+        # the connection and timeout errors of requests, which is imported by the connector on its first
+        # request: if it is not imported yet no request could have failed
+        requests = sys.modules.get('requests')
+        return (requests.RequestException,) if requests is not None else ()
+
+    def should_retry(self, error: BaseException, attempt: int) -> bool:
+        """
+        :param error: The error raised by the attempt
+        :param attempt: The number of the failed attempt, starting at 1
+        :return:
+        """
+        return attempt < self.max_attempts and self.is_retryable(error)
+
+    def get_delay(self, attempt: int, error: BaseException = None) -> float:
+        """
+        :param attempt: The number of the failed attempt, starting at 1
+        :param error: The error raised by the attempt, when the service asked to wait (Retry-After) the delay
+            is at least that long
+        :return: Seconds to wait before the next attempt
+        """
+        delay = min(self.backoff * self.multiplier ** (attempt - 1), self.max_backoff)
+        if self.jitter:
+            delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        return max(delay, getattr(error, 'retry_after', None) or 0.0)
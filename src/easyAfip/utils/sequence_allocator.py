@@ -0,0 +1,58 @@
+from typing import Callable
+
+from easyAfip.utils.store import BaseStore, MemoryStore, build_key
+
+
+class SequenceAllocator:
+    """
+    Clase encargada de asignar localmente los números de comprobante de cada secuencia
+    (CUIT, punto de venta, tipo de comprobante, ambiente).
+
+    El último número asignado se guarda en un almacenamiento (`easyAfip.utils.store`) y cada asignación se
+    hace bajo el lock de la clave, por lo que es atómica entre hilos y, con `FileStore` o `SqliteStore`,
+    entre procesos. La secuencia se inicializa desde FECompUltimoAutorizado la primera vez que se usa y
+    luego de un `reset` (por ejemplo, cuando la AFIP rechaza un comprobante por numeración).
+    """
+
+    # El número de comprobante no se corresponde con el próximo a autorizar
+    NUMBERING_ERROR_CODES = {10016}
+
+    def __init__(self, store: BaseStore = None):
+        self.store = store if store is not None else MemoryStore()
+
+    @staticmethod
+    def get_key(cuit, pto_vta, cbte_tipo, environment) -> str:
+        return build_key('cbte', cuit, pto_vta, cbte_tipo, environment)
+
+    def allocate(self, key: str, count: int, seed: Callable[[], int]) -> int:
+        """
+        Reserve `count` consecutive numbers of the sequence
+        :param key: The sequence key, see get_key
+        :param count: How many numbers to reserve
+        :param seed: Callable returning the last authorized number, used when the sequence is not initialized
+        :return: The last number before the reserved ones (the first reserved number is this value + 1)
+        """
+        with self.store.lock(key):
+            last = self.store.get(key)
+            if last is None:
+                last = int(seed())
+            self.store.set(key, last + count)
+        return last
+
+    def reset(self, key: str) -> None:
+        """
+        Forget the sequence state, the next allocation will seed it again from the service.
+        :param key: The sequence key, see get_key
+        :return:
+        """
+        with self.store.lock(key):
+            self.store.delete(key)
+
+    @classmethod
+    def is_numbering_error(cls, errors) -> bool:
+        """
+        Check if any of the given FEError is a numbering rejection
+        :param errors: List of FEError
+        :return:
+        """
+        return any(int(error.code) in cls.NUMBERING_ERROR_CODES for error in errors or [])
@@ -0,0 +1,145 @@
+import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Hashable
+
+
+logger = logging.getLogger(__name__)
+
+
+class ShardedExecutor:
+    """
+    Ejecutor de trabajos particionados en shards, sobre un pool de hilos acotado.
+
+    Los trabajos de un mismo shard se ejecutan en el orden en que fueron encolados, con a lo sumo
+    `max_in_flight_per_shard` en curso; los de shards distintos se ejecutan en paralelo, hasta `max_workers`
+    en total. Los shards con trabajos pendientes se atienden en round-robin, de modo que un shard con un
+    backlog grande no demore a los demás. Opcionalmente los shards se agrupan (`group`, p. ej. por CUIT) con
+    un límite de trabajos en curso por grupo.
+
+        executor = ShardedExecutor(max_workers=8)
+        future = executor.submit((pto_vta, cbte_tipo), wsfev.fecaesolicitar, pto_vta, cbte_tipo, invoices)
+    """
+
+    def __init__(self, max_workers: int = 8, max_in_flight_per_shard: int = 1, group: Callable = None,
+                 max_in_flight_per_group: int = None, thread_name_prefix: str = 'easyafip-shard'):
+        """
+        :param max_workers: Max number of jobs running at the same time, across all the shards
+        :param max_in_flight_per_shard: Max number of jobs of a single shard running at the same time
+        :param group: Optional callable returning the group of a shard, e.g. lambda shard: shard[0]
+        :param max_in_flight_per_group: Max number of jobs of a single group running at the same time
+        :param thread_name_prefix: Prefix of the worker thread names
+        """
+        self.max_workers = max_workers
+        self.max_in_flight_per_shard = max_in_flight_per_shard
+        self.group = group
+        self.max_in_flight_per_group = max_in_flight_per_group
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._queues = OrderedDict()
+        self._in_flight = {}
+        self._group_in_flight = {}
+        self._active = 0
+        self._shutdown = False
+
+    def submit(self, shard: Hashable, function: Callable, *args, **kwargs) -> Future:
+        """
+        Queue a job in a shard
+        :param shard: The shard key, the jobs with the same key run in order
+        :param function: The callable to run
+        :return: Future with the result of the callable
+        """
+        future = Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError('Cannot submit jobs after shutdown')
+            self._queues.setdefault(shard, deque()).append((future, function, args, kwargs))
+        self._dispatch()
+        return future
+
+    def pending(self) -> int:
+        """
+        :return: Number of jobs queued or running
+        """
+        with self._lock:
+            return self._active + sum(len(queue) for queue in self._queues.values())
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stop accepting jobs. With wait the queued jobs are run before returning, otherwise they are cancelled.
+        :param wait: Wait for the queued and running jobs
+        :return:
+        """
+        with self._lock:
+            self._shutdown = True
+            if wait:
+                while self._active or self._queues:
+                    self._idle.wait()
+            else:
+                for queue in self._queues.values():
+                    for future, *_ in queue:
+                        future.cancel()
+                self._queues.clear()
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def _dispatch(self) -> None:
+        with self._lock:
+            while self._active < self.max_workers:
+                work = self._next_work()
+                if work is None:
+                    break
+                shard, item = work
+                self._active += 1
+                self._in_flight[shard] = self._in_flight.get(shard, 0) + 1
+                if self.group is not None:
+                    group = self.group(shard)
+                    self._group_in_flight[group] = self._group_in_flight.get(group, 0) + 1
+                self._executor.submit(self._run, shard, *item)
+            if not self._active and not self._queues:
+                self._idle.notify_all()
+
+    def _next_work(self):
+        # round robin: take the first shard with room for another job and move it to the end of the line
+        for shard in list(self._queues):
+            if self._in_flight.get(shard, 0) >= self.max_in_flight_per_shard:
+                continue
+            if self.max_in_flight_per_group is not None and self.group is not None and \
+                    self._group_in_flight.get(self.group(shard), 0) >= self.max_in_flight_per_group:
+                continue
+            queue = self._queues.pop(shard)
+            item = queue.popleft()
+            if queue:
+                self._queues[shard] = queue
+            return shard, item
+        return None
+
+    def _run(self, shard, future: Future, function: Callable, args, kwargs) -> None:
+        try:
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = function(*args, **kwargs)
+                except BaseException as exc:
+                    logger.warning('Job of shard %s failed: %s', shard, exc)
+                    future.set_exception(exc)
+                else:
+                    future.set_result(result)
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._in_flight[shard] -= 1
+                if not self._in_flight[shard]:
+                    del self._in_flight[shard]
+                if self.group is not None:
+                    group = self.group(shard)
+                    self._group_in_flight[group] -= 1
+                    if not self._group_in_flight[group]:
+                        del self._group_in_flight[group]
+            self._dispatch()
@@ -1,21 +1,42 @@
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.serialization import load_pem_private_key
-from cryptography.x509 import load_pem_x509_certificate
-from cryptography.hazmat.primitives.serialization.pkcs7 import PKCS7SignatureBuilder, PKCS7Options
-from cryptography.hazmat.primitives.serialization import Encoding
-from cryptography.hazmat.backends import default_backend
+from easyAfip.utils import metrics
+
 
 class Signer:
-    def __init__(self, pem, key):
+    """
+    Firma CMS (PKCS#7) del ticket de login de WSAA. cryptography se importa recién al parsear el certificado
+    o firmar, de modo que un proceso que reutiliza un ticket de acceso vigente no lo paga.
+    """
+
+    def __init__(self, pem, key, certificate=None, private_key=None):
         self.pem = pem
         self.key = key
+        self._certificate = certificate
+        self._private_key = private_key
+
+    @property
+    def certificate(self):
+        if self._certificate is None:
+            from cryptography.x509 import load_pem_x509_certificate
+
+            self._certificate = load_pem_x509_certificate(self.pem)
+        return self._certificate
+
+    @property
+    def private_key(self):
+        if self._private_key is None:
+            from cryptography.hazmat.primitives.serialization import load_pem_private_key
+
+            self._private_key = load_pem_private_key(self.key, password=None)
+        return self._private_key
 
     def sign_cms(self, data):
-        private_key = load_pem_private_key(self.key, password=None, backend=default_backend())
-        certificate = load_pem_x509_certificate(self.pem, backend=default_backend())
-
-        builder = PKCS7SignatureBuilder()
-        builder = builder.set_data(data)
-        builder = builder.add_signer(certificate, private_key, hashes.SHA256())
-        builder = builder.sign(encoding=Encoding.PEM, options=[])
-        return builder
\ No newline at end of file
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.serialization import Encoding
+        from cryptography.hazmat.primitives.serialization.pkcs7 import PKCS7SignatureBuilder
+
+        with metrics.current().phase('sign'):
+            builder = PKCS7SignatureBuilder()
+            builder = builder.set_data(data)
+            builder = builder.add_signer(self.certificate, self.private_key, hashes.SHA256())
+            builder = builder.sign(encoding=Encoding.PEM, options=[])
+            return builder
\ No newline at end of file
@@ -0,0 +1,257 @@
+from collections import OrderedDict
+from typing import Iterable, List
+import threading
+
+
+def escape_text(text) -> str:
+    """
+    Escape a text node the same way lxml does when serializing
+    :param text: The text to escape
+    :return: The escaped text
+    """
+    text = str(text)
+    if '&' in text:
+        text = text.replace('&', '&amp;')
+    if '<' in text:
+        text = text.replace('<', '&lt;')
+    if '>' in text:
+        text = text.replace('>', '&gt;')
+    if '\r' in text:
+        text = text.replace('\r', '&#13;')
+    return text
+
+
+def element(tag: str, text=None) -> str:
+    """
+    Serialize a leaf element, empty texts are written as a self closed tag (as lxml does)
+    :param tag: The prefixed tag name, e.g. 'ar:PtoVta'
+    :param text: The element text
+    :return:
+    """
+    if text is None or text == '':
+        return f'<{tag}/>'
+    return f'<{tag}>{escape_text(text)}</{tag}>'
+
+
+def column_value(value):
+    """
+    Normalize a value read from a column: NaN (missing values of float columns) becomes None and floats
+    are written without binary noise (0.1 + 0.2 -> 0.3)
+    """
+    if type(value) is float:
+        if value != value:
+            return None
+        return repr(round(value, 6))
+    return value
+
+
+def render_column(tag: str, column: list) -> List[str]:
+    """
+    Serialize every value of a column as a leaf element. Integer columns (numbers, dates, document numbers)
+    need no escaping nor normalization and take a faster path
+    """
+    if all(type(value) is int for value in column):
+        return [f'<{tag}>{value}</{tag}>' for value in column]
+    return [element(tag, column_value(value)) for value in column]
+
+
+class SoapSerializer:
+    """
+    Serializador de los requests SOAP de WSFEv1 basado en templates precompilados.
+
+    Escribe el sobre completo en una sola pasada sobre strings, declarando los namespaces una única vez,
+    y produce exactamente los mismos bytes que la construcción nodo a nodo con XMLProcessor.
+    El bloque Auth se cachea por (token, sign, cuit).
+    """
+
+    XML_DECLARATION = "<?xml version='1.0' encoding='UTF-8'?>\n"
+
+    # (tag, atributo) de los campos de FECAEDetRequest, en el orden en que se serializan
+    DET_REQUIRED_FIELDS = (
+        ('Concepto', 'concepto'), ('DocTipo', 'doc_tipo'), ('CbteDesde', 'cbte_desde'), ('CbteHasta', 'cbte_hasta'),
+        ('CbteFch', 'cbte_fch'), ('ImpTotal', 'imp_total'), ('ImpTotConc', 'imp_tot_conc'), ('ImpNeto', 'imp_neto'),
+        ('ImpOpEx', 'imp_op_ex'), ('ImpIVA', 'imp_iva'), ('FchServDesde', 'fch_serv_desde'),
+        ('FchServHasta', 'fch_serv_hasta'), ('FchVtoPago', 'fch_vto_pago'), ('MonId', 'mon_id'),
+        ('MonCotiz', 'mon_cotiz'),
+    )
+    DET_OPTIONAL_FIELDS = (('ImpTrib', 'imp_trib'), ('DocNro', 'doc_nro'))
+    TRIBUTO_FIELDS = (('Id', 'id'), ('Desc', 'desc'), ('BaseImp', 'base_imp'), ('Alic', 'alic'), ('Importe', 'importe'))
+    CBTE_ASOC_FIELDS = (('Tipo', 'tipo'), ('PtoVta', 'pto_vta'), ('Nro', 'nro'))
+    # campos propios de FECAEADetRequest (FECAEARegInformativo), a continuación de los de FECAEDetRequest
+    CAEA_DET_FIELDS = (('CAEA', 'caea'), ('CbteFchHsGen', 'cbte_fch_hs_gen'))
+
+    AUTH_CACHE_SIZE = 1024
+
+    def __init__(self, namespaces: dict, envelope_prefix: str = 'soap', prefix: str = 'ar'):
+        """
+        :param namespaces: The service namespaces (WSBASE.WS_NSMAP['wsfev1'])
+        :param envelope_prefix: The prefix used for the SOAP envelope namespace
+        :param prefix: The prefix used for the service namespace
+        """
+        self.prefix = prefix
+        self._envelope_open = (
+            f'{self.XML_DECLARATION}<{envelope_prefix}:Envelope xmlns:{envelope_prefix}="{namespaces["soapenv"]}" '
+            f'xmlns:{prefix}="{namespaces[prefix]}"><{envelope_prefix}:Header/><{envelope_prefix}:Body/>')
+        self._envelope_close = f'</{envelope_prefix}:Envelope>'
+        extra_ns = ''.join(f' xmlns:{ns_prefix}="{uri}"' for ns_prefix, uri in namespaces.items()
+                           if ns_prefix not in (prefix, 'soapenv'))
+        self._method_open_template = f'<{prefix}:{{method}}{extra_ns}>'
+        self._det_required = tuple((f'{prefix}:{tag}', attr) for tag, attr in self.DET_REQUIRED_FIELDS)
+        self._det_optional = tuple((f'{prefix}:{tag}', attr) for tag, attr in self.DET_OPTIONAL_FIELDS)
+        self._tributo_fields = tuple((f'{prefix}:{tag}', attr) for tag, attr in self.TRIBUTO_FIELDS)
+        self._cbte_asoc_fields = tuple((f'{prefix}:{tag}', attr) for tag, attr in self.CBTE_ASOC_FIELDS)
+        self._caea_det_fields = tuple((f'{prefix}:{tag}', attr) for tag, attr in self.CAEA_DET_FIELDS)
+        self._auth_cache = OrderedDict()
+        self._auth_lock = threading.Lock()
+
+    def get_auth_block(self, token: str, sign: str, cuit: str) -> str:
+        """
+        Get the serialized Auth node, cached per (token, sign, cuit)
+        :return:
+        """
+        key = (token, sign, cuit)
+        with self._auth_lock:
+            block = self._auth_cache.get(key)
+            if block is not None:
+                self._auth_cache.move_to_end(key)
+                return block
+        p = self.prefix
+        block = (f'<{p}:Auth>{element(f"{p}:Token", token)}{element(f"{p}:Sign", sign)}'
+                 f'{element(f"{p}:Cuit", cuit)}</{p}:Auth>')
+        with self._auth_lock:
+            self._auth_cache[key] = block
+            if len(self._auth_cache) > self.AUTH_CACHE_SIZE:
+                self._auth_cache.popitem(last=False)
+        return block
+
+    def request(self, method_name: str, auth_block: str, body_parts: Iterable[str] = ()) -> bytes:
+        """
+        Serialize a full request envelope
+        :param method_name: The WS method name
+        :param auth_block: The serialized Auth node, see get_auth_block
+        :param body_parts: Already serialized nodes that follow the Auth node
+        :return: The UTF-8 encoded envelope
+        """
+        parts = [self._envelope_open, self._method_open_template.format(method=method_name), auth_block]
+        parts.extend(body_parts)
+        parts.append(f'</{self.prefix}:{method_name}>')
+        parts.append(self._envelope_close)
+        return ''.join(parts).encode('utf-8')
+
+    def fields(self, values: Iterable) -> str:
+        """
+        Serialize a sequence of (tag, text) leaf elements of the service namespace
+        :param values: Iterable of (tag, text)
+        :return:
+        """
+        return ''.join(element(f'{self.prefix}:{tag}', text) for tag, text in values)
+
+    def node(self, tag: str, values: Iterable) -> str:
+        """
+        Serialize a node of the service namespace containing the given (tag, text) leaf elements
+        :param tag: The node tag, without prefix
+        :param values: Iterable of (tag, text)
+        :return:
+        """
+        return f'<{self.prefix}:{tag}>{self.fields(values)}</{self.prefix}:{tag}>'
+
+    def fecaesolicitar_body(self, pto_vta, ct_tipo, invoices: List) -> List[str]:
+        """
+        Serialize the FeCAEReq node of a FECAESolicitar request
+        :param pto_vta: The point of sale
+        :param ct_tipo: The invoice type
+        :param invoices: The (already numbered) FECAEDetRequest to send
+        :return: The serialized parts
+        """
+        p = self.prefix
+        parts = [f'<{p}:FeCAEReq><{p}:FeCabReq>', element(f'{p}:PtoVta', pto_vta), element(f'{p}:CbteTipo', ct_tipo),
+                 element(f'{p}:CantReg', len(invoices)), f'</{p}:FeCabReq><{p}:FeDetReq>']
+        for invoice in invoices:
+            parts.append(self.fecaedetrequest(invoice))
+        parts.append(f'</{p}:FeDetReq></{p}:FeCAEReq>')
+        return parts
+
+    def fecaeareginformativo_body(self, pto_vta, ct_tipo, invoices: List) -> List[str]:
+        """
+        Serialize the FeCAEARegInfReq node of a FECAEARegInformativo request
+        :param pto_vta: The point of sale
+        :param ct_tipo: The invoice type
+        :param invoices: The FECAEADetRequest (numbered and with their CAEA) to inform
+        :return: The serialized parts
+        """
+        p = self.prefix
+        parts = [f'<{p}:FeCAEARegInfReq><{p}:FeCabReq>', element(f'{p}:PtoVta', pto_vta),
+                 element(f'{p}:CbteTipo', ct_tipo), element(f'{p}:CantReg', len(invoices)),
+                 f'</{p}:FeCabReq><{p}:FeDetReq>']
+        for invoice in invoices:
+            parts.append(self.fecaedetrequest(invoice, 'FECAEADetRequest', self._caea_det_fields))
+        parts.append(f'</{p}:FeDetReq></{p}:FeCAEARegInfReq>')
+        return parts
+
+    def fecaesolicitar_body_columns(self, pto_vta, ct_tipo, columns, numbers: List[int] = None) -> List[str]:
+        """
+        Serialize the FeCAEReq node of a FECAESolicitar request straight from an InvoiceColumns batch,
+        without building a FECAEDetRequest per row
+        :param pto_vta: The point of sale
+        :param ct_tipo: The invoice type
+        :param columns: The InvoiceColumns batch
+        :param numbers: The invoice numbers, when the batch has no cbte_desde/cbte_hasta columns
+        :return: The serialized parts
+        """
+        p = self.prefix
+        values = columns.columns
+        count = len(columns)
+        # every column is rendered in a single comprehension and the rows are then joined
+        rendered = [[f'<{p}:FECAEDetRequest>'] * count]
+        for tag, attr in self._det_required:
+            column = numbers if numbers is not None and attr in ('cbte_desde', 'cbte_hasta') else values.get(attr)
+            rendered.append(render_column(tag, column) if column is not None else [f'<{tag}/>'] * count)
+        for tag, attr in self._det_optional:
+            if attr in values:
+                # the same test as fecaedetrequest: a 0 (ImpTrib, DocNro of a final consumer) is sent
+                rendered.append([element(tag, value) if value is not None and value != '' else ''
+                                 for value in map(column_value, values[attr])])
+        rendered.append([f'</{p}:FECAEDetRequest>'] * count)
+        parts = [f'<{p}:FeCAEReq><{p}:FeCabReq>', element(f'{p}:PtoVta', pto_vta), element(f'{p}:CbteTipo', ct_tipo),
+                 element(f'{p}:CantReg', count), f'</{p}:FeCabReq><{p}:FeDetReq>']
+        parts.extend(map(''.join, zip(*rendered)))
+        parts.append(f'</{p}:FeDetReq></{p}:FeCAEReq>')
+        return parts
+
+    def fecaedetrequest(self, invoice, node_tag: str = 'FECAEDetRequest', extra_fields=()) -> str:
+        """
+        Serialize a single FECAEDetRequest node
+        :param invoice: The FECAEDetRequest
+        :param node_tag: The node tag, without prefix (FECAEADetRequest for the CAEA invoices)
+        :param extra_fields: Optional (prefixed tag, attribute) fields written after the common ones
+        :return:
+        """
+        p = self.prefix
+        parts = [f'<{p}:{node_tag}>']
+        for tag, attr in self._det_required:
+            parts.append(element(tag, getattr(invoice, attr)))
+        for tag, attr in self._det_optional:
+            value = getattr(invoice, attr)
+            # Decimal('0') is falsy but, as the string '0', it must be sent
+            if value is not None and value != '':
+                parts.append(element(tag, value))
+        if invoice.tributos:
+            parts.append(f'<{p}:Tributos>')
+            for tributo in invoice.tributos:
+                for tag, attr in self._tributo_fields:
+                    parts.append(element(tag, getattr(tributo, attr)))
+            parts.append(f'</{p}:Tributos>')
+        if invoice.cbtes_asoc:
+            parts.append(f'<{p}:CbtesAsoc>')
+            for cbte_asoc in invoice.cbtes_asoc:
+                parts.append(f'<{p}:CbteAsoc>')
+                for tag, attr in self._cbte_asoc_fields:
+                    parts.append(element(tag, getattr(cbte_asoc, attr)))
+                parts.append(f'</{p}:CbteAsoc>')
+            parts.append(f'</{p}:CbtesAsoc>')
+        for field_tag, attr in extra_fields:
+            value = getattr(invoice, attr)
+            if value is not None and value != '':
+                parts.append(element(field_tag, value))
+        parts.append(f'</{p}:{node_tag}>')
+        return ''.join(parts)
@@ -0,0 +1,257 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - windows
+    fcntl = None
+    import msvcrt
+
+
+def build_key(*parts) -> str:
+    """
+    Build a store key from the given parts, e.g. ('20123456789', 'wsfe', 'prod') -> '20123456789:wsfe:prod'
+    :param parts: The parts that identify the stored value
+    :return: The key as a string
+    """
+    return ':'.join(str(part) for part in parts)
+
+
+class BaseStore:
+    """
+    Clase base para los almacenamientos clave/valor compartidos (tickets de acceso, numeración, etc).
+
+    Los valores deben ser serializables a JSON. `lock(key)` garantiza exclusión mutua sobre la clave
+    dentro del alcance del almacenamiento (hilo, proceso o nodo según la implementación), de modo que
+    una secuencia get/set dentro del bloque es atómica.
+    """
+
+    def get(self, key: str):
+        raise NotImplementedError
+
+    def set(self, key: str, value) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def lock(self, key: str):
+        raise NotImplementedError
+
+
+class MemoryStore(BaseStore):
+    """
+    Almacenamiento en memoria, compartido entre los hilos del proceso.
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def get(self, key: str):
+        return self._values.get(key)
+
+    def set(self, key: str, value) -> None:
+        self._values[key] = value
+
+    def delete(self, key: str) -> None:
+        self._values.pop(key, None)
+
+    @contextmanager
+    def lock(self, key: str):
+        with self._guard:
+            key_lock = self._locks.setdefault(key, threading.RLock())
+        with key_lock:
+            yield
+
+
+class FileStore(BaseStore):
+    """
+    Almacenamiento en archivos JSON dentro de un directorio, uno por clave.
+    Las escrituras son atómicas (archivo temporal + rename) y `lock` usa un lock de archivo, por lo que
+    puede compartirse entre procesos de un mismo nodo (o entre nodos sobre un filesystem con soporte de locks).
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._thread_locks = {}
+        self._guard = threading.Lock()
+        self._local = threading.local()
+
+    def get(self, key: str):
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def set(self, key: str, value) -> None:
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(value, file)
+        os.replace(tmp_path, path)
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def lock(self, key: str):
+        held = getattr(self._local, 'held', None)
+        if held is None:
+            held = self._local.held = set()
+        if key in held:
+            # reentrant use from the same thread
+            yield
+            return
+        with self._guard:
+            thread_lock = self._thread_locks.setdefault(key, threading.Lock())
+        with thread_lock:
+            with open(self._path(key) + '.lock', 'a+') as lock_file:
+                self._lock_file(lock_file)
+                held.add(key)
+                try:
+                    yield
+                finally:
+                    held.discard(key)
+                    self._unlock_file(lock_file)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, re.sub(r'[^A-Za-z0-9_.-]', '_', key) + '.json')
+
+    @staticmethod
+    def _lock_file(lock_file):
+        if fcntl:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:  # pragma: no cover - windows
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+
+    @staticmethod
+    def _unlock_file(lock_file):
+        if fcntl:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        else:  # pragma: no cover - windows
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class SqliteStore(BaseStore):
+    """
+    Almacenamiento sobre una base sqlite. Puede compartirse entre procesos que accedan al mismo archivo.
+
+    `lock(key)` bloquea solo esa clave: toma una fila de la tabla de locks en una transacción corta y la
+    libera al salir del bloque, sin mantener abierta una transacción de escritura mientras tanto (el bloque
+    puede incluir requests a la AFIP, como la renovación de un ticket). La fila es un lease que vence a los
+    `lease` segundos, de modo que un proceso que muere con el lock tomado no lo retiene para siempre. Si el
+    lock no se obtiene dentro de `timeout` segundos se levanta TimeoutError.
+    """
+
+    TABLE = 'easyafip_store'
+    LOCK_TABLE = 'easyafip_store_locks'
+
+    def __init__(self, path: str, timeout: float = 30.0, lease: float = 300.0, poll_interval: float = 0.05):
+        """
+        :param path: The sqlite database file
+        :param timeout: Max seconds to wait for the database and for the lock of a key
+        :param lease: Seconds after which the lock of a key that was never released is reclaimed
+        :param poll_interval: Seconds between attempts to take a lock held by another process
+        """
+        self.path = path
+        self.timeout = timeout
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._thread_locks = {}
+        self._guard = threading.Lock()
+        self._local = threading.local()
+        self._execute(f'CREATE TABLE IF NOT EXISTS {self.TABLE} (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        self._execute(f'CREATE TABLE IF NOT EXISTS {self.LOCK_TABLE} '
+                      f'(key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)')
+
+    def get(self, key: str):
+        row = self._execute(f'SELECT value FROM {self.TABLE} WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value) -> None:
+        self._execute(f'INSERT OR REPLACE INTO {self.TABLE} (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+
+    def delete(self, key: str) -> None:
+        self._execute(f'DELETE FROM {self.TABLE} WHERE key = ?', (key,))
+
+    @contextmanager
+    def lock(self, key: str):
+        held = getattr(self._local, 'held', None)
+        if held is None:
+            held = self._local.held = set()
+        if key in held:
+            # reentrant use from the same thread
+            yield
+            return
+        deadline = time.monotonic() + self.timeout
+        with self._guard:
+            thread_lock = self._thread_locks.setdefault(key, threading.Lock())
+        # the threads of the process wait on a thread lock, only one of them polls the lock row
+        if not thread_lock.acquire(timeout=self.timeout):
+            raise TimeoutError(f'Could not lock {key} within {self.timeout}s')
+        try:
+            owner = self._acquire_row(key, deadline)
+            held.add(key)
+            try:
+                yield
+            finally:
+                held.discard(key)
+                self._execute(f'DELETE FROM {self.LOCK_TABLE} WHERE key = ? AND owner = ?', (key, owner))
+        finally:
+            thread_lock.release()
+
+    def _acquire_row(self, key: str, deadline: float) -> str:
+        owner = uuid.uuid4().hex
+        while True:
+            now = time.time()
+            conn = self._connect()
+            try:
+                conn.isolation_level = None
+                conn.execute('BEGIN IMMEDIATE')
+                conn.execute(f'DELETE FROM {self.LOCK_TABLE} WHERE key = ? AND expires_at < ?', (key, now))
+                acquired = conn.execute(f'INSERT OR IGNORE INTO {self.LOCK_TABLE} (key, owner, expires_at) '
+                                        f'VALUES (?, ?, ?)', (key, owner, now + self.lease)).rowcount
+                conn.execute('COMMIT')
+            finally:
+                conn.close()
+            if acquired:
+                return owner
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f'Could not lock {key} within {self.timeout}s, it is held by another process')
+            time.sleep(self.poll_interval)
+
+    def _execute(self, sql: str, params: tuple = ()):
+        with self._connect() as conn:
+            cursor = conn.execute(sql, params)
+            rows = cursor.fetchall()
+        conn.close()
+        return _Rows(rows)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=self.timeout)
+
+
+class _Rows:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return self._rows
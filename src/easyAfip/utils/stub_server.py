@@ -0,0 +1,385 @@
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+from lxml import etree
+
+from easyAfip.utils.invoice_validator import is_valid_cuit
+from easyAfip.utils.messages import Persona
+from easyAfip.wsbase import WSBASE
+
+
+class AfipStubServer:
+    """
+    Servidor local que simula WSAA (LoginCms), WSFEv1 (FECompUltimoAutorizado, FECompTotXRequest,
+    FECAESolicitar, FECompConsultar, los métodos de CAEA y los FEParamGet*) y el padrón
+    (ws_sr_constancia_inscripcion, getPersonaList_v2), para pruebas y benchmarks sin conexión a la AFIP.
+
+    Lleva la numeración de cada (CUIT, punto de venta, tipo de comprobante) y rechaza con el código 10016
+    los comprobantes que no son el próximo a autorizar. Permite agregar latencia y errores:
+        latency: segundos de demora por request (o un callable(method_name) que los devuelva)
+        error_rate: probabilidad de responder con un HTTP 500
+        faults: {method_name: cantidad} de respuestas HTTP 500 forzadas para los próximos requests al método
+        lost_responses: {method_name: cantidad} de requests que se procesan pero se responden con un HTTP 500,
+            como cuando la respuesta se pierde luego de autorizar los comprobantes
+        capacity: máximo de requests en proceso; los que lo superan se rechazan con un HTTP 503, con el header
+            Retry-After si se indica retry_after
+        personas: {CUIT: Persona o None} del padrón; las CUITs no incluidas con dígito verificador válido
+            existen como responsables inscriptos activos y el resto no existe
+
+    Uso:
+        with AfipStubServer(latency=0.05) as stub:
+            wsfev = WSFEV(token, sign, cuit, connector=AfipWSConnector(stub.url('wsfev1')))
+    """
+
+    FEV1_NS = WSBASE.WS_NSMAP['wsfev1']['ar']
+    SOAP12_NS = WSBASE.WS_NSMAP['wsfev1']['soapenv']
+    SOAP11_NS = WSBASE.WS_NSMAP['wsaa']['soapenv']
+    WSAA_NS = WSBASE.WS_NSMAP['wsaa']['wsaa']
+
+    PADRON_NS = WSBASE.WS_NSMAP['ws_sr_constancia_inscripcion']['a5']
+
+    PATHS = {'wsaa': '/ws/services/LoginCms', 'wsfev1': '/wsfev1/service.asmx',
+             'ws_sr_constancia_inscripcion': '/sr-padron/webservices/personaServiceA5'}
+
+    # FEParamGet*: método -> (tag de cada item, [(Id, Desc)])
+    PARAM_CATALOGS = {
+        'FEParamGetTiposCbte': ('CbteTipo', [(1, 'Factura A'), (6, 'Factura B'), (11, 'Factura C'), (3, 'Nota de Crédito A')]),
+        'FEParamGetTiposDoc': ('DocTipo', [(80, 'CUIT'), (86, 'CUIL'), (96, 'DNI'), (99, 'Doc. (Otro)')]),
+        'FEParamGetTiposIva': ('IvaTipo', [(3, '0%'), (4, '10.5%'), (5, '21%'), (6, '27%')]),
+        'FEParamGetTiposMonedas': ('Moneda', [('PES', 'Pesos Argentinos'), ('DOL', 'Dólar Estadounidense')]),
+        'FEParamGetTiposTributos': ('TributoTipo', [(1, 'Impuestos nacionales'), (2, 'Impuestos provinciales'), (99, 'Otro')]),
+    }
+    COTIZACIONES = {'PES': '1', 'DOL': '1000.50'}
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency=0.0, error_rate: float = 0.0,
+                 reg_x_req: int = 250, faults: dict = None, lost_responses: dict = None, seed: int = None,
+                 capacity: int = None, retry_after: float = None, personas: dict = None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.error_rate = error_rate
+        self.reg_x_req = reg_x_req
+        self.faults = dict(faults or {})
+        self.lost_responses = dict(lost_responses or {})
+        self.capacity = capacity
+        self.retry_after = retry_after
+        self.personas = dict(personas or {})
+        self.rejected = 0
+        self._in_progress = 0
+        self.last_numbers = {}
+        self.issued = {}
+        self.caeas = {}
+        self.caeas_sin_movimiento = {}
+        self.request_counts = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        handler = self._build_handler()
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name='afip-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def url(self, service: str) -> str:
+        """
+        Get the url of the given service ('wsaa', 'wsfev1' or 'ws_sr_constancia_inscripcion')
+        """
+        return f'http://{self.host}:{self.port}{self.PATHS[service]}'
+
+    @property
+    def endpoints(self) -> dict:
+        return {service: self.url(service) for service in self.PATHS}
+
+    def handle(self, path: str, soap_action: str, body: bytes):
+        """
+        Build the response for a request
+        :return: (status, response body)
+        """
+        with self._lock:
+            if self.capacity is not None and self._in_progress >= self.capacity:
+                self.rejected += 1
+                return 503, self._soap_fault('Server too busy')
+            self._in_progress += 1
+        try:
+            return self._handle(path, soap_action, body)
+        finally:
+            with self._lock:
+                self._in_progress -= 1
+
+    def _handle(self, path: str, soap_action: str, body: bytes):
+        method_name = soap_action.strip('"').rsplit('/', 1)[-1].replace('urn:', '')
+        if not method_name and body:
+            # an empty SOAPAction (padrón): the method is the first element of the body
+            method_name = etree.QName(etree.fromstring(body).find(f'{{{self.SOAP11_NS}}}Body')[0]).localname
+        with self._lock:
+            self.request_counts[method_name] = self.request_counts.get(method_name, 0) + 1
+            forced_fault = self.faults.get(method_name, 0) > 0
+            if forced_fault:
+                self.faults[method_name] -= 1
+            lost_response = not forced_fault and self.lost_responses.get(method_name, 0) > 0
+            if lost_response:
+                self.lost_responses[method_name] -= 1
+            random_fault = self.error_rate and self._random.random() < self.error_rate
+        latency = self.latency(method_name) if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+        if forced_fault or random_fault:
+            return 500, self._soap_fault('Injected error')
+        if path == self.PATHS['wsaa'] and method_name == 'LoginCms':
+            return 200, self._login_cms()
+        request = etree.fromstring(body)
+        if path == self.PATHS['ws_sr_constancia_inscripcion'] and method_name == 'getPersonaList_v2':
+            return 200, self._get_persona_list(request)
+        handler = getattr(self, f'_{method_name.lower()}', None)
+        if method_name in self.PARAM_CATALOGS:
+            handler = self._param_catalog(method_name)
+        if path != self.PATHS['wsfev1'] or handler is None:
+            return 500, self._soap_fault(f'Unknown method {method_name}')
+        response = self._fev1_envelope(method_name, handler(request))
+        if lost_response:
+            return 500, self._soap_fault('Injected error after processing the request')
+        return 200, response
+
+    def _fecompultimoautorizado(self, request) -> str:
+        cuit, pto_vta, cbte_tipo = self._text(request, 'Cuit'), self._text(request, 'PtoVta'), self._text(request, 'CbteTipo')
+        with self._lock:
+            last = self.last_numbers.get((cuit, pto_vta, cbte_tipo), 0)
+        return f'<PtoVta>{pto_vta}</PtoVta><CbteTipo>{cbte_tipo}</CbteTipo><CbteNro>{last}</CbteNro>'
+
+    def _fecomptotxrequest(self, request) -> str:
+        return f'<RegXReq>{self.reg_x_req}</RegXReq>'
+
+    def _fecaesolicitar(self, request) -> str:
+        return self._authorize(request, 'FECAEDetRequest', 'FECAEDetResponse')
+
+    def _fecaeareginformativo(self, request) -> str:
+        return self._authorize(request, 'FECAEADetRequest', 'FECAEADetResponse')
+
+    def _authorize(self, request, detail_tag: str, response_tag: str) -> str:
+        ns = {'ar': self.FEV1_NS}
+        cuit = self._text(request, 'Cuit')
+        pto_vta, cbte_tipo = self._text(request, 'PtoVta'), self._text(request, 'CbteTipo')
+        details = request.findall(f'.//ar:{detail_tag}', ns)
+        if len(details) > self.reg_x_req:
+            return self._errors(10001, f'La cantidad de registros supera {self.reg_x_req}')
+        key = (cuit, pto_vta, cbte_tipo)
+        today = datetime.now(timezone(timedelta(hours=-3)))
+        cae_fch_vto = (today + timedelta(days=10)).strftime('%Y%m%d')
+        parts = []
+        approved = 0
+        with self._lock:
+            for detail in details:
+                number = int(detail.findtext('ar:CbteDesde', namespaces=ns) or 0)
+                last = self.last_numbers.get(key, 0)
+                fields = ''.join(f'<{tag}>{escape(detail.findtext(f"ar:{tag}", "", ns))}</{tag}>'
+                                 for tag in ('Concepto', 'DocTipo', 'DocNro', 'CbteDesde', 'CbteHasta', 'CbteFch'))
+                caea = detail.findtext('ar:CAEA', None, ns)
+                if caea is not None and caea not in self.caeas.values():
+                    parts.append(f'<{response_tag}>{fields}<Resultado>R</Resultado><Observaciones><Obs><Code>1014</Code>'
+                                 f'<Msg>El CAEA informado no es valido</Msg></Obs></Observaciones>'
+                                 f'<CAEA>{escape(caea)}</CAEA></{response_tag}>')
+                elif number == last + 1:
+                    self.last_numbers[key] = number
+                    approved += 1
+                    cae = caea or f'{self._random.randrange(10 ** 13, 10 ** 14)}'
+                    self.issued[key + (number,)] = (fields, detail.findtext('ar:ImpTotal', '', ns), cae, cae_fch_vto,
+                                                    today.strftime('%Y%m%d'))
+                    authorization = (f'<CAEA>{cae}</CAEA>' if caea is not None
+                                     else f'<CAE>{cae}</CAE><CAEFchVto>{cae_fch_vto}</CAEFchVto>')
+                    parts.append(f'<{response_tag}>{fields}<Resultado>A</Resultado>{authorization}</{response_tag}>')
+                else:
+                    parts.append(f'<{response_tag}>{fields}<Resultado>R</Resultado><Observaciones><Obs>'
+                                 f'<Code>10016</Code><Msg>El numero o fecha del comprobante no se corresponde con el '
+                                 f'proximo a autorizar. Consultar metodo FECompUltimoAutorizado.</Msg></Obs>'
+                                 f'</Observaciones></{response_tag}>')
+        resultado = 'A' if approved == len(details) else ('R' if not approved else 'P')
+        return (f'<FeCabResp><Cuit>{cuit}</Cuit><PtoVta>{pto_vta}</PtoVta><CbteTipo>{cbte_tipo}</CbteTipo>'
+                f'<FchProceso>{today.strftime("%Y%m%d%H%M%S")}</FchProceso><CantReg>{len(details)}</CantReg>'
+                f'<Resultado>{resultado}</Resultado><Reproceso>N</Reproceso></FeCabResp>'
+                f'<FeDetResp>{"".join(parts)}</FeDetResp>')
+
+    def _fecompconsultar(self, request) -> str:
+        cuit = self._text(request, 'Cuit')
+        pto_vta, cbte_tipo, cbte_nro = self._text(request, 'PtoVta'), self._text(request, 'CbteTipo'), self._text(request, 'CbteNro')
+        with self._lock:
+            issued = self.issued.get((cuit, pto_vta, cbte_tipo, int(cbte_nro or 0)))
+        if issued is None:
+            return self._errors(602, 'No existen datos en nuestros registros para los parametros ingresados.')
+        fields, imp_total, cae, cae_fch_vto, fch_proceso = issued
+        return (f'<ResultGet>{fields}<ImpTotal>{escape(imp_total)}</ImpTotal><Resultado>A</Resultado>'
+                f'<CodAutorizacion>{cae}</CodAutorizacion><EmisionTipo>CAE</EmisionTipo><FchVto>{cae_fch_vto}</FchVto>'
+                f'<FchProceso>{fch_proceso}</FchProceso><PtoVta>{pto_vta}</PtoVta><CbteTipo>{cbte_tipo}</CbteTipo></ResultGet>')
+
+    def _fecaeasolicitar(self, request) -> str:
+        key = (self._text(request, 'Cuit'), self._text(request, 'Periodo'), self._text(request, 'Orden'))
+        with self._lock:
+            if key in self.caeas:
+                return self._errors(15008, 'Existe un CAEA otorgado para el periodo y orden informados')
+            self.caeas[key] = f'{self._random.randrange(10 ** 13, 10 ** 14)}'
+        return self._fecaea_result(key)
+
+    def _fecaeaconsultar(self, request) -> str:
+        key = (self._text(request, 'Cuit'), self._text(request, 'Periodo'), self._text(request, 'Orden'))
+        if key not in self.caeas:
+            return self._errors(602, 'No existen datos en nuestros registros para los parametros ingresados.')
+        return self._fecaea_result(key)
+
+    def _fecaea_result(self, key) -> str:
+        _, periodo, orden = key
+        month_start = datetime.strptime(periodo, '%Y%m')
+        next_month = (month_start + timedelta(days=32)).replace(day=1)
+        since = month_start if orden == '1' else month_start.replace(day=16)
+        until = month_start.replace(day=15) if orden == '1' else next_month - timedelta(days=1)
+        return (f'<ResultGet><CAEA>{self.caeas[key]}</CAEA><Periodo>{periodo}</Periodo><Orden>{orden}</Orden>'
+                f'<FchVigDesde>{since:%Y%m%d}</FchVigDesde><FchVigHasta>{until:%Y%m%d}</FchVigHasta>'
+                f'<FchTopeInf>{until + timedelta(days=8):%Y%m%d}</FchTopeInf>'
+                f'<FchProceso>{datetime.now():%Y%m%d%H%M%S}</FchProceso></ResultGet>')
+
+    def _fecaeasinmovimientoinformar(self, request) -> str:
+        cuit, pto_vta, caea = self._text(request, 'Cuit'), self._text(request, 'PtoVta'), self._text(request, 'CAEA')
+        if caea not in self.caeas.values():
+            return self._errors(1014, 'El CAEA informado no es valido')
+        fch_proceso = datetime.now().strftime('%Y%m%d')
+        with self._lock:
+            self.caeas_sin_movimiento[(cuit, pto_vta, caea)] = fch_proceso
+        return (f'<CAEA>{caea}</CAEA><FchProceso>{fch_proceso}</FchProceso><Resultado>A</Resultado>'
+                f'<PtoVta>{pto_vta}</PtoVta>')
+
+    def _fecaeasinmovimientoconsultar(self, request) -> str:
+        cuit, pto_vta, caea = self._text(request, 'Cuit'), self._text(request, 'PtoVta'), self._text(request, 'CAEA')
+        fch_proceso = self.caeas_sin_movimiento.get((cuit, pto_vta, caea))
+        if fch_proceso is None:
+            return self._errors(602, 'No existen datos en nuestros registros para los parametros ingresados.')
+        return (f'<ResultGet><FECAEASinMov><CAEA>{caea}</CAEA><FchProceso>{fch_proceso}</FchProceso>'
+                f'<PtoVta>{pto_vta}</PtoVta></FECAEASinMov></ResultGet>')
+
+    def _param_catalog(self, method_name: str):
+        item_tag, items = self.PARAM_CATALOGS[method_name]
+        result = ''.join(f'<{item_tag}><Id>{item_id}</Id><Desc>{escape(desc)}</Desc><FchDesde>20100917</FchDesde>'
+                         f'<FchHasta>NULL</FchHasta></{item_tag}>' for item_id, desc in items)
+        return lambda request: f'<ResultGet>{result}</ResultGet>'
+
+    def _feparamgetptosventa(self, request) -> str:
+        with self._lock:
+            ptos_vta = sorted({int(key[1]) for key in self.last_numbers if key[0] == self._text(request, 'Cuit')} | {1})
+        return '<ResultGet>' + ''.join(f'<PtoVenta><Nro>{nro}</Nro><EmisionTipo>CAE</EmisionTipo><Bloqueado>N</Bloqueado>'
+                                       f'<FchBaja>NULL</FchBaja></PtoVenta>' for nro in ptos_vta) + '</ResultGet>'
+
+    def _feparamgetcotizacion(self, request) -> str:
+        mon_id = self._text(request, 'MonId')
+        if mon_id not in self.COTIZACIONES:
+            return self._errors(602, 'Sin Resultados: - Metodo FEParamGetCotizacion')
+        fch_cotiz = self._text(request, 'FchCotiz') or datetime.now(timezone(timedelta(hours=-3))).strftime('%Y%m%d')
+        return (f'<ResultGet><MonId>{mon_id}</MonId><MonCotiz>{self.COTIZACIONES[mon_id]}</MonCotiz>'
+                f'<FchCotiz>{fch_cotiz}</FchCotiz></ResultGet>')
+
+    def _get_persona_list(self, request) -> bytes:
+        ids = [node.text for node in request.iter('idPersona')]
+        parts = [f'<persona>{self._persona(id_persona)}</persona>' for id_persona in ids]
+        return (f'<?xml version="1.0" encoding="UTF-8"?><soap:Envelope xmlns:soap="{self.SOAP11_NS}"><soap:Body>'
+                f'<ns2:getPersonaList_v2Response xmlns:ns2="{self.PADRON_NS}"><personaListReturn><metadata>'
+                f'<fechaHora>{datetime.now(timezone(timedelta(hours=-3))).isoformat()}</fechaHora>'
+                f'<servidor>stub</servidor></metadata><cantidadRegistros>{len(ids)}</cantidadRegistros>{"".join(parts)}'
+                f'</personaListReturn></ns2:getPersonaList_v2Response></soap:Body></soap:Envelope>').encode('utf-8')
+
+    def _persona(self, id_persona: str) -> str:
+        if id_persona in self.personas:
+            persona = self.personas[id_persona]
+        elif is_valid_cuit(id_persona):
+            persona = Persona(id_persona, 'JURIDICA', razon_social=f'CONTRIBUYENTE {id_persona}', estado_clave='ACTIVO',
+                              impuestos=[Persona.IVA_IMPUESTO])
+        else:
+            persona = None
+        if persona is None:
+            return (f'<errorConstancia><error>No existe persona con ese Id</error><idPersona>{escape(id_persona)}'
+                    f'</idPersona></errorConstancia>')
+        impuestos = ''.join(f'<impuesto><idImpuesto>{impuesto}</idImpuesto></impuesto>' for impuesto in persona.impuestos
+                            if impuesto != Persona.MONOTRIBUTO_IMPUESTO)
+        monotributo = ''
+        if persona.categoria_monotributo or Persona.MONOTRIBUTO_IMPUESTO in persona.impuestos:
+            monotributo = (f'<datosMonotributo><categoriaMonotributo><descripcionCategoria>'
+                           f'{escape(persona.categoria_monotributo or "")}</descripcionCategoria></categoriaMonotributo>'
+                           f'<impuesto><idImpuesto>{Persona.MONOTRIBUTO_IMPUESTO}</idImpuesto></impuesto>'
+                           f'</datosMonotributo>')
+        generales = ''.join(f'<{tag}>{escape(value)}</{tag}>' for tag, value in (
+            ('apellido', persona.apellido), ('estadoClave', persona.estado_clave), ('idPersona', id_persona),
+            ('nombre', persona.nombre), ('razonSocial', persona.razon_social), ('tipoPersona', persona.tipo_persona))
+            if value)
+        regimen_general = f'<datosRegimenGeneral>{impuestos}</datosRegimenGeneral>' if impuestos else ''
+        return f'<datosGenerales>{generales}</datosGenerales>{monotributo}{regimen_general}'
+
+    def _login_cms(self) -> bytes:
+        now = datetime.now(timezone(timedelta(hours=-3))).replace(microsecond=0)
+        ticket = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><loginTicketResponse version="1.0">'
+                  f'<header><source>CN=wsaahomo</source><destination>stub</destination>'
+                  f'<uniqueId>{self._random.randrange(1, 2 ** 32)}</uniqueId>'
+                  f'<generationTime>{now.isoformat()}</generationTime>'
+                  f'<expirationTime>{(now + timedelta(hours=12)).isoformat()}</expirationTime></header>'
+                  f'<credentials><token>stub-token-{self._random.randrange(10 ** 9)}</token>'
+                  f'<sign>stub-sign</sign></credentials></loginTicketResponse>')
+        return (f'<?xml version="1.0" encoding="UTF-8"?><soapenv:Envelope xmlns:soapenv="{self.SOAP11_NS}">'
+                f'<soapenv:Body><loginCmsResponse xmlns="{self.WSAA_NS}"><loginCmsReturn>{escape(ticket)}'
+                f'</loginCmsReturn></loginCmsResponse></soapenv:Body></soapenv:Envelope>').encode('utf-8')
+
+    def _fev1_envelope(self, method_name: str, result: str) -> bytes:
+        return (f'<?xml version="1.0" encoding="utf-8"?><soap:Envelope xmlns:soap="{self.SOAP12_NS}"><soap:Body>'
+                f'<{method_name}Response xmlns="{self.FEV1_NS}"><{method_name}Result>{result}</{method_name}Result>'
+                f'</{method_name}Response></soap:Body></soap:Envelope>').encode('utf-8')
+
+    def _soap_fault(self, message: str) -> bytes:
+        return (f'<?xml version="1.0" encoding="utf-8"?><soap:Envelope xmlns:soap="{self.SOAP12_NS}"><soap:Body>'
+                f'<soap:Fault><soap:Code><soap:Value>soap:Receiver</soap:Value></soap:Code><soap:Reason>'
+                f'<soap:Text>{escape(message)}</soap:Text></soap:Reason></soap:Fault></soap:Body></soap:Envelope>'
+                ).encode('utf-8')
+
+    @staticmethod
+    def _errors(code: int, message: str) -> str:
+        return f'<Errors><Err><Code>{code}</Code><Msg>{escape(message)}</Msg></Err></Errors>'
+
+    def _text(self, request, tag: str) -> str:
+        return request.findtext(f'.//ar:{tag}', namespaces={'ar': self.FEV1_NS})
+
+    def _build_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # the headers and the body are written separately, Nagle would delay the body until the client's ACK
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                status, response = stub.handle(self.path, self.headers.get('SOAPAction', ''), body)
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/xml; charset=utf-8')
+                if status == 503 and stub.retry_after is not None:
+                    self.send_header('Retry-After', str(stub.retry_after))
+                self.send_header('Content-Length', str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -1,6 +1,5 @@
 from typing import TypeVar
 
-from lxml import etree
 import logging
 import re
 
@@ -11,15 +10,20 @@ T = TypeVar('T', bound='XMLProcessor')
 class XMLProcessor:
     """
     Clase encargada de procesar y manipular documentos XML.
+    lxml se importa recién al usarse, para no sumarlo al tiempo de importación de la librería.
     """
 
     def __init__(self, xml: str = None, namespaces: dict = {}):
         if xml:
+            from lxml import etree
+
             self.xml = XMLProcessor.escape_xml(xml)
             self.root = etree.fromstring(self.xml)
         self.namespaces = namespaces
 
     def create_root(self, tag_name: str, tag_ns=None, namespaces: dict ={}):
+        from lxml import etree
+
         self.namespaces = {**self.namespaces, **namespaces}
         element_tag_name = self._build_tag(tag_name, tag_ns)
         self.root = etree.Element(element_tag_name, nsmap=self.namespaces)
@@ -30,6 +34,8 @@ class XMLProcessor:
         self.namespaces = namespaces
     
     def create_element_from_xml(self, xml: str, namespaces: dict =None):
+        from lxml import etree
+
         return etree.fromstring(XMLProcessor.escape_xml(xml))
     
     def add_text_to_child(self, child_xpath, text):
@@ -52,6 +58,8 @@ class XMLProcessor:
             self.root.append(new_element)
     
     def add_child(self, child_name, text=None, tag_ns=None, parent_element_path=None):
+        from lxml import etree
+
         tag_name = self._build_tag(child_name, tag_ns)
         new_element = etree.Element(tag_name, nsmap=self.namespaces)
         if text:
@@ -79,19 +87,21 @@ class XMLProcessor:
         return len([el for el in self.root.iterfind(children_name_path, namespaces={**self.namespaces, **namespaces})])
 
     def get_child_xml_processor_by_group_index(self, children_name_path, child_index=0, namespaces={}) -> T:
+        from lxml import etree
+
         children = [el for el in self.root.iterfind(children_name_path, namespaces={**self.namespaces, **namespaces})]
         xml = etree.tostring(children[child_index], xml_declaration=True, encoding='UTF-8')
         return XMLProcessor(xml.decode(), namespaces=self.namespaces)
 
     def get_errors_content(self, error_node_path, namespaces={}) -> list:
         parent_element = self.root.find(error_node_path, namespaces=self.namespaces)
-        if not parent_element:
+        if parent_element is None:
             return []
         return [(int(err.find('.//ar:Code', namespaces=self.namespaces).text), err.find('.//ar:Msg', namespaces=self.namespaces).text) for err in parent_element.findall('.//ar:Err', namespaces=self.namespaces)]
 
     def get_obs_content(self, obs_node_path, namespaces={}) -> list:
         parent_element = self.root.find(obs_node_path, namespaces=self.namespaces)
-        if not parent_element:
+        if parent_element is None:
             return []
         return [(int(err.find('.//ar:Code', namespaces=self.namespaces).text), err.find('.//ar:Msg', namespaces=self.namespaces).text) for err in parent_element.findall('.//ar:Obs', namespaces=self.namespaces)]
 
@@ -102,8 +112,10 @@ class XMLProcessor:
         return self._prettyprint(xml_declaration=True, encoding='UTF-8')
     
     def _prettyprint(self, **kwargs) -> str:
+        from lxml import etree
+
         xml = etree.tostring(self.root, **kwargs)
-        logger.info(xml)
+        logger.debug('%s', xml)
         return xml.decode()
 
     def _build_tag(self, tag_name, tag_ns=None):
@@ -0,0 +1,108 @@
+import time
+from typing import Iterable
+
+from easyAfip.utils.afip_ws_connector import AfipWSConnector
+from easyAfip.utils.param_cache import ParamCache
+from easyAfip.utils.store import BaseStore
+from easyAfip.wsaa import WSAA
+from easyAfip.wsfev import WSFEV
+
+
+class WarmState:
+    """
+        Estado "tibio" de un proceso para arrancar otro sin pagar el arranque en frío: los tickets de acceso
+        (TA) vigentes, las tablas de parámetros cacheadas y la configuración de los conectores.
+
+        Pensado para workers efímeros (AWS Lambda, Cloud Run, etc): un proceso ya autenticado toma un
+        snapshot, lo guarda como JSON (en un archivo, S3, una variable de entorno...) y el worker nuevo lo
+        restaura antes de crear sus clientes, de modo que su primer comprobante no requiere LoginCms ni
+        FEParamGet*. El TA sigue siendo una credencial: el snapshot debe guardarse como un secreto.
+
+            state = WarmState.capture([wsaa], wsfev).to_dict()           # proceso caliente
+            WarmState.from_dict(state).restore()                         # worker nuevo, antes de autenticar
+            wsaa = WSAA(pem, key, 'wsfe', cuit=cuit)
+            ticket = wsaa.get_access_ticket()                            # sin request a WSAA
+
+        La clave del TA incluye el CUIT: si WSAA no lo recibe lo lee del certificado, lo que importa
+        cryptography; para el menor tiempo de arranque pasarlo explícitamente.
+    """
+
+    VERSION = 1
+
+    def __init__(self, tickets: dict = None, params: dict = None, connectors: dict = None):
+        """
+        :param tickets: {ticket store key: TA}
+        :param params: {param cache key: {'expires_at', 'data'}}
+        :param connectors: {service: connector config}, see AfipWSConnector.get_config
+        """
+        self.tickets = tickets or {}
+        self.params = params or {}
+        self.connectors = connectors or {}
+
+    @classmethod
+    def capture(cls, wsaa_clients: Iterable[WSAA] = (), wsfev: WSFEV = None) -> 'WarmState':
+        """
+        Take a snapshot of the state of the given clients. The access tickets are taken with
+        get_access_ticket, so an expired one is renewed before being captured.
+        :param wsaa_clients: The WSAA clients whose tickets are captured
+        :param wsfev: The WSFEV client whose parameter cache is captured
+        :return:
+        """
+        state = cls()
+        for wsaa in wsaa_clients:
+            state.tickets[wsaa.get_ticket_key()] = wsaa.get_access_ticket()
+            state.connectors[wsaa.service] = wsaa.afip_ws_connector.get_config()
+        if wsfev is not None:
+            state.params = wsfev.param_cache.snapshot()
+            state.connectors[wsfev.service] = wsfev.afip_ws_connector.get_config()
+        return state
+
+    def restore(self, ticket_store: BaseStore = None, param_cache: ParamCache = None) -> None:
+        """
+        Load the state in this process: the tickets into the ticket store, the tables into the parameter cache
+        and the connectors as the shared connectors of their endpoints. Call it before creating the clients.
+        Expired tickets are skipped and a ticket only replaces a stored one that expires earlier, so an old
+        snapshot does not overwrite a ticket renewed in the meantime (e.g. by another worker sharing the store).
+        :param ticket_store: The store of the tickets, defaults to WSAA.DEFAULT_TICKET_STORE
+        :param param_cache: The parameter cache, defaults to WSFEV.DEFAULT_PARAM_CACHE
+        :return:
+        """
+        ticket_store = ticket_store if ticket_store is not None else WSAA.DEFAULT_TICKET_STORE
+        now = time.time()
+        for key, ticket in self.tickets.items():
+            expires_at = self._get_expires_at(ticket)
+            if expires_at <= now:
+                continue
+            with ticket_store.lock(key):
+                if self._get_expires_at(ticket_store.get(key)) < expires_at:
+                    ticket_store.set(key, ticket)
+        param_cache = param_cache if param_cache is not None else WSFEV.DEFAULT_PARAM_CACHE
+        param_cache.restore(self.params)
+        for service in self.connectors:
+            self.get_connector(service)
+
+    def get_connector(self, service: str) -> AfipWSConnector:
+        """
+        Get the shared connector of a captured service, e.g. to pass it to clients of a non default endpoint
+        :param service: The service, 'wsaa' or 'wsfev1'
+        :return:
+        """
+        return AfipWSConnector.get_shared(**self.connectors[service])
+
+    def to_dict(self) -> dict:
+        return {'version': self.VERSION, 'tickets': self.tickets, 'params': self.params, 'connectors': self.connectors}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'WarmState':
+        if data.get('version') != cls.VERSION:
+            raise ValueError(f"Unsupported warm state version: {data.get('version')}")
+        return cls(data.get('tickets'), data.get('params'), data.get('connectors'))
+
+    @staticmethod
+    def _get_expires_at(ticket: dict) -> float:
+        # as a timestamp, the expiration times informed by WSAA may be naive or aware
+        expiration_time = WSAA.get_expiration_time(ticket)
+        return expiration_time.timestamp() if expiration_time is not None else 0.0
+
+    def __str__(self):
+        return f"WarmState(tickets={len(self.tickets)}, params={len(self.params)}, connectors={list(self.connectors)})"
@@ -1,11 +1,14 @@
 from datetime import datetime, timedelta
 import random
-import pytz
 import re
+from zoneinfo import ZoneInfo
 
 from easyAfip.wsbase import WSBASE
+from easyAfip.utils import metrics
 from easyAfip.utils.afip_ws_connector import AfipWSConnector
+from easyAfip.utils.credentials import Credential
 from easyAfip.utils.signer import Signer
+from easyAfip.utils.store import BaseStore, MemoryStore, build_key
 from easyAfip.utils.xml_processor import XMLProcessor
 
 
@@ -13,26 +16,106 @@ class WSAA(WSBASE):
     """
         Clase encargada de interactuar con el servicio de autenticación de la AFIP WSAA.
         https://www.afip.gob.ar/ws/WSAA/WSAAmanualDev.pdf
+
+        Los tickets de acceso obtenidos se guardan en un almacenamiento (`ticket_store`) bajo la clave
+        (CUIT, servicio, ambiente) y se reutilizan hasta `refresh_margin` antes de su vencimiento. Por defecto
+        se usa un almacenamiento en memoria compartido por el proceso; para compartir el ticket entre procesos
+        o nodos usar `FileStore` o `SqliteStore` de `easyAfip.utils.store`.
     """
 
+    DEFAULT_TICKET_STORE = MemoryStore()
+    DEFAULT_REFRESH_MARGIN = timedelta(minutes=10)
+    TIMEZONE = ZoneInfo('America/Argentina/Buenos_Aires')
+    SOAP_HEADERS = {"SOAPAction": "urn:LoginCms"}
+
     BASE_TICKET_XML = '''<loginTicketRequest><header><uniqueId>UNIQUE_ID</uniqueId><generationTime>YYYY-mm-ddTHH:mm:ss</generationTime><expirationTime>YYYY-mm-ddTHH:mm:ss</expirationTime></header><service>PUT_SERVICE_HERE</service></loginTicketRequest>'''
     BASE_TA_REQUEST = '''<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns:wsaa="http://wsaa.view.sua.dvadac.desein.afip.gov"><soapenv:Header/><soapenv:Body></soapenv:Body></soapenv:Envelope>'''
 
-    def __init__(self, pem, key, service_to_auth, test_mode=None):
-        super().__init__('wsaa', test_mode=test_mode)
+    def __init__(self, pem, key, service_to_auth, test_mode=None, cuit=None, ticket_store: BaseStore = None,
+                 refresh_margin: timedelta = None, connector: AfipWSConnector = None):
+        super().__init__('wsaa', test_mode=test_mode, connector=connector)
         self.service_to_auth = service_to_auth
         self.pem = pem.encode('utf-8')
         self.key = key.encode('utf-8')
+        self.cuit = cuit
+        self.ticket_store = ticket_store if ticket_store is not None else self.DEFAULT_TICKET_STORE
+        self.refresh_margin = refresh_margin if refresh_margin is not None else self.DEFAULT_REFRESH_MARGIN
+        self.signer = Signer(self.pem, self.key)
+
+    @classmethod
+    def from_credential(cls, credential: Credential, service_to_auth, test_mode=None, **kwargs):
+        """
+        Build a WSAA client for the given credential, reusing its already parsed certificate and key
+        :param credential: The Credential, e.g. taken from a CredentialRegistry
+        :param service_to_auth: The service to authenticate
+        :param test_mode: Use the homologation environment
+        :return: The WSAA client
+        """
+        wsaa = cls(credential.pem.decode('utf-8'), credential.key.decode('utf-8'), service_to_auth,
+                   test_mode=test_mode, cuit=credential.cuit, **kwargs)
+        wsaa.signer = credential.signer
+        return wsaa
 
     
-    def get_access_ticket(self) -> list:
-        xml_ticket = self.get_pre_ticket_xml()
+    def get_access_ticket(self) -> dict:
+        """
+        Get a valid access ticket (TA) for the service. The ticket is taken from the ticket store while it is
+        still valid, otherwise a new one is requested to LoginCms and saved in the store. The refresh is done
+        holding the store lock, so concurrent callers sharing the store make a single request to WSAA.
+        :return: dict with token, sign, generation_time and expiration_time
+        """
+        key = self.get_ticket_key()
+        ticket = self.ticket_store.get(key)
+        if self._is_ticket_fresh(ticket):
+            return ticket
+        with self.ticket_store.lock(key):
+            ticket = self.ticket_store.get(key)
+            if self._is_ticket_fresh(ticket):
+                return ticket
+            ticket = self.request_access_ticket()
+            self.ticket_store.set(key, ticket)
+        return ticket
+
+    def invalidate_access_ticket(self) -> None:
+        """
+        Remove the stored access ticket, forcing the next call to get_access_ticket to request a new one.
+        :return:
+        """
+        self.ticket_store.delete(self.get_ticket_key())
+
+    def get_ticket_key(self) -> str:
+        """
+        Get the key used to store the access ticket: (CUIT, service, environment).
+        If no CUIT was given it is taken from the certificate subject serial number ("CUIT 20123456789").
+        :return:
+        """
+        if not self.cuit:
+            self.cuit = self._get_cert_cuit()
+        return build_key('wsaa', self.cuit, self.service_to_auth, self.environment)
+
+    def request_access_ticket(self) -> dict:
+        """
+        Request a new access ticket to LoginCms, without looking at the ticket store.
+        :return: dict with token, sign, generation_time and expiration_time
+        """
+        with metrics.measure(self.service, 'LoginCms'):
+            ws_wsaa_request = self.build_login_request()
+            result = self.afip_ws_connector.execute_request(ws_wsaa_request, self.SOAP_HEADERS)
+            passport = self.extract_ta(result)
+            return passport
+
+    def build_login_request(self) -> str:
+        """
+        Build the signed LoginCms request for the service
+        :return: The LoginCms SOAP request
+        """
+        request_metrics = metrics.current()
+        with request_metrics.phase('build'):
+            xml_ticket = self.get_pre_ticket_xml()
         xml_ticket_signed = self._sign_ticket(xml_ticket)
-        cleaned_xml_ticket_signed = re.sub(r'-----BEGIN [^-]+-----|-----END [^-]+-----', '', xml_ticket_signed.decode('utf-8'))
-        ws_wsaa_request = self.build_ta_request(cleaned_xml_ticket_signed)
-        result = self.afip_ws_connector.execute_request(ws_wsaa_request, {"SOAPAction": "urn:LoginCms"})
-        passport = self.extract_ta(result)
-        return passport
+        with request_metrics.phase('build'):
+            cleaned_xml_ticket_signed = re.sub(r'-----BEGIN [^-]+-----|-----END [^-]+-----', '', xml_ticket_signed.decode('utf-8'))
+            return self.build_ta_request(cleaned_xml_ticket_signed)
 
     def get_pre_ticket_xml(self):
         xml_processor = XMLProcessor(self.BASE_TICKET_XML)
@@ -51,18 +134,49 @@ class WSAA(WSBASE):
         return ta_rq_processor.get_xml()
 
     def extract_ta(self, response: str) -> dict:
+        with metrics.current().phase('parse'):
+            return self._extract_ta(response)
+
+    def _extract_ta(self, response: str) -> dict:
         xml_processor = XMLProcessor(response, self.WS_NSMAP['wsaa'])
         logincms_content = xml_processor.get_child_text('.//ns:loginCmsReturn', namespaces=self.WS_NSMAP['wsaa'])
         logincms_content = XMLProcessor.escape_xml(logincms_content)
         logincms_content_processor = XMLProcessor(logincms_content, self.WS_NSMAP['wsaa'])
         token = logincms_content_processor.get_child_text('.//token')
         sign = logincms_content_processor.get_child_text('.//sign')
-        return {'token': token, 'sign': sign}
+        generation_time = logincms_content_processor.get_child_text('.//generationTime')
+        expiration_time = logincms_content_processor.get_child_text('.//expirationTime')
+        return {'token': token, 'sign': sign, 'generation_time': generation_time, 'expiration_time': expiration_time}
+
+    @staticmethod
+    def get_expiration_time(ticket: dict):
+        """
+        Get the expiration time of an access ticket
+        :param ticket: The ticket, as returned by get_access_ticket
+        :return: The datetime informed by WSAA, None when there is no ticket
+        """
+        if not ticket or not ticket.get('expiration_time'):
+            return None
+        return datetime.fromisoformat(ticket['expiration_time'])
+
+    def _is_ticket_fresh(self, ticket: dict) -> bool:
+        expiration_time = self.get_expiration_time(ticket)
+        if expiration_time is None:
+            return False
+        now = datetime.now(expiration_time.tzinfo) if expiration_time.tzinfo else datetime.now()
+        return now + self.refresh_margin < expiration_time
+
+    def _get_cert_cuit(self) -> str:
+        from cryptography.x509.oid import NameOID
+
+        serial_numbers = self.signer.certificate.subject.get_attributes_for_oid(NameOID.SERIAL_NUMBER)
+        if not serial_numbers:
+            raise ValueError('The certificate has no CUIT in its subject, pass the cuit to WSAA explicitly')
+        return serial_numbers[0].value.replace('CUIT', '').strip()
 
     
     def _sign_ticket(self, ticket):
-        signer = Signer(self.pem, self.key)
-        return signer.sign_cms(ticket.encode('utf-8'))
+        return self.signer.sign_cms(ticket.encode('utf-8'))
 
 
     def _generate_unique_id(self):
@@ -70,8 +184,7 @@ class WSAA(WSBASE):
 
 
     def _get_ticket_dates(self):
-        argentina_tz = pytz.timezone('America/Argentina/Buenos_Aires')
-        actual_date = datetime.now(argentina_tz)
+        actual_date = datetime.now(self.TIMEZONE)
         fecha_plus_ten_minutes = actual_date + timedelta(minutes=10)
         
         # Formatear las fechas en el formato deseado
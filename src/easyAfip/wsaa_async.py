@@ -0,0 +1,55 @@
+import asyncio
+import threading
+import weakref
+
+from easyAfip.utils import metrics
+from easyAfip.utils.async_afip_ws_connector import AsyncAfipWSConnector
+from easyAfip.wsaa import WSAA
+
+
+class AsyncWSAA(WSAA):
+    """
+        Versión asyncio de WSAA. `get_access_ticket` es una corrutina que usa un transporte HTTP no bloqueante.
+
+        Los tickets se leen y guardan en el mismo `ticket_store` que WSAA. Dentro de un proceso las renovaciones
+        de una misma clave se serializan con un asyncio.Lock (el lock del store es bloqueante y no se toma desde
+        el event loop), por lo que la deduplicación entre procesos queda a cargo de los clientes sincrónicos.
+    """
+
+    CONNECTOR_CLASS = AsyncAfipWSConnector
+
+    _refresh_locks = weakref.WeakKeyDictionary()
+    _refresh_locks_guard = threading.Lock()
+
+    async def get_access_ticket(self) -> dict:
+        """
+        Async version of WSAA.get_access_ticket
+        :return: dict with token, sign, generation_time and expiration_time
+        """
+        key = self.get_ticket_key()
+        ticket = self.ticket_store.get(key)
+        if self._is_ticket_fresh(ticket):
+            return ticket
+        async with self._get_refresh_lock(key):
+            ticket = self.ticket_store.get(key)
+            if self._is_ticket_fresh(ticket):
+                return ticket
+            ticket = await self.request_access_ticket()
+            self.ticket_store.set(key, ticket)
+        return ticket
+
+    async def request_access_ticket(self) -> dict:
+        """
+        Async version of WSAA.request_access_ticket
+        :return: dict with token, sign, generation_time and expiration_time
+        """
+        with metrics.measure(self.service, 'LoginCms'):
+            ws_wsaa_request = self.build_login_request()
+            result = await self.afip_ws_connector.execute_request(ws_wsaa_request, self.SOAP_HEADERS)
+            return self.extract_ta(result)
+
+    def _get_refresh_lock(self, key: str) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        with self._refresh_locks_guard:
+            loop_locks = self._refresh_locks.setdefault(loop, {})
+            return loop_locks.setdefault(key, asyncio.Lock())
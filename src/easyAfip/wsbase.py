@@ -1,6 +1,5 @@
 
 from functools import wraps
-from xml.etree.ElementTree import Element
 from easyAfip.utils.xml_processor import XMLProcessor
 from easyAfip.utils.afip_ws_connector import AfipWSConnector
 
@@ -18,6 +17,10 @@ class WSBASE:
         'wsfev1': {
             'homo': '''https://wswhomo.afip.gov.ar/wsfev1/service.asmx''',
             'prod': '''https://servicios1.afip.gov.ar/wsfev1/service.asmx'''
+        },
+        'ws_sr_constancia_inscripcion': {
+            'homo': '''https://awshomo.afip.gov.ar/sr-padron/webservices/personaServiceA5''',
+            'prod': '''https://aws.afip.gov.ar/sr-padron/webservices/personaServiceA5'''
         }
     }
 
@@ -32,12 +35,19 @@ class WSBASE:
         'xsi': 'http://www.w3.org/2001/XMLSchema-instance',
         'xsd': 'http://www.w3.org/2001/XMLSchema-instance',
         'ar': 'http://ar.gov.afip.dif.FEV1/'
+    },
+    'ws_sr_constancia_inscripcion': {
+        'soapenv': 'http://schemas.xmlsoap.org/soap/envelope/',
+        'a5': 'http://a5.soap.ws.server.puc.sr/'
     }
     }
 
-    def __init__(self, service, test_mode=None) -> None:
-        self.ws_endpoint = self.ENDPOINTS[service]['homo'] if test_mode else self.ENDPOINTS[service]['prod']
-        self.afip_ws_connector = AfipWSConnector(self.ws_endpoint)
+    CONNECTOR_CLASS = AfipWSConnector
+
+    def __init__(self, service, test_mode=None, connector: AfipWSConnector = None) -> None:
+        self.environment = 'homo' if test_mode else 'prod'
+        self.ws_endpoint = self.ENDPOINTS[service][self.environment]
+        self.afip_ws_connector = connector if connector else self.CONNECTOR_CLASS.get_shared(self.ws_endpoint)
         self.service = service
 
 
@@ -1,17 +1,32 @@
 
 import logging
-from typing import List
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from itertools import islice
+from typing import Iterable, Iterator, List, Tuple
 
 from easyAfip.utils.messages import FECompUltimoAutorizadoResponse, WSFEVException, FECompTotXRequestResponse, FECAEDetRequest, \
-    FECAEDetResponse, FECAEResultEnum, FECAESolicitarResult, FEError
+    FECAEDetResponse, FECAEResultEnum, FECAESolicitarResult, FECompConsultarResponse, ParamItem, PtoVenta, \
+    Cotizacion, FECAEADetRequest, FECAEAResponse, FECAEASinMovimientoResponse, to_int
 from easyAfip.wsbase import WSBASE
+from easyAfip.wsfev_base import BaseWSFEV
+from easyAfip.utils import metrics
+from easyAfip.utils.afip_ws_connector import AfipWSConnector
+from easyAfip.utils.columnar import InvoiceColumns, FECAESolicitarColumns
+from easyAfip.utils.param_cache import ParamCache
+from easyAfip.utils.rate_limiter import RateLimiter
+from easyAfip.utils.retry_policy import RetryPolicy
+from easyAfip.utils.sequence_allocator import SequenceAllocator
+from easyAfip.utils.store import build_key
 from easyAfip.utils.xml_processor import XMLProcessor
 
 
 logger = logging.getLogger(__name__)
 
 
-class WSFEV(WSBASE):
+class WSFEV(BaseWSFEV):
     """
         Clase encargada de integrar el servicio de facturacion electronica de la AFIP (WSFEv1).
 
@@ -23,16 +38,52 @@ class WSFEV(WSBASE):
         Al momento de solicitar un Ticket de Acceso por medio del WS de Autenticación y Autorización
         WSAA tener en cuenta que debe enviar el tag service con el valor "wsfe" y que la duración del mismo es de 12 hs.
         Para más información deberá redirigirse a los manuales www.afip.gob.ar/ws.
+
+        Una instancia puede compartirse entre hilos (p. ej. entre los workers de una aplicación WSGI): su
+        configuración (ticket, CUIT, conector, caches, allocator) se fija al crearla y los métodos no la
+        modifican, ni modifican los comprobantes recibidos (la numeración se asigna sobre copias). Al renovar
+        el ticket de acceso se crea una nueva instancia. `submit`/`submit_many` encolan FECAESolicitar en un
+        InvoiceScheduler propio del cliente (`max_workers` requests en curso, de a uno por secuencia de
+        numeración) y devuelven futures:
+
+            wsfev = WSFEV(ticket['token'], ticket['sign'], cuit, max_workers=8)
+            futures = wsfev.submit_many((pto_vta, cbte_tipo, batch) for batch in batches)
+            results = [future.result() for future in futures]
+
+        La numeración automática entre hilos solo es segura a través de `submit`/`submit_many`, que envían de a
+        un request por secuencia. Sin `sequence_allocator` cada fecaesolicitar numera a partir de
+        FECompUltimoAutorizado, y dos llamadas directas concurrentes sobre la misma secuencia obtienen los
+        mismos números (la AFIP rechaza la segunda con el error 10016). Con allocator los números reservados no
+        se repiten, pero los lotes pueden llegar desordenados y la AFIP rechaza con 10016 los que se adelantan.
     """
 
-    BASE_REQUEST = '''<soap:Envelope xmlns:soap="http://www.w3.org/2003/05/soap-envelope" xmlns:ar="http://ar.gov.afip.dif.FEV1/"><soap:Header/><soap:Body></soap:Body></soap:Envelope>'''
+    DEFAULT_PARAM_CACHE = ParamCache()
+    DEFAULT_MAX_WORKERS = 8
 
-    def __init__(self, token, sign, cuit, test_mode=None):
-        super().__init__('wsfev1', test_mode=test_mode)
-        self.token = token
-        self.sign = sign
-        self.cuit = cuit
-    
+    # FEParamGet* de catálogos: método -> tag de cada item dentro de ResultGet
+    PARAM_CATALOGS = {
+        'FEParamGetTiposCbte': 'CbteTipo',
+        'FEParamGetTiposDoc': 'DocTipo',
+        'FEParamGetTiposIva': 'IvaTipo',
+        'FEParamGetTiposMonedas': 'Moneda',
+        'FEParamGetTiposTributos': 'TributoTipo',
+    }
+
+    def __init__(self, token, sign, cuit, test_mode=None, connector: AfipWSConnector = None,
+                 sequence_allocator: SequenceAllocator = None, retry_policy: RetryPolicy = None,
+                 param_cache: ParamCache = None, rate_limiter: RateLimiter = None, max_workers: int = None):
+        """
+        See BaseWSFEV for sequence_allocator, retry_policy and rate_limiter (which also shrinks the batches
+        sent by fecaesolicitar_columns)
+        :param param_cache: Cache of the FEParamGet* tables, defaults to WSFEV.DEFAULT_PARAM_CACHE
+        :param max_workers: Max number of FECAESolicitar in flight for the jobs queued with submit/submit_many
+        """
+        super().__init__(token, sign, cuit, test_mode=test_mode, connector=connector,
+                         sequence_allocator=sequence_allocator, retry_policy=retry_policy, rate_limiter=rate_limiter)
+        self.param_cache = param_cache if param_cache is not None else self.DEFAULT_PARAM_CACHE
+        self.max_workers = max_workers or self.DEFAULT_MAX_WORKERS
+        self._scheduler = None
+        self._scheduler_lock = threading.Lock()
 
     @WSBASE.non_none_nor_zero
     def fecompultimoautorizado(self, pto_vta, ct_tipo) -> FECompUltimoAutorizadoResponse:
@@ -44,15 +95,124 @@ class WSFEV(WSBASE):
         :param ct_tipo: El tipo de comprobante a consultar
         :return:
         """
-        auth_xml_processor = self.build_base_request('FECompUltimoAutorizado')
-        auth_xml_processor.add_child('PtoVta', tag_ns='ar', text= str(pto_vta), parent_element_path='ar:FECompUltimoAutorizado')
-        auth_xml_processor.add_child('CbteTipo', tag_ns='ar', text= str(ct_tipo), parent_element_path='ar:FECompUltimoAutorizado')
-        response_xml_processor = self.execute_request_and_check_response(auth_xml_processor, 'FECompUltimoAutorizado')
-        pto_vta_rs = response_xml_processor.get_child_text('.//ar:PtoVta')
-        ct_tipo_rs = response_xml_processor.get_child_text('.//ar:CbteTipo')
-        nro_cbte = response_xml_processor.get_child_text('.//ar:CbteNro')
-        response = FECompUltimoAutorizadoResponse(pto_vta_rs, ct_tipo_rs, nro_cbte)
-        return response
+        with metrics.measure(self.service, 'FECompUltimoAutorizado'):
+            request_xml_processor = self.build_fecompultimoautorizado_request(pto_vta, ct_tipo)
+            response_xml_processor = self.execute_request_and_check_response(request_xml_processor, 'FECompUltimoAutorizado')
+            return self.parse_fecompultimoautorizado_response(response_xml_processor)
+
+    @WSBASE.non_none_nor_zero
+    def fecompconsultar(self, pto_vta, ct_tipo, cbte_nro) -> FECompConsultarResponse:
+        """
+        Get an already authorized invoice
+        Afip's doc: Permite consultar la información correspondiente a un comprobante ya emitido cuya
+        autorización fue otorgada a través de CAE o CAEA.
+        :param pto_vta: El punto de venta del comprobante
+        :param ct_tipo: El tipo de comprobante
+        :param cbte_nro: El número de comprobante
+        :return: The invoice, or a response with the errors informed by the service (602 when it does not exist)
+        """
+        with metrics.measure(self.service, 'FECompConsultar'):
+            request = self.build_fecompconsultar_request(pto_vta, ct_tipo, cbte_nro)
+            response_xml_processor = self.execute_request_and_check_response(request, 'FECompConsultar')
+            return self.parse_fecompconsultar_response(response_xml_processor)
+
+    def feparamgettiposcbte(self) -> List[ParamItem]:
+        """
+        Get the invoice types (cached)
+        Afip's doc: Recupera el listado de Tipos de Comprobantes utilizables en servicio de autorización.
+        :return:
+        """
+        return self.get_param_catalog('FEParamGetTiposCbte')
+
+    def feparamgettiposdoc(self) -> List[ParamItem]:
+        """
+        Get the document types (cached)
+        Afip's doc: Recupera el listado de Tipos de Documentos utilizables en servicio de autorización.
+        :return:
+        """
+        return self.get_param_catalog('FEParamGetTiposDoc')
+
+    def feparamgettiposiva(self) -> List[ParamItem]:
+        """
+        Get the IVA rates (cached)
+        Afip's doc: Recupera el listado de Tipos de Iva utilizables en servicio de autorización.
+        :return:
+        """
+        return self.get_param_catalog('FEParamGetTiposIva')
+
+    def feparamgettiposmonedas(self) -> List[ParamItem]:
+        """
+        Get the currencies (cached)
+        Afip's doc: Recupera el listado de monedas utilizables en servicio de autorización.
+        :return:
+        """
+        return self.get_param_catalog('FEParamGetTiposMonedas')
+
+    def feparamgettipostributos(self) -> List[ParamItem]:
+        """
+        Get the tax types (cached)
+        Afip's doc: Recupera el listado de los diferente tributos que pueden ser utilizados en el servicio de autorización.
+        :return:
+        """
+        return self.get_param_catalog('FEParamGetTiposTributos')
+
+    def get_param_catalog(self, method_name: str) -> List[ParamItem]:
+        """
+        Get one of the PARAM_CATALOGS tables, from the param cache or from the service when it expired
+        :param method_name: The FEParamGet* method
+        :return:
+        """
+        item_tag = self.PARAM_CATALOGS[method_name]
+        return self.param_cache.get(build_key('param', self.environment, method_name), method_name,
+                                    lambda: self.request_param(method_name, item_tag, ('Id', 'Desc', 'FchDesde', 'FchHasta')),
+                                    lambda rows: [ParamItem(*row) for row in rows])
+
+    def feparamgetptosventa(self) -> List[PtoVenta]:
+        """
+        Get the points of sale of the CUIT (cached)
+        Afip's doc: Recupera el listado de puntos de venta registrados y su estado.
+        :return:
+        """
+        return self.param_cache.get(build_key('param', self.environment, 'FEParamGetPtosVenta', self.cuit),
+                                    'FEParamGetPtosVenta',
+                                    lambda: self.request_param('FEParamGetPtosVenta', 'PtoVenta',
+                                                               ('Nro', 'EmisionTipo', 'Bloqueado', 'FchBaja')),
+                                    lambda rows: [PtoVenta(*row) for row in rows])
+
+    def feparamgetcotizacion(self, mon_id, fch_cotiz=None) -> Cotizacion:
+        """
+        Get the exchange rate of a currency (cached for a few minutes)
+        Afip's doc: Recupera la cotización de la moneda consultada y su fecha.
+        :param mon_id: The currency id, e.g. 'DOL'
+        :param fch_cotiz: Optional date (yyyymmdd), defaults to the last informed rate
+        :return:
+        """
+        return self.param_cache.get(build_key('param', self.environment, 'FEParamGetCotizacion', mon_id, fch_cotiz or ''),
+                                    'FEParamGetCotizacion', lambda: self._request_cotizacion(mon_id, fch_cotiz),
+                                    lambda row: Cotizacion(*row))
+
+    def _request_cotizacion(self, mon_id, fch_cotiz=None) -> list:
+        fields = (('MonId', mon_id), ('FchCotiz', fch_cotiz)) if fch_cotiz else (('MonId', mon_id),)
+        rows = self.request_param('FEParamGetCotizacion', None, ('MonId', 'MonCotiz', 'FchCotiz'), fields=fields)
+        if not rows:
+            raise WSFEVException(f"There is no exchange rate for {mon_id}")
+        return rows[0]
+
+    def request_param(self, method_name: str, item_tag: str, item_fields, fields=()) -> list:
+        """
+        Request a FEParamGet* table to the service, without looking at the param cache
+        :param method_name: The FEParamGet* method
+        :param item_tag: The tag of every item inside ResultGet, None when ResultGet is the only item
+        :param item_fields: The tags of the item fields
+        :param fields: The (tag, text) request fields of the method
+        :return: A list with the field values of every item
+        :raises WSFEVException: If the service informs errors
+        """
+        with metrics.measure(self.service, method_name) as request_metrics:
+            with request_metrics.phase('build'):
+                request = self.serialize_request(method_name, fields=fields)
+            response_xml_processor = self.execute_request_and_check_response(request, method_name)
+            return self.parse_param_response(response_xml_processor, item_tag, item_fields)
 
     def fecomptotxrequest(self) -> FECompTotXRequestResponse:
         """
@@ -61,14 +221,32 @@ class WSFEV(WSBASE):
         FECAESolicitar / FECAEARegInformativo.
         :return:
         """
-        fecomptotxrequest = self.build_base_request('FECompTotXRequest')
-        response_xml_processor = self.execute_request_and_check_response(fecomptotxrequest, 'FECompTotXRequest')
-        reg_x_req = response_xml_processor.get_child_text('.//ar:RegXReq')
-        response = FECompTotXRequestResponse(reg_x_req)
-        return response
+        with metrics.measure(self.service, 'FECompTotXRequest') as request_metrics:
+            with request_metrics.phase('build'):
+                fecomptotxrequest = self.serialize_request('FECompTotXRequest')
+            response_xml_processor = self.execute_request_and_check_response(fecomptotxrequest, 'FECompTotXRequest')
+            return self.parse_fecomptotxrequest_response(response_xml_processor)
+
+    def get_reg_x_req(self) -> int:
+        """
+        Get the maximum number of invoices per FECAESolicitar request. The value is requested to the
+        service with fecomptotxrequest only once per instance.
+        :return:
+        """
+        if self._reg_x_req is None:
+            self._reg_x_req = int(self.fecomptotxrequest().reg_x_req)
+        return self._reg_x_req
 
+    def get_batch_size(self, batch_size: int = None) -> int:
+        """
+        Get the max number of invoices for the next request: batch_size capped by RegXReq and, with a rate
+        limiter, scaled down while the service is under pressure
+        :param batch_size: The requested batch size, defaults to RegXReq
+        :return:
+        """
+        return self.scale_batch_size(batch_size, self.get_reg_x_req())
 
-    def fecaesolicitar(self, pto_vta, ct_tipo, invoices: List[FECAEDetRequest]) -> None:
+    def fecaesolicitar(self, pto_vta, ct_tipo, invoices: List[FECAEDetRequest]) -> FECAESolicitarResult:
         """
         Send the request for create the given invoices for the given point of sale and invoice type
         Afip's doc: El cliente envía la información del comprobante/lote que desea autorizar mediante un requerimiento
@@ -79,164 +257,431 @@ class WSFEV(WSBASE):
                 observaciones, se le asigna el CAE con la fecha de vencimiento,
              No supere alguna de las validaciones excluyentes, el comprobante no es aprobado y la
                 solicitud es rechazada.
-        :param invoices: The invoices to create
+        :param invoices: The invoices to create, the ones without number are numbered on copies (the numbers
+            assigned are informed in the details of the result)
         :param pto_vta: The point of sale to create the invoices
         :param ct_tipo: The invoice type
         :return:
         """
-        fecomptotxrequest = self.build_base_request('FECAESolicitar')
-        fecomptotxrequest.add_child('FeCAEReq', tag_ns='ar', parent_element_path='ar:FECAESolicitar')
-        fecomptotxrequest.add_child('FeCabReq', tag_ns='ar', parent_element_path='.//ar:FeCAEReq')
-        fecomptotxrequest.add_child('PtoVta', tag_ns='ar', text=str(pto_vta), parent_element_path='.//ar:FeCabReq')
-        fecomptotxrequest.add_child('CbteTipo', tag_ns='ar', text=str(ct_tipo), parent_element_path='.//ar:FeCabReq')
-        fecomptotxrequest.add_child('CantReg', tag_ns='ar', text=str(len(invoices)), parent_element_path='.//ar:FeCabReq')
-        fecomptotxrequest.add_child('FeDetReq', tag_ns='ar', parent_element_path='.//ar:FeCAEReq')
-
-        last_comp_rs = self.fecompultimoautorizado(pto_vta, ct_tipo)
-        last_nro_cbte = last_comp_rs.nro_cbte
-
-        for index, invoice in enumerate(invoices):
-            if not invoice.cbte_desde:
-                last_cbte = str(int(last_nro_cbte) + (index + 1))
-                invoice.cbte_desde = last_cbte
-                invoice.cbte_hasta = last_cbte
-            new_node_xml_porcessor = XMLProcessor(namespaces=self.WS_NSMAP['wsfev1'])
-            new_node_xml_porcessor.create_root(tag_name= 'FECAEDetRequest', tag_ns='ar')
-            new_node_xml_porcessor.add_child('Concepto', tag_ns='ar', text=invoice.concepto)
-            new_node_xml_porcessor.add_child('DocTipo', tag_ns='ar', text=invoice.doc_tipo)
-            new_node_xml_porcessor.add_child('CbteDesde', tag_ns='ar', text=invoice.cbte_desde)
-            new_node_xml_porcessor.add_child('CbteHasta', tag_ns='ar', text=invoice.cbte_hasta)
-            new_node_xml_porcessor.add_child('CbteFch', tag_ns='ar', text=invoice.cbte_fch)
-            new_node_xml_porcessor.add_child('ImpTotal', tag_ns='ar', text=invoice.imp_total)
-            new_node_xml_porcessor.add_child('ImpTotConc', tag_ns='ar', text=invoice.imp_tot_conc)
-            new_node_xml_porcessor.add_child('ImpNeto', tag_ns='ar', text=invoice.imp_neto)
-            new_node_xml_porcessor.add_child('ImpOpEx', tag_ns='ar', text=invoice.imp_op_ex)
-            new_node_xml_porcessor.add_child('ImpIVA', tag_ns='ar', text=invoice.imp_iva)
-            new_node_xml_porcessor.add_child('FchServDesde', tag_ns='ar', text=invoice.fch_serv_desde)
-            new_node_xml_porcessor.add_child('FchServHasta', tag_ns='ar', text=invoice.fch_serv_hasta)
-            new_node_xml_porcessor.add_child('FchVtoPago', tag_ns='ar', text=invoice.fch_vto_pago)
-            new_node_xml_porcessor.add_child('MonId', tag_ns='ar', text=invoice.mon_id)
-            new_node_xml_porcessor.add_child('MonCotiz', tag_ns='ar', text=invoice.mon_cotiz)
-            # optionals
-            if invoice.imp_trib:
-                new_node_xml_porcessor.add_child('ImpTrib', tag_ns='ar', text=invoice.imp_trib)
-            if invoice.doc_nro:
-                new_node_xml_porcessor.add_child('DocNro', tag_ns='ar', text=invoice.doc_nro)
-            if invoice.tributos:
-                new_node_xml_porcessor.add_child('Tributos', tag_ns='ar')
-                for tributo in invoice.tributos:
-                    new_node_xml_porcessor.add_child('Id', tag_ns='ar', text=tributo.id,parent_element_path='.//ar:Tributos')
-                    new_node_xml_porcessor.add_child('Desc', tag_ns='ar', text=tributo.desc,parent_element_path='.//ar:Tributos')
-                    new_node_xml_porcessor.add_child('BaseImp', tag_ns='ar', text=tributo.base_imp,parent_element_path='.//ar:Tributos')
-                    new_node_xml_porcessor.add_child('Alic', tag_ns='ar', text=tributo.alic,parent_element_path='.//ar:Tributos')
-                    new_node_xml_porcessor.add_child('Importe', tag_ns='ar', text=tributo.importe,parent_element_path='.//ar:Tributos')
-            if invoice.cbtes_asoc:
-                fecomptotxrequest.add_child('CbtesAsoc', tag_ns='ar')
-                for cbte_asoc in invoice.cbtes_asoc:
-                    new_node_xml_porcessor.add_child('CbteAsoc', tag_ns='ar', parent_element_path='.//ar:CbtesAsoc')
-                    new_node_xml_porcessor.add_child('Tipo', tag_ns='ar', text=cbte_asoc.tipo,parent_element_path='.//ar:CbteAsoc')
-                    new_node_xml_porcessor.add_child('PtoVta', tag_ns='ar', text=cbte_asoc.pto_vta,parent_element_path='.//ar:CbteAsoc')
-                    new_node_xml_porcessor.add_child('Nro', tag_ns='ar', text=cbte_asoc.nro,parent_element_path='.//ar:CbteAsoc')
-            fecomptotxrequest.add_child_from_xml(new_node_xml_porcessor.get_xml(), parent_element_path='.//ar:FeDetReq')
-        
-        response_xml_processor = self.execute_request_and_check_response(fecomptotxrequest, 'FECAESolicitar')
-        errors = self.exctract_errors(response_xml_processor)
-
-        fecaesolicitarresult = FECAESolicitarResult()
-        fecaesolicitarresult.errors = errors
-
-        if response_xml_processor.has_child('.//ar:FeCabResp'):
-            fecaesolicitarresult.cuit = response_xml_processor.get_child_text('.//ar:Cuit', parent_node='.//ar:FeCabResp')
-            fecaesolicitarresult.pto_vta = int(response_xml_processor.get_child_text('.//ar:PtoVta', parent_node='.//ar:FeCabResp'))
-            fecaesolicitarresult.cbte_tipo = int(response_xml_processor.get_child_text('.//ar:CbteTipo', parent_node='.//ar:FeCabResp'))
-            fecaesolicitarresult.fecha_proceso = response_xml_processor.get_child_text('.//ar:FchProceso', parent_node='.//ar:FeCabResp')
-            fecaesolicitarresult.cant_reg = int(response_xml_processor.get_child_text('.//ar:CantReg', parent_node='.//ar:FeCabResp'))
-            fecaesolicitarresult.resultado = FECAEResultEnum.get_by_value(
-                response_xml_processor.get_child_text('.//ar:Resultado', parent_node='.//ar:FeCabResp'))
-            fecaesolicitarresult.reproceso = response_xml_processor.get_child_text('.//ar:Reproceso', parent_node='.//ar:FeCabResp')
-
-            children_nmr = response_xml_processor.get_children_count('.//ar:FECAEDetResponse')
-
-            for child in range(children_nmr):
-                child_xml_processor = response_xml_processor.get_child_xml_processor_by_group_index('.//ar:FECAEDetResponse', child)
-                fecaedetresponse = FECAEDetResponse(
-                    int(child_xml_processor.get_child_text('.//ar:Concepto')),
-                    int(child_xml_processor.get_child_text('.//ar:DocTipo')),
-                    child_xml_processor.get_child_text('.//ar:DocNro'),
-                    int(child_xml_processor.get_child_text('.//ar:CbteDesde')),
-                    int(child_xml_processor.get_child_text('.//ar:CbteHasta')),
-                    child_xml_processor.get_child_text('.//ar:CbteFch'),
-                    FECAEResultEnum.get_by_value(child_xml_processor.get_child_text('.//ar:Resultado')))
-                fecaedetresponse.obs_l = self.exctract_obs(child_xml_processor)
-                fecaesolicitarresult.details.append(fecaedetresponse)
-        return fecaesolicitarresult
-
-
-    def execute_request_and_check_response(self, xml_repr: XMLProcessor, method_name: str) -> XMLProcessor:
+        invoices = self._copy_unnumbered(invoices)
+        auto_numbered = [invoice for invoice in invoices if not invoice.cbte_desde]
+        if auto_numbered:
+            # only the invoices without number take one, reserving more would leave a gap in the sequence
+            self.number_invoices(invoices, self.reserve_numbers(pto_vta, ct_tipo, len(auto_numbered)))
+        with metrics.measure(self.service, 'FECAESolicitar') as request_metrics:
+            if self.retry_policy is None:
+                return self._fecaesolicitar(pto_vta, ct_tipo, invoices, auto_numbered, request_metrics)
+            return self._fecaesolicitar_with_retries(pto_vta, ct_tipo, invoices, auto_numbered, request_metrics)
+
+    def _fecaesolicitar_with_retries(self, pto_vta, ct_tipo, invoices, auto_numbered, request_metrics) -> FECAESolicitarResult:
+        # after a communication error we don't know whether AFIP authorized the invoices, so before sending
+        # them again the authorized ones are looked up and only the missing ones are resubmitted
+        recovered = []
+        pending = invoices
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                if attempt > 1:
+                    granted, pending = self.reconcile(pto_vta, ct_tipo, pending)
+                    recovered.extend(granted)
+                    if not pending:
+                        return self._merge_results(pto_vta, ct_tipo, None, recovered)
+                pending_auto_numbered = [invoice for invoice in auto_numbered if invoice in pending]
+                result = self._fecaesolicitar(pto_vta, ct_tipo, pending, pending_auto_numbered, request_metrics)
+                return self._merge_results(pto_vta, ct_tipo, result, recovered)
+            except Exception as error:
+                if not self.retry_policy.should_retry(error, attempt):
+                    raise
+                delay = self.retry_policy.get_delay(attempt, error)
+                logger.warning('FECAESolicitar attempt %s failed for pto_vta=%s cbte_tipo=%s (%s), reconciling and '
+                               'retrying in %.2fs', attempt, pto_vta, ct_tipo, error, delay)
+                request_metrics.retries += 1
+                time.sleep(delay)
+
+    def reconcile(self, pto_vta, ct_tipo, invoices: List[FECAEDetRequest]) -> Tuple[List[FECAEDetResponse], List[FECAEDetRequest]]:
         """
-        This method will execute the request to AFIP WS and check the response
-        :param xml_repr: XMLProcessor object with the request to AFIP WS
-        :param method_name: The name of the method to execute
-        :return: XMLProcessor object with the response from AFIP WS
+        Find out which of the given (already numbered) invoices were authorized, e.g. after a FECAESolicitar
+        whose response was lost. Only the numbers up to the last authorized one are looked up with FECompConsultar.
+        :param pto_vta: The point of sale of the invoices
+        :param ct_tipo: The invoice type
+        :param invoices: The numbered invoices
+        :return: (the FECAEDetResponse of the authorized invoices, the invoices still to be authorized)
+        :raises WSFEVException: If a number was authorized for a different invoice
         """
-        logger.info('Request to AFIP WS: %s', xml_repr.get_xml())
-        result = self.afip_ws_connector.execute_request(xml_repr.get_xml(), {"SOAPAction": f'http://ar.gov.afip.dif.FEV1/{method_name}'})
-        logger.info('Response from AFIP WS: %s', result)
-        auth_response_xml_processor = XMLProcessor(result, self.WS_NSMAP['wsfev1'])
-        # self.check_response(auth_response_xml_processor)
-        return auth_response_xml_processor
+        last_nro_cbte = int(self.fecompultimoautorizado(pto_vta, ct_tipo).nro_cbte)
+        granted, missing = [], []
+        for invoice in invoices:
+            if int(invoice.cbte_desde) > last_nro_cbte:
+                missing.append(invoice)
+                continue
+            consulted = self.fecompconsultar(pto_vta, ct_tipo, invoice.cbte_desde)
+            granted.append(self.check_reconciled(pto_vta, ct_tipo, invoice, consulted))
+        if granted:
+            logger.info('%s of %s invoices were already authorized for pto_vta=%s cbte_tipo=%s',
+                        len(granted), len(invoices), pto_vta, ct_tipo)
+        return granted, missing
 
+    def _fecaesolicitar(self, pto_vta, ct_tipo, invoices, auto_numbered, request_metrics) -> FECAESolicitarResult:
+        fecomptotxrequest = self.build_fecaesolicitar_request(pto_vta, ct_tipo, invoices)
+        response = self.execute_raw_request(fecomptotxrequest, 'FECAESolicitar')
+        result = self.parse_fecaesolicitar_response(response)
+        self._check_overload(result.errors)
+        if self.sequence_allocator and self._has_numbering_error(result):
+            # the local sequence was out of sync with AFIP: reseed it and, if nothing was authorized, retry once
+            self.reset_numbers(pto_vta, ct_tipo)
+            if auto_numbered and not any(detail.resultado == FECAEResultEnum.APROBADO for detail in result.details):
+                logger.warning('Invoice numbering rejected for pto_vta=%s cbte_tipo=%s, retrying with reseeded numbers',
+                               pto_vta, ct_tipo)
+                request_metrics.retries += 1
+                for invoice in auto_numbered:
+                    invoice.cbte_desde = invoice.cbte_hasta = None
+                self.number_invoices(invoices, self.reserve_numbers(pto_vta, ct_tipo, len(auto_numbered)))
+                fecomptotxrequest = self.build_fecaesolicitar_request(pto_vta, ct_tipo, invoices)
+                response = self.execute_raw_request(fecomptotxrequest, 'FECAESolicitar')
+                result = self.parse_fecaesolicitar_response(response)
+        return result
 
-    def build_base_request(self, method_name: str) -> XMLProcessor:
+    def reserve_numbers(self, pto_vta, ct_tipo, count: int, after=None) -> int:
         """
-        Build the base request with the main node for the required method and the auth node
-        :param method_name: The name of the method to execute
-        :return: XMLProcessor object with the base request
+        Reserve `count` invoice numbers for the given point of sale and invoice type.
+        With a sequence allocator the numbers are taken from it, otherwise they follow `after` or, when not
+        given, the last authorized number informed by FECompUltimoAutorizado.
+        :param pto_vta: The point of sale
+        :param ct_tipo: The invoice type
+        :param count: How many numbers to reserve
+        :param after: The last number already used by the caller, if known
+        :return: The number previous to the first reserved one
         """
-        auth_xml_processor = XMLProcessor(self.BASE_REQUEST, namespaces=self.WS_NSMAP['wsfev1'])
-        auth_xml_processor.add_child(method_name, tag_ns='ar')
-        auth_node = super().get_auth_node(self.cuit, self.token, self.sign)
-        auth_xml_processor.add_child_from_xml(auth_node, parent_element_path=f'ar:{method_name}')
-        return auth_xml_processor
-    
+        if self.sequence_allocator:
+            return self.sequence_allocator.allocate(self.get_sequence_key(pto_vta, ct_tipo), count,
+                                                    seed=lambda: self.fecompultimoautorizado(pto_vta, ct_tipo).nro_cbte)
+        if after is not None:
+            return int(after)
+        return int(self.fecompultimoautorizado(pto_vta, ct_tipo).nro_cbte)
 
-# TODO eliminar esto y crear una clase que lo represente, y cuando ocurra un error, inicializar dicha clase y retornar los errores del servicio.
-    def check_response(self, xml_repr_rs: XMLProcessor) -> None:
+    def reset_numbers(self, pto_vta, ct_tipo) -> None:
         """
-        This method will check the response from AFIP WS and raise an exception if the response is an error
-        :param xml_repr_rs: XMLProcessor object with the response from AFIP WS
+        Discard the local numbering state of the given point of sale and invoice type, if any
+        :param pto_vta: The point of sale
+        :param ct_tipo: The invoice type
         :return:
         """
-        errors = xml_repr_rs.get_errors_content('.//ar:Errors')
-        if errors:
-            # agregar codigo de error
-            logger.error('Error Response from AFIP WS: %s', errors)
-            raise WSFEVException(f"There are errors in the process.", errors)
+        if self.sequence_allocator:
+            self.sequence_allocator.reset(self.get_sequence_key(pto_vta, ct_tipo))
+
+    def fecaesolicitar_stream(self, pto_vta, ct_tipo, invoices: Iterable[FECAEDetRequest],
+                              batch_size: int = None) -> Iterator[FECAESolicitarResult]:
+        """
+        Send the given invoices in consecutive FECAESolicitar requests of at most RegXReq invoices each,
+        yielding the result of every batch as soon as it is processed. The invoices are consumed lazily,
+        so any iterable (even a generator over a huge export) can be used with bounded memory.
+        While a batch is in flight the request of the next one is built with the numbers that follow it;
+        if the batch is not fully approved the next batch is renumbered from FECompUltimoAutorizado (or from
+        the sequence allocator, when the client has one).
+        :param pto_vta: The point of sale to create the invoices
+        :param ct_tipo: The invoice type
+        :param invoices: Iterable with the invoices to create
+        :param batch_size: Max invoices per request, defaults to the RegXReq informed by the service
+        :return: Iterator of FECAESolicitarResult, one per batch
+        """
+        invoices = iter(invoices)
+        batch = list(islice(invoices, self.get_batch_size(batch_size)))
+        if not batch:
+            return
+        last_nro_cbte = self._reserve_numbers_for(pto_vta, ct_tipo, batch)
+        # every batch has its own metrics, activated explicitly since batches overlap in time
+        batch_metrics = metrics.start(self.service, 'FECAESolicitar')
+        with batch_metrics.activate():
+            request, batch, _ = self._build_stream_batch(pto_vta, ct_tipo, batch, last_nro_cbte)
+        # whether numbers were reserved for a batch that was not sent yet
+        reserved_ahead = False
+        try:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                while batch:
+                    future = executor.submit(batch_metrics.run, self.execute_raw_request, request, 'FECAESolicitar')
+                    reserved_ahead = False
+                    next_batch = list(islice(invoices, self.get_batch_size(batch_size)))
+                    if next_batch:
+                        next_last_nro_cbte = self._reserve_numbers_for(pto_vta, ct_tipo, next_batch,
+                                                                       after=self._last_number(batch))
+                        reserved_ahead = next_last_nro_cbte is not None
+                        next_metrics = metrics.start(self.service, 'FECAESolicitar')
+                        with next_metrics.activate():
+                            next_request, next_batch, next_auto_numbered = self._build_stream_batch(
+                                pto_vta, ct_tipo, next_batch, next_last_nro_cbte)
+                    try:
+                        response = future.result()
+                    except BaseException as error:
+                        batch_metrics.finish(error)
+                        raise
+                    with batch_metrics.activate():
+                        result = self.parse_fecaesolicitar_response(response)
+                    batch_metrics.finish()
+                    self._check_overload(result.errors)
+                    if next_batch and not self._is_fully_approved(result):
+                        for invoice in next_auto_numbered:
+                            invoice.cbte_desde = invoice.cbte_hasta = None
+                        self.reset_numbers(pto_vta, ct_tipo)
+                        last_nro_cbte = self._reserve_numbers_for(pto_vta, ct_tipo, next_batch)
+                        reserved_ahead = last_nro_cbte is not None
+                        with next_metrics.activate():
+                            next_request, next_batch, next_auto_numbered = self._build_stream_batch(
+                                pto_vta, ct_tipo, next_batch, last_nro_cbte)
+                    yield result
+                    if not next_batch:
+                        break
+                    batch, request, batch_metrics = next_batch, next_request, next_metrics
+        except BaseException:
+            # the batch in flight failed or the caller stopped iterating: the numbers reserved for the next
+            # batch will not be sent, so the local sequence is reseeded instead of staying ahead of AFIP
+            if reserved_ahead:
+                self.reset_numbers(pto_vta, ct_tipo)
+            raise
+
+    def _reserve_numbers_for(self, pto_vta, ct_tipo, invoices: List[FECAEDetRequest], after=None):
+        # only the invoices without number take one: reserving more would leave a gap in the sequence
+        count = sum(1 for invoice in invoices if not invoice.cbte_desde)
+        return self.reserve_numbers(pto_vta, ct_tipo, count, after=after) if count else None
+
+    def fecaesolicitar_columns(self, pto_vta, ct_tipo, columns, batch_size: int = None) -> FECAESolicitarColumns:
+        """
+        Send invoices given in columnar form (see InvoiceColumns) in consecutive FECAESolicitar requests of at
+        most RegXReq invoices, serializing every batch straight from the columns.
+        When the columns have no cbte_desde/cbte_hasta the invoices are numbered following the last authorized
+        number; if a batch is not fully approved the numbering of the next one is requested again.
+        :param pto_vta: The point of sale to create the invoices
+        :param ct_tipo: The invoice type
+        :param columns: An InvoiceColumns, or an iterable of them (e.g. InvoiceColumns.iter_csv)
+        :param batch_size: Max invoices per request, defaults to the RegXReq informed by the service
+        :return: The results of every invoice, in columnar form and in the same order
+        """
+        result = FECAESolicitarColumns()
+        after = None
+        for chunk in ([columns] if isinstance(columns, InvoiceColumns) else columns):
+            start = 0
+            while start < len(chunk):
+                batch = chunk.slice(start, start + self.get_batch_size(batch_size))
+                start += len(batch)
+                numbers = None
+                if not batch.has('cbte_desde'):
+                    last_nro_cbte = self.reserve_numbers(pto_vta, ct_tipo, len(batch), after=after)
+                    numbers = list(range(last_nro_cbte + 1, last_nro_cbte + 1 + len(batch)))
+                with metrics.measure(self.service, 'FECAESolicitar') as request_metrics:
+                    with request_metrics.phase('build'):
+                        request = self.serialize_request('FECAESolicitar', body_parts=self.SERIALIZER.fecaesolicitar_body_columns(
+                            pto_vta, ct_tipo, batch, numbers))
+                    response = self.execute_raw_request(request, 'FECAESolicitar')
+                    with request_metrics.phase('parse'):
+                        batch_result = self.RESPONSE_PARSER.parse_columns(response)
+                    self._check_overload(batch_result.errors)
+                result.extend(batch_result)
+                if numbers and batch_result.is_fully_approved():
+                    after = numbers[-1]
+                else:
+                    after = None
+                    self.reset_numbers(pto_vta, ct_tipo)
+        return result
+
+    def submit(self, pto_vta, ct_tipo, invoices: List[FECAEDetRequest]) -> Future:
+        """
+        Queue a FECAESolicitar in the InvoiceScheduler of the client. The requests of a sequence (point of sale
+        and invoice type) are sent in order and one at a time, the ones of different sequences in parallel, up
+        to max_workers.
+        :param pto_vta: The point of sale
+        :param ct_tipo: The invoice type
+        :param invoices: The invoices to create
+        :return: Future with the FECAESolicitarResult
+        """
+        return self._get_scheduler().submit(pto_vta, ct_tipo, invoices)
+
+    def submit_many(self, work_items: Iterable[Tuple]) -> List[Future]:
+        """
+        Queue many (pto_vta, cbte_tipo, invoices) work items
+        :param work_items: Iterable of work items
+        :return: The futures, in the same order as the work items
+        """
+        return self._get_scheduler().submit_many(work_items)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stop the scheduler of submit/submit_many, if it was started. With wait the queued requests are sent
+        before returning, otherwise they are cancelled.
+        """
+        with self._scheduler_lock:
+            scheduler, self._scheduler = self._scheduler, None
+        if scheduler is not None:
+            scheduler.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def _get_scheduler(self):
+        # started on the first submit, the clients that only send requests inline don't start any thread
+        from easyAfip.invoice_scheduler import InvoiceScheduler  # it imports this module
+
+        with self._scheduler_lock:
+            if self._scheduler is None:
+                self._scheduler = InvoiceScheduler(self, max_workers=self.max_workers)
+            return self._scheduler
+
+    @WSBASE.non_none_nor_zero
+    def fecaeasolicitar(self, periodo, orden) -> FECAEAResponse:
+        """
+        Request the CAEA of a fortnight
+        Afip's doc: Solicitud de Código de Autorización Electrónico Anticipado (CAEA). Se puede solicitar dentro de
+        los 5 días corridos anteriores al comienzo de cada quincena y durante la misma.
+        :param periodo: The period, yyyymm
+        :param orden: The fortnight, 1 (days 1 to 15) or 2 (from day 16 to the end of the month)
+        :return: The CAEA, or a response with the errors informed by the service
+        """
+        with metrics.measure(self.service, 'FECAEASolicitar'):
+            request = self.build_fecaea_request('FECAEASolicitar', periodo, orden)
+            response_xml_processor = self.execute_request_and_check_response(request, 'FECAEASolicitar')
+            return self.parse_fecaea_response(response_xml_processor)
+
+    @WSBASE.non_none_nor_zero
+    def fecaeaconsultar(self, periodo, orden) -> FECAEAResponse:
+        """
+        Get a CAEA already granted
+        Afip's doc: Consulta de un CAEA otorgado previamente para el período y la quincena indicados.
+        :param periodo: The period, yyyymm
+        :param orden: The fortnight, 1 or 2
+        :return: The CAEA, or a response with the errors informed by the service
+        """
+        with metrics.measure(self.service, 'FECAEAConsultar'):
+            request = self.build_fecaea_request('FECAEAConsultar', periodo, orden)
+            response_xml_processor = self.execute_request_and_check_response(request, 'FECAEAConsultar')
+            return self.parse_fecaea_response(response_xml_processor)
+
+    def fecaeareginformativo(self, pto_vta, ct_tipo, invoices: List[FECAEADetRequest]) -> FECAESolicitarResult:
+        """
+        Inform invoices issued with a CAEA, in a single request of at most RegXReq invoices
+        Afip's doc: Rendición de los comprobantes emitidos con CAEA. Los comprobantes se informan con el CAEA
+        asignado y, como en FECAESolicitar, se aprueban o rechazan individualmente.
+        :param pto_vta: The point of sale of the invoices
+        :param ct_tipo: The invoice type
+        :param invoices: The numbered invoices, with their CAEA
+        :return: The result, the cae of every detail holds the informed CAEA
+        """
+        with metrics.measure(self.service, 'FECAEARegInformativo') as request_metrics:
+            with request_metrics.phase('build'):
+                request = self.serialize_request('FECAEARegInformativo', body_parts=self.SERIALIZER.fecaeareginformativo_body(
+                    pto_vta, ct_tipo, invoices))
+            response = self.execute_raw_request(request, 'FECAEARegInformativo')
+            with request_metrics.phase('parse'):
+                return self.CAEA_RESPONSE_PARSER.parse(response)
+
+    def fecaeareginformativo_stream(self, pto_vta, ct_tipo, invoices: Iterable[FECAEADetRequest],
+                                    batch_size: int = None) -> Iterator[FECAESolicitarResult]:
+        """
+        Inform invoices issued with a CAEA in consecutive FECAEARegInformativo requests of at most RegXReq
+        invoices each. The invoices are consumed lazily, one batch at a time.
+        :param pto_vta: The point of sale of the invoices
+        :param ct_tipo: The invoice type
+        :param invoices: Iterable with the numbered invoices, with their CAEA
+        :param batch_size: Max invoices per request, defaults to the RegXReq informed by the service
+        :return: Iterator of FECAESolicitarResult, one per batch
+        """
+        invoices = iter(invoices)
+        while True:
+            batch = list(islice(invoices, self.get_batch_size(batch_size)))
+            if not batch:
+                return
+            yield self.fecaeareginformativo(pto_vta, ct_tipo, batch)
 
-    def exctract_errors(self, xml_repr_rs: XMLProcessor) -> list:
+    @WSBASE.non_none_nor_zero
+    def fecaeasinmovimientoinformar(self, pto_vta, caea) -> FECAEASinMovimientoResponse:
         """
-        This method will check the response from AFIP WS and raise an exception if the response is an error
-        :param xml_repr_rs: XMLProcessor object with the response from AFIP WS
+        Inform that no invoices were issued with a CAEA in a point of sale
+        Afip's doc: Informa que un CAEA otorgado no ha tenido movimiento en el punto de venta indicado.
+        :param pto_vta: The point of sale
+        :param caea: The CAEA
         :return:
         """
-        errors = xml_repr_rs.get_errors_content('.//ar:Errors')
-        errors_list = []
-        for error in errors:
-            feerror = FEError(error[0], error[1])
-            errors_list.append(feerror)
-        return errors_list
-    
-    def exctract_obs(self, xml_repr_rs: XMLProcessor) -> list:
+        return self._fecaeasinmovimiento('FECAEASinMovimientoInformar', pto_vta, caea)
+
+    @WSBASE.non_none_nor_zero
+    def fecaeasinmovimientoconsultar(self, pto_vta, caea) -> FECAEASinMovimientoResponse:
         """
-        This method will check the response from AFIP WS and raise an exception if the response is an error
-        :param xml_repr_rs: XMLProcessor object with the response from AFIP WS
+        Check whether a CAEA was informed without movement in a point of sale
+        :param pto_vta: The point of sale
+        :param caea: The CAEA
         :return:
         """
-        obs_l = xml_repr_rs.get_obs_content('.//ar:Observaciones')
-        if not obs_l:
-            return []
-        obs_error_list = []
-        for obs in obs_l:
-            obs_error = FEError(obs[0], obs[1])
-            obs_error_list.append(obs_error)
-        return obs_error_list
+        return self._fecaeasinmovimiento('FECAEASinMovimientoConsultar', pto_vta, caea)
+
+    def _fecaeasinmovimiento(self, method_name: str, pto_vta, caea) -> FECAEASinMovimientoResponse:
+        with metrics.measure(self.service, method_name) as request_metrics:
+            with request_metrics.phase('build'):
+                request = self.serialize_request(method_name, fields=(('PtoVta', pto_vta), ('CAEA', caea)))
+            response_xml_processor = self.execute_request_and_check_response(request, method_name)
+            response = FECAEASinMovimientoResponse()
+            response.errors = self.exctract_errors(response_xml_processor)
+            # FECAEASinMovimientoInformar answers with the fields in the result node and FECAEASinMovimientoConsultar
+            # inside ResultGet/FECAEASinMov
+            text = lambda tag: response_xml_processor.get_child_text(f'.//ar:{tag}')
+            if text('CAEA'):
+                response.caea = text('CAEA')
+                response.pto_vta = to_int(text('PtoVta'))
+                response.fch_proceso = text('FchProceso')
+                resultado = text('Resultado')
+                response.resultado = FECAEResultEnum.get_by_value(resultado) if resultado else None
+            return response
+
+    def execute_request_and_check_response(self, xml_repr, method_name: str) -> XMLProcessor:
+        """
+        This method will execute the request to AFIP WS and check the response
+        :param xml_repr: The serialized request or an XMLProcessor object with the request to AFIP WS
+        :param method_name: The name of the method to execute
+        :return: XMLProcessor object with the response from AFIP WS
+        """
+        request = xml_repr.get_xml() if isinstance(xml_repr, XMLProcessor) else xml_repr
+        logger.info('Request to AFIP WS: %s', request)
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                with self.acquire_slot():
+                    result = self.afip_ws_connector.execute_request(request, self.get_soap_headers(method_name))
+                break
+            except Exception as error:
+                # queries and CAEA requests can be sent again as they are, with no need to reconcile
+                if self.retry_policy is None or not self.retry_policy.should_retry(error, attempt):
+                    raise
+                delay = self.retry_policy.get_delay(attempt, error)
+                logger.warning('%s attempt %s failed (%s), retrying in %.2fs', method_name, attempt, error, delay)
+                metrics.current().retries += 1
+                time.sleep(delay)
+        logger.info('Response from AFIP WS: %s', result)
+        with metrics.current().phase('parse'):
+            auth_response_xml_processor = XMLProcessor(result, self.WS_NSMAP['wsfev1'])
+        # self.check_response(auth_response_xml_processor)
+        return auth_response_xml_processor
+
+    def execute_raw_request(self, request, method_name: str) -> bytes:
+        """
+        Execute the request to AFIP WS and return the undecoded response, to be parsed directly from bytes
+        :param request: The serialized request
+        :param method_name: The name of the method to execute
+        :return: The response body
+        """
+        logger.info('Request to AFIP WS: %s', request)
+        with self.acquire_slot():
+            result = self.afip_ws_connector.execute_request_raw(request, self.get_soap_headers(method_name))
+        logger.info('Response from AFIP WS: %s', result)
+        return result
+
+    def acquire_slot(self):
+        """
+        Wait for a slot of the rate limiter to send a request to the service
+        :return: A context manager releasing the slot with the outcome of the request
+        :raises RateLimitError: If the limiter did not grant a slot within its timeout
+        """
+        if self.rate_limiter is None:
+            return nullcontext()
+        with metrics.current().phase('throttle'):
+            return self.rate_limiter.acquire(self.ws_endpoint, self.cuit)
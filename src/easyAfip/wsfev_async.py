@@ -0,0 +1,303 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from itertools import islice
+from typing import AsyncIterator, Iterable, List, Tuple
+
+from easyAfip.utils import metrics
+from easyAfip.utils.async_afip_ws_connector import AsyncAfipWSConnector
+from easyAfip.utils.messages import FECompUltimoAutorizadoResponse, FECompTotXRequestResponse, FECAEDetRequest, \
+    FECAEDetResponse, FECAESolicitarResult, FECompConsultarResponse, FECAEResultEnum
+from easyAfip.utils.rate_limiter import RateLimiter
+from easyAfip.utils.retry_policy import RetryPolicy
+from easyAfip.utils.sequence_allocator import SequenceAllocator
+from easyAfip.utils.xml_processor import XMLProcessor
+from easyAfip.wsbase import WSBASE
+from easyAfip.wsfev_base import BaseWSFEV
+
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncWSFEV(BaseWSFEV):
+    """
+        Versión asyncio de WSFEV. Los métodos que consumen el WS son corrutinas y usan un transporte HTTP
+        no bloqueante (aiohttp); la construcción de los requests y el parseo de las respuestas son los de
+        BaseWSFEV, compartidos con WSFEV.
+
+        Soporta FECompUltimoAutorizado, FECompConsultar, FECompTotXRequest y FECAESolicitar (también en
+        lotes con `fecaesolicitar_stream`, un generador asíncrono) con la misma configuración que WSFEV:
+        numeración local con un `SequenceAllocator`, reintentos con reconciliación según `retry_policy` y
+        `rate_limiter`. Los FEParamGet*, CAEA, columnas y submit solo existen en WSFEV; para ellos usar un
+        WSFEV, por ejemplo con asyncio.to_thread.
+    """
+
+    CONNECTOR_CLASS = AsyncAfipWSConnector
+
+    def __init__(self, token, sign, cuit, test_mode=None, connector: AsyncAfipWSConnector = None,
+                 sequence_allocator: SequenceAllocator = None, retry_policy: RetryPolicy = None,
+                 rate_limiter: RateLimiter = None):
+        """
+        See BaseWSFEV for sequence_allocator, retry_policy and rate_limiter. The allocator and the limiter
+        keep their state in a store with blocking locks, they are called from a thread
+        """
+        super().__init__(token, sign, cuit, test_mode=test_mode, connector=connector,
+                         sequence_allocator=sequence_allocator, retry_policy=retry_policy, rate_limiter=rate_limiter)
+
+    @WSBASE.non_none_nor_zero
+    async def fecompultimoautorizado(self, pto_vta, ct_tipo) -> FECompUltimoAutorizadoResponse:
+        """
+        Async version of WSFEV.fecompultimoautorizado
+        :param pto_vta: El punto de venta a consultar
+        :param ct_tipo: El tipo de comprobante a consultar
+        :return:
+        """
+        with metrics.measure(self.service, 'FECompUltimoAutorizado'):
+            request_xml_processor = self.build_fecompultimoautorizado_request(pto_vta, ct_tipo)
+            response_xml_processor = await self.execute_request_and_check_response(request_xml_processor, 'FECompUltimoAutorizado')
+            return self.parse_fecompultimoautorizado_response(response_xml_processor)
+
+    @WSBASE.non_none_nor_zero
+    async def fecompconsultar(self, pto_vta, ct_tipo, cbte_nro) -> FECompConsultarResponse:
+        """
+        Async version of WSFEV.fecompconsultar
+        :param pto_vta: El punto de venta del comprobante
+        :param ct_tipo: El tipo de comprobante
+        :param cbte_nro: El número de comprobante
+        :return:
+        """
+        with metrics.measure(self.service, 'FECompConsultar'):
+            request = self.build_fecompconsultar_request(pto_vta, ct_tipo, cbte_nro)
+            response_xml_processor = await self.execute_request_and_check_response(request, 'FECompConsultar')
+            return self.parse_fecompconsultar_response(response_xml_processor)
+
+    async def fecomptotxrequest(self) -> FECompTotXRequestResponse:
+        """
+        Async version of WSFEV.fecomptotxrequest
+        :return:
+        """
+        with metrics.measure(self.service, 'FECompTotXRequest') as request_metrics:
+            with request_metrics.phase('build'):
+                fecomptotxrequest = self.serialize_request('FECompTotXRequest')
+            response_xml_processor = await self.execute_request_and_check_response(fecomptotxrequest, 'FECompTotXRequest')
+            return self.parse_fecomptotxrequest_response(response_xml_processor)
+
+    async def get_reg_x_req(self) -> int:
+        """
+        Async version of WSFEV.get_reg_x_req
+        :return:
+        """
+        if self._reg_x_req is None:
+            self._reg_x_req = int((await self.fecomptotxrequest()).reg_x_req)
+        return self._reg_x_req
+
+    async def get_batch_size(self, batch_size: int = None) -> int:
+        """
+        Async version of WSFEV.get_batch_size
+        :param batch_size: The requested batch size, defaults to RegXReq
+        :return:
+        """
+        return self.scale_batch_size(batch_size, await self.get_reg_x_req())
+
+    async def fecaesolicitar(self, pto_vta, ct_tipo, invoices: List[FECAEDetRequest]) -> FECAESolicitarResult:
+        """
+        Async version of WSFEV.fecaesolicitar
+        :param invoices: The invoices to create, the ones without number are numbered on copies
+        :param pto_vta: The point of sale to create the invoices
+        :param ct_tipo: The invoice type
+        :return:
+        """
+        invoices = self._copy_unnumbered(invoices)
+        auto_numbered = [invoice for invoice in invoices if not invoice.cbte_desde]
+        if auto_numbered:
+            self.number_invoices(invoices, await self.reserve_numbers(pto_vta, ct_tipo, len(auto_numbered)))
+        with metrics.measure(self.service, 'FECAESolicitar') as request_metrics:
+            if self.retry_policy is None:
+                return await self._fecaesolicitar(pto_vta, ct_tipo, invoices, auto_numbered, request_metrics)
+            return await self._fecaesolicitar_with_retries(pto_vta, ct_tipo, invoices, auto_numbered, request_metrics)
+
+    async def _fecaesolicitar_with_retries(self, pto_vta, ct_tipo, invoices, auto_numbered, request_metrics) -> FECAESolicitarResult:
+        # as in WSFEV, the invoices authorized by a failed attempt are looked up and only the missing ones resent
+        recovered = []
+        pending = invoices
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                if attempt > 1:
+                    granted, pending = await self.reconcile(pto_vta, ct_tipo, pending)
+                    recovered.extend(granted)
+                    if not pending:
+                        return self._merge_results(pto_vta, ct_tipo, None, recovered)
+                pending_auto_numbered = [invoice for invoice in auto_numbered if invoice in pending]
+                result = await self._fecaesolicitar(pto_vta, ct_tipo, pending, pending_auto_numbered, request_metrics)
+                return self._merge_results(pto_vta, ct_tipo, result, recovered)
+            except Exception as error:
+                if not self.retry_policy.should_retry(error, attempt):
+                    raise
+                delay = self.retry_policy.get_delay(attempt, error)
+                logger.warning('FECAESolicitar attempt %s failed for pto_vta=%s cbte_tipo=%s (%s), reconciling and '
+                               'retrying in %.2fs', attempt, pto_vta, ct_tipo, error, delay)
+                request_metrics.retries += 1
+                await asyncio.sleep(delay)
+
+    async def reconcile(self, pto_vta, ct_tipo, invoices: List[FECAEDetRequest]) -> Tuple[List[FECAEDetResponse], List[FECAEDetRequest]]:
+        """
+        Async version of WSFEV.reconcile
+        :param pto_vta: The point of sale of the invoices
+        :param ct_tipo: The invoice type
+        :param invoices: The numbered invoices
+        :return: (the FECAEDetResponse of the authorized invoices, the invoices still to be authorized)
+        :raises WSFEVException: If a number was authorized for a different invoice
+        """
+        last_nro_cbte = int((await self.fecompultimoautorizado(pto_vta, ct_tipo)).nro_cbte)
+        granted, missing = [], []
+        for invoice in invoices:
+            if int(invoice.cbte_desde) > last_nro_cbte:
+                missing.append(invoice)
+                continue
+            consulted = await self.fecompconsultar(pto_vta, ct_tipo, invoice.cbte_desde)
+            granted.append(self.check_reconciled(pto_vta, ct_tipo, invoice, consulted))
+        if granted:
+            logger.info('%s of %s invoices were already authorized for pto_vta=%s cbte_tipo=%s',
+                        len(granted), len(invoices), pto_vta, ct_tipo)
+        return granted, missing
+
+    async def _fecaesolicitar(self, pto_vta, ct_tipo, invoices, auto_numbered, request_metrics) -> FECAESolicitarResult:
+        result = await self._send_fecaesolicitar(pto_vta, ct_tipo, invoices)
+        if self.sequence_allocator and self._has_numbering_error(result):
+            # the local sequence was out of sync with AFIP: reseed it and, if nothing was authorized, retry once
+            await self.reset_numbers(pto_vta, ct_tipo)
+            if auto_numbered and not any(detail.resultado == FECAEResultEnum.APROBADO for detail in result.details):
+                logger.warning('Invoice numbering rejected for pto_vta=%s cbte_tipo=%s, retrying with reseeded '
+                               'numbers', pto_vta, ct_tipo)
+                request_metrics.retries += 1
+                for invoice in auto_numbered:
+                    invoice.cbte_desde = invoice.cbte_hasta = None
+                self.number_invoices(invoices, await self.reserve_numbers(pto_vta, ct_tipo, len(auto_numbered)))
+                result = await self._send_fecaesolicitar(pto_vta, ct_tipo, invoices)
+        return result
+
+    async def _send_fecaesolicitar(self, pto_vta, ct_tipo, invoices) -> FECAESolicitarResult:
+        request = self.build_fecaesolicitar_request(pto_vta, ct_tipo, invoices)
+        response = await self.execute_raw_request(request, 'FECAESolicitar')
+        result = self.parse_fecaesolicitar_response(response)
+        self._check_overload(result.errors)
+        return result
+
+    async def fecaesolicitar_stream(self, pto_vta, ct_tipo, invoices: Iterable[FECAEDetRequest],
+                                    batch_size: int = None) -> AsyncIterator[FECAESolicitarResult]:
+        """
+        Async version of WSFEV.fecaesolicitar_stream. The batches are sent one after the other, each one
+        numbered when it is sent and sized with get_batch_size.
+        :param pto_vta: The point of sale to create the invoices
+        :param ct_tipo: The invoice type
+        :param invoices: Iterable with the invoices to create
+        :param batch_size: Max invoices per request, defaults to the RegXReq informed by the service
+        :return: Async iterator of FECAESolicitarResult, one per batch
+        """
+        invoices = iter(invoices)
+        while True:
+            batch = list(islice(invoices, await self.get_batch_size(batch_size)))
+            if not batch:
+                return
+            yield await self.fecaesolicitar(pto_vta, ct_tipo, batch)
+
+    async def reserve_numbers(self, pto_vta, ct_tipo, count: int, after=None) -> int:
+        """
+        Async version of WSFEV.reserve_numbers. The allocator runs in a thread, its store lock is blocking.
+        :return: The number previous to the first reserved one
+        """
+        if not self.sequence_allocator:
+            if after is not None:
+                return int(after)
+            return int((await self.fecompultimoautorizado(pto_vta, ct_tipo)).nro_cbte)
+        key = self.get_sequence_key(pto_vta, ct_tipo)
+        seed = None
+        while True:
+            try:
+                return await asyncio.to_thread(self.sequence_allocator.allocate, key, count,
+                                               lambda: self._get_seed(seed))
+            except _NotSeeded:
+                # the sequence is not initialized: ask the service outside of the allocator lock and try again
+                seed = (await self.fecompultimoautorizado(pto_vta, ct_tipo)).nro_cbte
+
+    async def reset_numbers(self, pto_vta, ct_tipo) -> None:
+        """
+        Async version of WSFEV.reset_numbers
+        """
+        if self.sequence_allocator:
+            await asyncio.to_thread(self.sequence_allocator.reset, self.get_sequence_key(pto_vta, ct_tipo))
+
+    @staticmethod
+    def _get_seed(seed):
+        if seed is None:
+            raise _NotSeeded()
+        return seed
+
+    async def execute_request_and_check_response(self, xml_repr, method_name: str) -> XMLProcessor:
+        """
+        Async version of WSFEV.execute_request_and_check_response
+        :param xml_repr: The serialized request or an XMLProcessor object with the request to AFIP WS
+        :param method_name: The name of the method to execute
+        :return: XMLProcessor object with the response from AFIP WS
+        """
+        request = xml_repr.get_xml() if isinstance(xml_repr, XMLProcessor) else xml_repr
+        logger.info('Request to AFIP WS: %s', request)
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                async with self.acquire_slot():
+                    result = await self.afip_ws_connector.execute_request(request, self.get_soap_headers(method_name))
+                break
+            except Exception as error:
+                # queries can be sent again as they are, with no need to reconcile
+                if self.retry_policy is None or not self.retry_policy.should_retry(error, attempt):
+                    raise
+                delay = self.retry_policy.get_delay(attempt, error)
+                logger.warning('%s attempt %s failed (%s), retrying in %.2fs', method_name, attempt, error, delay)
+                metrics.current().retries += 1
+                await asyncio.sleep(delay)
+        logger.info('Response from AFIP WS: %s', result)
+        with metrics.current().phase('parse'):
+            return XMLProcessor(result, self.WS_NSMAP['wsfev1'])
+
+    async def execute_raw_request(self, request, method_name: str) -> bytes:
+        """
+        Async version of WSFEV.execute_raw_request
+        :param request: The serialized request
+        :param method_name: The name of the method to execute
+        :return: The response body
+        """
+        logger.info('Request to AFIP WS: %s', request)
+        async with self.acquire_slot():
+            result = await self.afip_ws_connector.execute_request_raw(request, self.get_soap_headers(method_name))
+        logger.info('Response from AFIP WS: %s', result)
+        return result
+
+    @asynccontextmanager
+    async def acquire_slot(self):
+        """
+        Async version of WSFEV.acquire_slot: waits in a thread for a slot of the rate limiter, released with
+        the outcome of the request
+        :raises RateLimitError: If the limiter did not grant a slot within its timeout
+        """
+        if self.rate_limiter is None:
+            yield None
+            return
+        acquiring = asyncio.ensure_future(asyncio.to_thread(self.rate_limiter.acquire, self.ws_endpoint, self.cuit))
+        try:
+            with metrics.current().phase('throttle'):
+                permit = await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # the thread keeps waiting: a slot granted after the cancellation is released right away
+            acquiring.add_done_callback(lambda done: done.cancelled() or done.exception() is not None
+                                        or self.rate_limiter.release(done.result()))
+            raise
+        with permit:
+            yield permit
+
+
+class _NotSeeded(Exception):
+    pass
@@ -0,0 +1,323 @@
+import logging
+from copy import copy
+from typing import List
+
+from easyAfip.utils import metrics
+from easyAfip.utils.messages import FECompUltimoAutorizadoResponse, WSFEVException, FECompTotXRequestResponse, \
+    FECAEDetRequest, FECAEDetResponse, FECAEResultEnum, FECAESolicitarResult, FEError, FECompConsultarResponse, \
+    FECAEAResponse, to_decimal, to_int
+from easyAfip.utils.rate_limiter import RateLimiter
+from easyAfip.utils.response_parser import FECAESolicitarResponseParser
+from easyAfip.utils.retry_policy import RetryPolicy
+from easyAfip.utils.sequence_allocator import SequenceAllocator
+from easyAfip.utils.soap_serializer import SoapSerializer
+from easyAfip.utils.xml_processor import XMLProcessor
+from easyAfip.wsbase import WSBASE
+
+
+logger = logging.getLogger(__name__)
+
+
+class BaseWSFEV(WSBASE):
+    """
+        Base de los clientes de WSFEv1 (WSFEV y AsyncWSFEV).
+
+        Reúne lo que no depende del transporte: la construcción de los requests, el parseo de las respuestas,
+        la numeración de los comprobantes y la configuración del cliente (ticket, CUIT, allocator, política de
+        reintentos y rate limiter). Cada subclase implementa los métodos que consumen el WS, sincrónicos o
+        corrutinas.
+    """
+
+    SERIALIZER = SoapSerializer(WSBASE.WS_NSMAP['wsfev1'])
+    RESPONSE_PARSER = FECAESolicitarResponseParser(WSBASE.WS_NSMAP['wsfev1']['ar'])
+    CAEA_RESPONSE_PARSER = FECAESolicitarResponseParser(WSBASE.WS_NSMAP['wsfev1']['ar'], detail_tag='FECAEADetResponse')
+
+    BASE_REQUEST = '''<soap:Envelope xmlns:soap="http://www.w3.org/2003/05/soap-envelope" xmlns:ar="http://ar.gov.afip.dif.FEV1/"><soap:Header/><soap:Body></soap:Body></soap:Envelope>'''
+
+    # FECompConsultar / FEParamGet*: no existen datos en nuestros registros para los parametros ingresados
+    NOT_FOUND_ERROR_CODE = 602
+
+    def __init__(self, token, sign, cuit, test_mode=None, connector=None, sequence_allocator: SequenceAllocator = None,
+                 retry_policy: RetryPolicy = None, rate_limiter: RateLimiter = None):
+        """
+        :param sequence_allocator: When given, the invoice numbers are assigned locally by the allocator
+            instead of calling FECompUltimoAutorizado on every fecaesolicitar
+        :param retry_policy: When given, fecaesolicitar retries communication errors, resubmitting only the
+            invoices that were not authorized by the failed attempt; the queries are retried as they are
+        :param rate_limiter: When given, every request waits for a slot of the limiter of the endpoint and CUIT,
+            and the batches sent by the *_stream methods shrink while the service is under pressure
+        """
+        super().__init__('wsfev1', test_mode=test_mode, connector=connector)
+        self.token = token
+        self.sign = sign
+        self.cuit = cuit
+        self.sequence_allocator = sequence_allocator
+        self.retry_policy = retry_policy
+        self.rate_limiter = rate_limiter
+        self._reg_x_req = None
+
+    def get_sequence_key(self, pto_vta, ct_tipo) -> str:
+        """
+        Get the key of the numbering sequence of the given point of sale and invoice type
+        """
+        return SequenceAllocator.get_key(self.cuit, pto_vta, ct_tipo, self.environment)
+
+    def scale_batch_size(self, batch_size: int, reg_x_req: int) -> int:
+        """
+        Get the max number of invoices for the next request: batch_size capped by RegXReq and, with a rate
+        limiter, scaled down while the service is under pressure
+        :param batch_size: The requested batch size, defaults to RegXReq
+        :param reg_x_req: The RegXReq informed by the service
+        :return:
+        """
+        batch_size = min(batch_size, reg_x_req) if batch_size else reg_x_req
+        if self.rate_limiter is not None:
+            batch_size = self.rate_limiter.get_batch_size(batch_size, self.ws_endpoint, self.cuit)
+        return batch_size
+
+    def build_fecompultimoautorizado_request(self, pto_vta, ct_tipo) -> bytes:
+        with metrics.current().phase('build'):
+            return self.serialize_request('FECompUltimoAutorizado', fields=(('PtoVta', pto_vta), ('CbteTipo', ct_tipo)))
+
+    def parse_fecompultimoautorizado_response(self, response_xml_processor: XMLProcessor) -> FECompUltimoAutorizadoResponse:
+        pto_vta_rs = response_xml_processor.get_child_text('.//ar:PtoVta')
+        ct_tipo_rs = response_xml_processor.get_child_text('.//ar:CbteTipo')
+        nro_cbte = response_xml_processor.get_child_text('.//ar:CbteNro')
+        response = FECompUltimoAutorizadoResponse(pto_vta_rs, ct_tipo_rs, nro_cbte)
+        return response
+
+    def build_fecompconsultar_request(self, pto_vta, ct_tipo, cbte_nro) -> bytes:
+        with metrics.current().phase('build'):
+            fe_comp_cons_req = self.SERIALIZER.node('FeCompConsReq', (('CbteTipo', ct_tipo), ('CbteNro', cbte_nro),
+                                                                      ('PtoVta', pto_vta)))
+            return self.serialize_request('FECompConsultar', body_parts=(fe_comp_cons_req,))
+
+    def parse_fecompconsultar_response(self, response_xml_processor: XMLProcessor) -> FECompConsultarResponse:
+        response = FECompConsultarResponse()
+        response.errors = self.exctract_errors(response_xml_processor)
+        if not response_xml_processor.has_child('.//ar:ResultGet'):
+            return response
+        text = lambda tag: response_xml_processor.get_child_text(f'.//ar:ResultGet/ar:{tag}')
+        response.pto_vta = int(text('PtoVta'))
+        response.cbte_tipo = int(text('CbteTipo'))
+        response.concepto = int(text('Concepto'))
+        response.doc_tipo = int(text('DocTipo'))
+        response.doc_nro = text('DocNro')
+        response.cbte_desde = int(text('CbteDesde'))
+        response.cbte_hasta = int(text('CbteHasta'))
+        response.cbte_fch = text('CbteFch')
+        response.imp_total = to_decimal(text('ImpTotal'))
+        response.resultado = FECAEResultEnum.get_by_value(text('Resultado'))
+        response.cod_autorizacion = text('CodAutorizacion')
+        response.emision_tipo = text('EmisionTipo')
+        response.fch_vto = text('FchVto')
+        response.fch_proceso = text('FchProceso')
+        return response
+
+    def parse_param_response(self, response_xml_processor: XMLProcessor, item_tag: str, item_fields) -> list:
+        errors = self.exctract_errors(response_xml_processor)
+        if errors and not all(error.code == self.NOT_FOUND_ERROR_CODE for error in errors):
+            raise WSFEVException("There are errors in the process.", [(error.code, error.msg) for error in errors])
+        namespaces = self.WS_NSMAP['wsfev1']
+        path = f'.//ar:ResultGet/ar:{item_tag}' if item_tag else './/ar:ResultGet'
+        return [[item.findtext(f'ar:{tag}', namespaces=namespaces) for tag in item_fields]
+                for item in response_xml_processor.root.iterfind(path, namespaces=namespaces)]
+
+    def parse_fecomptotxrequest_response(self, response_xml_processor: XMLProcessor) -> FECompTotXRequestResponse:
+        reg_x_req = response_xml_processor.get_child_text('.//ar:RegXReq')
+        response = FECompTotXRequestResponse(reg_x_req)
+        return response
+
+    def build_fecaesolicitar_request(self, pto_vta, ct_tipo, invoices: List[FECAEDetRequest]) -> bytes:
+        """
+        Build the FECAESolicitar request for the given (already numbered) invoices
+        :param pto_vta: The point of sale to create the invoices
+        :param ct_tipo: The invoice type
+        :param invoices: The invoices to create
+        :return: The serialized request
+        """
+        with metrics.current().phase('build'):
+            return self.serialize_request('FECAESolicitar', body_parts=self.SERIALIZER.fecaesolicitar_body(pto_vta, ct_tipo, invoices))
+
+    def parse_fecaesolicitar_response(self, response) -> FECAESolicitarResult:
+        """
+        Parse the FECAESolicitar response in a single pass
+        :param response: The raw response (bytes or str) or an XMLProcessor object with it
+        :return:
+        """
+        if isinstance(response, XMLProcessor):
+            response = response.get_xml()
+        with metrics.current().phase('parse'):
+            return self.RESPONSE_PARSER.parse(response)
+
+    def number_invoices(self, invoices: List[FECAEDetRequest], last_nro_cbte) -> None:
+        """
+        Set cbte_desde/cbte_hasta to the invoices without number, consecutive numbers following the last
+        authorized one. The invoices already numbered keep their number and don't take one of the sequence.
+        :param invoices: The invoices to number
+        :param last_nro_cbte: The last authorized invoice number
+        :return:
+        """
+        last_cbte = int(last_nro_cbte)
+        for invoice in invoices:
+            if not invoice.cbte_desde:
+                last_cbte += 1
+                invoice.cbte_desde = last_cbte
+                invoice.cbte_hasta = last_cbte
+
+    @staticmethod
+    def _copy_unnumbered(invoices: List[FECAEDetRequest]) -> List[FECAEDetRequest]:
+        # the numbers are assigned to shallow copies, the invoices of the caller are left as they were given
+        return [invoice if invoice.cbte_desde else copy(invoice) for invoice in invoices]
+
+    def _build_stream_batch(self, pto_vta, ct_tipo, batch: List[FECAEDetRequest], last_nro_cbte):
+        batch = self._copy_unnumbered(batch)
+        auto_numbered = [invoice for invoice in batch if not invoice.cbte_desde]
+        if auto_numbered:
+            self.number_invoices(batch, last_nro_cbte)
+        return self.build_fecaesolicitar_request(pto_vta, ct_tipo, batch), batch, auto_numbered
+
+    @staticmethod
+    def _last_number(invoices: List[FECAEDetRequest]) -> int:
+        return max(int(invoice.cbte_hasta or invoice.cbte_desde) for invoice in invoices)
+
+    @staticmethod
+    def _has_numbering_error(result: FECAESolicitarResult) -> bool:
+        return (SequenceAllocator.is_numbering_error(result.errors)
+                or any(SequenceAllocator.is_numbering_error(detail.obs_l) for detail in result.details))
+
+    @staticmethod
+    def _is_fully_approved(result: FECAESolicitarResult) -> bool:
+        return (not result.errors and result.resultado == FECAEResultEnum.APROBADO
+                and all(detail.resultado == FECAEResultEnum.APROBADO for detail in result.details))
+
+    def _check_overload(self, errors) -> None:
+        # WSFEv1 reports some overload conditions as errors of an HTTP 200 response
+        if self.rate_limiter is not None and any(error.code in RateLimiter.OVERLOAD_ERROR_CODES for error in errors or ()):
+            self.rate_limiter.record_overload(self.ws_endpoint, self.cuit)
+
+    def check_reconciled(self, pto_vta, ct_tipo, invoice: FECAEDetRequest, consulted: FECompConsultarResponse) -> FECAEDetResponse:
+        """
+        Check that the number of an invoice, authorized according to FECompUltimoAutorizado, was authorized for it
+        :param pto_vta: The point of sale of the invoice
+        :param ct_tipo: The invoice type
+        :param invoice: The numbered invoice
+        :param consulted: The FECompConsultar response of its number
+        :return: The FECAEDetResponse of the invoice
+        :raises WSFEVException: If the number was authorized for a different invoice
+        """
+        if not consulted.found or not self._is_same_invoice(invoice, consulted):
+            raise WSFEVException(f"The invoice number {invoice.cbte_desde} (pto_vta={pto_vta}, cbte_tipo={ct_tipo}) "
+                                 f"was not authorized for the given invoice, it must be reconciled manually",
+                                 [(error.code, error.msg) for error in consulted.errors])
+        return consulted.to_detail()
+
+    @staticmethod
+    def _is_same_invoice(invoice: FECAEDetRequest, consulted: FECompConsultarResponse) -> bool:
+        return (int(invoice.doc_nro or 0) == int(consulted.doc_nro or 0)
+                and round(float(invoice.imp_total or 0), 2) == round(float(consulted.imp_total or 0), 2)
+                and (not invoice.cbte_fch or invoice.cbte_fch == consulted.cbte_fch))
+
+    def _merge_results(self, pto_vta, ct_tipo, result: FECAESolicitarResult, recovered: List[FECAEDetResponse]) -> FECAESolicitarResult:
+        if not recovered:
+            return result
+        if result is None:
+            result = FECAESolicitarResult()
+            result.errors = []
+            result.cuit, result.pto_vta, result.cbte_tipo = str(self.cuit), int(pto_vta), int(ct_tipo)
+        result.details = recovered + result.details
+        result.cant_reg = len(result.details)
+        approved = sum(detail.resultado == FECAEResultEnum.APROBADO for detail in result.details)
+        result.resultado = (FECAEResultEnum.APROBADO if approved == len(result.details)
+                            else FECAEResultEnum.PARCIAL if approved else FECAEResultEnum.RECHAZADO)
+        return result
+
+    def build_fecaea_request(self, method_name: str, periodo, orden) -> bytes:
+        with metrics.current().phase('build'):
+            return self.serialize_request(method_name, fields=(('Periodo', periodo), ('Orden', orden)))
+
+    def parse_fecaea_response(self, response_xml_processor: XMLProcessor) -> FECAEAResponse:
+        response = FECAEAResponse()
+        response.errors = self.exctract_errors(response_xml_processor)
+        if not response_xml_processor.has_child('.//ar:ResultGet'):
+            return response
+        text = lambda tag: response_xml_processor.get_child_text(f'.//ar:ResultGet/ar:{tag}')
+        response.caea = text('CAEA')
+        response.periodo = to_int(text('Periodo'))
+        response.orden = to_int(text('Orden'))
+        response.fch_vig_desde = text('FchVigDesde')
+        response.fch_vig_hasta = text('FchVigHasta')
+        response.fch_tope_inf = text('FchTopeInf')
+        response.fch_proceso = text('FchProceso')
+        response.observaciones = self.exctract_obs(response_xml_processor)
+        return response
+
+    def get_soap_headers(self, method_name: str) -> dict:
+        return {"SOAPAction": f'http://ar.gov.afip.dif.FEV1/{method_name}'}
+
+    def serialize_request(self, method_name: str, fields=(), body_parts=()) -> bytes:
+        """
+        Serialize the request for the given method, with the auth node followed by the given leaf fields
+        and already serialized nodes
+        :param method_name: The name of the method to execute
+        :param fields: Iterable of (tag, text) leaf nodes of the method
+        :param body_parts: Iterable of serialized nodes of the method
+        :return: The serialized request
+        """
+        auth_block = self.SERIALIZER.get_auth_block(self.token, self.sign, self.cuit)
+        parts = [self.SERIALIZER.fields(fields)] if fields else []
+        parts.extend(body_parts)
+        return self.SERIALIZER.request(method_name, auth_block, parts)
+
+    def build_base_request(self, method_name: str) -> XMLProcessor:
+        """
+        Build the base request with the main node for the required method and the auth node
+        :param method_name: The name of the method to execute
+        :return: XMLProcessor object with the base request
+        """
+        auth_xml_processor = XMLProcessor(self.BASE_REQUEST, namespaces=self.WS_NSMAP['wsfev1'])
+        auth_xml_processor.add_child(method_name, tag_ns='ar')
+        auth_node = super().get_auth_node(self.cuit, self.token, self.sign)
+        auth_xml_processor.add_child_from_xml(auth_node, parent_element_path=f'ar:{method_name}')
+        return auth_xml_processor
+
+# TODO eliminar esto y crear una clase que lo represente, y cuando ocurra un error, inicializar dicha clase y retornar los errores del servicio.
+    def check_response(self, xml_repr_rs: XMLProcessor) -> None:
+        """
+        This method will check the response from AFIP WS and raise an exception if the response is an error
+        :param xml_repr_rs: XMLProcessor object with the response from AFIP WS
+        :return:
+        """
+        errors = xml_repr_rs.get_errors_content('.//ar:Errors')
+        if errors:
+            # agregar codigo de error
+            logger.error('Error Response from AFIP WS: %s', errors)
+            raise WSFEVException(f"There are errors in the process.", errors)
+
+    def exctract_errors(self, xml_repr_rs: XMLProcessor) -> list:
+        """
+        This method will check the response from AFIP WS and raise an exception if the response is an error
+        :param xml_repr_rs: XMLProcessor object with the response from AFIP WS
+        :return:
+        """
+        errors = xml_repr_rs.get_errors_content('.//ar:Errors')
+        errors_list = []
+        for error in errors:
+            feerror = FEError(error[0], error[1])
+            errors_list.append(feerror)
+        return errors_list
+
+    def exctract_obs(self, xml_repr_rs: XMLProcessor) -> list:
+        """
+        This method will check the response from AFIP WS and raise an exception if the response is an error
+        :param xml_repr_rs: XMLProcessor object with the response from AFIP WS
+        :return:
+        """
+        obs_l = xml_repr_rs.get_obs_content('.//ar:Observaciones')
+        if not obs_l:
+            return []
+        obs_error_list = []
+        for obs in obs_l:
+            obs_error = FEError(obs[0], obs[1])
+            obs_error_list.append(obs_error)
+        return obs_error_list
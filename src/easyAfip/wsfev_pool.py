@@ -0,0 +1,129 @@
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Iterable, List, Tuple
+
+from easyAfip.utils.afip_ws_connector import AfipWSConnector
+from easyAfip.utils.credentials import CredentialRegistry
+from easyAfip.utils.messages import FECAEDetRequest
+from easyAfip.utils.rate_limiter import RateLimiter
+from easyAfip.utils.retry_policy import RetryPolicy
+from easyAfip.utils.sequence_allocator import SequenceAllocator
+from easyAfip.utils.sharded_executor import ShardedExecutor
+from easyAfip.utils.store import BaseStore
+from easyAfip.wsaa import WSAA
+from easyAfip.wsbase import WSBASE
+from easyAfip.wsfev import WSFEV
+
+
+logger = logging.getLogger(__name__)
+
+
+class WSFEVPool:
+    """
+        Fachada para facturar en nombre de múltiples CUITs.
+
+        Crea bajo demanda un cliente WSFEV autenticado por CUIT (tomando las credenciales del
+        `CredentialRegistry` y el ticket de acceso del `ticket_store`), comparte un pool de conexiones por
+        endpoint entre todos ellos y ejecuta los trabajos en un pool de hilos acotado.
+        Los trabajos pendientes se encolan por secuencia de numeración (CUIT, punto de venta, tipo de
+        comprobante) y se despachan en round-robin: los de una misma secuencia en orden y de a uno, los de
+        secuencias distintas en paralelo, de modo que una secuencia con un backlog grande no demore a las demás.
+        Con `max_in_flight_per_cuit` se limitan además los trabajos en curso por CUIT.
+    """
+
+    SERVICE = 'wsfe'
+
+    def __init__(self, credentials: CredentialRegistry, max_workers: int = 8, test_mode=None,
+                 ticket_store: BaseStore = None, sequence_allocator: SequenceAllocator = None,
+                 max_in_flight_per_cuit: int = None, endpoints: dict = None, retry_policy: RetryPolicy = None,
+                 rate_limiter: RateLimiter = None):
+        """
+        :param credentials: Registry with the certificate/key of every CUIT
+        :param max_workers: Max number of requests in flight across all CUITs
+        :param test_mode: Use the homologation environment
+        :param ticket_store: Store for the access tickets, defaults to WSAA.DEFAULT_TICKET_STORE
+        :param sequence_allocator: Optional allocator for local invoice numbering
+        :param max_in_flight_per_cuit: Max number of requests in flight for a single CUIT, by default only
+            limited by max_workers (and by one request per sequence)
+        :param endpoints: Optional {service: url} overriding the AFIP endpoints (e.g. an AfipStubServer)
+        :param retry_policy: Optional retry policy for FECAESolicitar, see WSFEV
+        :param rate_limiter: Optional adaptive rate limiter shared by the clients, see WSFEV
+        """
+        self.credentials = credentials
+        self.max_workers = max_workers
+        self.test_mode = test_mode
+        self.ticket_store = ticket_store
+        self.sequence_allocator = sequence_allocator
+        self.max_in_flight_per_cuit = max_in_flight_per_cuit
+        self.retry_policy = retry_policy
+        self.rate_limiter = rate_limiter
+        environment = 'homo' if test_mode else 'prod'
+        endpoints = endpoints or {}
+        self.connectors = {
+            service: AfipWSConnector(endpoints.get(service, WSBASE.ENDPOINTS[service][environment]), pool_size=max_workers)
+            for service in ('wsaa', 'wsfev1')
+        }
+        self._executor = ShardedExecutor(max_workers=max_workers, group=lambda shard: shard[0],
+                                         max_in_flight_per_group=max_in_flight_per_cuit,
+                                         thread_name_prefix='easyafip-pool')
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._client_locks = {}
+
+    def submit(self, cuit, pto_vta, cbte_tipo, invoices: List[FECAEDetRequest]) -> Future:
+        """
+        Queue a FECAESolicitar for the given CUIT
+        :param cuit: The CUIT issuing the invoices
+        :param pto_vta: The point of sale
+        :param cbte_tipo: The invoice type
+        :param invoices: The invoices to create
+        :return: Future with the FECAESolicitarResult
+        """
+        cuit = str(cuit)
+        return self._executor.submit((cuit, str(pto_vta), str(cbte_tipo)), self._fecaesolicitar, cuit, pto_vta,
+                                     cbte_tipo, invoices)
+
+    def submit_many(self, work_items: Iterable[Tuple]) -> List[Future]:
+        """
+        Queue many (cuit, pto_vta, cbte_tipo, invoices) work items
+        :param work_items: Iterable of work items
+        :return: The futures, in the same order as the work items
+        """
+        return [self.submit(*work_item) for work_item in work_items]
+
+    def get_client(self, cuit) -> WSFEV:
+        """
+        Get the WSFEV client of the given CUIT, authenticated with a valid access ticket
+        :param cuit: The CUIT
+        :return:
+        """
+        cuit = str(cuit)
+        with self._lock:
+            client_lock = self._client_locks.setdefault(cuit, threading.Lock())
+        with client_lock:
+            wsaa, wsfev = self._clients.get(cuit, (None, None))
+            if wsaa is None:
+                wsaa = WSAA.from_credential(self.credentials.get(cuit), self.SERVICE, test_mode=self.test_mode,
+                                            ticket_store=self.ticket_store, connector=self.connectors['wsaa'])
+            ticket = wsaa.get_access_ticket()
+            if wsfev is None or wsfev.token != ticket['token']:
+                wsfev = WSFEV(ticket['token'], ticket['sign'], cuit, test_mode=self.test_mode,
+                              connector=self.connectors['wsfev1'], sequence_allocator=self.sequence_allocator,
+                              retry_policy=self.retry_policy, rate_limiter=self.rate_limiter)
+            self._clients[cuit] = (wsaa, wsfev)
+            return wsfev
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+        for connector in self.connectors.values():
+            connector.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def _fecaesolicitar(self, cuit, pto_vta, cbte_tipo, invoices):
+        return self.get_client(cuit).fecaesolicitar(pto_vta, cbte_tipo, invoices)
@@ -0,0 +1,139 @@
+import logging
+from typing import Dict, Iterable, List
+
+from easyAfip.utils import metrics
+from easyAfip.utils.afip_ws_connector import AfipWSConnector
+from easyAfip.utils.messages import FEError, Persona
+from easyAfip.utils.persona_cache import PersonaCache
+from easyAfip.utils.soap_serializer import element
+from easyAfip.utils.store import build_key
+from easyAfip.utils.xml_processor import XMLProcessor
+from easyAfip.wsbase import WSBASE
+
+
+logger = logging.getLogger(__name__)
+
+
+class WSPadron(WSBASE):
+    """
+        Clase encargada de integrar el servicio de consulta de constancia de inscripción del padrón de la AFIP
+        (ws_sr_constancia_inscripcion, ex ws_sr_padron_a5), para conocer la situación fiscal del receptor de
+        un comprobante antes de emitirlo.
+
+        Requiere un Ticket de Acceso del WSAA para el servicio "ws_sr_constancia_inscripcion" (ver
+        WSPadron.WSAA_SERVICE). Las consultas se agrupan en requests a getPersonaList_v2 de hasta 250 CUITs y
+        pasan por un PersonaCache (LRU con TTL, que también recuerda las CUITs inexistentes), de modo que
+        validar un lote de comprobantes de clientes ya consultados no requiere ningún request.
+
+            ticket = WSAA(pem, key, WSPadron.WSAA_SERVICE, cuit=cuit).get_access_ticket()
+            padron = WSPadron(ticket['token'], ticket['sign'], cuit)
+            personas = padron.get_persona_list(invoice.doc_nro for invoice in invoices)
+    """
+
+    WSAA_SERVICE = 'ws_sr_constancia_inscripcion'
+    # máximo de CUITs por request de getPersonaList_v2
+    MAX_IDS_PER_REQUEST = 250
+
+    DEFAULT_PERSONA_CACHE = PersonaCache()
+
+    def __init__(self, token, sign, cuit, test_mode=None, connector: AfipWSConnector = None,
+                 persona_cache: PersonaCache = None):
+        """
+        :param cuit: The CUIT represented by the ticket (cuitRepresentada)
+        :param persona_cache: Cache of the lookups, defaults to WSPadron.DEFAULT_PERSONA_CACHE
+        """
+        super().__init__(self.WSAA_SERVICE, test_mode=test_mode, connector=connector)
+        self.token = token
+        self.sign = sign
+        self.cuit = cuit
+        self.persona_cache = persona_cache if persona_cache is not None else self.DEFAULT_PERSONA_CACHE
+        self.namespaces = self.WS_NSMAP[self.WSAA_SERVICE]
+
+    def get_persona(self, id_persona) -> Persona:
+        """
+        Get a taxpayer (cached)
+        Afip's doc: Devuelve los datos de la constancia de inscripción del contribuyente.
+        :param id_persona: The CUIT of the taxpayer
+        :return: The taxpayer, with found in False when the CUIT does not exist
+        """
+        return self.get_persona_list([id_persona])[str(id_persona)]
+
+    def get_persona_list(self, ids_persona: Iterable) -> Dict[str, Persona]:
+        """
+        Get many taxpayers (cached). The ones not cached are requested with getPersonaList_v2, in requests of
+        at most MAX_IDS_PER_REQUEST CUITs.
+        :param ids_persona: The CUITs of the taxpayers, repeated ones are looked up once
+        :return: {CUIT (as str): Persona}
+        """
+        ids = list(dict.fromkeys(str(id_persona) for id_persona in ids_persona))
+        keys = {id_persona: self.get_cache_key(id_persona) for id_persona in ids}
+        cached = self.persona_cache.get_many(keys.values())
+        personas = {id_persona: cached[key] for id_persona, key in keys.items() if key in cached}
+        missing = [id_persona for id_persona in ids if id_persona not in personas]
+        for start in range(0, len(missing), self.MAX_IDS_PER_REQUEST):
+            chunk = missing[start:start + self.MAX_IDS_PER_REQUEST]
+            requested = {persona.id_persona: persona for persona in self.request_persona_list(chunk)}
+            for id_persona in chunk:
+                # a CUIT left out of the response is unknown to the padrón
+                requested.setdefault(id_persona, self._not_found(id_persona, 'No existe persona con ese Id'))
+            self.persona_cache.set_many({keys[id_persona]: requested[id_persona] for id_persona in chunk})
+            personas.update((id_persona, requested[id_persona]) for id_persona in chunk)
+        return {id_persona: personas[id_persona] for id_persona in ids}
+
+    def request_persona_list(self, ids_persona: List[str]) -> List[Persona]:
+        """
+        Request taxpayers to the service, without looking at the cache
+        Afip's doc: getPersonaList_v2, devuelve los datos de hasta 250 contribuyentes.
+        :param ids_persona: The CUITs, at most MAX_IDS_PER_REQUEST
+        :return: The taxpayers informed by the service
+        """
+        if len(ids_persona) > self.MAX_IDS_PER_REQUEST:
+            raise ValueError(f"getPersonaList_v2 accepts up to {self.MAX_IDS_PER_REQUEST} CUITs per request")
+        with metrics.measure(self.service, 'getPersonaList_v2') as request_metrics:
+            with request_metrics.phase('build'):
+                request = self.build_persona_list_request(ids_persona)
+            logger.info('Request to AFIP WS: %s', request)
+            response = self.afip_ws_connector.execute_request(request, self.get_soap_headers())
+            logger.info('Response from AFIP WS: %s', response)
+            with request_metrics.phase('parse'):
+                return self.parse_persona_list_response(XMLProcessor(response, self.namespaces))
+
+    def build_persona_list_request(self, ids_persona: List[str]) -> bytes:
+        fields = [element('token', self.token), element('sign', self.sign), element('cuitRepresentada', self.cuit)]
+        fields.extend(element('idPersona', id_persona) for id_persona in ids_persona)
+        return (f'<soapenv:Envelope xmlns:soapenv="{self.namespaces["soapenv"]}" xmlns:a5="{self.namespaces["a5"]}">'
+                f'<soapenv:Header/><soapenv:Body><a5:getPersonaList_v2>{"".join(fields)}</a5:getPersonaList_v2>'
+                f'</soapenv:Body></soapenv:Envelope>').encode('utf-8')
+
+    def parse_persona_list_response(self, response_xml_processor: XMLProcessor) -> List[Persona]:
+        # the elements of the response are not qualified
+        return [self.parse_persona(node) for node in response_xml_processor.root.iter('persona')]
+
+    def parse_persona(self, node) -> Persona:
+        errors = [FEError(None, error.text) for path in ('errorConstancia', 'errorRegimenGeneral', 'errorMonotributo')
+                  for error in node.findall(f'{path}/error') if error.text]
+        generales = node.find('datosGenerales')
+        if generales is None:
+            persona = self._not_found(node.findtext('errorConstancia/idPersona'))
+            persona.errors = errors
+            return persona
+        impuestos = [int(item.text) for path in ('datosRegimenGeneral', 'datosMonotributo')
+                     for item in node.findall(f'{path}/impuesto/idImpuesto') if item.text]
+        persona = Persona(generales.findtext('idPersona'), generales.findtext('tipoPersona'), generales.findtext('nombre'),
+                          generales.findtext('apellido'), generales.findtext('razonSocial'),
+                          generales.findtext('estadoClave'), impuestos,
+                          node.findtext('datosMonotributo/categoriaMonotributo/descripcionCategoria'))
+        persona.errors = errors
+        return persona
+
+    def get_cache_key(self, id_persona) -> str:
+        return build_key('padron', self.environment, id_persona)
+
+    def get_soap_headers(self) -> dict:
+        return {"SOAPAction": '""'}
+
+    @staticmethod
+    def _not_found(id_persona, message: str = None) -> Persona:
+        persona = Persona(id_persona)
+        persona.errors = [FEError(None, message)] if message else []
+        return persona
@@ -0,0 +1,79 @@
+import datetime
+
+import pytest
+
+from easyAfip.utils.afip_ws_connector import AfipWSConnector
+from easyAfip.utils.messages import FECAEDetRequest, Tributo
+from easyAfip.utils.param_cache import ParamCache
+from easyAfip.utils.stub_server import AfipStubServer
+from easyAfip.wsfev import WSFEV
+
+CUIT = '20123456786'
+
+
+def build_invoices(count, first=None):
+    """
+    Build `count` invoices, numbered from `first` or without number
+    """
+    invoices = []
+    for index in range(count):
+        invoice = FECAEDetRequest(concepto='1', doc_tipo='80', doc_nro='20123456786', cbte_fch='20240101',
+                                  imp_total='122.00', imp_tot_conc='0', imp_neto='100.00', imp_op_ex='0',
+                                  imp_iva='21.00', imp_trib='1.00', mon_id='PES', mon_cotiz='1',
+                                  tributos=[Tributo('99', '100.00', '1', '1.00', 'Percepcion')])
+        if first is not None:
+            invoice.cbte_desde = invoice.cbte_hasta = first + index
+        invoices.append(invoice)
+    return invoices
+
+
+def build_credentials(cuit=CUIT, valid_days=365):
+    """
+    Build a self signed certificate with the CUIT in its subject, as AFIP issues them
+    :return: (pem, key) as str
+    """
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'easyafip-test'),
+                      x509.NameAttribute(NameOID.SERIAL_NUMBER, f'CUIT {cuit}')])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+                   .serial_number(x509.random_serial_number()).not_valid_before(now - datetime.timedelta(days=2))
+                   .not_valid_after(now + datetime.timedelta(days=valid_days)).sign(key, hashes.SHA256()))
+    return (certificate.public_bytes(serialization.Encoding.PEM).decode('utf-8'),
+            key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                              serialization.NoEncryption()).decode('utf-8'))
+
+
+@pytest.fixture(scope='session')
+def credentials():
+    return build_credentials()
+
+
+@pytest.fixture
+def stub():
+    with AfipStubServer() as stub:
+        yield stub
+
+
+@pytest.fixture
+def connector(stub):
+    connector = AfipWSConnector(stub.url('wsfev1'))
+    yield connector
+    connector.close()
+
+
+@pytest.fixture
+def make_wsfev(connector):
+    """
+    Build WSFEV clients against the stub server (the stub does not check the ticket)
+    """
+    def make(**kwargs):
+        kwargs.setdefault('connector', connector)
+        kwargs.setdefault('param_cache', ParamCache())
+        return WSFEV('token', 'sign', CUIT, test_mode=True, **kwargs)
+    return make
@@ -0,0 +1,69 @@
+import threading
+
+import pytest
+import requests
+
+from conftest import CUIT
+from easyAfip.utils.afip_ws_connector import AfipWSConnector
+from easyAfip.utils.http_adapters import TimedHTTPConnection
+from easyAfip.utils.messages import AfipThrottledError
+from easyAfip.wsfev import WSFEV
+
+
+@pytest.fixture
+def connects(monkeypatch):
+    # count the connections opened against the stub server
+    calls = []
+    connect = TimedHTTPConnection.connect
+
+    def counting_connect(self):
+        calls.append(self)
+        connect(self)
+    monkeypatch.setattr(TimedHTTPConnection, 'connect', counting_connect)
+    return calls
+
+
+def test_connections_are_kept_alive(make_wsfev, connects):
+    wsfev = make_wsfev()
+    for _ in range(20):
+        wsfev.fecompultimoautorizado(1, 1)
+    assert len(connects) == 1
+
+
+def test_concurrent_requests_share_the_pool(stub, connects):
+    stub.latency = 0.05
+    connector = AfipWSConnector(stub.url('wsfev1'), pool_size=3)
+    clients = [WSFEV('token', 'sign', CUIT, test_mode=True, connector=connector) for _ in range(8)]
+    threads = [threading.Thread(target=wsfev.fecompultimoautorizado, args=(1, 1)) for wsfev in clients * 2]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert stub.request_counts['FECompUltimoAutorizado'] == 16
+    assert len(connects) == 3
+    connector.close()
+
+
+def test_clients_of_an_endpoint_share_its_connector():
+    try:
+        first, second = (WSFEV('token', 'sign', CUIT, test_mode=True) for _ in range(2))
+        assert first.afip_ws_connector is second.afip_ws_connector
+        assert WSFEV('token', 'sign', CUIT, test_mode=False).afip_ws_connector is not first.afip_ws_connector
+    finally:
+        AfipWSConnector.close_shared()
+
+
+def test_timeout_and_throttling(stub):
+    connector = AfipWSConnector(stub.url('wsfev1'), timeout=(1, 0.1), headers={'X-Test': '1'})
+    stub.latency = 0.3
+    with pytest.raises(requests.Timeout):
+        connector.execute_request('<soap/>', {'SOAPAction': 'FECompUltimoAutorizado'})
+
+    stub.latency, stub.capacity, stub.retry_after = 0, 0, 2
+    with pytest.raises(AfipThrottledError) as error:
+        connector.execute_request('<soap/>')
+    assert (error.value.status_code, error.value.retry_after) == (503, 2.0)
+
+    config = connector.get_config()
+    assert config['timeout'] == (1, 0.1) and config['headers']['X-Test'] == '1'
+    connector.close()
@@ -0,0 +1,85 @@
+import pytest
+
+from conftest import CUIT, build_invoices
+from easyAfip.caea_issuer import CAEAIssuer
+from easyAfip.utils.messages import FECAEDetRequest, FECAEResultEnum, WSFEVException
+from easyAfip.utils.store import SqliteStore
+
+CBTE_FCH = '20240101'
+
+
+def test_issue_numbers_without_requests_and_report_informs_in_order(make_wsfev, stub):
+    stub.reg_x_req = 2
+    issuer = CAEAIssuer(make_wsfev())
+    caea = issuer.prepare(1, 1, CBTE_FCH)
+    assert (caea.periodo, caea.orden, caea.fch_vig_desde, caea.fch_vig_hasta) == (202401, 1, '20240101', '20240115')
+    requests = sum(stub.request_counts.values())
+
+    issued = [issuer.issue(1, 1, invoice) for invoice in build_invoices(5)]
+    assert sum(stub.request_counts.values()) == requests
+    assert [invoice.cbte_desde for invoice in issued] == [1, 2, 3, 4, 5]
+    assert all(invoice.caea == caea.caea for invoice in issued)
+    assert [invoice.cbte_desde for invoice in issuer.pending(1, 1)] == [1, 2, 3, 4, 5]
+
+    results = issuer.report(1, 1)
+    assert [[detail.cbte_desde for detail in result.details] for result in results] == [[1, 2], [3, 4], [5]]
+    assert all(result.resultado == FECAEResultEnum.APROBADO for result in results)
+    assert stub.last_numbers[(CUIT, '1', '1')] == 5
+    assert list(issuer.pending(1, 1)) == []
+
+
+def test_report_stops_at_the_first_rejected_batch(make_wsfev, stub):
+    stub.reg_x_req = 2
+    issuer = CAEAIssuer(make_wsfev())
+    issuer.prepare(1, 1, CBTE_FCH)
+    issued = [issuer.issue(1, 1, invoice) for invoice in build_invoices(5)]
+    # e.g. a pending invoice saved with a CAEA the service does not know
+    issuer.store.set(issuer._invoice_key(1, 1, 3), dict(issued[2].to_dict(json_safe=True), caea='12345678901234'))
+
+    results = issuer.report(1, 1)
+    assert [result.resultado for result in results] == [FECAEResultEnum.APROBADO, FECAEResultEnum.RECHAZADO]
+    assert stub.last_numbers[(CUIT, '1', '1')] == 2
+    assert [invoice.cbte_desde for invoice in issuer.pending(1, 1)] == [3, 4, 5]
+
+    # the corrected invoice keeps its number
+    assert issuer.issue(1, 1, issued[2]).cbte_desde == 3
+    issuer.report(1, 1)
+    assert stub.last_numbers[(CUIT, '1', '1')] == 5
+
+
+def test_missing_pending_invoice_stops_the_report(make_wsfev, stub):
+    issuer = CAEAIssuer(make_wsfev())
+    issuer.prepare(1, 1, CBTE_FCH)
+    for invoice in build_invoices(3):
+        issuer.issue(1, 1, invoice)
+    issuer.store.delete(issuer._invoice_key(1, 1, 2))
+
+    with pytest.raises(WSFEVException):
+        issuer.report(1, 1)
+    assert (CUIT, '1', '1') not in stub.last_numbers
+
+
+def test_caea_and_numbering_are_shared_through_the_store(make_wsfev, stub, tmp_path):
+    path = str(tmp_path / 'caea.db')
+    first, second = CAEAIssuer(make_wsfev(), SqliteStore(path)), CAEAIssuer(make_wsfev(), SqliteStore(path))
+    caea = first.prepare(1, 1, CBTE_FCH)
+    assert second.prepare(1, 1, CBTE_FCH).caea == caea.caea
+    assert stub.request_counts['FECAEASolicitar'] == 1
+
+    assert [issuer.issue(1, 1, invoice).cbte_desde for issuer, invoice in zip((first, second, first),
+                                                                             build_invoices(3))] == [1, 2, 3]
+    # another system already got the CAEA of the fortnight: it is consulted
+    assert CAEAIssuer(make_wsfev()).get_caea(202401, 1).caea == caea.caea
+    assert stub.request_counts['FECAEAConsultar'] == 1
+
+
+def test_caea_must_cover_the_invoice_date(make_wsfev):
+    issuer = CAEAIssuer(make_wsfev())
+    invoice = build_invoices(1)[0]
+    invoice.cbte_fch = '20240116'
+    assert CAEAIssuer.get_period(invoice.cbte_fch) == (202401, 2)
+    assert issuer.issue(1, 1, invoice).caea == issuer.get_caea(202401, 2).caea
+
+    issuer.get_caea(202401, 2).fch_vig_desde = '20240120'
+    with pytest.raises(WSFEVException):
+        issuer.issue(1, 1, FECAEDetRequest(cbte_fch='20240116'))
@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+import pytest
+
+from conftest import CUIT
+from easyAfip.utils.afip_ws_connector import AfipWSConnector
+from easyAfip.utils.circuit_breaker import CircuitBreaker
+from easyAfip.utils.messages import AfipCommunicationError, CircuitOpenError
+
+
+def test_opens_after_threshold_and_closes_after_a_successful_trial(make_wsfev, stub):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+    wsfev = make_wsfev(connector=AfipWSConnector(stub.url('wsfev1'), circuit_breaker=breaker))
+    stub.faults['FECompUltimoAutorizado'] = 2
+
+    for _ in range(2):
+        with pytest.raises(AfipCommunicationError):
+            wsfev.fecompultimoautorizado(1, 1)
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        wsfev.fecompultimoautorizado(1, 1)
+
+    time.sleep(0.2)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    wsfev.fecompultimoautorizado(1, 1)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_trial_reopens_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+
+    breaker.before_request()
+    breaker.record_failure()
+    assert breaker._state == CircuitBreaker.OPEN
+
+
+def test_only_one_trial_request_is_let_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.2)
+    breaker.record_failure()
+    time.sleep(0.2)
+
+    breaker.before_request()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+    breaker.release()
+    breaker.before_request()
+
+
+def test_trial_without_outcome_expires():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+    breaker.record_failure()
+    time.sleep(0.1)
+    breaker.before_request()
+
+    time.sleep(0.1)
+    breaker.before_request()
+
+
+def test_interrupted_trial_is_released(stub, monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    connector = AfipWSConnector(stub.url('wsfev1'), circuit_breaker=breaker)
+
+    def interrupt(*args, **kwargs):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(connector.session, 'post', interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        connector.execute_request_raw('<soap/>')
+    assert not breaker._trial_in_flight
+    connector.close()
+
+
+def test_cancelled_trial_is_released(stub):
+    pytest.importorskip('aiohttp')
+    from easyAfip.utils.async_afip_ws_connector import AsyncAfipWSConnector
+    from easyAfip.wsfev_async import AsyncWSFEV
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    stub.latency = 0.5
+
+    async def main():
+        connector = AsyncAfipWSConnector(stub.url('wsfev1'), circuit_breaker=breaker)
+        wsfev = AsyncWSFEV('token', 'sign', CUIT, test_mode=True, connector=connector)
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(wsfev.fecompultimoautorizado(1, 1), 0.1)
+        finally:
+            await connector.close()
+
+    asyncio.run(main())
+    assert not breaker._trial_in_flight
+    assert breaker._state == CircuitBreaker.HALF_OPEN
@@ -0,0 +1,70 @@
+from datetime import timedelta
+
+import pytest
+
+from conftest import CUIT, build_credentials
+from easyAfip.utils.afip_ws_connector import AfipWSConnector
+from easyAfip.utils.credentials import CredentialRegistry
+from easyAfip.utils.messages import CredentialError
+from easyAfip.utils.store import MemoryStore
+from easyAfip.wsaa import WSAA
+
+OTHER_CUIT = '30712345674'
+
+
+def write_credentials(directory, cuit, extension='.crt', **kwargs):
+    pem, key = build_credentials(cuit, **kwargs)
+    (directory / f'{cuit}{extension}').write_text(pem)
+    (directory / f'{cuit}.key').write_text(key)
+    return pem
+
+
+def test_credentials_are_loaded_from_a_directory(tmp_path):
+    write_credentials(tmp_path, CUIT)
+    pem = write_credentials(tmp_path, OTHER_CUIT, extension='.pem')
+    registry = CredentialRegistry(directory=str(tmp_path))
+
+    credential = registry.get(int(CUIT))
+    assert credential.cuit == CUIT and registry.get(CUIT) is credential
+    assert registry.get(OTHER_CUIT).pem == pem.encode('utf-8')
+    with pytest.raises(CredentialError):
+        registry.get('20111111112')
+
+
+def test_credentials_are_parsed_once_and_evicted_lru(credentials):
+    loads = []
+    registry = CredentialRegistry(loader=lambda cuit: loads.append(cuit) or credentials, max_size=2)
+    for cuit in (CUIT, OTHER_CUIT, CUIT, '20111111112', CUIT, OTHER_CUIT):
+        registry.get(cuit)
+    assert loads == [CUIT, OTHER_CUIT, '20111111112', OTHER_CUIT]
+
+    registry.invalidate(CUIT)
+    registry.get(CUIT)
+    assert loads[-1] == CUIT
+    with pytest.raises(ValueError):
+        CredentialRegistry()
+
+
+def test_expired_certificates_are_rejected(tmp_path):
+    write_credentials(tmp_path, CUIT, valid_days=-1)
+    write_credentials(tmp_path, OTHER_CUIT, valid_days=10)
+    registry = CredentialRegistry(directory=str(tmp_path))
+
+    with pytest.raises(CredentialError):
+        registry.get(CUIT)
+    assert [credential.cuit for credential in registry.expiring(timedelta(days=30))] == [CUIT]
+    registry.get(OTHER_CUIT)
+    assert sorted(credential.cuit for credential in registry.expiring(timedelta(days=30))) == [CUIT, OTHER_CUIT]
+    with pytest.raises(CredentialError):
+        CredentialRegistry(directory=str(tmp_path), expiry_margin=timedelta(days=30)).get(OTHER_CUIT)
+
+
+def test_wsaa_reuses_the_parsed_credential(stub, credentials):
+    credential = CredentialRegistry(loader=lambda cuit: credentials).get(CUIT)
+    connector = AfipWSConnector(stub.url('wsaa'))
+    wsaa = WSAA.from_credential(credential, 'wsfe', test_mode=True, ticket_store=MemoryStore(), connector=connector)
+
+    assert wsaa.signer is credential.signer
+    assert wsaa.get_ticket_key() == f'wsaa:{CUIT}:wsfe:homo'
+    assert wsaa.get_access_ticket()['token']
+    connector.close()
@@ -0,0 +1,58 @@
+import pytest
+
+from conftest import CUIT, build_invoices
+from easyAfip.invoice_ledger import InvoiceLedger
+
+DATES = ['20240101'] * 5 + ['20240105'] * 5 + ['20240110'] * 5 + ['20240120'] * 5
+
+
+@pytest.fixture
+def issued(make_wsfev):
+    wsfev = make_wsfev()
+    invoices = build_invoices(len(DATES))
+    for invoice, cbte_fch in zip(invoices, DATES):
+        invoice.cbte_fch = cbte_fch
+    wsfev.fecaesolicitar(1, 1, invoices)
+    return wsfev
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    return InvoiceLedger(str(tmp_path / 'ledger.db'))
+
+
+@pytest.mark.parametrize('fch_desde, fch_hasta, expected', [
+    ('20240105', '20240110', (6, 15)),
+    ('20240102', '20240109', (6, 10)),
+    (None, '20240101', (1, 5)),
+    ('20240111', None, (16, 20)),
+    ('20240121', None, (21, 20)),
+    ('20231201', '20231231', (1, 0)),
+])
+def test_find_range_searches_the_dates(issued, ledger, stub, fch_desde, fch_hasta, expected):
+    assert ledger.find_range(issued, 1, 1, fch_desde, fch_hasta) == expected
+    # a binary search, not a scan
+    assert stub.request_counts['FECompConsultar'] <= 2 * 5
+
+
+@pytest.mark.parametrize('removed', [7, 8, 6, 15, 16])
+def test_missing_numbers_are_taken_as_part_of_the_period(issued, ledger, stub, removed):
+    # e.g. a number rejected by the service
+    del stub.issued[(CUIT, '1', '1', removed)]
+    first, last = ledger.find_range(issued, 1, 1, '20240105', '20240110')
+    assert first <= 6 and last >= 15
+    assert DATES[first - 1] >= '20240105' or first == removed
+    assert DATES[last - 1] <= '20240110' or last == removed
+
+
+def test_download_resumes_with_the_missing_numbers(issued, ledger, stub):
+    del stub.issued[(CUIT, '1', '1', 12)]
+    stub.faults['FECompConsultar'] = 1
+    first = ledger.download(issued, 1, 1, cbte_desde=1, cbte_hasta=20, max_workers=1)
+    assert first == {'downloaded': 18, 'skipped': 0, 'not_found': 1, 'failed': 1}
+
+    second = ledger.download(issued, 1, 1, fch_desde='20240105', fch_hasta='20240110')
+    assert second['skipped'] + second['downloaded'] + second['not_found'] == 10
+    assert second['not_found'] == 1
+    assert [invoice.cbte_desde for invoice in ledger.query(CUIT, fch_desde='20240110')][:5] == [11, 13, 14, 15, 16]
+    assert ledger.get_by_cae(ledger.get(CUIT, 1, 1, 20).cod_autorizacion).cbte_desde == 20
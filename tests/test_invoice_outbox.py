@@ -0,0 +1,89 @@
+import pytest
+
+from conftest import CUIT, build_invoices
+from easyAfip.invoice_outbox import InvoiceOutbox
+from easyAfip.utils.sequence_allocator import SequenceAllocator
+from easyAfip.utils.store import MemoryStore
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    return InvoiceOutbox(str(tmp_path / 'outbox.db'))
+
+
+def submit(outbox, count, pto_vta=1, cbte_tipo=1):
+    items = [(f'order-{pto_vta}-{cbte_tipo}-{index}', pto_vta, cbte_tipo, invoice)
+             for index, invoice in enumerate(build_invoices(count))]
+    return outbox.submit_many(items, CUIT)
+
+
+def assert_all_done(outbox, count):
+    entries = [outbox.get(f'order-1-1-{index}') for index in range(count)]
+    assert [entry.status for entry in entries] == [InvoiceOutbox.DONE] * count
+    assert sorted(entry.cbte_nro for entry in entries) == list(range(1, count + 1))
+    assert all(entry.cae for entry in entries)
+    assert not any(error.code == 10016 for entry in entries for error in entry.errors)
+
+
+@pytest.mark.parametrize('allocator', [False, True])
+def test_drain_sends_every_batch_once(outbox, make_wsfev, stub, allocator):
+    wsfev = make_wsfev(sequence_allocator=SequenceAllocator(MemoryStore()) if allocator else None)
+    submit(outbox, 6)
+
+    assert outbox.drain(wsfev, batch_size=2) == 3
+    assert outbox.counts() == {InvoiceOutbox.DONE: 6}
+    assert_all_done(outbox, 6)
+    assert stub.last_numbers[(CUIT, '1', '1')] == 6
+
+
+def test_drain_keeps_numbering_across_drains(outbox, make_wsfev, stub):
+    wsfev = make_wsfev(sequence_allocator=SequenceAllocator(MemoryStore()))
+    submit(outbox, 3)
+    assert outbox.drain(wsfev, batch_size=2) == 2
+    outbox.submit_many([(f'order-1-1-{index}', 1, 1, invoice) for index, invoice in enumerate(build_invoices(5))][3:],
+                       CUIT)
+
+    assert outbox.drain(wsfev, batch_size=2) == 1
+    assert_all_done(outbox, 5)
+
+
+def test_resubmitting_a_key_returns_its_state(outbox, make_wsfev):
+    submit(outbox, 1)
+    outbox.drain(make_wsfev())
+
+    entry = outbox.submit('order-1-1-0', 1, 1, build_invoices(1)[0], cuit=CUIT)
+    assert entry.status == InvoiceOutbox.DONE and entry.cbte_nro == 1
+    with pytest.raises(ValueError):
+        outbox.submit('order-1-1-0', 2, 1, build_invoices(1)[0], cuit=CUIT)
+
+
+def test_lost_response_is_reconciled_without_duplicates(outbox, make_wsfev, stub):
+    stub.lost_responses['FECAESolicitar'] = 1
+    wsfev = make_wsfev(sequence_allocator=SequenceAllocator(MemoryStore()))
+    submit(outbox, 4)
+
+    # the first batch is authorized but its response is lost: the drain stops after reconciling it
+    assert outbox.drain(wsfev, batch_size=2) == 1
+    assert outbox.counts() == {InvoiceOutbox.DONE: 2, InvoiceOutbox.PENDING: 2}
+    outbox.drain(wsfev, batch_size=2)
+    assert_all_done(outbox, 4)
+    assert stub.last_numbers[(CUIT, '1', '1')] == 4
+
+
+def test_recover_resolves_abandoned_batches(outbox, make_wsfev, stub, monkeypatch):
+    stub.lost_responses['FECAESolicitar'] = 1
+    wsfev = make_wsfev()
+    submit(outbox, 3)
+
+    # the worker can't reconcile either (e.g. it dies): the batch stays in sending
+    def fail(*args, **kwargs):
+        raise RuntimeError('worker died')
+    monkeypatch.setattr(wsfev, 'reconcile', fail)
+    outbox.drain(wsfev, batch_size=2)
+    assert outbox.counts() == {InvoiceOutbox.SENDING: 2, InvoiceOutbox.PENDING: 1}
+
+    monkeypatch.undo()
+    assert outbox.recover(wsfev, stale_after=0) == 2
+    assert outbox.counts() == {InvoiceOutbox.DONE: 2, InvoiceOutbox.PENDING: 1}
+    outbox.drain(wsfev)
+    assert_all_done(outbox, 3)
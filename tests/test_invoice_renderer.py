@@ -0,0 +1,64 @@
+import io
+import zipfile
+
+import pytest
+
+from conftest import CUIT, build_invoices
+from easyAfip.caea_issuer import CAEAIssuer
+from easyAfip.invoice_renderer import InvoiceDocument, InvoiceRenderer, InvoiceTemplate
+from easyAfip.utils.afip_qr import build_qr_data, build_qr_url, parse_qr_url
+
+
+@pytest.fixture
+def documents(make_wsfev, stub):
+    invoices = build_invoices(4, first=1)
+    invoices[1].imp_total = '122.50'
+    # a final consumer without document
+    invoices[2].doc_tipo, invoices[2].doc_nro = 99, '0'
+    invoices[3].cbte_desde = invoices[3].cbte_hasta = 5
+    result = make_wsfev().fecaesolicitar(1, 6, invoices)
+    return InvoiceDocument.from_result(result, invoices)
+
+
+def test_only_approved_invoices_are_documents(documents):
+    # the 5th number was rejected, 4 was never sent
+    assert [document.number for document in documents] == [1, 2, 3]
+    assert documents[0].filename == f'{CUIT}_006_00001_00000001.pdf'
+
+
+def test_qr_data_follows_rg_4892(documents):
+    document = documents[0]
+    data = build_qr_data(document.cuit, document.pto_vta, document.cbte_tipo, document.invoice, document.detail)
+    assert list(data) == ['ver', 'fecha', 'cuit', 'ptoVta', 'tipoCmp', 'nroCmp', 'importe', 'moneda', 'ctz',
+                          'tipoDocRec', 'nroDocRec', 'tipoCodAut', 'codAut']
+    assert data == {'ver': 1, 'fecha': '2024-01-01', 'cuit': int(CUIT), 'ptoVta': 1, 'tipoCmp': 6, 'nroCmp': 1,
+                    'importe': 122, 'moneda': 'PES', 'ctz': 1, 'tipoDocRec': 80, 'nroDocRec': 20123456786,
+                    'tipoCodAut': 'E', 'codAut': int(document.detail.cae)}
+    assert document.qr_url.startswith('https://www.afip.gob.ar/fe/qr/?p=')
+    assert parse_qr_url(document.qr_url) == data
+
+    assert parse_qr_url(documents[1].qr_url)['importe'] == 122.5
+    assert 'tipoDocRec' not in parse_qr_url(documents[2].qr_url)
+
+
+def test_qr_data_of_a_caea_invoice(make_wsfev):
+    issuer = CAEAIssuer(make_wsfev())
+    invoice = issuer.issue(1, 6, build_invoices(1)[0])
+    result = issuer.report(1, 6)[0]
+    data = parse_qr_url(build_qr_url(build_qr_data(CUIT, 1, 6, invoice, result.details[0])))
+    assert (data['tipoCodAut'], data['codAut']) == ('A', int(invoice.caea))
+
+
+@pytest.mark.parametrize('max_workers', [0, 2])
+def test_render_to_zip(documents, max_workers):
+    pytest.importorskip('reportlab')
+    output = io.BytesIO()
+    with InvoiceRenderer(InvoiceTemplate({'razon_social': 'EMPRESA SA'}), max_workers=max_workers,
+                         chunk_size=2) as renderer:
+        assert renderer.render_to_zip(documents, output) == 3
+        # more chunks than workers, the renderer reuses its processes
+        assert sorted(filename for filename, _ in renderer.render(documents * 3)) == \
+            sorted(document.filename for document in documents * 3)
+    with zipfile.ZipFile(output) as archive:
+        assert sorted(archive.namelist()) == [document.filename for document in documents]
+        assert all(archive.read(name).startswith(b'%PDF') for name in archive.namelist())
@@ -0,0 +1,62 @@
+import threading
+from collections import Counter
+
+from conftest import CUIT, build_invoices
+from easyAfip.invoice_scheduler import InvoiceScheduler
+from easyAfip.utils.messages import AfipCommunicationError, FECAEResultEnum
+
+
+def track(wsfev):
+    # wrap FECAESolicitar to record the max requests in flight, overall and per sequence
+    fecaesolicitar, in_flight, peaks, lock = wsfev.fecaesolicitar, Counter(), Counter(), threading.Lock()
+
+    def wrapper(pto_vta, ct_tipo, invoices):
+        with lock:
+            in_flight[(pto_vta, ct_tipo)] += 1
+            in_flight['total'] += 1
+            for key, count in in_flight.items():
+                peaks[key] = max(peaks[key], count)
+        try:
+            return fecaesolicitar(pto_vta, ct_tipo, invoices)
+        finally:
+            with lock:
+                in_flight[(pto_vta, ct_tipo)] -= 1
+                in_flight['total'] -= 1
+    wsfev.fecaesolicitar = wrapper
+    return peaks
+
+
+def test_sequences_run_in_parallel_and_in_order(make_wsfev, stub):
+    stub.latency = lambda method_name: 0.05 if method_name == 'FECAESolicitar' else 0
+    wsfev = make_wsfev()
+    peaks = track(wsfev)
+    sequences = [(pto_vta, cbte_tipo) for pto_vta in (1, 2) for cbte_tipo in (1, 6)]
+    work = [(pto_vta, cbte_tipo, build_invoices(2)) for _ in range(3) for pto_vta, cbte_tipo in sequences]
+
+    with InvoiceScheduler(wsfev, max_workers=4) as scheduler:
+        futures = scheduler.submit_many(work)
+        assert scheduler.pending() > 0
+        results = [future.result() for future in futures]
+        assert scheduler.pending() == 0
+
+    assert all(result.resultado == FECAEResultEnum.APROBADO for result in results)
+    for pto_vta, cbte_tipo in sequences:
+        assert [detail.cbte_desde for result, item in zip(results, work) if item[:2] == (pto_vta, cbte_tipo)
+                for detail in result.details] == [1, 2, 3, 4, 5, 6]
+        assert stub.last_numbers[(CUIT, str(pto_vta), str(cbte_tipo))] == 6
+        assert peaks[(pto_vta, cbte_tipo)] == 1
+    assert 1 < peaks['total'] <= 4
+
+
+def test_a_failed_batch_does_not_stop_its_sequence(make_wsfev, stub):
+    stub.faults['FECAESolicitar'] = 1
+    with InvoiceScheduler(make_wsfev(), max_workers=2) as scheduler:
+        failed, following = scheduler.submit(1, 1, build_invoices(1)), scheduler.submit(1, 1, build_invoices(1))
+        assert isinstance(failed.exception(), AfipCommunicationError)
+        assert [detail.cbte_desde for detail in following.result().details] == [1]
+
+
+def test_shard_is_the_sequence_key(make_wsfev):
+    scheduler = InvoiceScheduler(make_wsfev())
+    assert scheduler.get_shard(1, 6) == scheduler.get_shard('1', '6') != scheduler.get_shard(2, 6)
+    scheduler.shutdown()
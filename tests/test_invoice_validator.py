@@ -0,0 +1,92 @@
+from datetime import date
+
+import pytest
+
+from conftest import CUIT, build_invoices
+from easyAfip.utils.afip_ws_connector import AfipWSConnector
+from easyAfip.utils.invoice_validator import InvoiceValidator, is_valid_cuit
+from easyAfip.utils.messages import FECAEResultEnum, Persona
+from easyAfip.utils.persona_cache import PersonaCache
+from easyAfip.utils.sequence_allocator import SequenceAllocator
+from easyAfip.wspadron import WSPadron
+
+TODAY = date(2024, 1, 3)
+
+
+def build_invoice(**fields):
+    invoice = build_invoices(1)[0]
+    invoice.cbte_fch = f'{TODAY:%Y%m%d}'
+    for name, value in fields.items():
+        setattr(invoice, name, value)
+    return invoice
+
+
+def codes(errors):
+    return [error.code for error in errors]
+
+
+def test_is_valid_cuit():
+    assert is_valid_cuit(CUIT) and is_valid_cuit('20-12345678-6') and is_valid_cuit(int(CUIT))
+    assert not is_valid_cuit('20123456787') and not is_valid_cuit('2012345678') and not is_valid_cuit('2012345678a')
+
+
+@pytest.mark.parametrize('fields, expected', [
+    ({}, []),
+    ({'imp_total': '122.01'}, []),
+    ({'imp_total': '123.00'}, [InvoiceValidator.IMP_TOTAL_ERROR]),
+    ({'imp_total': 'NaN'}, [InvoiceValidator.IMP_TOTAL_ERROR]),
+    ({'imp_total': 'Infinity'}, [InvoiceValidator.IMP_TOTAL_ERROR]),
+    ({'imp_neto': float('nan')}, [InvoiceValidator.IMP_TOTAL_ERROR]),
+    ({'imp_iva': 'abc'}, [InvoiceValidator.IMP_TOTAL_ERROR]),
+    ({'cbte_fch': '20231228'}, [InvoiceValidator.CBTE_FCH_ERROR]),
+    ({'cbte_fch': '20240230'}, [InvoiceValidator.CBTE_FCH_ERROR]),
+    ({'fch_vto_pago': '20240110'}, [InvoiceValidator.FCH_VTO_PAGO_ERROR]),
+    ({'concepto': 2, 'cbte_fch': '20231228', 'fch_serv_desde': '20231201', 'fch_serv_hasta': '20231231',
+      'fch_vto_pago': '20240110'}, []),
+    ({'concepto': 2, 'fch_serv_desde': '20240201', 'fch_serv_hasta': '20240131', 'fch_vto_pago': '20240102'},
+     [InvoiceValidator.FCH_SERV_HASTA_ERROR, InvoiceValidator.FCH_VTO_PAGO_ERROR]),
+    ({'concepto': 3}, [InvoiceValidator.FCH_SERV_DESDE_ERROR, InvoiceValidator.FCH_SERV_HASTA_ERROR,
+                       InvoiceValidator.FCH_VTO_PAGO_ERROR]),
+    ({'doc_nro': '20123456787'}, [InvoiceValidator.DOC_NRO_ERROR]),
+    ({'doc_tipo': 96, 'doc_nro': '123456789'}, [InvoiceValidator.DOC_TYPE_ERROR, InvoiceValidator.DOC_NRO_ERROR]),
+    ({'doc_tipo': 99, 'doc_nro': 0}, [InvoiceValidator.DOC_TYPE_ERROR]),
+])
+def test_validate(fields, expected):
+    invoice = build_invoice(**fields)
+    assert codes(InvoiceValidator(today=TODAY).validate([invoice], cbte_tipo=1)[0]) == expected
+
+
+def test_date_errors_are_not_numbering_errors():
+    errors = InvoiceValidator(today=TODAY).validate([build_invoice(cbte_fch='20240201')])[0]
+    assert codes(errors) == [InvoiceValidator.CBTE_FCH_ERROR]
+    assert not SequenceAllocator.is_numbering_error(errors)
+
+
+def test_only_valid_invoices_are_sent(make_wsfev, stub):
+    invoices = [build_invoice(), build_invoice(imp_total='NaN'), build_invoice(), build_invoice(doc_nro='1')]
+    valid, rejected = InvoiceValidator(today=TODAY).split(invoices, cbte_tipo=1)
+    assert valid == [invoices[0], invoices[2]]
+    assert [invoice for invoice, _ in rejected] == [invoices[1], invoices[3]]
+
+    result = make_wsfev().fecaesolicitar(1, 1, valid)
+    assert result.resultado == FECAEResultEnum.APROBADO
+
+
+def test_receptors_are_checked_in_the_padron(stub):
+    stub.personas.update({'20111111112': None,
+                          '20222222223': Persona('20222222223', 'FISICA', 'ANA', 'GOMEZ', estado_clave='INACTIVO')})
+    connector = AfipWSConnector(stub.url('ws_sr_constancia_inscripcion'))
+    padron = WSPadron('token', 'sign', CUIT, test_mode=True, connector=connector, persona_cache=PersonaCache())
+    invoices = [build_invoice(doc_nro=doc_nro) for doc_nro in (CUIT, '20111111112', '20222222223', CUIT)]
+    validator = InvoiceValidator(today=TODAY, padron=padron)
+
+    assert [codes(errors) for errors in validator.validate(invoices)] == \
+        [[], [InvoiceValidator.DOC_NRO_ERROR], [InvoiceValidator.DOC_NRO_ERROR], []]
+    validator.validate(invoices)
+    assert stub.request_counts['getPersonaList_v2'] == 1
+
+    # an unavailable padron does not stop the batch
+    padron.persona_cache = PersonaCache()
+    stub.faults['getPersonaList_v2'] = 1
+    assert validator.validate(invoices) == [[], [], [], []]
+    connector.close()
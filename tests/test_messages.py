@@ -0,0 +1,27 @@
+from decimal import Decimal
+
+from easyAfip.utils.messages import AlicIva, FECAEDetRequest, Tributo, to_decimal
+
+
+def test_to_decimal_keeps_the_representation():
+    assert str(to_decimal('122.00')) == '122.00'
+    assert to_decimal('122.00') is to_decimal('122.00')
+    assert str(to_decimal(Decimal('1.10'))) == '1.10'
+    assert str(to_decimal(Decimal('1.1'))) == '1.1'
+    assert str(to_decimal('1.10')) == '1.10'
+    assert str(to_decimal(1.1)) == '1.1'
+    assert str(to_decimal(1)) == '1'
+    assert to_decimal(None) is None and to_decimal('') == ''
+
+
+def test_invoice_lists_are_lists():
+    invoice = FECAEDetRequest(concepto='1', tributos=[Tributo('99', '100.00', '1', '1.00', 'Percepcion')])
+    assert invoice.iva == [] and invoice.cbtes_asoc == [] and invoice.opcionales == []
+    invoice.iva.append(AlicIva('5', '100.00', '21.00'))
+    assert FECAEDetRequest().iva == []
+
+    restored = FECAEDetRequest.from_dict(invoice.to_dict(json_safe=True))
+    assert isinstance(restored.tributos, list) and isinstance(restored.iva, list)
+    assert restored.to_dict() == invoice.to_dict()
+    restored.tributos.append(Tributo('99', '100.00', '1', '1.00', 'Percepcion'))
+    assert len(invoice.tributos) == 1
@@ -0,0 +1,61 @@
+import threading
+import time
+from datetime import timedelta
+
+from easyAfip.utils.param_cache import ParamCache
+from easyAfip.utils.store import FileStore
+
+
+def test_tables_are_requested_once(make_wsfev, stub):
+    wsfev = make_wsfev()
+    threads = [threading.Thread(target=wsfev.feparamgettiposcbte) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [item.id for item in wsfev.feparamgettiposcbte()] == ['1', '6', '11', '3']
+    assert stub.request_counts['FEParamGetTiposCbte'] == 1
+
+    wsfev.param_cache.invalidate()
+    wsfev.feparamgettiposcbte()
+    assert stub.request_counts['FEParamGetTiposCbte'] == 2
+
+
+def test_every_table_has_its_ttl_and_a_stale_one_is_used_when_the_service_fails(make_wsfev, stub):
+    wsfev = make_wsfev(param_cache=ParamCache(ttls={'FEParamGetCotizacion': timedelta(seconds=0.1)}))
+    cotizacion = wsfev.feparamgetcotizacion('DOL')
+    wsfev.feparamgettiposmonedas()
+    time.sleep(0.1)
+
+    stub.faults['FEParamGetCotizacion'] = 1
+    assert wsfev.feparamgetcotizacion('DOL').mon_cotiz == cotizacion.mon_cotiz
+    wsfev.feparamgetcotizacion('DOL')
+    wsfev.feparamgettiposmonedas()
+    assert stub.request_counts['FEParamGetCotizacion'] == 3
+    assert stub.request_counts['FEParamGetTiposMonedas'] == 1
+
+
+def test_persisted_tables_are_shared_with_a_new_process(make_wsfev, stub, tmp_path):
+    store = FileStore(str(tmp_path / 'params'))
+    make_wsfev(param_cache=ParamCache(store=store)).feparamgettiposiva()
+    assert [item.desc for item in make_wsfev(param_cache=ParamCache(store=store)).feparamgettiposiva()] == \
+        ['0%', '10.5%', '21%', '27%']
+    assert stub.request_counts['FEParamGetTiposIva'] == 1
+
+
+def test_snapshot_restores_only_the_valid_tables(make_wsfev, stub):
+    cache = ParamCache(ttls={'FEParamGetCotizacion': timedelta(seconds=0.1)})
+    wsfev = make_wsfev(param_cache=cache)
+    wsfev.feparamgettiposdoc()
+    wsfev.feparamgetcotizacion('DOL')
+    snapshot = cache.snapshot()
+    assert len(snapshot) == 2
+    time.sleep(0.1)
+
+    restored = ParamCache()
+    restored.restore(snapshot)
+    other = make_wsfev(param_cache=restored)
+    other.feparamgettiposdoc()
+    other.feparamgetcotizacion('DOL')
+    assert stub.request_counts['FEParamGetTiposDoc'] == 1
+    assert stub.request_counts['FEParamGetCotizacion'] == 2
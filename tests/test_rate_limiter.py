@@ -0,0 +1,91 @@
+import threading
+import time
+
+import pytest
+
+from conftest import CUIT
+from easyAfip.utils.afip_ws_connector import AfipWSConnector
+from easyAfip.utils.messages import AfipCommunicationError, AfipThrottledError, RateLimitError
+from easyAfip.utils.rate_limiter import RateLimiter
+from easyAfip.utils.store import SqliteStore
+from easyAfip.wsfev import WSFEV
+
+SCOPE = ('wsfev1', CUIT)
+
+
+def test_limit_decreases_on_pressure_and_grows_back_slowly():
+    limiter = RateLimiter(rate=1000, initial_limit=8, latency_target=1.0)
+    permits = [limiter.acquire(*SCOPE) for _ in range(3)]
+
+    limiter.release(permits[0], error=AfipCommunicationError('HTTP 503', 503))
+    assert limiter.get_state(*SCOPE)['limit'] == 4
+    assert limiter.get_batch_size(100, *SCOPE) == 50
+    # the requests sent before the decrease are the same sign of pressure
+    limiter.release(permits[1], latency=2.0)
+    assert limiter.get_state(*SCOPE)['limit'] == 4
+    # a client error is not a sign of pressure
+    limiter.release(permits[2], error=AfipCommunicationError('HTTP 400', 400))
+    assert limiter.get_state(*SCOPE)['limit'] == 4
+
+    for _ in range(4):
+        with limiter.acquire(*SCOPE):
+            pass
+    state = limiter.get_state(*SCOPE)
+    assert 4.9 < state['limit'] < 5
+    assert state['batch_scale'] == pytest.approx(0.7)
+    assert not state['leases']
+
+
+def test_slow_response_after_the_decrease_is_a_new_sign_of_pressure():
+    limiter = RateLimiter(rate=1000, initial_limit=8, latency_target=1.0)
+    limiter.record_overload(*SCOPE)
+    time.sleep(0.01)
+    limiter.release(limiter.acquire(*SCOPE), latency=2.0)
+    assert limiter.get_state(*SCOPE)['limit'] == 2
+
+
+def test_retry_after_blocks_the_scope(make_wsfev, stub):
+    stub.capacity, stub.retry_after = 0, 0.3
+    limiter = RateLimiter(rate=1000)
+    wsfev = make_wsfev(rate_limiter=limiter)
+
+    with pytest.raises(AfipThrottledError):
+        wsfev.fecompultimoautorizado(1, 1)
+    with pytest.raises(RateLimitError):
+        limiter.acquire(wsfev.ws_endpoint, wsfev.cuit, timeout=0.1)
+    # other CUITs are not blocked
+    limiter.release(limiter.acquire(wsfev.ws_endpoint, '20111111112', timeout=0.1))
+
+    stub.capacity = None
+    started = time.monotonic()
+    assert wsfev.fecompultimoautorizado(1, 1).nro_cbte == 0
+    assert time.monotonic() - started >= 0.1
+    assert not limiter.get_state(wsfev.ws_endpoint, wsfev.cuit)['leases']
+
+
+def test_requests_in_flight_are_limited(stub):
+    stub.capacity, stub.latency = 2, 0.1
+    limiter = RateLimiter(rate=1000, initial_limit=2, max_limit=2)
+    connector = AfipWSConnector(stub.url('wsfev1'), pool_size=8)
+    wsfev = WSFEV('token', 'sign', CUIT, test_mode=True, connector=connector, rate_limiter=limiter)
+
+    threads = [threading.Thread(target=wsfev.fecompultimoautorizado, args=(1, 1)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    connector.close()
+    assert stub.request_counts['FECompUltimoAutorizado'] == 6
+    assert stub.rejected == 0
+
+
+def test_lease_of_a_lost_permit_is_reclaimed(tmp_path):
+    store = SqliteStore(str(tmp_path / 'limiter.db'))
+    # two processes sharing the limit
+    first, second = (RateLimiter(store, rate=1000, initial_limit=1, lease=0.2) for _ in range(2))
+    first.acquire(*SCOPE)
+
+    with pytest.raises(RateLimitError):
+        second.acquire(*SCOPE, timeout=0.05)
+    with second.acquire(*SCOPE, timeout=1):
+        assert len(second.get_state(*SCOPE)['leases']) == 1
@@ -0,0 +1,43 @@
+import pytest
+
+from easyAfip.utils.columnar import InvoiceColumns
+from easyAfip.utils.messages import FECAEDetRequest
+from easyAfip.wsfev import WSFEV
+
+
+def build_invoice(cbte_nro, **kwargs):
+    fields = dict(concepto='1', doc_tipo='80', doc_nro='20123456786', cbte_desde=cbte_nro, cbte_hasta=cbte_nro,
+                  cbte_fch='20240101', imp_total='121.00', imp_tot_conc='0', imp_neto='100.00', imp_op_ex='0',
+                  imp_iva='21.00', imp_trib='0', mon_id='PES', mon_cotiz='1')
+    fields.update(kwargs)
+    return FECAEDetRequest(**fields)
+
+
+def to_columns(invoices):
+    return InvoiceColumns({name: [getattr(invoice, name) for invoice in invoices] for name in InvoiceColumns.FIELDS})
+
+
+@pytest.mark.parametrize('invoices', [
+    [build_invoice(1), build_invoice(2, imp_trib='1.00', imp_total='122.00')],
+    # a final consumer without document: DocNro 0 and ImpTrib 0 must be sent
+    [build_invoice(1, doc_tipo='99', doc_nro='0'), build_invoice(2, doc_tipo='99', doc_nro=0, imp_trib=0)],
+    [build_invoice(1, concepto='2', fch_serv_desde='20240101', fch_serv_hasta='20240131', fch_vto_pago='20240210',
+                   mon_id='DOL', mon_cotiz='1000.50')],
+])
+def test_columns_and_objects_serialize_the_same(invoices):
+    serializer = WSFEV.SERIALIZER
+    assert serializer.fecaesolicitar_body_columns(1, 6, to_columns(invoices)) == \
+        serializer.fecaesolicitar_body(1, 6, invoices)
+
+
+def test_columns_numbered_when_sending():
+    invoices = [build_invoice(7), build_invoice(8)]
+    columns = to_columns([build_invoice(None), build_invoice(None)])
+    assert WSFEV.SERIALIZER.fecaesolicitar_body_columns(1, 6, columns, numbers=[7, 8]) == \
+        WSFEV.SERIALIZER.fecaesolicitar_body(1, 6, invoices)
+
+
+def test_zero_optional_fields_are_sent():
+    invoices = [build_invoice(1, doc_tipo='99', doc_nro=0, imp_trib=0)]
+    body = ''.join(WSFEV.SERIALIZER.fecaesolicitar_body_columns(1, 6, to_columns(invoices)))
+    assert '<ar:ImpTrib>0</ar:ImpTrib>' in body and '<ar:DocNro>0</ar:DocNro>' in body
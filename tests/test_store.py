@@ -0,0 +1,71 @@
+import threading
+import time
+
+import pytest
+
+from easyAfip.utils.store import FileStore, MemoryStore, SqliteStore
+
+STORES = {
+    'memory': lambda tmp_path: MemoryStore(),
+    'file': lambda tmp_path: FileStore(str(tmp_path / 'store')),
+    'sqlite': lambda tmp_path: SqliteStore(str(tmp_path / 'store.db')),
+}
+
+
+@pytest.mark.parametrize('store', STORES)
+def test_lock_makes_read_modify_write_atomic(tmp_path, store):
+    store = STORES[store](tmp_path)
+    store.set('counter', 0)
+
+    def increment():
+        for _ in range(20):
+            with store.lock('counter'):
+                value = store.get('counter')
+                time.sleep(0.001)
+                store.set('counter', value + 1)
+    threads = [threading.Thread(target=increment) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert store.get('counter') == 80
+
+
+@pytest.mark.parametrize('store', STORES)
+def test_lock_is_reentrant(tmp_path, store):
+    store = STORES[store](tmp_path)
+    with store.lock('key'):
+        with store.lock('key'):
+            store.set('key', {'value': 1})
+    assert store.get('key') == {'value': 1}
+    store.delete('key')
+    assert store.get('key') is None
+
+
+def test_sqlite_lock_is_per_key(tmp_path):
+    path = str(tmp_path / 'store.db')
+    # two stores on the same file, as two processes would be
+    holder, other = SqliteStore(path), SqliteStore(path, timeout=0.2)
+    with holder.lock('a'):
+        with other.lock('b'):
+            other.set('b', 1)
+        with pytest.raises(TimeoutError):
+            with other.lock('a'):
+                pass
+    with other.lock('a'):
+        other.set('a', 1)
+    assert holder.get('a') == holder.get('b') == 1
+
+
+def test_sqlite_expired_lease_is_reclaimed(tmp_path):
+    path = str(tmp_path / 'store.db')
+    # the holder died without releasing the lock
+    SqliteStore(path, lease=0.1)._acquire_row('a', time.monotonic())
+    store = SqliteStore(path, timeout=0.2)
+    with pytest.raises(TimeoutError):
+        with SqliteStore(path, timeout=0.05).lock('a'):
+            pass
+    time.sleep(0.1)
+    with store.lock('a'):
+        store.set('a', 1)
+    assert store.get('a') == 1
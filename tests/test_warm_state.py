@@ -0,0 +1,67 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import CUIT
+from easyAfip.utils.afip_ws_connector import AfipWSConnector
+from easyAfip.utils.param_cache import ParamCache
+from easyAfip.utils.store import MemoryStore
+from easyAfip.warm_state import WarmState
+from easyAfip.wsaa import WSAA
+
+
+@pytest.fixture
+def make_wsaa(stub, credentials):
+    connector = AfipWSConnector(stub.url('wsaa'))
+
+    def make(ticket_store):
+        pem, key = credentials
+        return WSAA(pem, key, 'wsfe', test_mode=True, cuit=CUIT, ticket_store=ticket_store, connector=connector)
+    yield make
+    connector.close()
+
+
+def with_expiration(ticket, delta):
+    return dict(ticket, expiration_time=(datetime.now(WSAA.TIMEZONE) + delta).isoformat())
+
+
+def test_restored_worker_needs_no_login_nor_params(make_wsaa, make_wsfev, stub):
+    wsfev = make_wsfev()
+    wsfev.feparamgettiposcbte()
+    state = WarmState.capture([make_wsaa(MemoryStore())], wsfev)
+    data = json.loads(json.dumps(state.to_dict()))
+
+    ticket_store, param_cache = MemoryStore(), ParamCache()
+    WarmState.from_dict(data).restore(ticket_store, param_cache)
+    restored = make_wsaa(ticket_store)
+    assert restored.get_access_ticket() == state.tickets[restored.get_ticket_key()]
+    make_wsfev(param_cache=param_cache).feparamgettiposcbte()
+    assert stub.request_counts['LoginCms'] == 1
+    assert stub.request_counts['FEParamGetTiposCbte'] == 1
+    assert WarmState.from_dict(data).get_connector('wsfev1') is AfipWSConnector.get_shared(stub.url('wsfev1'))
+    AfipWSConnector.close_shared()
+
+    with pytest.raises(ValueError):
+        WarmState.from_dict(dict(data, version=0))
+
+
+def test_restore_keeps_the_ticket_that_expires_later(make_wsaa):
+    ticket_store = MemoryStore()
+    wsaa = make_wsaa(ticket_store)
+    key = wsaa.get_ticket_key()
+    ticket = wsaa.get_access_ticket()
+    renewed = with_expiration(ticket, timedelta(hours=12))
+
+    # an older snapshot does not overwrite the ticket renewed in the meantime
+    ticket_store.set(key, renewed)
+    WarmState({key: with_expiration(ticket, timedelta(hours=1))}).restore(ticket_store, ParamCache())
+    assert ticket_store.get(key) == renewed
+
+    # an expired one is not restored, not even into an empty store
+    ticket_store.delete(key)
+    WarmState({key: with_expiration(ticket, timedelta(minutes=-1))}).restore(ticket_store, ParamCache())
+    assert ticket_store.get(key) is None
+
+    WarmState({key: renewed}).restore(ticket_store, ParamCache())
+    assert ticket_store.get(key) == renewed
@@ -0,0 +1,86 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import CUIT
+from easyAfip.utils.afip_ws_connector import AfipWSConnector
+from easyAfip.utils.store import FileStore, MemoryStore, SqliteStore
+from easyAfip.wsaa import WSAA
+
+STORES = {
+    'memory': lambda tmp_path: MemoryStore(),
+    'file': lambda tmp_path: FileStore(str(tmp_path / 'tickets')),
+    'sqlite': lambda tmp_path: SqliteStore(str(tmp_path / 'tickets.db')),
+}
+
+
+@pytest.fixture
+def make_wsaa(stub, credentials):
+    connectors = []
+
+    def make(ticket_store, **kwargs):
+        connector = AfipWSConnector(stub.url('wsaa'))
+        connectors.append(connector)
+        pem, key = credentials
+        return WSAA(pem, key, 'wsfe', test_mode=True, ticket_store=ticket_store, connector=connector, **kwargs)
+    yield make
+    for connector in connectors:
+        connector.close()
+
+
+@pytest.mark.parametrize('store', STORES)
+def test_ticket_is_shared_by_the_clients_of_the_store(make_wsaa, stub, tmp_path, store):
+    ticket_store = STORES[store](tmp_path)
+    clients = [make_wsaa(ticket_store) for _ in range(4)]
+    stub.latency = 0.1
+    tickets = []
+
+    threads = [threading.Thread(target=lambda wsaa=wsaa: tickets.append(wsaa.get_access_ticket()))
+               for wsaa in clients * 2]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert stub.request_counts['LoginCms'] == 1
+    assert len({ticket['token'] for ticket in tickets}) == 1
+    assert ticket_store.get(clients[0].get_ticket_key()) == tickets[0]
+
+
+def test_ticket_key_takes_the_cuit_from_the_certificate(make_wsaa):
+    assert make_wsaa(MemoryStore()).get_ticket_key() == f'wsaa:{CUIT}:wsfe:homo'
+
+
+def test_ticket_is_refreshed_before_it_expires(make_wsaa, stub):
+    ticket_store = MemoryStore()
+    wsaa = make_wsaa(ticket_store)
+    ticket = wsaa.get_access_ticket()
+    assert wsaa.get_access_ticket() == ticket
+
+    # within the refresh margin
+    expiration_time = datetime.now(WSAA.TIMEZONE) + WSAA.DEFAULT_REFRESH_MARGIN - timedelta(minutes=1)
+    ticket_store.set(wsaa.get_ticket_key(), dict(ticket, expiration_time=expiration_time.isoformat()))
+    assert wsaa.get_access_ticket()['token'] != ticket['token']
+    assert stub.request_counts['LoginCms'] == 2
+
+    wsaa.invalidate_access_ticket()
+    wsaa.get_access_ticket()
+    assert stub.request_counts['LoginCms'] == 3
+
+
+def test_sqlite_refresh_does_not_block_other_keys(make_wsaa, stub, tmp_path):
+    ticket_store = SqliteStore(str(tmp_path / 'tickets.db'))
+    wsaa = make_wsaa(ticket_store)
+    stub.latency = lambda method_name: 0.5 if method_name == 'LoginCms' else 0
+    refresh = threading.Thread(target=wsaa.get_access_ticket)
+    refresh.start()
+    time.sleep(0.1)
+
+    # the refresh of the ticket holds only its own key, the rest of the store is still writable
+    start = time.monotonic()
+    with ticket_store.lock('sequence'):
+        ticket_store.set('sequence', 1)
+    assert time.monotonic() - start < 0.3
+    refresh.join()
+    assert ticket_store.get(wsaa.get_ticket_key())
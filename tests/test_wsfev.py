@@ -0,0 +1,120 @@
+import pytest
+
+from conftest import CUIT, build_invoices
+from easyAfip.invoice_scheduler import InvoiceScheduler
+from easyAfip.utils.messages import AfipCommunicationError, FECAEResultEnum, WSFEVException
+from easyAfip.utils.retry_policy import RetryPolicy
+from easyAfip.utils.sequence_allocator import SequenceAllocator
+from easyAfip.utils.store import MemoryStore
+
+
+def numbers(results):
+    return [detail.cbte_desde for result in results for detail in result.details]
+
+
+def allocator_or_none(allocator):
+    return SequenceAllocator(MemoryStore()) if allocator else None
+
+
+@pytest.mark.parametrize('allocator', [False, True])
+def test_fecaesolicitar_numbers_the_invoices(make_wsfev, stub, allocator):
+    wsfev = make_wsfev(sequence_allocator=allocator_or_none(allocator))
+    invoices = build_invoices(3)
+
+    results = [wsfev.fecaesolicitar(1, 1, invoices), wsfev.fecaesolicitar(1, 1, build_invoices(2))]
+    assert numbers(results) == [1, 2, 3, 4, 5]
+    assert all(result.resultado == FECAEResultEnum.APROBADO for result in results)
+    assert all(invoice.cbte_desde is None for invoice in invoices)
+    assert stub.last_numbers[(CUIT, '1', '1')] == 5
+
+
+def test_numbered_invoices_take_no_number_from_the_allocator(make_wsfev, stub):
+    allocator = SequenceAllocator(MemoryStore())
+    wsfev = make_wsfev(sequence_allocator=allocator)
+    key = SequenceAllocator.get_key(CUIT, 1, 1, wsfev.environment)
+    wsfev.fecaesolicitar(1, 1, build_invoices(1))
+    assert allocator.store.get(key) == 1
+
+    # e.g. a batch numbered by the outbox, which already reserved its numbers
+    allocator.allocate(key, 2, seed=lambda: 0)
+    result = wsfev.fecaesolicitar(1, 1, build_invoices(2, first=2))
+    assert numbers([result]) == [2, 3]
+    assert allocator.store.get(key) == 3
+    assert numbers([wsfev.fecaesolicitar(1, 1, build_invoices(1))]) == [4]
+
+
+@pytest.mark.parametrize('allocator', [False, True])
+def test_stream_numbers_consecutive_batches(make_wsfev, stub, allocator):
+    stub.reg_x_req = 2
+    wsfev = make_wsfev(sequence_allocator=allocator_or_none(allocator))
+
+    results = list(wsfev.fecaesolicitar_stream(1, 1, iter(build_invoices(5))))
+    assert [len(result.details) for result in results] == [2, 2, 1]
+    assert numbers(results) == [1, 2, 3, 4, 5]
+    assert numbers([wsfev.fecaesolicitar(1, 1, build_invoices(1))]) == [6]
+
+
+def test_allocator_is_reseeded_after_a_numbering_error(make_wsfev, stub):
+    wsfev = make_wsfev(sequence_allocator=SequenceAllocator(MemoryStore()))
+    wsfev.fecaesolicitar(1, 1, build_invoices(1))
+    # another client issued invoices behind the allocator's back
+    stub.last_numbers[(CUIT, '1', '1')] = 10
+
+    result = wsfev.fecaesolicitar(1, 1, build_invoices(2))
+    assert numbers([result]) == [11, 12]
+    assert result.resultado == FECAEResultEnum.APROBADO
+
+
+@pytest.mark.parametrize('fault', ['faults', 'lost_responses'])
+def test_retry_resubmits_only_the_missing_invoices(make_wsfev, stub, fault):
+    # faults: the request is not processed; lost_responses: it is authorized but the response is lost
+    getattr(stub, fault)['FECAESolicitar'] = 1
+    wsfev = make_wsfev(retry_policy=RetryPolicy(backoff=0, jitter=0))
+
+    result = wsfev.fecaesolicitar(1, 1, build_invoices(3))
+    assert numbers([result]) == [1, 2, 3]
+    assert result.resultado == FECAEResultEnum.APROBADO
+    assert all(detail.cae for detail in result.details)
+    assert stub.last_numbers[(CUIT, '1', '1')] == 3
+
+
+def test_retry_gives_up_after_max_attempts(make_wsfev, stub):
+    stub.faults['FECAESolicitar'] = 2
+    wsfev = make_wsfev(retry_policy=RetryPolicy(max_attempts=2, backoff=0, jitter=0))
+
+    with pytest.raises(AfipCommunicationError):
+        wsfev.fecaesolicitar(1, 1, build_invoices(1))
+    assert numbers([wsfev.fecaesolicitar(1, 1, build_invoices(1))]) == [1]
+
+
+def test_reconcile_splits_authorized_and_missing_invoices(make_wsfev):
+    wsfev = make_wsfev()
+    invoices = build_invoices(3, first=1)
+    wsfev.fecaesolicitar(1, 1, invoices[:2])
+
+    granted, missing = wsfev.reconcile(1, 1, invoices)
+    assert [detail.cbte_desde for detail in granted] == [1, 2]
+    assert all(detail.cae for detail in granted)
+    assert missing == invoices[2:]
+
+    other = build_invoices(1, first=1)[0]
+    other.imp_total = 500
+    with pytest.raises(WSFEVException):
+        wsfev.reconcile(1, 1, [other])
+
+
+@pytest.mark.parametrize('allocator', [False, True])
+def test_submit_many_numbers_every_sequence_in_order(make_wsfev, stub, allocator):
+    work = [(pto_vta, 1, build_invoices(2)) for _ in range(4) for pto_vta in (1, 2)]
+    with make_wsfev(sequence_allocator=allocator_or_none(allocator), max_workers=4) as wsfev:
+        futures = wsfev.submit_many(work)
+        assert isinstance(wsfev._scheduler, InvoiceScheduler)
+        results = [future.result() for future in futures]
+
+    assert wsfev._scheduler is None
+    for pto_vta in (1, 2):
+        assert numbers(result for result, (item_pto_vta, _, _) in zip(results, work) if item_pto_vta == pto_vta) == \
+            list(range(1, 9))
+        assert stub.last_numbers[(CUIT, str(pto_vta), '1')] == 8
+    assert all(result.resultado == FECAEResultEnum.APROBADO for result in results)
+
@@ -0,0 +1,140 @@
+import asyncio
+import inspect
+
+import pytest
+
+pytest.importorskip('aiohttp')
+
+from conftest import CUIT, build_invoices
+from easyAfip.utils.async_afip_ws_connector import AsyncAfipWSConnector
+from easyAfip.utils.messages import FECAEResultEnum
+from easyAfip.utils.rate_limiter import RateLimiter
+from easyAfip.utils.retry_policy import RetryPolicy
+from easyAfip.utils.sequence_allocator import SequenceAllocator
+from easyAfip.utils.store import MemoryStore
+from easyAfip.wsfev import WSFEV
+from easyAfip.wsfev_async import AsyncWSFEV
+
+
+def run(stub, coroutine_function, **kwargs):
+    async def main():
+        connector = AsyncAfipWSConnector(stub.url('wsfev1'))
+        try:
+            return await coroutine_function(AsyncWSFEV('token', 'sign', CUIT, test_mode=True, connector=connector,
+                                                       **kwargs))
+        finally:
+            await connector.close()
+    return asyncio.run(main())
+
+
+def numbers(results):
+    return [detail.cbte_desde for result in results for detail in result.details]
+
+
+@pytest.mark.parametrize('allocator', [False, True])
+def test_fecaesolicitar_numbers_the_invoices(stub, allocator):
+    invoices = build_invoices(3)
+
+    async def issue(wsfev):
+        return [await wsfev.fecaesolicitar(1, 1, invoices), await wsfev.fecaesolicitar(1, 1, build_invoices(2))]
+
+    results = run(stub, issue, sequence_allocator=SequenceAllocator(MemoryStore()) if allocator else None)
+    assert numbers(results) == [1, 2, 3, 4, 5]
+    assert all(detail.resultado == FECAEResultEnum.APROBADO for result in results for detail in result.details)
+    assert all(invoice.cbte_desde is None for invoice in invoices)
+
+
+def test_allocator_is_reseeded_after_a_numbering_error(stub):
+    allocator = SequenceAllocator(MemoryStore())
+    stub.last_numbers[(CUIT, '1', '1')] = 0
+
+    async def issue(wsfev):
+        await wsfev.fecaesolicitar(1, 1, build_invoices(1))
+        # another client issued invoices behind the allocator's back
+        stub.last_numbers[(CUIT, '1', '1')] = 10
+        return await wsfev.fecaesolicitar(1, 1, build_invoices(2))
+
+    result = run(stub, issue, sequence_allocator=allocator)
+    assert [detail.cbte_desde for detail in result.details] == [11, 12]
+    assert result.resultado == FECAEResultEnum.APROBADO
+
+
+def test_stream_and_batch_size(stub):
+    stub.reg_x_req = 2
+
+    async def issue(wsfev):
+        assert await wsfev.get_reg_x_req() == 2
+        assert await wsfev.get_batch_size(5) == 2
+        return [result async for result in wsfev.fecaesolicitar_stream(1, 1, build_invoices(5))]
+
+    results = run(stub, issue)
+    assert len(results) == 3
+    assert numbers(results) == [1, 2, 3, 4, 5]
+
+
+@pytest.mark.parametrize('fault', ['faults', 'lost_responses'])
+def test_retry_resubmits_only_the_missing_invoices(stub, fault):
+    getattr(stub, fault)['FECAESolicitar'] = 1
+
+    async def issue(wsfev):
+        return await wsfev.fecaesolicitar(1, 1, build_invoices(3))
+
+    result = run(stub, issue, retry_policy=RetryPolicy(backoff=0, jitter=0))
+    assert numbers([result]) == [1, 2, 3]
+    assert result.resultado == FECAEResultEnum.APROBADO
+    assert stub.last_numbers[(CUIT, '1', '1')] == 3
+
+
+def test_queries_are_retried(stub):
+    stub.faults['FECompUltimoAutorizado'] = 1
+
+    async def query(wsfev):
+        return await wsfev.fecompultimoautorizado(1, 1)
+
+    assert run(stub, query, retry_policy=RetryPolicy(backoff=0, jitter=0)).nro_cbte == 0
+
+
+def test_reconcile(stub):
+    invoices = build_invoices(3, first=1)
+
+    async def issue(wsfev):
+        await wsfev.fecaesolicitar(1, 1, invoices[:2])
+        return await wsfev.reconcile(1, 1, invoices)
+
+    granted, missing = run(stub, issue)
+    assert [detail.cbte_desde for detail in granted] == [1, 2]
+    assert missing == invoices[2:]
+
+
+def test_rate_limiter_slots_and_batch_size(stub):
+    stub.reg_x_req = 4
+    limiter = RateLimiter(rate=1000)
+
+    async def issue(wsfev):
+        limiter.record_overload(wsfev.ws_endpoint, CUIT)
+        assert await wsfev.get_batch_size() == 2
+        return [result async for result in wsfev.fecaesolicitar_stream(1, 1, build_invoices(4))]
+
+    results = run(stub, issue, rate_limiter=limiter)
+    assert [len(result.details) for result in results] == [2, 2]
+    state = limiter.get_state(AsyncWSFEV.ENDPOINTS['wsfev1']['homo'], CUIT)
+    assert not state['leases']
+
+
+def test_only_the_async_api_is_exposed():
+    assert not issubclass(AsyncWSFEV, WSFEV)
+    for name in ('feparamgettiposcbte', 'fecaesolicitar_columns', 'fecaeasolicitar', 'submit', 'submit_many'):
+        assert not hasattr(AsyncWSFEV, name)
+    for name in ('fecaesolicitar', 'fecaesolicitar_stream', 'reconcile', 'fecomptotxrequest', 'get_batch_size'):
+        assert inspect.iscoroutinefunction(getattr(AsyncWSFEV, name)) or \
+            inspect.isasyncgenfunction(getattr(AsyncWSFEV, name))
+
+
+def test_shared_connector_config():
+    url = 'http://127.0.0.1:1/wsfev1-config-test'
+    connector = AsyncAfipWSConnector.get_shared(url, pool_size=3, timeout=[2, 5], headers={'X-Test': '1'})
+    assert AsyncAfipWSConnector.get_shared(url) is connector
+    config = connector.get_config()
+    assert config == {'ws_url': url, 'pool_size': 3, 'timeout': (2, 5),
+                      'headers': {**AsyncAfipWSConnector.HEADERS, 'X-Test': '1'}}
+    assert AsyncAfipWSConnector(**config).get_config() == config
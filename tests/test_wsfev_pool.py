@@ -0,0 +1,88 @@
+import threading
+from collections import Counter
+
+import pytest
+
+from conftest import build_invoices
+from easyAfip.utils.credentials import CredentialRegistry
+from easyAfip.utils.messages import FECAEResultEnum
+from easyAfip.utils.store import MemoryStore
+from easyAfip.wsfev_pool import WSFEVPool
+
+CUITS = ('20123456786', '30712345674')
+
+
+@pytest.fixture
+def make_pool(stub, credentials):
+    def make(**kwargs):
+        registry = CredentialRegistry(loader=lambda cuit: credentials)
+        return WSFEVPool(registry, test_mode=True, ticket_store=MemoryStore(), endpoints=stub.endpoints, **kwargs)
+    return make
+
+
+def track_in_flight(pool, log):
+    # wrap the job run by the pool to record the jobs in flight of every CUIT and the finishing order
+    fecaesolicitar, in_flight, lock = pool._fecaesolicitar, Counter(), threading.Lock()
+
+    def wrapper(cuit, pto_vta, cbte_tipo, invoices):
+        with lock:
+            in_flight[cuit] += 1
+            log.append(('max', cuit, in_flight[cuit]))
+        try:
+            return fecaesolicitar(cuit, pto_vta, cbte_tipo, invoices)
+        finally:
+            with lock:
+                in_flight[cuit] -= 1
+                log.append(('done', cuit, pto_vta))
+    pool._fecaesolicitar = wrapper
+
+
+def test_every_sequence_is_numbered_in_order(make_pool, stub):
+    work = [(cuit, pto_vta, 1, build_invoices(2)) for _ in range(3) for cuit in CUITS for pto_vta in (1, 2)]
+    with make_pool(max_workers=4) as pool:
+        results = [future.result() for future in pool.submit_many(work)]
+        client = pool.get_client(CUITS[0])
+        assert pool.get_client(CUITS[0]) is client
+
+    assert all(result.resultado == FECAEResultEnum.APROBADO for result in results)
+    for cuit in CUITS:
+        for pto_vta in (1, 2):
+            assert [detail.cbte_desde for result, item in zip(results, work) if item[:2] == (cuit, pto_vta)
+                    for detail in result.details] == [1, 2, 3, 4, 5, 6]
+            assert stub.last_numbers[(cuit, str(pto_vta), '1')] == 6
+    # a ticket per CUIT
+    assert stub.request_counts['LoginCms'] == 2
+
+
+def test_in_flight_jobs_per_cuit_are_limited(make_pool, stub):
+    stub.latency = lambda method_name: 0.05 if method_name == 'FECAESolicitar' else 0
+    log = []
+    with make_pool(max_workers=4, max_in_flight_per_cuit=1) as pool:
+        track_in_flight(pool, log)
+        futures = pool.submit_many((cuit, pto_vta, 1, build_invoices(1)) for cuit in CUITS for pto_vta in (1, 2, 3))
+        for future in futures:
+            future.result()
+    assert max(count for event, _, count in log if event == 'max') == 1
+
+
+def test_a_backlog_does_not_delay_other_sequences(make_pool, stub):
+    stub.latency = lambda method_name: 0.02 if method_name == 'FECAESolicitar' else 0
+    log = []
+    with make_pool(max_workers=1) as pool:
+        track_in_flight(pool, log)
+        futures = pool.submit_many([(CUITS[0], 1, 1, build_invoices(1)) for _ in range(6)] +
+                                   [(CUITS[1], 1, 1, build_invoices(1))])
+        for future in futures:
+            future.result()
+    finished = [cuit for event, cuit, _ in log if event == 'done']
+    assert finished.index(CUITS[1]) <= 2
+
+
+def test_client_is_rebuilt_with_a_new_ticket(make_pool):
+    with make_pool() as pool:
+        client = pool.get_client(CUITS[0])
+        wsaa, _ = pool._clients[CUITS[0]]
+        wsaa.invalidate_access_ticket()
+        renewed = pool.get_client(CUITS[0])
+        assert renewed is not client and renewed.token != client.token
+        assert renewed.afip_ws_connector is client.afip_ws_connector
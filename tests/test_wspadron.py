@@ -0,0 +1,78 @@
+import time
+from datetime import timedelta
+
+import pytest
+
+from easyAfip.utils.afip_ws_connector import AfipWSConnector
+from easyAfip.utils.invoice_validator import is_valid_cuit
+from easyAfip.utils.messages import Persona
+from easyAfip.utils.persona_cache import PersonaCache
+from easyAfip.utils.store import SqliteStore
+from easyAfip.wspadron import WSPadron
+
+
+def build_cuits(count, prefix='20'):
+    cuits = []
+    for number in range(10000000, 99999999):
+        cuit = next((candidate for candidate in (f'{prefix}{number}{digit}' for digit in range(10))
+                     if is_valid_cuit(candidate)), None)
+        if cuit:
+            cuits.append(cuit)
+        if len(cuits) == count:
+            return cuits
+
+
+@pytest.fixture
+def make_padron(stub):
+    connector = AfipWSConnector(stub.url('ws_sr_constancia_inscripcion'))
+
+    def make(persona_cache=None):
+        return WSPadron('token', 'sign', '20123456786', test_mode=True, connector=connector,
+                        persona_cache=persona_cache if persona_cache is not None else PersonaCache())
+    yield make
+    connector.close()
+
+
+def test_lookups_are_chunked_and_cached(make_padron, stub):
+    padron = make_padron()
+    cuits = build_cuits(600)
+
+    personas = padron.get_persona_list(cuits + cuits[:10])
+    assert list(personas) == cuits
+    assert all(persona.found for persona in personas.values())
+    assert stub.request_counts['getPersonaList_v2'] == 3
+
+    padron.get_persona_list(reversed(cuits))
+    assert padron.get_persona(cuits[0]).razon_social == f'CONTRIBUYENTE {cuits[0]}'
+    assert stub.request_counts['getPersonaList_v2'] == 3
+    with pytest.raises(ValueError):
+        padron.request_persona_list(cuits[:WSPadron.MAX_IDS_PER_REQUEST + 1])
+
+
+def test_not_found_cuits_are_cached_for_the_negative_ttl(make_padron, stub):
+    stub.personas['20111111112'] = Persona('20111111112', 'FISICA', 'JUAN', 'PEREZ', estado_clave='ACTIVO',
+                                           impuestos=[Persona.MONOTRIBUTO_IMPUESTO], categoria_monotributo='A')
+    cache = PersonaCache(negative_ttl=timedelta(seconds=0.2))
+    padron = make_padron(cache)
+
+    personas = padron.get_persona_list(['20111111112', '20111111111', '20000000000'])
+    assert personas['20111111112'].categoria_monotributo == 'A'
+    assert not personas['20111111111'].found and not personas['20000000000'].found
+    assert personas['20111111111'].errors[0].msg == 'No existe persona con ese Id'
+
+    padron.get_persona_list(['20111111111', '20000000000'])
+    assert stub.request_counts['getPersonaList_v2'] == 1
+    time.sleep(0.2)
+    padron.get_persona_list(['20111111112', '20111111111'])
+    assert stub.request_counts['getPersonaList_v2'] == 2
+    assert cache.hits == 3 and cache.misses == 4
+
+
+def test_persisted_lookups_survive_a_new_cache(make_padron, stub, tmp_path):
+    store = SqliteStore(str(tmp_path / 'padron.db'))
+    cuits = build_cuits(3) + ['20111111111']
+    make_padron(PersonaCache(store=store)).get_persona_list(cuits)
+
+    personas = make_padron(PersonaCache(store=store)).get_persona_list(cuits)
+    assert [persona.found for persona in personas.values()] == [True, True, True, False]
+    assert stub.request_counts['getPersonaList_v2'] == 1